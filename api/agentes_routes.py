@@ -15,6 +15,7 @@ import bcrypt
 
 from database.models import get_db
 from api.auth import crear_token, verificar_token
+from api.contadores_no_leidos import clave_agentes, leer_contador
 
 router = APIRouter()
 security = HTTPBearer()
@@ -85,7 +86,7 @@ def obtener_agente_actual(
 # =====================================================
 
 @router.post("/registro", tags=["Agentes"])
-async def registrar_agente(datos: AgenteRegistro, db: Session = Depends(get_db)):
+def registrar_agente(datos: AgenteRegistro, db: Session = Depends(get_db)):
     """Registrar nuevo agente (solo admin puede hacer esto desde panel)"""
     
     # Verificar si email ya existe
@@ -134,7 +135,7 @@ async def registrar_agente(datos: AgenteRegistro, db: Session = Depends(get_db))
     }
 
 @router.post("/login", tags=["Agentes"])
-async def login_agente(datos: AgenteLogin, db: Session = Depends(get_db)):
+def login_agente(datos: AgenteLogin, db: Session = Depends(get_db)):
     """Login para agentes"""
     
     # Buscar agente
@@ -173,7 +174,7 @@ async def login_agente(datos: AgenteLogin, db: Session = Depends(get_db)):
 # =====================================================
 
 @router.get("/perfil", tags=["Agentes"])
-async def obtener_perfil_agente(
+def obtener_perfil_agente(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
@@ -207,7 +208,7 @@ async def obtener_perfil_agente(
     }
 
 @router.get("/estadisticas", tags=["Agentes"])
-async def obtener_estadisticas_agente(
+def obtener_estadisticas_agente(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
@@ -268,7 +269,7 @@ async def obtener_estadisticas_agente(
 # =====================================================
 
 @router.get("/referidos", tags=["Agentes"])
-async def listar_referidos(
+def listar_referidos(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
@@ -302,7 +303,7 @@ async def listar_referidos(
     ]
 
 @router.get("/referidos/{estudiante_id}", tags=["Agentes"])
-async def obtener_detalle_referido(
+def obtener_detalle_referido(
     estudiante_id: int,
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
@@ -342,7 +343,7 @@ async def obtener_detalle_referido(
     }
 
 @router.put("/referidos/{estudiante_id}", tags=["Agentes"])
-async def actualizar_referido(
+def actualizar_referido(
     estudiante_id: int,
     datos: dict,
     agente = Depends(obtener_agente_actual),
@@ -385,7 +386,7 @@ async def actualizar_referido(
 # =====================================================
 
 @router.post("/referidos/{estudiante_id}/documentos", tags=["Agentes"])
-async def subir_documento_referido(
+def subir_documento_referido(
     estudiante_id: int,
     tipo_documento: str = Form(...),
     archivo: UploadFile = File(...),
@@ -417,7 +418,7 @@ async def subir_documento_referido(
 # =====================================================
 
 @router.post("/solicitar-retiro", tags=["Agentes"])
-async def solicitar_retiro(
+def solicitar_retiro(
     data: dict,
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
@@ -468,7 +469,7 @@ async def solicitar_retiro(
 
 
 @router.get("/retiros", tags=["Agentes"])
-async def obtener_retiros(
+def obtener_retiros(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
@@ -502,7 +503,7 @@ async def obtener_retiros(
 # =====================================================
 
 @router.get("/mensajes", tags=["Agentes"])
-async def obtener_mensajes_agente(
+def obtener_mensajes_agente(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
@@ -537,7 +538,7 @@ async def obtener_mensajes_agente(
 
 
 @router.post("/enviar-mensaje", tags=["Agentes"])
-async def enviar_mensaje_a_admin(
+def enviar_mensaje_a_admin(
     mensaje: dict,
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
@@ -561,16 +562,11 @@ async def enviar_mensaje_a_admin(
 
 
 @router.get("/mensajes/no-leidos", tags=["Agentes"])
-async def contar_mensajes_no_leidos(
+def contar_mensajes_no_leidos(
     agente = Depends(obtener_agente_actual),
     db: Session = Depends(get_db)
 ):
     """Contar mensajes no leídos del admin"""
     
-    result = db.execute(text("""
-        SELECT COUNT(*) FROM mensajes_agentes
-        WHERE agente_id = :agente_id AND remitente = 'admin' AND leido = FALSE
-    """), {"agente_id": agente["id"]}).fetchone()
-    
-    return {"no_leidos": result[0] if result else 0}
+    return {"no_leidos": leer_contador(db, clave_agentes("admin", agente["id"]))}
 
@@ -2,11 +2,11 @@
 Sistema de alertas internas por email al admin
 """
 
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from datetime import datetime
+from api import servicio_smtp
 
 def enviar_alerta_admin(estudiante_data: dict, tipo_alerta: str = "registro"):
     """
@@ -151,10 +151,7 @@ def enviar_alerta_admin(estudiante_data: dict, tipo_alerta: str = "registro"):
     
     # Enviar email
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as servidor:
-            servidor.starttls()
-            servidor.login(EMAIL_FROM, EMAIL_PASSWORD)
-            servidor.send_message(mensaje)
+        servicio_smtp.enviar(mensaje, servicio_smtp.ConfigSMTP(SMTP_SERVER, SMTP_PORT, EMAIL_FROM, EMAIL_PASSWORD))
         
         print(f"✅ Alerta enviada al admin: {ADMIN_EMAIL}")
         return True
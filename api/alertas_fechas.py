@@ -1,9 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+from html import escape
+from string import Template
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from database.models import FechaImportante, Estudiante
-from api.email_utils import enviar_email
+from database.models import FechaImportante, Estudiante, Notificacion
+from api import servicio_smtp
+from api.email_utils import config_smtp, construir_mensaje
 import os
 
+# Umbrales de aviso en días antes de la fecha (de menos a más urgente)
+UMBRALES_ALERTA = (30, 15, 7, 1)
+# Hilos que envían emails de alertas en paralelo (cada uno usa una conexión del pool SMTP)
+ALERTAS_HILOS_EMAIL = int(os.getenv('ALERTAS_HILOS_EMAIL', servicio_smtp.SMTP_POOL_TAMANO))
+# Notificaciones por INSERT
+LOTE_NOTIFICACIONES = 500
+
+ICONOS_TIPO_FECHA = {
+    'entrevista_consular': '📅',
+    'cita_visa': '📅',
+    'vencimiento_pasaporte': '⚠️',
+    'vencimiento_documento': '⚠️',
+    'renovacion_visa': '🆔',
+    'inicio_clases': '🎓',
+    'entrega_documentos': '📄',
+    'pago_matricula': '💶',
+}
+
+
+def _formatear_fecha(fecha: datetime) -> str:
+    fecha_formateada = fecha.strftime("%d/%m/%Y")
+    if fecha.hour > 0:
+        fecha_formateada += f" a las {fecha.strftime('%H:%M')}"
+    return fecha_formateada
+
+
+def _nivel_urgencia(dias_restantes: int) -> str:
+    if dias_restantes <= 1:
+        return 'urgente'
+    if dias_restantes <= 7:
+        return 'importante'
+    return 'recordatorio'
+
+
+def _asunto_alerta(alerta: dict) -> str:
+    dias_restantes = alerta['dias_restantes']
+    if dias_restantes <= 1:
+        return f"🚨 ¡MAÑANA! {alerta['tipo_nombre']} - {alerta['fecha_formateada']}"
+    if dias_restantes <= 7:
+        return f"⚠️ {alerta['tipo_nombre']} en {dias_restantes} días - {alerta['fecha_formateada']}"
+    return f"📅 Recordatorio: {alerta['tipo_nombre']} - {alerta['fecha_formateada']}"
+
+
+def _html_alerta(alerta: dict) -> str:
+    dias_restantes = alerta['dias_restantes']
+    plural = "s" if dias_restantes != 1 else ""
+    descripcion = (f'<div class="descripcion"><strong>Detalles:</strong><br>{escape(alerta["descripcion"])}</div>'
+                   if alerta['descripcion'] else '')
+    return _plantilla_alerta(alerta['tipo'], _nivel_urgencia(dias_restantes)).substitute(
+        nombre=escape(alerta['nombre'] or ''),
+        fecha=alerta['fecha_formateada'],
+        dias=f"{dias_restantes} día{plural}",
+        quedan="Quedan solo" if dias_restantes > 1 else "Queda solo",
+        descripcion=descripcion
+    )
+
+
+@lru_cache(maxsize=64)
+def _plantilla_alerta(tipo_fecha: str, nivel: str) -> Template:
+    """HTML del email por tipo de fecha y urgencia; se construye una vez y solo se rellenan los datos"""
+    urgencia, color, emoji = {
+        'urgente': ("¡URGENTE!", "#dc3545", "🚨"),
+        'importante': ("IMPORTANTE", "#ffc107", "⚠️"),
+        'recordatorio': ("Recordatorio", "#667eea", "📅"),
+    }[nivel]
+    # '$$': lo que no es un hueco de la plantilla no debe interpretarse como tal
+    tipo_nombre = escape(GestorAlertasFechas.TIPOS_FECHA.get(tipo_fecha, tipo_fecha)).replace('$', '$$')
+    frontend_url = os.getenv('FRONTEND_URL', 'https://bot-visas-estudio.vercel.app').replace('$', '$$')
+
+    html = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background: linear-gradient(135deg, {color} 0%, {color}dd 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+                .header h1 {{ margin: 0; font-size: 28px; }}
+                .content {{ background: white; padding: 30px; border: 1px solid #e2e8f0; border-top: none; }}
+                .fecha-box {{ background: #f8f9fa; border-left: 4px solid {color}; padding: 20px; margin: 20px 0; border-radius: 5px; }}
+                .fecha-box h2 {{ margin: 0 0 10px 0; color: {color}; font-size: 22px; }}
+                .dias-restantes {{ font-size: 48px; font-weight: bold; color: {color}; text-align: center; margin: 20px 0; }}
+                .descripcion {{ background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 15px 0; border-radius: 5px; }}
+                .acciones {{ margin-top: 30px; text-align: center; }}
+                .btn {{ display: inline-block; background: {color}; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; margin: 5px; }}
+                .footer {{ text-align: center; margin-top: 30px; color: #718096; font-size: 14px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>{emoji} {urgencia}</h1>
+                    <p style="margin: 10px 0 0 0; font-size: 18px;">Recordatorio de Fecha Importante</p>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>$nombre</strong>,</p>
+
+                    <div class="fecha-box">
+                        <h2>{tipo_nombre}</h2>
+                        <p style="margin: 5px 0; font-size: 16px;">📅 <strong>$fecha</strong></p>
+                    </div>
+
+                    <div class="dias-restantes">
+                        $dias
+                    </div>
+                    <p style="text-align: center; color: #718096;">$quedan <strong>$dias</strong> para esta fecha importante.</p>
+
+                    $descripcion
+
+                    <div style="background: #e8f4fd; border-left: 4px solid #2196f3; padding: 15px; margin: 20px 0; border-radius: 5px;">
+                        <strong>💡 Recomendaciones:</strong>
+                        <ul style="margin: 10px 0 0 0; padding-left: 20px;">
+                            {"<li>Verifica que tengas todos los documentos necesarios</li>" if tipo_fecha in ['entrevista_consular', 'cita_visa'] else ""}
+                            {"<li>Revisa los requisitos específicos de tu cita</li>" if tipo_fecha == 'cita_visa' else ""}
+                            {"<li>Practica tus respuestas con nuestro simulador</li>" if tipo_fecha == 'entrevista_consular' else ""}
+                            {"<li>Llega con 15-30 minutos de anticipación</li>" if tipo_fecha in ['entrevista_consular', 'cita_visa'] else ""}
+                            {"<li>Renueva este documento con anticipación</li>" if 'vencimiento' in tipo_fecha else ""}
+                            {"<li>Completa tu aplicación con todos los datos requeridos</li>" if tipo_fecha == 'deadline_aplicacion' else ""}
+                            <li>Contacta a nuestro equipo si necesitas ayuda</li>
+                        </ul>
+                    </div>
+
+                    <div class="acciones">
+                        <a href="{frontend_url}/estudiante/dashboard" class="btn">
+                            📋 Ver Mi Dashboard
+                        </a>
+                        <a href="{frontend_url}/estudiante/alertas" class="btn" style="background: #28a745;">
+                            📅 Ver Todas Mis Fechas
+                        </a>
+                    </div>
+
+                    <div class="footer">
+                        <p>Recibiste este email porque tienes fechas importantes registradas en tu perfil.</p>
+                        <p>🎓 <strong>Agencia Educativa España</strong><br>
+                        Tu éxito es nuestra misión</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+    return Template(html)
+
+
 class GestorAlertasFechas:
     """Gestor de alertas automáticas para fechas importantes"""
     
@@ -79,185 +230,161 @@ class GestorAlertasFechas:
         """
         Verifica todas las fechas y envía alertas según corresponda
         Debe ejecutarse diariamente (scheduler)
+        
+        Todo por lotes: una consulta trae las fechas con alerta pendiente y
+        los datos del estudiante, las notificaciones se insertan de una vez
+        con una clave por fecha y umbral (reejecutar el job no duplica nada:
+        solo se envía lo que esta ejecución consiguió insertar) y los emails
+        salen por el pool SMTP con ALERTAS_HILOS_EMAIL hilos.
         """
         hoy = datetime.utcnow()
-        alertas_enviadas = []
         
-        # Obtener todas las fechas activas
-        fechas_activas = db.query(FechaImportante).filter(
-            FechaImportante.completada == False,
-            FechaImportante.fecha >= hoy
-        ).all()
+        filas = db.execute(text("""
+            SELECT f.id, f.estudiante_id, f.tipo_fecha, f.fecha, f.descripcion,
+                   COALESCE(f.alertado_30d, FALSE), COALESCE(f.alertado_15d, FALSE),
+                   COALESCE(f.alertado_7d, FALSE), COALESCE(f.alertado_1d, FALSE),
+                   e.nombre, e.email
+            FROM fechas_importantes f
+            JOIN estudiantes e ON e.id = f.estudiante_id
+            WHERE COALESCE(f.completada, FALSE) = FALSE
+              AND f.fecha >= :hoy
+              AND f.fecha < :limite
+              AND NOT (COALESCE(f.alertado_30d, FALSE) AND COALESCE(f.alertado_15d, FALSE)
+                       AND COALESCE(f.alertado_7d, FALSE) AND COALESCE(f.alertado_1d, FALSE))
+        """), {'hoy': hoy, 'limite': hoy + timedelta(days=UMBRALES_ALERTA[0] + 1)}).fetchall()
         
-        for fecha in fechas_activas:
-            dias_restantes = (fecha.fecha - hoy).days
-            
-            # Verificar si corresponde enviar alerta de 30 días
-            if dias_restantes <= 30 and not fecha.alertado_30d:
-                if GestorAlertasFechas._enviar_alerta(db, fecha, 30):
-                    fecha.alertado_30d = True
-                    alertas_enviadas.append({
-                        'fecha_id': fecha.id,
-                        'tipo': '30 días',
-                        'estudiante_id': fecha.estudiante_id
-                    })
-            
-            # Verificar si corresponde enviar alerta de 15 días
-            if dias_restantes <= 15 and not fecha.alertado_15d:
-                if GestorAlertasFechas._enviar_alerta(db, fecha, 15):
-                    fecha.alertado_15d = True
-                    alertas_enviadas.append({
-                        'fecha_id': fecha.id,
-                        'tipo': '15 días',
-                        'estudiante_id': fecha.estudiante_id
-                    })
-            
-            # Verificar si corresponde enviar alerta de 7 días
-            if dias_restantes <= 7 and not fecha.alertado_7d:
-                if GestorAlertasFechas._enviar_alerta(db, fecha, 7):
-                    fecha.alertado_7d = True
-                    alertas_enviadas.append({
-                        'fecha_id': fecha.id,
-                        'tipo': '7 días',
-                        'estudiante_id': fecha.estudiante_id
-                    })
-            
-            # Verificar si corresponde enviar alerta de 1 día
-            if dias_restantes <= 1 and not fecha.alertado_1d:
-                if GestorAlertasFechas._enviar_alerta(db, fecha, 1):
-                    fecha.alertado_1d = True
-                    alertas_enviadas.append({
-                        'fecha_id': fecha.id,
-                        'tipo': '1 día',
-                        'estudiante_id': fecha.estudiante_id
-                    })
+        # Una sola alerta por fecha y día: la del umbral más urgente alcanzado
+        # (una fecha a 5 días sin avisos previos no recibe 3 emails a la vez)
+        alertas = []
+        for (fecha_id, estudiante_id, tipo_fecha, fecha, descripcion,
+             a30, a15, a7, a1, nombre, email) in filas:
+            dias_restantes = (fecha - hoy).days
+            alertados = dict(zip(UMBRALES_ALERTA, (a30, a15, a7, a1)))
+            pendientes = [u for u in UMBRALES_ALERTA if dias_restantes <= u and not alertados[u]]
+            if not pendientes:
+                continue
+            alertas.append({
+                'fecha_id': fecha_id,
+                'estudiante_id': estudiante_id,
+                'tipo': tipo_fecha,
+                'umbral': min(pendientes),
+                'dias_restantes': dias_restantes,
+                'fecha': fecha,
+                'descripcion': descripcion,
+                'nombre': nombre,
+                'email': email
+            })
+        if not alertas:
+            return []
         
-        db.commit()
-        return alertas_enviadas
+        reclamadas = GestorAlertasFechas._registrar_alertas(db, alertas)
+        alertas = [a for a in alertas if a['clave'] in reclamadas]
+        
+        GestorAlertasFechas._enviar_emails_alertas(alertas)
+        
+        return [{
+            'fecha_id': a['fecha_id'],
+            'estudiante_id': a['estudiante_id'],
+            'tipo': a['tipo'],
+            'dias_restantes': a['dias_restantes'],
+            'email_enviado': a['email_enviado']
+        } for a in alertas]
     
     @staticmethod
-    def _enviar_alerta(db: Session, fecha: FechaImportante, dias_restantes: int):
-        """Envía email de alerta al estudiante"""
-        # Obtener datos del estudiante
-        estudiante = db.query(Estudiante).filter(Estudiante.id == fecha.estudiante_id).first()
-        if not estudiante or not estudiante.email:
-            return False
-        
-        # Determinar urgencia
-        if dias_restantes <= 1:
-            urgencia = "¡URGENTE!"
-            color = "#dc3545"
-            emoji = "🚨"
-        elif dias_restantes <= 7:
-            urgencia = "IMPORTANTE"
-            color = "#ffc107"
-            emoji = "⚠️"
-        else:
-            urgencia = "Recordatorio"
-            color = "#667eea"
-            emoji = "📅"
+    def _registrar_alertas(db: Session, alertas: list) -> set:
+        """
+        En una transacción: inserta las notificaciones (ON CONFLICT DO NOTHING
+        sobre la clave de idempotencia) y marca los umbrales como alertados.
+        Devuelve las claves insertadas ahora: solo esas alertas se envían.
+        """
+        tabla = Notificacion.__table__
+        filas = []
+        for alerta in alertas:
+            alerta['clave'] = f"alerta_fecha:{alerta['fecha_id']}:{alerta['umbral']}d"
+            alerta['tipo_nombre'] = GestorAlertasFechas.TIPOS_FECHA.get(alerta['tipo'], alerta['tipo'])
+            alerta['fecha_formateada'] = _formatear_fecha(alerta['fecha'])
+            icono = ICONOS_TIPO_FECHA.get(alerta['tipo'], '🔔')
+            dias = alerta['dias_restantes']
+            filas.append({
+                'estudiante_id': alerta['estudiante_id'],
+                'tipo': 'alerta',
+                'titulo': f"Recordatorio: {alerta['tipo_nombre']}",
+                'mensaje': f"{alerta['tipo_nombre']} el {alerta['fecha_formateada']} "
+                           f"(queda{'n' if dias != 1 else ''} {dias} día{'s' if dias != 1 else ''})",
+                'url_accion': '/estudiante/alertas',
+                'icono': icono,
+                'prioridad': 'urgente' if 'vencimiento' in alerta['tipo'] else 'alta',
+                'leida': False,
+                'clave_idempotencia': alerta['clave'],
+                'created_at': datetime.utcnow()
+            })
         
-        # Obtener nombre del tipo de fecha
-        tipo_nombre = GestorAlertasFechas.TIPOS_FECHA.get(fecha.tipo_fecha, fecha.tipo_fecha)
+        try:
+            reclamadas = set()
+            for i in range(0, len(filas), LOTE_NOTIFICACIONES):
+                resultado = db.execute(
+                    pg_insert(tabla)
+                    .values(filas[i:i + LOTE_NOTIFICACIONES])
+                    .on_conflict_do_nothing(index_elements=['clave_idempotencia'])
+                    .returning(tabla.c.clave_idempotencia)
+                )
+                reclamadas.update(fila[0] for fila in resultado)
+            
+            db.execute(text("""
+                UPDATE fechas_importantes f
+                SET alertado_30d = COALESCE(f.alertado_30d, FALSE) OR v.umbral <= 30,
+                    alertado_15d = COALESCE(f.alertado_15d, FALSE) OR v.umbral <= 15,
+                    alertado_7d = COALESCE(f.alertado_7d, FALSE) OR v.umbral <= 7,
+                    alertado_1d = COALESCE(f.alertado_1d, FALSE) OR v.umbral <= 1,
+                    updated_at = NOW()
+                FROM unnest(CAST(:ids AS INTEGER[]), CAST(:umbrales AS INTEGER[])) AS v(id, umbral)
+                WHERE f.id = v.id
+            """), {
+                'ids': [a['fecha_id'] for a in alertas],
+                'umbrales': [a['umbral'] for a in alertas]
+            })
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return reclamadas
+    
+    @staticmethod
+    def _enviar_emails_alertas(alertas: list):
+        """Renderiza y envía los emails por lotes; marca alerta['email_enviado']"""
+        mensajes = []
+        for alerta in alertas:
+            alerta['email_enviado'] = False
+            if alerta['email']:
+                mensajes.append((alerta, None))
+        if not mensajes:
+            return
         
-        # Formatear fecha
-        fecha_formateada = fecha.fecha.strftime("%d/%m/%Y")
-        if fecha.fecha.hour > 0:
-            fecha_formateada += f" a las {fecha.fecha.strftime('%H:%M')}"
+        try:
+            config = config_smtp()
+        except ValueError as e:
+            print(f"❌ No se envían emails de alertas: {e}")
+            return
         
-        # Template HTML del email
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, {color} 0%, {color}dd 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .header h1 {{ margin: 0; font-size: 28px; }}
-                .content {{ background: white; padding: 30px; border: 1px solid #e2e8f0; border-top: none; }}
-                .fecha-box {{ background: #f8f9fa; border-left: 4px solid {color}; padding: 20px; margin: 20px 0; border-radius: 5px; }}
-                .fecha-box h2 {{ margin: 0 0 10px 0; color: {color}; font-size: 22px; }}
-                .dias-restantes {{ font-size: 48px; font-weight: bold; color: {color}; text-align: center; margin: 20px 0; }}
-                .descripcion {{ background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 15px 0; border-radius: 5px; }}
-                .acciones {{ margin-top: 30px; text-align: center; }}
-                .btn {{ display: inline-block; background: {color}; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; margin: 5px; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #718096; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>{emoji} {urgencia}</h1>
-                    <p style="margin: 10px 0 0 0; font-size: 18px;">Recordatorio de Fecha Importante</p>
-                </div>
-                <div class="content">
-                    <p>Hola <strong>{estudiante.nombre}</strong>,</p>
-                    
-                    <div class="fecha-box">
-                        <h2>{tipo_nombre}</h2>
-                        <p style="margin: 5px 0; font-size: 16px;">📅 <strong>{fecha_formateada}</strong></p>
-                    </div>
-                    
-                    <div class="dias-restantes">
-                        {dias_restantes} día{"s" if dias_restantes != 1 else ""}
-                    </div>
-                    <p style="text-align: center; color: #718096;">{"Quedan solo" if dias_restantes > 1 else "Queda solo"} <strong>{dias_restantes} día{"s" if dias_restantes != 1 else ""}</strong> para esta fecha importante.</p>
-                    
-                    {f'<div class="descripcion"><strong>Detalles:</strong><br>{fecha.descripcion}</div>' if fecha.descripcion else ''}
-                    
-                    <div style="background: #e8f4fd; border-left: 4px solid #2196f3; padding: 15px; margin: 20px 0; border-radius: 5px;">
-                        <strong>💡 Recomendaciones:</strong>
-                        <ul style="margin: 10px 0 0 0; padding-left: 20px;">
-                            {"<li>Verifica que tengas todos los documentos necesarios</li>" if fecha.tipo_fecha in ['entrevista_consular', 'cita_visa'] else ""}
-                            {"<li>Revisa los requisitos específicos de tu cita</li>" if fecha.tipo_fecha == 'cita_visa' else ""}
-                            {"<li>Practica tus respuestas con nuestro simulador</li>" if fecha.tipo_fecha == 'entrevista_consular' else ""}
-                            {"<li>Llega con 15-30 minutos de anticipación</li>" if fecha.tipo_fecha in ['entrevista_consular', 'cita_visa'] else ""}
-                            {"<li>Renueva este documento con anticipación</li>" if 'vencimiento' in fecha.tipo_fecha else ""}
-                            {"<li>Completa tu aplicación con todos los datos requeridos</li>" if fecha.tipo_fecha == 'deadline_aplicacion' else ""}
-                            <li>Contacta a nuestro equipo si necesitas ayuda</li>
-                        </ul>
-                    </div>
-                    
-                    <div class="acciones">
-                        <a href="{os.getenv('FRONTEND_URL', 'https://bot-visas-estudio.vercel.app')}/estudiante/dashboard" class="btn">
-                            📋 Ver Mi Dashboard
-                        </a>
-                        <a href="{os.getenv('FRONTEND_URL', 'https://bot-visas-estudio.vercel.app')}/estudiante/alertas" class="btn" style="background: #28a745;">
-                            📅 Ver Todas Mis Fechas
-                        </a>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>Recibiste este email porque tienes fechas importantes registradas en tu perfil.</p>
-                        <p>🎓 <strong>Agencia Educativa España</strong><br>
-                        Tu éxito es nuestra misión</p>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        mensajes = [
+            (alerta, construir_mensaje(config.usuario, alerta['email'], _asunto_alerta(alerta), _html_alerta(alerta)))
+            for alerta, _ in mensajes
+        ]
+        lotes = [mensajes[i:i + servicio_smtp.LOTE_COLA] for i in range(0, len(mensajes), servicio_smtp.LOTE_COLA)]
         
-        # Asunto del email
-        if dias_restantes <= 1:
-            asunto = f"🚨 ¡MAÑANA! {tipo_nombre} - {fecha_formateada}"
-        elif dias_restantes <= 7:
-            asunto = f"⚠️ {tipo_nombre} en {dias_restantes} días - {fecha_formateada}"
-        else:
-            asunto = f"📅 Recordatorio: {tipo_nombre} - {fecha_formateada}"
+        def enviar(lote):
+            return servicio_smtp.enviar_lote([mensaje for _, mensaje in lote], config)
         
-        # Enviar email
-        try:
-            enviar_email(
-                destinatario=estudiante.email,
-                asunto=asunto,
-                contenido_html=html
-            )
-            return True
-        except Exception as e:
-            print(f"❌ Error enviando alerta: {e}")
-            return False
+        errores = 0
+        with ThreadPoolExecutor(max_workers=ALERTAS_HILOS_EMAIL) as hilos:
+            for lote, resultados in zip(lotes, hilos.map(enviar, lotes)):
+                for (alerta, _), (_, error) in zip(lote, resultados):
+                    if error:
+                        errores += 1
+                        print(f"❌ Error enviando alerta a {alerta['email']}: {error}")
+                    else:
+                        alerta['email_enviado'] = True
+        print(f"📧 Alertas de fechas: {len(mensajes) - errores} emails enviados, {errores} errores")
     
     @staticmethod
     def generar_ics(fecha: FechaImportante, estudiante: Estudiante):
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database.models import get_db
+from database.models import get_db, get_connection
 from api.auth import verificar_token
+from api.metricas_dashboard import obtener_metricas
 from datetime import datetime, timedelta
 import os
-import psycopg2
 
 router = APIRouter()
 
@@ -20,21 +20,10 @@ def obtener_analytics_general(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
-        cursor = conn.cursor()
-        
-        # Total estudiantes
-        cursor.execute("SELECT COUNT(*) FROM estudiantes")
-        total_estudiantes = cursor.fetchone()[0]
-        
-        # Estudiantes por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) 
-            FROM estudiantes 
-            WHERE estado IS NOT NULL
-            GROUP BY estado
-        """)
-        estados = {row[0]: row[1] for row in cursor.fetchall()}
+        # Contadores precalculados (vista materializada metricas_dashboard)
+        metricas = obtener_metricas()
+        total_estudiantes = metricas['total_estudiantes']
+        estados = metricas['por_estado']
         
         # Aprobados y rechazados
         aprobados = estados.get('aprobado', 0) + estados.get('visa_aprobada', 0)
@@ -45,21 +34,11 @@ def obtener_analytics_general(
         total_procesados = aprobados + rechazados
         tasa_aprobacion = (aprobados / total_procesados * 100) if total_procesados > 0 else 0
         
-        # Estudiantes registrados últimos 30 días
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM estudiantes 
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        nuevos_30_dias = cursor.fetchone()[0]
+        nuevos_30_dias = metricas['registros_30d']
+        mensajes_mes = metricas['mensajes_30d']
         
-        # Mensajes chat último mes
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM mensajes_chat 
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        mensajes_mes = cursor.fetchone()[0]
+        conn = get_connection()
+        cursor = conn.cursor()
         
         # Simulador completados (verificar si tabla existe)
         cursor.execute("""
@@ -110,7 +89,7 @@ def obtener_estudiantes_por_pais(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -146,7 +125,7 @@ def obtener_estudiantes_por_especialidad(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -183,7 +162,7 @@ def obtener_crecimiento_mensual(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute(f"""
@@ -220,7 +199,7 @@ def obtener_distribucion_estados(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -256,7 +235,7 @@ def obtener_universidades_populares(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Verificar si la columna visitas existe
@@ -307,7 +286,7 @@ def obtener_metricas_engagement(
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Total estudiantes
@@ -380,7 +359,7 @@ def exportar_estudiantes_csv(
         import csv
         from fastapi.responses import StreamingResponse
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -0,0 +1,257 @@
+"""
+Almacenamiento de binarios de documentos (blob store)
+Los archivos se guardan fuera de Postgres, direccionados por su SHA-256:
+un mismo archivo subido dos veces se guarda una sola vez y las filas de
+`documentos` / `documentos_generados` solo guardan metadatos + `blob_key`.
+
+Borrar una fila no borra su blob: una subida idéntica en paralelo podría
+estar reutilizándolo en ese momento. Los blobs sin filas se borran en
+limpiar_blobs_huerfanos() (tarea diaria) cuando llevan BLOB_GRACIA_SEGUNDOS
+sin que nadie los guarde; cada subida deduplicada renueva su mtime.
+"""
+import base64
+import hashlib
+import io
+import os
+import tempfile
+import time
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+TAMANO_CHUNK = 64 * 1024
+# Un blob sin referencias se conserva este tiempo desde su última subida
+BLOB_GRACIA_SEGUNDOS = int(os.getenv('BLOB_GRACIA_SEGUNDOS', 24 * 3600))
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """El archivo supera el límite de tamaño (se detecta mientras se copia)"""
+
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        super().__init__(f"El archivo supera el máximo de {limite_bytes // (1024 * 1024)}MB")
+
+
+class BlobStorage:
+    """Interfaz base para backends de almacenamiento"""
+
+    def guardar_archivo(self, archivo: BinaryIO, limite_bytes: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Copia un archivo por trozos calculando el SHA-256 sobre la marcha.
+        Lanza ArchivoDemasiadoGrande en cuanto se pasa de limite_bytes.
+
+        Returns:
+            (clave, tamaño en bytes)
+        """
+        raise NotImplementedError
+
+    def guardar(self, contenido: bytes) -> str:
+        """Guarda el contenido y devuelve su clave (sha256 hex)"""
+        return self.guardar_archivo(io.BytesIO(contenido))[0]
+
+    def abrir(self, clave: str) -> BinaryIO:
+        """Abre el blob para lectura en binario"""
+        raise NotImplementedError
+
+    def existe(self, clave: str) -> bool:
+        raise NotImplementedError
+
+    def eliminar(self, clave: str) -> None:
+        raise NotImplementedError
+
+    def listar_antiguos(self, antes_de: float) -> Iterator[str]:
+        """Claves de los blobs guardados por última vez antes de `antes_de` (epoch)"""
+        raise NotImplementedError
+
+    def eliminar_si_antiguo(self, clave: str, antes_de: float) -> bool:
+        """
+        Borra el blob solo si nadie lo ha vuelto a guardar desde `antes_de`,
+        sin carrera con una subida que lo deduplica a la vez. True si se borró.
+        """
+        raise NotImplementedError
+
+    def leer(self, clave: str) -> bytes:
+        with self.abrir(clave) as f:
+            return f.read()
+
+    @staticmethod
+    def calcular_clave(contenido: bytes) -> str:
+        return hashlib.sha256(contenido).hexdigest()
+
+
+class LocalBlobStorage(BlobStorage):
+    """Backend en sistema de archivos local: <raiz>/ab/cd/abcd...."""
+
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        if len(clave) != 64 or not all(c in '0123456789abcdef' for c in clave):
+            raise ValueError(f"Clave de blob inválida: {clave}")
+        return os.path.join(self.raiz, clave[:2], clave[2:4], clave)
+
+    def guardar_archivo(self, archivo: BinaryIO, limite_bytes: Optional[int] = None) -> Tuple[str, int]:
+        # Escritura atómica: archivo temporal + rename cuando ya se conoce el hash
+        fd, tmp = tempfile.mkstemp(dir=self.raiz, prefix='.tmp-')
+        sha256 = hashlib.sha256()
+        tamano = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = archivo.read(TAMANO_CHUNK)
+                    if not chunk:
+                        break
+                    tamano += len(chunk)
+                    if limite_bytes is not None and tamano > limite_bytes:
+                        raise ArchivoDemasiadoGrande(limite_bytes)
+                    sha256.update(chunk)
+                    f.write(chunk)
+
+            clave = sha256.hexdigest()
+            ruta = self._ruta(clave)
+            try:
+                # Mismo contenido ya almacenado (deduplicación): renovar el
+                # mtime para que la limpieza de huérfanos no lo borre ahora
+                os.utime(ruta)
+                os.remove(tmp)
+            except FileNotFoundError:
+                # No existía (o la limpieza acaba de retirarlo): usar nuestra copia
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                os.replace(tmp, ruta)
+            return clave, tamano
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def abrir(self, clave: str) -> BinaryIO:
+        return open(self._ruta(clave), 'rb')
+
+    def existe(self, clave: str) -> bool:
+        return os.path.exists(self._ruta(clave))
+
+    def eliminar(self, clave: str) -> None:
+        try:
+            os.remove(self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+    def listar_antiguos(self, antes_de: float) -> Iterator[str]:
+        for directorio, _, archivos in os.walk(self.raiz):
+            for nombre in archivos:
+                if nombre.startswith('.'):
+                    # Temporales de subidas en curso y blobs retirándose
+                    continue
+                try:
+                    if os.stat(os.path.join(directorio, nombre)).st_mtime < antes_de:
+                        yield nombre
+                except FileNotFoundError:
+                    pass
+
+    def eliminar_si_antiguo(self, clave: str, antes_de: float) -> bool:
+        ruta = self._ruta(clave)
+        retirado = os.path.join(self.raiz, f'.retirando-{clave}')
+        # Tras el rename, una subida del mismo contenido ya no lo encuentra y
+        # guarda su propia copia en la ruta (ver guardar_archivo)
+        try:
+            os.replace(ruta, retirado)
+        except FileNotFoundError:
+            return False
+        if os.stat(retirado).st_mtime >= antes_de:
+            # Una subida lo reutilizó justo antes del rename: devolverlo
+            os.replace(retirado, ruta)
+            return False
+        os.remove(retirado)
+        return True
+
+
+_storage: Optional[BlobStorage] = None
+
+
+def obtener_storage() -> BlobStorage:
+    """Backend configurado (BLOB_STORAGE_BACKEND, por defecto 'local')"""
+    global _storage
+    if _storage is None:
+        backend = os.getenv('BLOB_STORAGE_BACKEND', 'local')
+        if backend == 'local':
+            _storage = LocalBlobStorage(os.getenv('BLOB_STORAGE_DIR', './storage/blobs'))
+        else:
+            raise ValueError(f"Backend de blob storage no soportado: {backend}")
+    return _storage
+
+
+def guardar_upload(archivo, limite_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Guarda un UploadFile en el blob storage sin cargarlo entero en memoria.
+    Si el cliente indicó el tamaño de la parte se rechaza antes de leer nada;
+    si no, se corta en cuanto la copia pasa del límite.
+    Bloquea (copia + hash): llamar desde handlers síncronos, que FastAPI
+    ejecuta en el threadpool, nunca directamente en el event loop.
+    """
+    tamano = getattr(archivo, 'size', None)
+    if limite_bytes is not None and tamano is not None and tamano > limite_bytes:
+        raise ArchivoDemasiadoGrande(limite_bytes)
+    archivo.file.seek(0)
+    return obtener_storage().guardar_archivo(archivo.file, limite_bytes)
+
+
+def decodificar_base64_legacy(contenido_b64: Optional[str]) -> Optional[bytes]:
+    """Decodifica el formato antiguo (base64 plano o data:mime;base64,...)"""
+    if not contenido_b64:
+        return None
+    if contenido_b64.startswith('data:') and ',' in contenido_b64:
+        contenido_b64 = contenido_b64.split(',', 1)[1]
+    return base64.b64decode(contenido_b64)
+
+
+def leer_documento(blob_key: Optional[str], contenido_b64: Optional[str] = None) -> Optional[bytes]:
+    """
+    Contenido binario de un documento.
+    Usa el blob store si la fila ya tiene blob_key; si no (filas aún sin
+    migrar) cae al base64 guardado en la propia fila.
+    """
+    if blob_key:
+        return obtener_storage().leer(blob_key)
+    return decodificar_base64_legacy(contenido_b64)
+
+
+def abrir_documento(blob_key: Optional[str], contenido_b64: Optional[str] = None) -> Optional[BinaryIO]:
+    """Como leer_documento() pero devuelve un archivo para leer por trozos"""
+    if blob_key:
+        return obtener_storage().abrir(blob_key)
+    contenido = decodificar_base64_legacy(contenido_b64)
+    return io.BytesIO(contenido) if contenido is not None else None
+
+
+def limpiar_blobs_huerfanos(gracia_segundos: int = BLOB_GRACIA_SEGUNDOS) -> Dict:
+    """
+    Borra los blobs que ninguna fila referencia y que nadie ha guardado en
+    `gracia_segundos`. La gracia cubre subidas cuya fila aún no se ha
+    confirmado; eliminar_si_antiguo() cubre las que llegan durante la limpieza.
+    """
+    from database.models import get_connection
+
+    storage = obtener_storage()
+    antes_de = time.time() - gracia_segundos
+    candidatas = list(storage.listar_antiguos(antes_de))
+    borrados = 0
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for i in range(0, len(candidatas), 1000):
+            lote = candidatas[i:i + 1000]
+            cursor.execute("""
+                SELECT blob_key FROM documentos WHERE blob_key = ANY(%s)
+                UNION
+                SELECT blob_key FROM documentos_generados WHERE blob_key = ANY(%s)
+            """, (lote, lote))
+            referenciadas = {fila[0] for fila in cursor.fetchall()}
+            for clave in lote:
+                if clave not in referenciadas and storage.eliminar_si_antiguo(clave, antes_de):
+                    borrados += 1
+        cursor.close()
+    finally:
+        conn.close()
+
+    print(f"🧹 Blobs huérfanos: {borrados} borrados de {len(candidatas)} sin uso reciente")
+    return {'revisados': len(candidatas), 'borrados': borrados}
@@ -0,0 +1,274 @@
+"""
+Buscador de programas universitarios (índice invertido en memoria)
+El catálogo de programas activos se carga una vez y se indexa por palabras
+(nombre del programa, universidad, siglas, ciudad y área), sin acentos ni
+mayúsculas. Cada búsqueda resuelve en memoria:
+- coincidencia exacta y por prefijo (búsqueda mientras se escribe)
+- palabras parecidas por trigramas (errores de escritura)
+- ranking por relevancia y conteos por tipo de programa, ciudad y precio
+El índice se reconstruye tras actualizar_todas_universidades() o cuando
+tiene más de PROGRAMAS_INDICE_TTL segundos.
+"""
+import bisect
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+INDICE_TTL = int(os.getenv('PROGRAMAS_INDICE_TTL', 600))
+
+# Peso de cada campo en la relevancia
+PESO_PROGRAMA = 3.0
+PESO_AREA = 1.5
+PESO_UNIVERSIDAD = 1.0
+PESO_CIUDAD = 1.0
+
+# Factor según cómo coincide la palabra buscada
+FACTOR_EXACTA = 1.0
+FACTOR_PREFIJO = 0.8
+SIMILITUD_MINIMA = 0.45
+
+BANDAS_PRECIO = [
+    ('hasta_3000', 0, 3000),
+    ('3000_6000', 3000, 6000),
+    ('6000_12000', 6000, 12000),
+    ('mas_12000', 12000, None),
+]
+
+
+def normalizar(texto: Optional[str]) -> str:
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    return re.findall(r'[a-z0-9]+', normalizar(texto))
+
+
+def trigramas(palabra: str) -> Set[str]:
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def banda_precio(precio: Optional[float]) -> str:
+    if precio is None:
+        return 'sin_precio'
+    for nombre, minimo, maximo in BANDAS_PRECIO:
+        if precio >= minimo and (maximo is None or precio < maximo):
+            return nombre
+    return 'sin_precio'
+
+
+class IndiceProgramas:
+    """Índice invertido inmutable: se sustituye entero al reconstruir"""
+
+    def __init__(self, filas: List[Dict]):
+        self.documentos = filas
+        # palabra -> {posición del documento: peso del mejor campo}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        for posicion, doc in enumerate(filas):
+            programa, universidad = doc['programa'], doc['universidad']
+            campos = [
+                (programa['nombre'], PESO_PROGRAMA),
+                (doc['_area'], PESO_AREA),
+                (universidad['nombre'], PESO_UNIVERSIDAD),
+                (doc['_siglas'], PESO_UNIVERSIDAD),
+                (universidad['ciudad'], PESO_CIUDAD),
+            ]
+            for texto, peso in campos:
+                for palabra in tokenizar(texto):
+                    docs = self.postings.setdefault(palabra, {})
+                    if docs.get(posicion, 0) < peso:
+                        docs[posicion] = peso
+
+        self.vocabulario = sorted(self.postings)
+        # trigrama -> palabras del vocabulario que lo contienen
+        self.trigramas: Dict[str, Set[str]] = {}
+        for palabra in self.vocabulario:
+            for trigrama in trigramas(palabra):
+                self.trigramas.setdefault(trigrama, set()).add(palabra)
+
+    def _palabras_candidatas(self, termino: str) -> Dict[str, float]:
+        """Palabras del vocabulario que encajan con el término y su factor"""
+        candidatas = {}
+        if termino in self.postings:
+            candidatas[termino] = FACTOR_EXACTA
+
+        # Prefijo: rango contiguo del vocabulario ordenado
+        inicio = bisect.bisect_left(self.vocabulario, termino)
+        for palabra in self.vocabulario[inicio:]:
+            if not palabra.startswith(termino):
+                break
+            candidatas.setdefault(palabra, FACTOR_PREFIJO)
+
+        # Parecidas (errores de escritura): similitud de trigramas
+        if len(termino) >= 3:
+            trig_termino = trigramas(termino)
+            comunes: Dict[str, int] = {}
+            for trigrama in trig_termino:
+                for palabra in self.trigramas.get(trigrama, ()):
+                    comunes[palabra] = comunes.get(palabra, 0) + 1
+            for palabra, n in comunes.items():
+                if palabra in candidatas:
+                    continue
+                similitud = n / (len(trig_termino) + len(trigramas(palabra)) - n)
+                if similitud >= SIMILITUD_MINIMA:
+                    candidatas[palabra] = similitud * FACTOR_PREFIJO
+        return candidatas
+
+    def _coincidencias(self, query: str) -> Dict[int, float]:
+        """Documentos que encajan con TODAS las palabras buscadas -> puntuación"""
+        terminos = tokenizar(query)
+        if not terminos:
+            return {posicion: 0.0 for posicion in range(len(self.documentos))}
+
+        puntuaciones: Optional[Dict[int, float]] = None
+        for termino in terminos:
+            por_termino: Dict[int, float] = {}
+            for palabra, factor in self._palabras_candidatas(termino).items():
+                for posicion, peso in self.postings[palabra].items():
+                    puntuacion = peso * factor
+                    if puntuacion > por_termino.get(posicion, 0):
+                        por_termino[posicion] = puntuacion
+
+            if puntuaciones is None:
+                puntuaciones = por_termino
+            else:
+                puntuaciones = {
+                    posicion: puntuaciones[posicion] + puntuacion
+                    for posicion, puntuacion in por_termino.items()
+                    if posicion in puntuaciones
+                }
+            if not puntuaciones:
+                break
+        return puntuaciones or {}
+
+    def buscar(
+        self,
+        query: str,
+        ciudad: Optional[str] = None,
+        tipo_programa: Optional[str] = None,
+        precio_max: Optional[float] = None,
+        limite: int = 50
+    ) -> Dict:
+        puntuaciones = self._coincidencias(query)
+        ciudad_norm = normalizar(ciudad) if ciudad else None
+        tipo_norm = normalizar(tipo_programa) if tipo_programa else None
+
+        def pasa(doc, excluir=None):
+            if ciudad_norm and excluir != 'ciudad' and ciudad_norm not in doc['_ciudad']:
+                return False
+            if tipo_norm and excluir != 'tipo_programa' and doc['_tipo'] != tipo_norm:
+                return False
+            if precio_max and excluir != 'precio':
+                precio = doc['programa']['precio_anual_eur']
+                if precio is None or precio > precio_max:
+                    return False
+            return True
+
+        # Facetas: cada una se cuenta sin su propio filtro
+        facetas = {'tipo_programa': {}, 'ciudad': {}, 'precio': {}}
+        seleccionados = []
+        for posicion, puntuacion in puntuaciones.items():
+            doc = self.documentos[posicion]
+            for faceta, valor in (
+                ('tipo_programa', doc['programa']['tipo_programa'] or 'sin_tipo'),
+                ('ciudad', doc['universidad']['ciudad'] or 'sin_ciudad'),
+                ('precio', banda_precio(doc['programa']['precio_anual_eur'])),
+            ):
+                if pasa(doc, excluir=faceta):
+                    facetas[faceta][valor] = facetas[faceta].get(valor, 0) + 1
+            if pasa(doc):
+                seleccionados.append((puntuacion, doc))
+
+        seleccionados.sort(key=lambda item: (-item[0], item[1]['programa']['nombre']))
+        return {
+            'total_coincidencias': len(seleccionados),
+            'resultados': [
+                {
+                    'programa': doc['programa'],
+                    'universidad': doc['universidad'],
+                    'relevancia': round(puntuacion, 3)
+                }
+                for puntuacion, doc in seleccionados[:limite]
+            ],
+            'facetas': {
+                faceta: dict(sorted(conteos.items(), key=lambda item: -item[1]))
+                for faceta, conteos in facetas.items()
+            }
+        }
+
+
+def _cargar_filas(db_session) -> List[Dict]:
+    from database.models import ProgramaUniversitario, UniversidadEspana
+
+    filas = db_session.query(
+        ProgramaUniversitario, UniversidadEspana
+    ).join(
+        UniversidadEspana,
+        ProgramaUniversitario.universidad_id == UniversidadEspana.id
+    ).filter(
+        ProgramaUniversitario.activo == True
+    ).all()
+
+    return [
+        {
+            'programa': {
+                'id': programa.id,
+                'nombre': programa.nombre,
+                'tipo_programa': programa.tipo_programa,
+                'duracion_anos': programa.duracion_anos,
+                'precio_anual_eur': programa.precio_anual_eur,
+                'modalidad': programa.modalidad,
+                'idioma': programa.idioma
+            },
+            'universidad': {
+                'id': universidad.id,
+                'nombre': universidad.nombre,
+                'ciudad': universidad.ciudad,
+                'tipo': universidad.tipo,
+                'url_oficial': universidad.url_oficial
+            },
+            '_area': programa.area_estudio,
+            '_siglas': universidad.siglas,
+            '_ciudad': normalizar(universidad.ciudad),
+            '_tipo': normalizar(programa.tipo_programa),
+        }
+        for programa, universidad in filas
+    ]
+
+
+_indice: Optional[IndiceProgramas] = None
+_construido_en = 0.0
+_lock = threading.Lock()
+
+
+def obtener_indice(db_session) -> IndiceProgramas:
+    """
+    Índice actual; lo reconstruye si no existe o ha caducado.
+    Mientras un hilo reconstruye, los demás siguen usando el anterior.
+    """
+    global _indice, _construido_en
+    caducado = _indice is None or time.monotonic() - _construido_en > INDICE_TTL
+    if not caducado:
+        return _indice
+
+    if _indice is not None and not _lock.acquire(blocking=False):
+        return _indice
+    if _indice is None:
+        _lock.acquire()
+    try:
+        if _indice is None or time.monotonic() - _construido_en > INDICE_TTL:
+            _indice = IndiceProgramas(_cargar_filas(db_session))
+            _construido_en = time.monotonic()
+        return _indice
+    finally:
+        _lock.release()
+
+
+def invalidar_indice():
+    """Fuerza la reconstrucción en la próxima búsqueda (p.ej. tras el scraping)"""
+    global _construido_en
+    _construido_en = float('-inf')
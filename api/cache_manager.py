@@ -1,13 +1,92 @@
 """
 Sistema de caché para cursos scraped
 Evita scraping excesivo y mejora rendimiento
+
+Dos niveles:
+- memoria: LRU acotado por número de entradas y por bytes, compartido por
+  todas las instancias del proceso (las lecturas repetidas no tocan disco)
+- disco: un JSON compacto por entrada en CACHE_DIR, escrito de forma atómica
+  (archivo temporal + rename) para que nunca se lea un archivo a medias
 """
 import json
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import hashlib
 
+MEMORIA_MAX_ENTRADAS = int(os.getenv('CACHE_MEMORIA_MAX_ENTRADAS', 256))
+MEMORIA_MAX_BYTES = int(os.getenv('CACHE_MEMORIA_MAX_BYTES', 64 * 1024 * 1024))
+
+
+class _MemoriaLRU:
+    """LRU con caducidad; el tamaño de cada entrada es el de su JSON compacto"""
+    
+    def __init__(self, max_entradas: int, max_bytes: int):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.contadores = {
+            'hits_memoria': 0,
+            'hits_disco': 0,
+            'misses': 0,
+            'expirados': 0,
+            'evicciones': 0,
+            'cargas_compartidas': 0
+        }
+    
+    def contar(self, contador: str):
+        with self._lock:
+            self.contadores[contador] += 1
+    
+    def obtener(self, clave: str) -> Optional[Dict]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if datetime.now() > entrada['expira']:
+                self._quitar(clave)
+                self.contadores['expirados'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada
+    
+    def guardar(self, clave: str, source: str, cursos: List[Dict], expira: datetime, tamano: int):
+        with self._lock:
+            self._quitar(clave)
+            # Una entrada más grande que todo el presupuesto se queda solo en disco
+            if tamano > self.max_bytes:
+                return
+            self._entradas[clave] = {'source': source, 'cursos': cursos, 'expira': expira, 'tamano': tamano}
+            self._bytes += tamano
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                antigua = next(iter(self._entradas))
+                self._quitar(antigua)
+                self.contadores['evicciones'] += 1
+    
+    def _quitar(self, clave: str):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= entrada['tamano']
+    
+    def borrar(self, source: str = None):
+        with self._lock:
+            for clave in [c for c, e in self._entradas.items() if source is None or e['source'] == source]:
+                self._quitar(clave)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_entradas': self.max_entradas,
+                'max_bytes': self.max_bytes,
+                **self.contadores
+            }
+
 
 class CacheManager:
     """Gestor de caché para cursos externos"""
@@ -15,6 +94,15 @@ class CacheManager:
     CACHE_DIR = "cache"
     CACHE_DURATION_HOURS = 24
     
+    # Compartidos por todas las instancias del proceso
+    _memoria = _MemoriaLRU(MEMORIA_MAX_ENTRADAS, MEMORIA_MAX_BYTES)
+    # archivo -> (mtime_ns, tamaño, source, count, timestamp) para get_stats/clear
+    _metadatos: Dict[str, tuple] = {}
+    _metadatos_lock = threading.Lock()
+    # Singleflight: clave -> [lock, hilos esperando]
+    _cargas: Dict[str, list] = {}
+    _cargas_lock = threading.Lock()
+    
     def __init__(self):
         # Crear directorio cache si no existe
         if not os.path.exists(self.CACHE_DIR):
@@ -30,48 +118,86 @@ class CacheManager:
         """Ruta del archivo de cache"""
         return os.path.join(self.CACHE_DIR, f"{cache_key}.json")
     
-    def get(self, source: str, filters: Dict = None) -> Optional[List[Dict]]:
-        """
-        Obtiene cursos del cache si existen y no han expirado
-        
-        Args:
-            source: Fuente de datos (ej: 'educations', 'emagister')
-            filters: Filtros aplicados (ej: {'especialidad': 'ingenieria'})
+    def _escribir_atomico(self, path: str, data: Dict) -> int:
+        """Escribe JSON compacto en un temporal y lo renombra; devuelve los bytes escritos"""
+        contenido = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(contenido)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._recordar_metadatos(os.path.basename(path), data)
+        return len(contenido)
+    
+    def _recordar_metadatos(self, filename: str, data: Dict):
+        try:
+            st = os.stat(os.path.join(self.CACHE_DIR, filename))
+        except FileNotFoundError:
+            return
+        with self._metadatos_lock:
+            self._metadatos[filename] = (
+                st.st_mtime_ns, st.st_size,
+                data.get('source', 'unknown'), data.get('count', 0), data.get('timestamp')
+            )
+    
+    def _leer(self, source: str, cache_key: str) -> Optional[List[Dict]]:
+        """Busca la entrada en memoria y luego en disco (sin contar misses)"""
+        entrada = self._memoria.obtener(cache_key)
+        if entrada is not None:
+            self._memoria.contar('hits_memoria')
+            return entrada['cursos']
         
-        Returns:
-            Lista de cursos o None si no hay cache válido
-        """
-        cache_key = self._get_cache_key(source, filters)
         cache_path = self._get_cache_path(cache_key)
         
         # Verificar si existe el archivo
         if not os.path.exists(cache_path):
-            print(f"⚠️ No existe cache para {source}")
             return None
         
         try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(cache_path, 'rb') as f:
+                contenido = f.read()
+            data = json.loads(contenido)
             
             # Verificar expiración
             cached_at = datetime.fromisoformat(data['timestamp'])
-            expires_at = cached_at + timedelta(hours=self.CACHE_DURATION_HOURS)
+            expires_at = cached_at + timedelta(hours=data.get('ttl_horas', self.CACHE_DURATION_HOURS))
             
             if datetime.now() > expires_at:
-                print(f"⏰ Cache expirado para {source} (más de {self.CACHE_DURATION_HOURS}h)")
+                print(f"⏰ Cache expirado para {source}")
                 os.remove(cache_path)  # Eliminar cache expirado
+                self._memoria.contar('expirados')
                 return None
             
-            # Cache válido
-            hours_ago = (datetime.now() - cached_at).total_seconds() / 3600
-            print(f"✅ Cache válido para {source} ({hours_ago:.1f}h antiguos, {len(data['cursos'])} cursos)")
+            # Cache válido: se sube a memoria para las próximas lecturas
+            self._memoria.guardar(cache_key, source, data['cursos'], expires_at, len(contenido))
+            self._memoria.contar('hits_disco')
             return data['cursos']
-            
+        
         except Exception as e:
             print(f"❌ Error leyendo cache: {e}")
             return None
     
-    def set(self, source: str, cursos: List[Dict], filters: Dict = None):
+    def get(self, source: str, filters: Dict = None) -> Optional[List[Dict]]:
+        """
+        Obtiene cursos del cache si existen y no han expirado
+        
+        Args:
+            source: Fuente de datos (ej: 'educations', 'emagister')
+            filters: Filtros aplicados (ej: {'especialidad': 'ingenieria'})
+        
+        Returns:
+            Lista de cursos o None si no hay cache válido
+        """
+        cursos = self._leer(source, self._get_cache_key(source, filters))
+        if cursos is None:
+            self._memoria.contar('misses')
+        return cursos
+    
+    def set(self, source: str, cursos: List[Dict], filters: Dict = None, ttl_horas: float = None):
         """
         Guarda cursos en cache
         
@@ -79,27 +205,129 @@ class CacheManager:
             source: Fuente de datos
             cursos: Lista de cursos a cachear
             filters: Filtros aplicados
+            ttl_horas: Duración (por defecto CACHE_DURATION_HOURS)
         """
         cache_key = self._get_cache_key(source, filters)
         cache_path = self._get_cache_path(cache_key)
+        ttl_horas = ttl_horas or self.CACHE_DURATION_HOURS
         
         try:
+            ahora = datetime.now()
             data = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': ahora.isoformat(),
                 'source': source,
                 'filters': filters or {},
                 'cursos': cursos,
-                'count': len(cursos)
+                'count': len(cursos),
+                'ttl_horas': ttl_horas
             }
             
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            tamano = self._escribir_atomico(cache_path, data)
+            self._memoria.guardar(cache_key, source, cursos, ahora + timedelta(hours=ttl_horas), tamano)
             
             print(f"💾 Cache guardado: {source} ({len(cursos)} cursos)")
-            
+        
         except Exception as e:
             print(f"❌ Error guardando cache: {e}")
     
+    def get_or_set(
+        self,
+        source: str,
+        cargar: Callable[[], List[Dict]],
+        filters: Dict = None,
+        ttl_horas: float = None
+    ) -> List[Dict]:
+        """
+        Devuelve la entrada del cache o la calcula con cargar().
+        Si varios hilos fallan a la vez para la misma clave, solo uno llama a
+        cargar(); los demás esperan y reciben su resultado.
+        """
+        cursos = self.get(source, filters)
+        if cursos is not None:
+            return cursos
+        
+        cache_key = self._get_cache_key(source, filters)
+        with self._cargas_lock:
+            carga = self._cargas.setdefault(cache_key, [threading.Lock(), 0])
+            carga[1] += 1
+        try:
+            with carga[0]:
+                # Otro hilo pudo haberlo cargado mientras esperábamos
+                cursos = self._leer(source, cache_key)
+                if cursos is not None:
+                    self._memoria.contar('cargas_compartidas')
+                    return cursos
+                cursos = cargar()
+                if cursos:
+                    self.set(source, cursos, filters, ttl_horas)
+                return cursos
+        finally:
+            with self._cargas_lock:
+                carga[1] -= 1
+                if carga[1] == 0:
+                    del self._cargas[cache_key]
+    
+    def _get_snapshot_path(self, source: str) -> str:
+        return os.path.join(self.CACHE_DIR, f"snapshot_{source}.json")
+    
+    def set_snapshot(self, source: str, cursos: List[Dict]):
+        """
+        Guarda el último resultado bueno de una fuente (no caduca).
+        Se usa como respaldo cuando el scraping de esa fuente falla.
+        """
+        try:
+            data = {
+                'timestamp': datetime.now().isoformat(),
+                'source': source,
+                'cursos': cursos,
+                'count': len(cursos)
+            }
+            self._escribir_atomico(self._get_snapshot_path(source), data)
+        except Exception as e:
+            print(f"❌ Error guardando snapshot de {source}: {e}")
+    
+    def get_snapshot(self, source: str) -> Optional[Dict]:
+        """Último resultado bueno de la fuente: {'timestamp', 'cursos', ...} o None"""
+        snapshot_path = self._get_snapshot_path(source)
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"❌ Error leyendo snapshot de {source}: {e}")
+            return None
+    
+    def _metadatos_archivos(self) -> Dict[str, tuple]:
+        """
+        Metadatos de cada archivo del cache. Solo se parsean los archivos
+        nuevos o modificados desde la última vez (se comparan mtime y tamaño).
+        """
+        actuales = {}
+        for entry in os.scandir(self.CACHE_DIR):
+            if not entry.name.endswith('.json'):
+                continue
+            st = entry.stat()
+            with self._metadatos_lock:
+                meta = self._metadatos.get(entry.name)
+            if meta is None or meta[:2] != (st.st_mtime_ns, st.st_size):
+                try:
+                    with open(entry.path, 'rb') as f:
+                        data = json.loads(f.read())
+                except Exception as e:
+                    print(f"Error leyendo {entry.name}: {e}")
+                    continue
+                meta = (
+                    st.st_mtime_ns, st.st_size,
+                    data.get('source', 'unknown'), data.get('count', 0), data.get('timestamp')
+                )
+            actuales[entry.name] = meta
+        
+        with self._metadatos_lock:
+            self._metadatos.clear()
+            self._metadatos.update(actuales)
+        return actuales
+    
     def clear(self, source: str = None):
         """
         Limpia cache
@@ -110,9 +338,10 @@ class CacheManager:
         """
         try:
             if source:
-                # Borrar cache específico
-                for filename in os.listdir(self.CACHE_DIR):
-                    if filename.startswith(source):
+                # Borrar cache específico (los archivos se nombran por hash,
+                # la fuente se sabe por los metadatos)
+                for filename, meta in self._metadatos_archivos().items():
+                    if meta[2] == source and not filename.startswith('snapshot_'):
                         os.remove(os.path.join(self.CACHE_DIR, filename))
                 print(f"🗑️ Cache borrado: {source}")
             else:
@@ -120,6 +349,7 @@ class CacheManager:
                 for filename in os.listdir(self.CACHE_DIR):
                     os.remove(os.path.join(self.CACHE_DIR, filename))
                 print("🗑️ Todo el cache ha sido borrado")
+            self._memoria.borrar(source)
         except Exception as e:
             print(f"❌ Error limpiando cache: {e}")
     
@@ -129,35 +359,33 @@ class CacheManager:
             'total_files': 0,
             'total_cursos': 0,
             'sources': {},
+            'snapshots': {},
             'oldest': None,
-            'newest': None
+            'newest': None,
+            'memoria': self._memoria.stats()
         }
         
         try:
-            for filename in os.listdir(self.CACHE_DIR):
-                if filename.endswith('.json'):
-                    stats['total_files'] += 1
-                    
-                    with open(os.path.join(self.CACHE_DIR, filename), 'r') as f:
-                        data = json.load(f)
-                        
-                        source = data.get('source', 'unknown')
-                        count = data.get('count', 0)
-                        timestamp = data.get('timestamp')
-                        
-                        if source not in stats['sources']:
-                            stats['sources'][source] = {'files': 0, 'cursos': 0}
-                        
-                        stats['sources'][source]['files'] += 1
-                        stats['sources'][source]['cursos'] += count
-                        stats['total_cursos'] += count
-                        
-                        # Track oldest/newest
-                        if timestamp:
-                            if not stats['oldest'] or timestamp < stats['oldest']:
-                                stats['oldest'] = timestamp
-                            if not stats['newest'] or timestamp > stats['newest']:
-                                stats['newest'] = timestamp
+            for filename, (_, _, source, count, timestamp) in self._metadatos_archivos().items():
+                if filename.startswith('snapshot_'):
+                    stats['snapshots'][source] = {'cursos': count, 'timestamp': timestamp}
+                    continue
+                
+                stats['total_files'] += 1
+                
+                if source not in stats['sources']:
+                    stats['sources'][source] = {'files': 0, 'cursos': 0}
+                
+                stats['sources'][source]['files'] += 1
+                stats['sources'][source]['cursos'] += count
+                stats['total_cursos'] += count
+                
+                # Track oldest/newest
+                if timestamp:
+                    if not stats['oldest'] or timestamp < stats['oldest']:
+                        stats['oldest'] = timestamp
+                    if not stats['newest'] or timestamp > stats['newest']:
+                        stats['newest'] = timestamp
         
         except Exception as e:
             print(f"Error getting cache stats: {e}")
@@ -0,0 +1,126 @@
+"""
+Caché de resultados OCR por contenido
+El texto extraído se guarda en la tabla `ocr_cache` con clave
+(SHA-256 de los bytes del documento, motor OCR, idioma): volver a subir el
+mismo archivo o pulsar "re-validar" no vuelve a llamar a OCR.space (ni gasta
+cuota del límite mensual) ni a Tesseract.
+Se eliminan las entradas sin usar en OCR_CACHE_DIAS días y, por encima de
+OCR_CACHE_MAX_ENTRADAS, las usadas hace más tiempo.
+Cualquier error de la caché se trata como un fallo de caché: el OCR sigue.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+from database.models import get_connection
+
+OCR_CACHE_DIAS = int(os.getenv('OCR_CACHE_DIAS', 180))
+OCR_CACHE_MAX_ENTRADAS = int(os.getenv('OCR_CACHE_MAX_ENTRADAS', 20000))
+
+# La poda se hace cada PODA_CADA inserciones
+PODA_CADA = 100
+
+_inserciones = 0
+_lock = threading.Lock()
+
+
+def hash_contenido(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def obtener(sha256: str, motor: str, idioma: str) -> Optional[str]:
+    """Texto en caché (y marca el uso) o None"""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE ocr_cache
+            SET hits = hits + 1, ultimo_uso = NOW()
+            WHERE sha256 = %s AND motor = %s AND idioma = %s
+            RETURNING texto
+        """, (sha256, motor, idioma))
+        fila = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+        if fila:
+            print(f"♻️ OCR en caché ({motor}, {sha256[:12]})")
+            return fila[0]
+        return None
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"⚠️ Caché OCR no disponible: {e}")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def guardar(sha256: str, motor: str, idioma: str, texto: str):
+    global _inserciones
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO ocr_cache (sha256, motor, idioma, texto)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (sha256, motor, idioma)
+            DO UPDATE SET texto = EXCLUDED.texto, ultimo_uso = NOW()
+        """, (sha256, motor, idioma, texto))
+
+        with _lock:
+            _inserciones += 1
+            podar_ahora = _inserciones % PODA_CADA == 0
+        if podar_ahora:
+            _podar(cursor)
+
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"⚠️ No se pudo guardar el OCR en caché: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _podar(cursor):
+    cursor.execute("""
+        DELETE FROM ocr_cache
+        WHERE ultimo_uso < NOW() - make_interval(days => %s)
+    """, (OCR_CACHE_DIAS,))
+    cursor.execute("""
+        DELETE FROM ocr_cache
+        WHERE (sha256, motor, idioma) IN (
+            SELECT sha256, motor, idioma
+            FROM ocr_cache
+            ORDER BY ultimo_uso DESC
+            OFFSET %s
+        )
+    """, (OCR_CACHE_MAX_ENTRADAS,))
+
+
+def estadisticas() -> Dict:
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(hits), 0),
+                   COUNT(*) FILTER (WHERE ultimo_uso >= date_trunc('month', NOW()) AND hits > 0)
+            FROM ocr_cache
+        """)
+        entradas, hits, usadas_mes = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    return {
+        'entradas': entradas,
+        'hits_totales': int(hits),
+        'entradas_reutilizadas_este_mes': usadas_mes,
+        'max_entradas': OCR_CACHE_MAX_ENTRADAS,
+        'dias_sin_uso_max': OCR_CACHE_DIAS
+    }
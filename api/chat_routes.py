@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from database.models import MensajeChat, Estudiante, get_db
+from database.models import MensajeChat, Estudiante, get_db, get_connection
+from api.contadores_no_leidos import CLAVE_CHAT_TOTAL, clave_chat, leer_contador
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
@@ -251,11 +253,7 @@ def contar_mensajes_no_leidos(
 ):
     """Contar mensajes no leídos"""
     try:
-        count = db.query(MensajeChat).filter(
-            MensajeChat.estudiante_id == estudiante_id,
-            MensajeChat.remitente == remitente,
-            MensajeChat.leido == False
-        ).count()
+        count = leer_contador(db, clave_chat(remitente, estudiante_id))
         
         return {"success": True, "no_leidos": count}
     except Exception as e:
@@ -265,6 +263,47 @@ def contar_mensajes_no_leidos(
 # WEBSOCKET (tiempo real)
 # ============================================
 
+def _guardar_mensaje_ws(db: Session, estudiante_id: int, user_type: str, data: dict) -> dict:
+    """
+    Guarda un mensaje recibido por WebSocket (y la notificación al estudiante
+    si lo envía el equipo). Es I/O síncrono: se llama con run_in_threadpool
+    para no congelar el resto de conexiones del worker.
+    """
+    mensaje = MensajeChat(
+        estudiante_id=estudiante_id,
+        admin_id=data.get('admin_id'),
+        remitente=data.get('remitente', user_type),
+        mensaje=data.get('mensaje'),
+        leido=False,
+        tipo=data.get('tipo', 'texto')
+    )
+    db.add(mensaje)
+    db.commit()
+    db.refresh(mensaje)
+    
+    if mensaje.remitente != 'estudiante':
+        from api.notificaciones_routes import crear_notificacion
+        crear_notificacion(
+            db=db,
+            estudiante_id=estudiante_id,
+            tipo='mensaje',
+            titulo='💬 Nuevo mensaje del equipo',
+            mensaje=mensaje.mensaje[:100] + ('...' if len(mensaje.mensaje) > 100 else ''),
+            url_accion='/estudiante/dashboard',
+            icono='💬',
+            prioridad='normal'
+        )
+    
+    return {
+        "id": mensaje.id,
+        "estudiante_id": mensaje.estudiante_id,
+        "admin_id": mensaje.admin_id,
+        "remitente": mensaje.remitente,
+        "mensaje": mensaje.mensaje,
+        "tipo": mensaje.tipo,
+        "created_at": mensaje.created_at.isoformat()
+    }
+
 @router.websocket("/ws/chat/{estudiante_id}/{user_type}")
 async def websocket_chat(
     websocket: WebSocket,
@@ -283,31 +322,11 @@ async def websocket_chat(
             # Recibir mensaje
             data = await websocket.receive_json()
             
-            # Guardar en base de datos
-            mensaje = MensajeChat(
-                estudiante_id=estudiante_id,
-                admin_id=data.get('admin_id'),
-                remitente=data.get('remitente', user_type),
-                mensaje=data.get('mensaje'),
-                leido=False,
-                tipo=data.get('tipo', 'texto')
-            )
-            db.add(mensaje)
-            db.commit()
-            db.refresh(mensaje)
-            
-            mensaje_data = {
-                "id": mensaje.id,
-                "estudiante_id": mensaje.estudiante_id,
-                "admin_id": mensaje.admin_id,
-                "remitente": mensaje.remitente,
-                "mensaje": mensaje.mensaje,
-                "tipo": mensaje.tipo,
-                "created_at": mensaje.created_at.isoformat()
-            }
+            # Guardar en base de datos (fuera del event loop)
+            mensaje_data = await run_in_threadpool(_guardar_mensaje_ws, db, estudiante_id, user_type, data)
             
             # Enviar a destinatario según remitente
-            if mensaje.remitente == 'estudiante':
+            if mensaje_data['remitente'] == 'estudiante':
                 # Notificar a admins
                 await manager.notify_admin(estudiante_id, mensaje_data)
             else:
@@ -317,19 +336,6 @@ async def websocket_chat(
                     estudiante_id,
                     'estudiante'
                 )
-                
-                # Crear notificación
-                from api.notificaciones_routes import crear_notificacion
-                crear_notificacion(
-                    db=db,
-                    estudiante_id=estudiante_id,
-                    tipo='mensaje',
-                    titulo='💬 Nuevo mensaje del equipo',
-                    mensaje=mensaje.mensaje[:100] + ('...' if len(mensaje.mensaje) > 100 else ''),
-                    url_accion='/estudiante/dashboard',
-                    icono='💬',
-                    prioridad='normal'
-                )
             
     except WebSocketDisconnect:
         manager.disconnect(estudiante_id, user_type)
@@ -350,7 +356,7 @@ def listar_conversaciones_activas(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -391,23 +397,7 @@ def obtener_total_mensajes_no_leidos(
 ):
     """Obtener el total de mensajes no leídos de todos los estudiantes"""
     try:
-        import os
-        import psycopg2
-        
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*) as total_no_leidos
-            FROM mensajes_chat 
-            WHERE remitente = 'estudiante' AND leido = false
-        """)
-        
-        result = cursor.fetchone()
-        total_no_leidos = result[0] if result else 0
-        
-        cursor.close()
-        conn.close()
+        total_no_leidos = leer_contador(db, CLAVE_CHAT_TOTAL)
         
         return {
             "success": True,
@@ -0,0 +1,233 @@
+"""
+Cola de trabajos OCR
+La validación OCR de los documentos de un estudiante se encola y responde al
+momento con un id de trabajo. Los documentos se procesan en un pool de hilos
+compartido por todos los trabajos (como mucho OCR_CONCURRENCIA a la vez), con
+reintentos. El tiempo máximo por documento lo pone el propio OCR: el timeout
+de Tesseract (api.ocr_processor.OCR_TIMEOUT_TESSERACT), que mata el proceso y
+deja el documento como fallido. Un intento solo se repite cuando el anterior
+ya terminó, nunca con el original aún corriendo (se haría el OCR dos veces).
+El estado de cada trabajo se guarda en la tabla `trabajos_ocr` tras cada
+documento y, mientras espera, cada OCR_LATIDO_SEGUNDOS (latido en updated_at).
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from api.trabajos import GestorTrabajos, Trabajo
+from database.models import get_connection
+
+OCR_CONCURRENCIA = int(os.getenv('OCR_CONCURRENCIA', 3))
+OCR_REINTENTOS = int(os.getenv('OCR_REINTENTOS', 2))
+# Un trabajo vivo toca updated_at al menos cada OCR_LATIDO_SEGUNDOS; sin
+# latido durante OCR_TRABAJO_ABANDONADO_MINUTOS, su proceso ya no existe
+OCR_LATIDO_SEGUNDOS = int(os.getenv('OCR_LATIDO_SEGUNDOS', 60))
+OCR_TRABAJO_ABANDONADO_MINUTOS = int(os.getenv('OCR_TRABAJO_ABANDONADO_MINUTOS', 10))
+
+def marcar_interrumpidos():
+    """
+    Marca como interrumpidos los trabajos sin latido: la cola vive en memoria
+    y el proceso que los llevaba se reinició o murió. Solo mira el latido,
+    así que los trabajos en curso de otros workers no se tocan. Corre en cada
+    arranque y como tarea periódica del planificador.
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE trabajos_ocr
+            SET estado = 'interrumpido', updated_at = NOW()
+            WHERE estado IN ('pendiente', 'en_curso')
+              AND updated_at < NOW() - %s * INTERVAL '1 minute'
+        """, (OCR_TRABAJO_ABANDONADO_MINUTOS,))
+        if cursor.rowcount:
+            print(f"⚠️ {cursor.rowcount} trabajos OCR interrumpidos (sin latido desde hace {OCR_TRABAJO_ABANDONADO_MINUTOS} min)")
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"⚠️ No se pudieron marcar los trabajos OCR interrumpidos: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+class ColaOCR:
+    """Trabajos de validación OCR por lotes con concurrencia acotada"""
+
+    def __init__(self, concurrencia: int = OCR_CONCURRENCIA):
+        # Hilos que coordinan cada lote (esperan, no hacen OCR)
+        self._gestor = GestorTrabajos(max_workers=2)
+        # Hilos que hacen el OCR: el límite real de concurrencia
+        self._pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='ocr')
+
+    def encolar(
+        self,
+        estudiante_id: int,
+        documentos: List[Tuple[int, str]],
+        procesar: Callable[[int], Dict]
+    ) -> Trabajo:
+        """
+        Encola la validación de los documentos [(id, tipo), ...].
+        procesar(documento_id) valida un documento y devuelve su resultado.
+        """
+        trabajo = self._gestor.crear('validar_ocr', self._ejecutar_lote, estudiante_id, documentos, procesar)
+        trabajo.actualizar(estudiante_id=estudiante_id, total=len(documentos), procesados=0, exitosos=0, fallidos=0)
+        return trabajo
+
+    def obtener(self, trabajo_id: str) -> Optional[Dict]:
+        """Estado del trabajo: de memoria si sigue en este proceso, si no de la BD"""
+        trabajo = self._gestor.obtener(trabajo_id)
+        if trabajo is not None:
+            return trabajo.to_dict()
+        return _leer_trabajo(trabajo_id)
+
+    @staticmethod
+    def _intento(procesar: Callable, documento_id: int, intento: int):
+        if intento > 1:
+            time.sleep(2 ** (intento - 2))  # 1s, 2s, 4s...
+        return procesar(documento_id)
+
+    def _ejecutar_lote(self, trabajo: Trabajo, estudiante_id: int, documentos: List[Tuple[int, str]], procesar: Callable):
+        resultados = []
+        contadores = {'procesados': 0, 'exitosos': 0, 'fallidos': 0}
+        _guardar_trabajo(trabajo.id, estudiante_id, Trabajo.EN_CURSO, len(documentos), contadores, resultados, nuevo=True)
+
+        # futuro -> (documento_id, tipo, intento)
+        pendientes = {}
+
+        def lanzar(doc_id, tipo, intento):
+            futuro = self._pool.submit(self._intento, procesar, doc_id, intento)
+            pendientes[futuro] = (doc_id, tipo, intento)
+
+        def terminar(doc_id, tipo, **resultado):
+            exito = resultado.get('resultado', {}).get('exito', False)
+            contadores['procesados'] += 1
+            contadores['exitosos' if exito else 'fallidos'] += 1
+            resultados.append({'documento_id': doc_id, 'tipo': tipo, **resultado})
+            trabajo.actualizar(**contadores)
+            _guardar_trabajo(trabajo.id, estudiante_id, Trabajo.EN_CURSO, len(documentos), contadores, resultados)
+
+        def fallar(doc_id, tipo, intento, error):
+            if intento <= OCR_REINTENTOS:
+                print(f"⚠️ OCR documento {doc_id} (intento {intento}): {error}, reintentando")
+                lanzar(doc_id, tipo, intento + 1)
+            else:
+                terminar(doc_id, tipo, error=error, intentos=intento)
+
+        try:
+            for doc_id, tipo in documentos:
+                lanzar(doc_id, tipo, 1)
+
+            while pendientes:
+                terminados, _ = wait(list(pendientes), timeout=OCR_LATIDO_SEGUNDOS, return_when=FIRST_COMPLETED)
+                if not terminados:
+                    # Latido: el trabajo sigue vivo aunque ningún documento haya acabado
+                    _guardar_trabajo(trabajo.id, estudiante_id, Trabajo.EN_CURSO, len(documentos), contadores, resultados)
+                for futuro in terminados:
+                    doc_id, tipo, intento = pendientes.pop(futuro)
+                    try:
+                        terminar(doc_id, tipo, resultado=futuro.result())
+                    except HTTPException as e:
+                        # 404 / documento sin imagen: reintentar no cambia nada
+                        terminar(doc_id, tipo, error=e.detail, intentos=intento)
+                    except Exception as e:
+                        # El intento ya terminó: reintentar no duplica trabajo en curso
+                        fallar(doc_id, tipo, intento, str(e))
+        except Exception:
+            _guardar_trabajo(trabajo.id, estudiante_id, Trabajo.ERROR, len(documentos), contadores, resultados)
+            raise
+
+        _guardar_trabajo(trabajo.id, estudiante_id, Trabajo.COMPLETADO, len(documentos), contadores, resultados)
+        return {
+            'exito': True,
+            'procesados': contadores['exitosos'],
+            'total': len(documentos),
+            'resultados': resultados
+        }
+
+
+def _guardar_trabajo(trabajo_id, estudiante_id, estado, total, contadores, resultados, nuevo=False):
+    """Persiste el estado; un fallo aquí no detiene el lote"""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        if nuevo:
+            cursor.execute("""
+                INSERT INTO trabajos_ocr (id, estudiante_id, estado, total)
+                VALUES (%s, %s, %s, %s)
+            """, (trabajo_id, estudiante_id, estado, total))
+        else:
+            cursor.execute("""
+                UPDATE trabajos_ocr
+                SET estado = %s, procesados = %s, exitosos = %s, fallidos = %s,
+                    resultados = %s::jsonb, updated_at = NOW(),
+                    terminado_at = CASE WHEN %s IN ('completado', 'error') THEN NOW() END
+                WHERE id = %s
+            """, (
+                estado, contadores['procesados'], contadores['exitosos'], contadores['fallidos'],
+                json.dumps(resultados, default=str), estado, trabajo_id
+            ))
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"⚠️ No se pudo guardar el trabajo OCR {trabajo_id}: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _leer_trabajo(trabajo_id: str) -> Optional[Dict]:
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, estudiante_id, estado, total, procesados, exitosos, fallidos,
+                   resultados, created_at, updated_at, terminado_at
+            FROM trabajos_ocr
+            WHERE id = %s
+        """, (trabajo_id,))
+        fila = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+    if not fila:
+        return None
+    (id_, estudiante_id, estado, total, procesados, exitosos, fallidos,
+     resultados, creado, actualizado, terminado) = fila
+    return {
+        'id': id_,
+        'tipo': 'validar_ocr',
+        'estado': estado,
+        'progreso': {
+            'estudiante_id': estudiante_id,
+            'total': total,
+            'procesados': procesados,
+            'exitosos': exitosos,
+            'fallidos': fallidos
+        },
+        'resultado': {
+            'exito': True,
+            'procesados': exitosos,
+            'total': total,
+            'resultados': resultados
+        } if estado == Trabajo.COMPLETADO else None,
+        'error': None,
+        'creado': creado.isoformat() if creado else None,
+        'iniciado': creado.isoformat() if creado else None,
+        'terminado': terminado.isoformat() if terminado else None,
+        'actualizado': actualizado.isoformat() if actualizado else None
+    }
+
+
+cola_ocr = ColaOCR()
@@ -0,0 +1,324 @@
+"""
+Contadores de no leídos y su reenvío en tiempo real
+Los badges del frontend (notificaciones, chat con el equipo, mensajes de
+agentes) preguntaban cada 10-30 s por su contador y cada pregunta era un
+COUNT(*) sobre la tabla de mensajes. Ahora:
+
+- `contadores_no_leidos` guarda un contador por clave (destinatario + canal)
+  que mantienen triggers de Postgres en notificaciones, mensajes_chat y
+  mensajes_agentes. Cualquier INSERT, marcado como leído o DELETE lo ajusta,
+  venga del ORM, de SQL crudo o de un INSERT por lotes, así que no hay que
+  acordarse de actualizarlo en cada endpoint. Leer un contador es una
+  búsqueda por clave primaria.
+- Cada ajuste hace pg_notify('contadores_no_leidos', clave). En cada worker
+  un hilo escucha ese canal y reenvía el valor nuevo a los navegadores
+  suscritos por SSE (api/eventos_routes.py), sin importar qué worker hizo
+  el cambio.
+
+Claves:
+    notificaciones:<estudiante_id>   notificaciones sin leer del estudiante
+    chat:admin:<estudiante_id>       mensajes del equipo sin leer por el estudiante
+    chat:estudiante:<estudiante_id>  mensajes del estudiante sin leer por el equipo
+    chat:estudiante:total            lo mismo para todos los estudiantes
+    agentes:admin:<agente_id>        mensajes del admin sin leer por el agente
+    agentes:agente:<agente_id>       mensajes del agente sin leer por el admin
+    agentes:agente:total             lo mismo para todos los agentes
+"""
+import asyncio
+import select
+import threading
+from typing import Dict, Iterable, Optional
+
+import psycopg2
+from sqlalchemy import text
+
+from database.migraciones import _existe_tabla
+from database.models import DATABASE_URL, get_connection
+
+CANAL_NOTIFY = 'contadores_no_leidos'
+CLAVE_CHAT_TOTAL = 'chat:estudiante:total'
+CLAVE_AGENTES_TOTAL = 'agentes:agente:total'
+# Sin avisos en este tiempo se comprueba que la conexión LISTEN sigue viva
+ESPERA_SELECT_SEGUNDOS = 30
+
+_SQL_LEER = "SELECT clave, no_leidos FROM contadores_no_leidos WHERE clave = ANY(%s)"
+
+# tabla -> (columna de leído, claves que cuenta cada fila `t` sin leer)
+TABLAS_CONTADAS = {
+    'notificaciones': (
+        'leida',
+        "ARRAY['notificaciones:' || t.estudiante_id]"
+    ),
+    'mensajes_chat': (
+        'leido',
+        "ARRAY['chat:' || t.remitente || ':' || t.estudiante_id]"
+        " || CASE WHEN t.remitente = 'estudiante' THEN ARRAY['chat:estudiante:total'] ELSE ARRAY[]::TEXT[] END"
+    ),
+    'mensajes_agentes': (
+        'leido',
+        "ARRAY['agentes:' || t.remitente || ':' || t.agente_id]"
+        " || CASE WHEN t.remitente = 'agente' THEN ARRAY['agentes:agente:total'] ELSE ARRAY[]::TEXT[] END"
+    ),
+}
+
+
+def clave_notificaciones(estudiante_id: int) -> str:
+    return f"notificaciones:{estudiante_id}"
+
+
+def clave_chat(remitente: str, estudiante_id: int) -> str:
+    """Mensajes de `remitente` ('admin' o 'estudiante') sin leer en la conversación"""
+    return f"chat:{remitente}:{estudiante_id}"
+
+
+def clave_agentes(remitente: str, agente_id: int) -> str:
+    """Mensajes de `remitente` ('admin' o 'agente') sin leer en el chat con el agente"""
+    return f"agentes:{remitente}:{agente_id}"
+
+
+# ----------------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------------
+
+def leer_contador(db, clave: str) -> int:
+    """Valor de un contador con la sesión del request (0 si no hay nada sin leer)"""
+    valor = db.execute(
+        text("SELECT no_leidos FROM contadores_no_leidos WHERE clave = :clave"),
+        {"clave": clave}
+    ).scalar()
+    return valor or 0
+
+
+def _leer_con_cursor(cursor, claves: Iterable[str]) -> Dict[str, int]:
+    claves = list(claves)
+    valores = dict.fromkeys(claves, 0)
+    cursor.execute(_SQL_LEER, (claves,))
+    valores.update(cursor.fetchall())
+    return valores
+
+
+def leer_contadores(claves: Iterable[str]) -> Dict[str, int]:
+    """Varios contadores de una vez, con una conexión del pool"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        valores = _leer_con_cursor(cursor, claves)
+        cursor.close()
+        return valores
+    finally:
+        conn.close()
+
+
+# ----------------------------------------------------------------------------
+# Reparación (el esquema lo crea la migración 012)
+# ----------------------------------------------------------------------------
+
+def recalcular_contadores(cursor):
+    """
+    Rehace todos los contadores con COUNT(*) sobre las tablas. Solo para
+    reparar un contador descuadrado, sin escrituras concurrentes (una que
+    llegue entre el recálculo y el commit se contaría dos veces o ninguna).
+    """
+    cursor.execute("UPDATE contadores_no_leidos SET no_leidos = 0, actualizado_en = NOW() WHERE no_leidos <> 0")
+    for tabla, (columna_leido, claves) in TABLAS_CONTADAS.items():
+        if not _existe_tabla(cursor, tabla):
+            continue
+        cursor.execute(f"""
+            INSERT INTO contadores_no_leidos (clave, no_leidos)
+            SELECT c.clave, COUNT(*)
+            FROM (
+                SELECT unnest({claves}) AS clave
+                FROM {tabla} t
+                WHERE NOT COALESCE(t.{columna_leido}, FALSE)
+            ) c
+            GROUP BY c.clave
+            ON CONFLICT (clave) DO UPDATE
+            SET no_leidos = EXCLUDED.no_leidos, actualizado_en = NOW()
+        """)
+        print(f"   ✅ Contadores de {tabla}: {cursor.rowcount} claves")
+
+
+# ----------------------------------------------------------------------------
+# Reenvío en tiempo real (LISTEN/NOTIFY -> clientes SSE del worker)
+# ----------------------------------------------------------------------------
+
+class Suscripcion:
+    """
+    Contadores que sigue un cliente SSE. Solo se guarda el último valor de
+    cada clave: si llegan diez cambios antes de que el cliente lea, recibe
+    uno con el valor final (la memoria por cliente no crece).
+    """
+
+    def __init__(self, claves: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.claves = set(claves)
+        self.loop = loop
+        self._pendientes: Dict[str, int] = {}
+        self._aviso = asyncio.Event()
+
+    def _publicar(self, valores: Dict[str, int]):
+        # Se ejecuta en el event loop (call_soon_threadsafe desde el hilo LISTEN)
+        self._pendientes.update(valores)
+        self._aviso.set()
+
+    async def siguiente(self, espera: float) -> Dict[str, int]:
+        """Cambios desde la última llamada; {} si en `espera` segundos no hubo ninguno"""
+        try:
+            await asyncio.wait_for(self._aviso.wait(), espera)
+        except asyncio.TimeoutError:
+            return {}
+        self._aviso.clear()
+        cambios, self._pendientes = self._pendientes, {}
+        return cambios
+
+
+class CanalContadores:
+    """
+    Un hilo por worker con una conexión dedicada en LISTEN. Arranca con el
+    primer cliente suscrito, de modo que un worker sin navegadores abiertos
+    no ocupa ninguna conexión.
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.conectado = False
+        self.avisos_recibidos = 0
+        self._suscripciones: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._conexion = None
+
+    def suscribir(self, claves: Iterable[str]) -> Suscripcion:
+        """Llamar desde el event loop (el endpoint SSE)"""
+        suscripcion = Suscripcion(claves, asyncio.get_running_loop())
+        with self._lock:
+            for clave in suscripcion.claves:
+                self._suscripciones.setdefault(clave, set()).add(suscripcion)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._parar.clear()
+                self._hilo = threading.Thread(target=self._escuchar, name='canal-contadores', daemon=True)
+                self._hilo.start()
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            for clave in suscripcion.claves:
+                suscritas = self._suscripciones.get(clave)
+                if suscritas is not None:
+                    suscritas.discard(suscripcion)
+                    if not suscritas:
+                        del self._suscripciones[clave]
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+
+    def estado(self) -> Dict:
+        with self._lock:
+            clientes = set().union(*self._suscripciones.values()) if self._suscripciones else set()
+            claves = len(self._suscripciones)
+        return {
+            'escuchando': self._hilo is not None and self._hilo.is_alive(),
+            'conectado': self.conectado,
+            'clientes': len(clientes),
+            'claves_suscritas': claves,
+            'avisos_recibidos': self.avisos_recibidos
+        }
+
+    def _escuchar(self):
+        espera = 1
+        while not self._parar.is_set():
+            try:
+                self._conectar()
+                espera = 1
+                # Lo que cambió mientras no escuchábamos (arranque o reconexión)
+                with self._lock:
+                    claves = list(self._suscripciones)
+                self._reenviar(claves)
+
+                while not self._parar.is_set():
+                    if select.select([self._conexion], [], [], ESPERA_SELECT_SEGUNDOS) == ([], [], []):
+                        self._comprobar_conexion()
+                        continue
+                    self._conexion.poll()
+                    # Postgres ya agrupa los avisos repetidos de una transacción
+                    claves = {aviso.payload for aviso in self._conexion.notifies}
+                    self._conexion.notifies.clear()
+                    self.avisos_recibidos += len(claves)
+                    self._reenviar(claves)
+            except Exception as e:
+                print(f"⚠️ Canal de contadores: {e}")
+                self._cerrar()
+                if self._parar.wait(espera):
+                    break
+                espera = min(espera * 2, 30)
+        self._cerrar()
+
+    def _conectar(self):
+        self._conexion = psycopg2.connect(
+            self.dsn, keepalives=1, keepalives_idle=30,
+            keepalives_interval=10, keepalives_count=5,
+            application_name='canal-contadores'
+        )
+        self._conexion.autocommit = True
+        cursor = self._conexion.cursor()
+        cursor.execute(f"LISTEN {CANAL_NOTIFY}")
+        cursor.close()
+        self.conectado = True
+
+    def _comprobar_conexion(self):
+        cursor = self._conexion.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+
+    def _cerrar(self):
+        self.conectado = False
+        if self._conexion is not None:
+            try:
+                self._conexion.close()
+            except Exception:
+                pass
+            self._conexion = None
+
+    def _reenviar(self, claves: Iterable[str]):
+        with self._lock:
+            claves = [clave for clave in claves if clave in self._suscripciones]
+        if not claves:
+            return
+        cursor = self._conexion.cursor()
+        valores = _leer_con_cursor(cursor, claves)
+        cursor.close()
+
+        destinos: Dict[Suscripcion, Dict[str, int]] = {}
+        with self._lock:
+            for clave, valor in valores.items():
+                for suscripcion in self._suscripciones.get(clave, ()):
+                    destinos.setdefault(suscripcion, {})[clave] = valor
+        for suscripcion, cambios in destinos.items():
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._publicar, cambios)
+            except RuntimeError:
+                # Event loop ya cerrado (apagando el worker)
+                pass
+
+
+_canal: Optional[CanalContadores] = None
+_canal_lock = threading.Lock()
+
+
+def obtener_canal() -> CanalContadores:
+    global _canal
+    with _canal_lock:
+        if _canal is None:
+            _canal = CanalContadores()
+        return _canal
+
+
+def detener_canal():
+    if _canal is not None:
+        _canal.detener()
+
+
+def estado() -> Dict:
+    return _canal.estado() if _canal is not None else {'escuchando': False, 'clientes': 0}
@@ -0,0 +1,95 @@
+"""
+Detector de bloqueos del event loop
+Los handlers `async def` corren en el event loop: una consulta psycopg2 o
+SQLAlchemy síncrona dentro de uno congela todo el worker (incluido el chat
+por WebSocket) mientras dura. Los handlers con I/O síncrono deben ser `def`
+(FastAPI los ejecuta en su threadpool) o usar run_in_threadpool.
+
+Se activa con DETECTAR_BLOQUEOS=<segundos> (p.ej. 0.2):
+- asyncio en modo debug avisa de cada callback que tarde más que eso;
+- un latido mide cada 100 ms el retraso del loop;
+- un hilo vigilante, si el loop no late a tiempo, imprime la pila del hilo
+  del loop: la línea que aparece es la que está bloqueando.
+
+Para revisar el código sin arrancar nada: python verificar_bloqueos_event_loop.py
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+INTERVALO_LATIDO = 0.1
+
+
+class DetectorBloqueos:
+    """Vigila un event loop y registra las veces que se queda bloqueado"""
+
+    def __init__(self, umbral: float):
+        self.umbral = umbral
+        self.estadisticas: Dict = {'bloqueos': 0, 'max_retraso_ms': 0.0, 'ultimo': None}
+        self._ultimo_latido = time.monotonic()
+        self._hilo_loop: Optional[int] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._parar = threading.Event()
+
+    def iniciar(self, loop: asyncio.AbstractEventLoop):
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.umbral
+        self._hilo_loop = threading.get_ident()
+        self._ultimo_latido = time.monotonic()
+        self._tarea = loop.create_task(self._latido())
+        threading.Thread(target=self._vigilar, name='detector-bloqueos', daemon=True).start()
+        print(f"🔎 Detector de bloqueos del event loop activo (umbral {self.umbral * 1000:.0f} ms)")
+
+    def detener(self):
+        self._parar.set()
+        if self._tarea:
+            self._tarea.cancel()
+
+    async def _latido(self):
+        while True:
+            antes = time.monotonic()
+            await asyncio.sleep(INTERVALO_LATIDO)
+            ahora = time.monotonic()
+            self._ultimo_latido = ahora
+            retraso = ahora - antes - INTERVALO_LATIDO
+            if retraso * 1000 > self.estadisticas['max_retraso_ms']:
+                self.estadisticas['max_retraso_ms'] = round(retraso * 1000, 1)
+
+    def _vigilar(self):
+        avisado = False
+        while not self._parar.wait(self.umbral / 2):
+            retraso = time.monotonic() - self._ultimo_latido - INTERVALO_LATIDO
+            if retraso <= self.umbral:
+                avisado = False
+                continue
+            if avisado:
+                # Mismo bloqueo: una sola pila por episodio
+                continue
+            avisado = True
+            marco = sys._current_frames().get(self._hilo_loop)
+            pila = ''.join(traceback.format_stack(marco)) if marco else '(sin pila)'
+            self.estadisticas['bloqueos'] += 1
+            self.estadisticas['ultimo'] = {'retraso_ms': round(retraso * 1000, 1), 'pila': pila}
+            print(f"🐢 Event loop bloqueado más de {retraso * 1000:.0f} ms en:\n{pila}")
+
+
+_detector: Optional[DetectorBloqueos] = None
+
+
+def activar_si_configurado() -> Optional[DetectorBloqueos]:
+    """Llamar desde el startup de la app (dentro del event loop)"""
+    global _detector
+    umbral = os.getenv('DETECTAR_BLOQUEOS')
+    if not umbral or _detector is not None:
+        return _detector
+    _detector = DetectorBloqueos(float(umbral))
+    _detector.iniciar(asyncio.get_running_loop())
+    return _detector
+
+
+def estadisticas() -> Optional[Dict]:
+    return _detector.estadisticas if _detector else None
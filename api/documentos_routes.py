@@ -1,24 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database.models import get_db, Estudiante, Notificacion
+from database.models import get_db, get_connection, Estudiante, Notificacion
 from api.auth import verificar_token
+from api.blob_storage import (
+    leer_documento, abrir_documento, guardar_upload, ArchivoDemasiadoGrande
+)
+from api.limite_subidas import MAX_ARCHIVO_DOCUMENTO
+from api.zip_streaming import generar_zip, filas_servidor, nombre_seguro
+from api.paginacion import condicion_keyset, orden_keyset, normalizar_limite, recortar_pagina, total_estimado
 from datetime import datetime
-import os
-import psycopg2
-import base64
+from typing import Optional
+from psycopg2.extras import execute_values
 import io
-import zipfile
 
 router = APIRouter()
 
 CATEGORIAS_PERMITIDAS = ['pasaporte', 'visa', 'academicos', 'financieros', 'otros']
 TIPOS_ARCHIVO_PERMITIDOS = ['application/pdf', 'image/jpeg', 'image/png', 'image/jpg', 'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = MAX_ARCHIVO_DOCUMENTO  # 10MB (el cuerpo entero lo limita LimiteSubidas)
 
 @router.post("/documentos/{estudiante_id}/subir")
-async def subir_documentos(
+def subir_documentos(
     estudiante_id: int,
     archivos: list[UploadFile] = File(...),
     categorias: str = Form(...),
@@ -32,71 +36,86 @@ async def subir_documentos(
         if len(archivos) != len(categorias_list):
             raise HTTPException(status_code=400, detail="Número de archivos y categorías no coincide")
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
-        cursor = conn.cursor()
-        
         documentos_subidos = []
+        rechazados = []
+        filas = []
         
         for i, archivo in enumerate(archivos):
             categoria = categorias_list[i]
             
             # Validar categoría
             if categoria not in CATEGORIAS_PERMITIDAS:
+                rechazados.append({'nombre': archivo.filename, 'error': f'Categoría no permitida: {categoria}'})
                 continue
             
             # Validar tipo de archivo
             if archivo.content_type not in TIPOS_ARCHIVO_PERMITIDOS:
+                rechazados.append({'nombre': archivo.filename, 'error': f'Tipo de archivo no permitido: {archivo.content_type}'})
                 continue
             
-            # Leer contenido
-            contenido = await archivo.read()
-            
-            # Validar tamaño
-            if len(contenido) > MAX_FILE_SIZE:
+            # Guardar en blob storage por trozos, cortando al pasar de MAX_FILE_SIZE
+            try:
+                blob_key, tamano = guardar_upload(archivo, MAX_FILE_SIZE)
+            except ArchivoDemasiadoGrande as e:
+                rechazados.append({'nombre': archivo.filename, 'error': str(e), 'codigo': 413})
                 continue
             
-            # Convertir a base64 para almacenar en DB
-            contenido_base64 = base64.b64encode(contenido).decode('utf-8')
-            
-            # Insertar en BD
-            cursor.execute("""
-                INSERT INTO documentos (
-                    estudiante_id, tipo_documento, nombre_archivo, url_archivo,
-                    categoria, contenido_base64, mime_type, tamano_archivo,
-                    estado_revision, created_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
+            filas.append((
                 estudiante_id,
                 categoria,  # tipo_documento = categoria
                 archivo.filename,
-                f'base64://{archivo.filename}',  # url_archivo placeholder para base64
+                f'blob://{blob_key}',
                 categoria,
-                contenido_base64,
+                blob_key,
                 archivo.content_type,
-                len(contenido),
+                tamano,
                 'pendiente',
                 datetime.now()
             ))
-            
-            doc_id = cursor.fetchone()[0]
-            
             documentos_subidos.append({
-                'id': doc_id,
                 'nombre': archivo.filename,
                 'categoria': categoria,
-                'tamano': len(contenido)
+                'tamano': tamano
             })
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if rechazados and not filas:
+            # Si todos fallaron por tamaño es un 413; si no, petición inválida
+            codigo = 413 if all(r.get('codigo') == 413 for r in rechazados) else 400
+            raise HTTPException(status_code=codigo, detail={'message': 'Ningún archivo se pudo subir', 'rechazados': rechazados})
+        
+        # La conexión solo se toma del pool para el INSERT, no durante la subida
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            # Insertar todas las filas en una sola sentencia
+            if filas:
+                ids = execute_values(cursor, """
+                    INSERT INTO documentos (
+                        estudiante_id, tipo_documento, nombre_archivo, url_archivo,
+                        categoria, blob_key, mime_type, tamano_archivo,
+                        estado_revision, created_at
+                    ) VALUES %s
+                    RETURNING id
+                """, filas, fetch=True)
+                for doc, (doc_id,) in zip(documentos_subidos, ids):
+                    doc['id'] = doc_id
+            conn.commit()
+        except Exception:
+            # Los blobs recién guardados se quedan sin fila: los borra la limpieza de huérfanos
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
         
         return {
             'success': True,
             'message': f'{len(documentos_subidos)} documentos subidos',
-            'documentos': documentos_subidos
+            'documentos': documentos_subidos,
+            'rechazados': rechazados
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error subiendo documentos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -108,7 +127,7 @@ def listar_documentos(
 ):
     """Listar todos los documentos de un estudiante"""
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -159,11 +178,11 @@ def descargar_documento(
 ):
     """Descargar un documento específico"""
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT nombre_archivo, contenido_base64, mime_type
+            SELECT nombre_archivo, blob_key, contenido_base64, mime_type
             FROM documentos
             WHERE id = %s
         """, (doc_id,))
@@ -172,8 +191,8 @@ def descargar_documento(
         if not row:
             raise HTTPException(status_code=404, detail="Documento no encontrado")
         
-        nombre, contenido_b64, mime_type = row
-        contenido = base64.b64decode(contenido_b64)
+        nombre, blob_key, contenido_b64, mime_type = row
+        contenido = leer_documento(blob_key, contenido_b64)
         
         cursor.close()
         conn.close()
@@ -194,41 +213,38 @@ def descargar_documentos_zip(
     estudiante_id: int,
     db: Session = Depends(get_db)
 ):
-    """Descargar todos los documentos de un estudiante en ZIP"""
+    """Descargar todos los documentos de un estudiante en ZIP (streaming)"""
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT nombre_archivo, contenido_base64
-            FROM documentos
-            WHERE estudiante_id = %s
-        """, (estudiante_id,))
+        cursor.execute("SELECT 1 FROM documentos WHERE estudiante_id = %s LIMIT 1", (estudiante_id,))
+        tiene_documentos = cursor.fetchone() is not None
         
-        documentos = cursor.fetchall()
+        cursor.close()
+        conn.close()
         
-        if not documentos:
+        if not tiene_documentos:
             raise HTTPException(status_code=404, detail="No hay documentos para descargar")
         
-        # Crear ZIP en memoria
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for nombre, contenido_b64 in documentos:
-                contenido = base64.b64decode(contenido_b64)
-                zip_file.writestr(nombre, contenido)
-        
-        zip_buffer.seek(0)
-        
-        cursor.close()
-        conn.close()
+        def entradas():
+            for nombre, blob_key, contenido_b64 in filas_servidor("""
+                SELECT nombre_archivo, blob_key, contenido_base64
+                FROM documentos
+                WHERE estudiante_id = %s
+                ORDER BY id
+            """, (estudiante_id,)):
+                yield nombre_seguro(nombre), abrir_documento(blob_key, contenido_b64)
         
         return StreamingResponse(
-            zip_buffer,
+            generar_zip(entradas()),
             media_type="application/zip",
             headers={
                 "Content-Disposition": f"attachment; filename=estudiante_{estudiante_id}_documentos.zip"
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error creando ZIP: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -248,7 +264,7 @@ def revisar_documento(
         if estado not in ['aprobado', 'rechazado']:
             raise HTTPException(status_code=400, detail="Estado inválido")
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Actualizar documento
@@ -299,17 +315,24 @@ def revisar_documento(
 
 @router.get("/admin/documentos/todos")
 def listar_todos_documentos(
+    limit: Optional[int] = None,
+    pagina_cursor: Optional[str] = Query(None, alias="cursor"),
     db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
 ):
-    """Admin lista todos los estudiantes con sus documentos"""
+    """
+    Admin lista todos los estudiantes con sus documentos.
+    Con `limit` se pagina por cursor (siguiente_cursor en la respuesta).
+    """
     verificar_token(credentials.credentials)
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
+        # Más documentos pendientes primero; id como desempate
+        claves = ["COUNT(CASE WHEN d.estado_revision = 'pendiente' THEN 1 END)", "e.id"]
+        query = """
             SELECT 
                 e.id,
                 e.nombre,
@@ -319,14 +342,33 @@ def listar_todos_documentos(
                 COUNT(CASE WHEN d.estado_revision = 'aprobado' THEN 1 END) as aprobados,
                 COUNT(CASE WHEN d.estado_revision = 'rechazado' THEN 1 END) as rechazados
             FROM estudiantes e
-            LEFT JOIN documentos d ON e.id = d.estudiante_id
+            JOIN documentos d ON e.id = d.estudiante_id
             GROUP BY e.id, e.nombre, e.email
             HAVING COUNT(d.id) > 0
-            ORDER BY COUNT(CASE WHEN d.estado_revision = 'pendiente' THEN 1 END) DESC
-        """)
+        """
+        params = []
+        total = None
+        siguiente = None
+        
+        if limit is not None:
+            limit = normalizar_limite(limit)
+            if not pagina_cursor:
+                total = total_estimado(cursor, query, params)
+            condicion, params = condicion_keyset(claves, pagina_cursor)
+            if condicion:
+                query += f" AND {condicion}"
+        
+        query += " " + orden_keyset(claves)
+        
+        if limit is not None:
+            cursor.execute(query + " LIMIT %s", params + [limit + 1])
+            filas, siguiente = recortar_pagina(cursor.fetchall(), limit, [4, 0])
+        else:
+            cursor.execute(query, params)
+            filas = cursor.fetchall()
         
         estudiantes = []
-        for row in cursor.fetchall():
+        for row in filas:
             estudiantes.append({
                 'id': row[0],
                 'nombre': row[1] or 'Sin nombre',
@@ -342,8 +384,12 @@ def listar_todos_documentos(
         
         return {
             'success': True,
-            'estudiantes': estudiantes
+            'estudiantes': estudiantes,
+            'total_estimado': total,
+            'siguiente_cursor': siguiente
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error listando documentos admin: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -355,9 +401,10 @@ def eliminar_documento(
 ):
     """Eliminar un documento"""
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
+        # El blob, si ya no lo usa nadie, lo borra limpiar_blobs_huerfanos()
         cursor.execute("DELETE FROM documentos WHERE id = %s", (doc_id,))
         conn.commit()
         
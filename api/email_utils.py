@@ -2,13 +2,64 @@
 Utilidades para envío de emails automáticos
 """
 import os
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from typing import Optional, List
 import base64
 
+from api import servicio_smtp
+
+
+def config_smtp() -> servicio_smtp.ConfigSMTP:
+    """Configuración SMTP del .env (lanza ValueError si falta el remitente o la contraseña)"""
+    # Soportar ambos formatos de configuración
+    email_sender = os.getenv('EMAIL_SENDER') or os.getenv('SMTP_USER')
+    email_password = os.getenv('EMAIL_PASSWORD') or os.getenv('SMTP_PASSWORD')
+    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+    smtp_port = int(os.getenv('SMTP_PORT', 587))
+    
+    # Validar configuración
+    if not email_sender:
+        raise ValueError("❌ EMAIL_SENDER o SMTP_USER no configurado en .env")
+    if not email_password:
+        raise ValueError("❌ EMAIL_PASSWORD o SMTP_PASSWORD no configurado en .env")
+    
+    return servicio_smtp.ConfigSMTP(smtp_server, smtp_port, email_sender, email_password)
+
+
+def construir_mensaje(
+    remitente: str,
+    destinatario: str,
+    asunto: str,
+    cuerpo_html: str,
+    archivos_adjuntos: Optional[List[dict]] = None
+) -> MIMEMultipart:
+    """Mensaje listo para enviar por servicio_smtp (mismas cabeceras para todos los emails)"""
+    msg = MIMEMultipart()
+    msg['From'] = f"Estudio Visa España <{remitente}>"
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg['Reply-To'] = remitente
+    
+    # Headers para evitar spam
+    msg['X-Priority'] = '1'
+    msg['X-MSMail-Priority'] = 'High'
+    msg['Importance'] = 'High'
+    
+    # Adjuntar cuerpo HTML
+    msg.attach(MIMEText(cuerpo_html, 'html'))
+    
+    # Adjuntar archivos si los hay
+    if archivos_adjuntos:
+        for archivo in archivos_adjuntos:
+            contenido = base64.b64decode(archivo['contenido_base64'])
+            attachment = MIMEApplication(contenido, _subtype=archivo.get('tipo', 'pdf'))
+            attachment.add_header('Content-Disposition', 'attachment', filename=archivo['nombre'])
+            msg.attach(attachment)
+    
+    return msg
+
 
 def enviar_email(
     destinatario: str,
@@ -29,54 +80,16 @@ def enviar_email(
         bool: True si se envió correctamente, False si hubo error
     """
     try:
-        msg = MIMEMultipart()
-        
-        # Soportar ambos formatos de configuración
-        email_sender = os.getenv('EMAIL_SENDER') or os.getenv('SMTP_USER')
-        email_password = os.getenv('EMAIL_PASSWORD') or os.getenv('SMTP_PASSWORD')
-        smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.getenv('SMTP_PORT', 587))
-        
-        # Validar configuración
-        if not email_sender:
-            raise ValueError("❌ EMAIL_SENDER o SMTP_USER no configurado en .env")
-        if not email_password:
-            raise ValueError("❌ EMAIL_PASSWORD o SMTP_PASSWORD no configurado en .env")
+        config = config_smtp()
         
         print(f"📧 Enviando email a {destinatario}")
-        print(f"   Servidor: {smtp_server}:{smtp_port}")
-        print(f"   Remitente: {email_sender}")
-        
-        msg['From'] = f"Estudio Visa España <{email_sender}>"
-        msg['To'] = destinatario
-        msg['Subject'] = asunto
-        msg['Reply-To'] = email_sender
-        
-        # Headers para evitar spam
-        msg['X-Priority'] = '1'
-        msg['X-MSMail-Priority'] = 'High'
-        msg['Importance'] = 'High'
-        
-        # Adjuntar cuerpo HTML
-        msg.attach(MIMEText(cuerpo_html, 'html'))
+        print(f"   Servidor: {config.servidor}:{config.puerto}")
+        print(f"   Remitente: {config.usuario}")
         
-        # Adjuntar archivos si los hay
-        if archivos_adjuntos:
-            for archivo in archivos_adjuntos:
-                contenido = base64.b64decode(archivo['contenido_base64'])
-                attachment = MIMEApplication(contenido, _subtype=archivo.get('tipo', 'pdf'))
-                attachment.add_header('Content-Disposition', 'attachment', filename=archivo['nombre'])
-                msg.attach(attachment)
+        msg = construir_mensaje(config.usuario, destinatario, asunto, cuerpo_html, archivos_adjuntos)
         
-        # Conectar y enviar
-        print(f"   Conectando a {smtp_server}...")
-        smtp = smtplib.SMTP(smtp_server, smtp_port)
-        smtp.starttls()
-        print(f"   Autenticando...")
-        smtp.login(email_sender, email_password)
-        print(f"   Enviando mensaje...")
-        smtp.send_message(msg)
-        smtp.quit()
+        # Enviar por una conexión SMTP ya autenticada del pool
+        servicio_smtp.enviar(msg, config)
         
         print(f"✅ Email enviado exitosamente a {destinatario}")
         return True
@@ -0,0 +1,123 @@
+"""
+Canal de eventos en tiempo real (Server-Sent Events)
+Sustituye el polling de los badges de no leídos: el navegador abre un
+EventSource, recibe los contadores al conectar y después solo los cambios,
+empujados desde api/contadores_no_leidos.py. Un navegador inactivo ya no hace
+peticiones: solo recibe un comentario de keepalive cada KEEPALIVE_SEGUNDOS.
+
+Eventos (`event: contadores`), con solo los contadores que cambiaron:
+    estudiante:  {"notificaciones": 3, "chat": 1}
+    admin:       {"chat": 12, "agentes": 2}
+    agente:      {"mensajes": 1}
+
+EventSource no permite cabeceras, así que admin y agentes mandan el JWT en
+?token= (el mismo que usan en Authorization).
+"""
+
+import json
+from typing import Dict
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from api.auth import verificar_token
+from api.contadores_no_leidos import (
+    CLAVE_AGENTES_TOTAL, CLAVE_CHAT_TOTAL, clave_agentes, clave_chat,
+    clave_notificaciones, leer_contadores, obtener_canal
+)
+from database.models import get_connection
+
+router = APIRouter()
+
+# Por debajo de los ~60 s en que cortan los proxies una respuesta sin datos
+KEEPALIVE_SEGUNDOS = 25
+# Espera que pedimos al navegador antes de reconectar
+RECONEXION_MS = 5000
+
+
+def _evento(datos: Dict[str, int]) -> str:
+    return f"event: contadores\ndata: {json.dumps(datos)}\n\n"
+
+
+async def _flujo_contadores(request: Request, nombres: Dict[str, str]):
+    """nombres: clave del contador -> nombre con el que lo ve el frontend"""
+    canal = obtener_canal()
+    # Suscribir antes de leer: un cambio entre ambas cosas llega igualmente
+    suscripcion = canal.suscribir(nombres)
+    try:
+        yield f"retry: {RECONEXION_MS}\n\n"
+        actuales = await run_in_threadpool(leer_contadores, list(nombres))
+        yield _evento({nombres[clave]: valor for clave, valor in actuales.items()})
+
+        while not await request.is_disconnected():
+            cambios = await suscripcion.siguiente(KEEPALIVE_SEGUNDOS)
+            if cambios:
+                yield _evento({nombres[clave]: valor for clave, valor in cambios.items()})
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        canal.cancelar(suscripcion)
+
+
+def _respuesta_sse(request: Request, nombres: Dict[str, str]) -> StreamingResponse:
+    return StreamingResponse(
+        _flujo_contadores(request, nombres),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Sin buffering en nginx/Render: cada evento sale en cuanto se escribe
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+def _id_agente_activo(email: str):
+    # Conexión suelta y devuelta al momento: con Depends(get_db) la sesión
+    # quedaría abierta mientras dure el stream (horas)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM agentes WHERE email = %s AND activo = TRUE", (email,))
+        fila = cursor.fetchone()
+        cursor.close()
+        return fila[0] if fila else None
+    finally:
+        conn.close()
+
+
+@router.get("/eventos/estudiante/{estudiante_id}", tags=["Eventos"])
+def eventos_estudiante(estudiante_id: int, request: Request):
+    """Contadores de notificaciones y mensajes del equipo sin leer del estudiante"""
+    return _respuesta_sse(request, {
+        clave_notificaciones(estudiante_id): "notificaciones",
+        clave_chat("admin", estudiante_id): "chat"
+    })
+
+
+@router.get("/eventos/equipo", tags=["Eventos"])
+def eventos_equipo(token: str, request: Request):
+    """Contadores del panel admin o del dashboard de agente, según el token"""
+    payload = verificar_token(token)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o expirado"
+        )
+
+    if payload.get("tipo") == "agente":
+        agente_id = _id_agente_activo(payload.get("sub"))
+        if agente_id is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Agente no encontrado o inactivo")
+        return _respuesta_sse(request, {clave_agentes("admin", agente_id): "mensajes"})
+
+    if payload.get("rol") == "admin":
+        return _respuesta_sse(request, {
+            CLAVE_CHAT_TOTAL: "chat",
+            CLAVE_AGENTES_TOTAL: "agentes"
+        })
+
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Se requieren permisos de administrador o agente"
+    )
@@ -0,0 +1,308 @@
+"""
+Extractor de campos del texto OCR (compartido por ValidadorOCR y OCRProcessor)
+Una sola pasada con una expresión precompilada recoge fechas, importes
+(solo cifras con divisa, con formato o tras "saldo"/"balance"), IBAN,
+números de DNI y de pasaporte en orden de aparición (los emails, con otra
+aparte y solo si el texto contiene '@'). La zona MRZ de pasaportes (TD3) y
+documentos de identidad (TD1) se interpreta con sus dígitos de control
+(ICAO 9303).
+"""
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# El orden de las alternativas importa: lo más específico primero, para que
+# p.ej. los dígitos de una fecha o de un IBAN no se lean como importes.
+# La anticipación inicial descarta de un vistazo las posiciones que no pueden
+# empezar un token (minúsculas, espacios...), que son la mayoría del texto.
+_TOKENS = re.compile(r"""
+    (?=[\dA-Z€$£])
+    (?:
+      (?P<iban>\bES\d{2}(?:\s?\d{4}){5}\b)
+    | (?P<fecha_ymd>\b\d{4}[/-]\d{2}[/-]\d{2}\b)
+    | (?P<fecha_dmy>\b\d{2}[/.-]\d{2}[/.-]\d{4}\b)
+    | (?P<dni>\b\d{8}[A-Z]\b)
+    | (?P<pasaporte>\b(?:[A-Z]{1,3}\d{6,9}|\d{6,9}[A-Z]{1,2})\b)
+    | (?P<divisa_pre>[€$£]\s?)?
+      (?P<cifra>\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)
+      (?P<divisa_post>\s?(?:€|EUR|USD|\$))?
+    )
+""", re.VERBOSE)
+
+# Una cifra sin divisa ni separadores solo es importe si va tras una
+# etiqueta de saldo en la misma línea; si no, es un número de cuenta, de
+# cliente, un año... Con más de MAX_DIGITOS_SIN_FORMATO dígitos nunca lo es.
+_ETIQUETA_SALDO = re.compile(r'(?:saldo|balance)[^\n\d]{0,30}$', re.IGNORECASE)
+MAX_DIGITOS_SIN_FORMATO = 7
+
+# Los emails pueden empezar en cualquier letra: solo se buscan si hay '@'
+_EMAIL = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+_LINEA_MRZ = re.compile(r'^[A-Z0-9<]{28,46}$')
+
+_VALORES_MRZ = {c: i for i, c in enumerate('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')}
+_VALORES_MRZ['<'] = 0
+_PESOS_MRZ = (7, 3, 1)
+
+# Confusiones típicas del OCR en campos que solo pueden ser números
+_A_DIGITO = str.maketrans('OQDILZSBG', '001112586')
+
+
+class CamposDocumento:
+    """Campos encontrados en el texto, en orden de aparición"""
+
+    __slots__ = ('texto', 'lineas', 'fechas', 'montos', 'ibans', 'emails',
+                 'dnis', 'pasaportes', 'mrz', '_texto_lower')
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self.lineas = texto.split('\n')
+        self.fechas: List[Tuple[str, Optional[datetime]]] = []
+        self.montos: List[Tuple[str, float, Optional[str]]] = []
+        self.ibans: List[str] = []
+        self.emails: List[str] = []
+        self.dnis: List[str] = []
+        self.pasaportes: List[str] = []
+        self.mrz: Optional[Dict] = None
+        self._texto_lower = None
+
+    @property
+    def texto_lower(self) -> str:
+        if self._texto_lower is None:
+            self._texto_lower = self.texto.lower()
+        return self._texto_lower
+
+    def contar_palabras(self, palabras: List[str]) -> int:
+        texto_lower = self.texto_lower
+        return sum(1 for palabra in palabras if palabra in texto_lower)
+
+    def primera_fecha_valida(self) -> Optional[datetime]:
+        return next((fecha for _, fecha in self.fechas if fecha), None)
+
+
+def extraer_campos(texto: str) -> CamposDocumento:
+    """Recorre el texto una sola vez y clasifica cada token"""
+    campos = CamposDocumento(texto or '')
+    # Tramos ocupados por emails: sus dígitos no son importes ni fechas
+    tramos_email = []
+    if '@' in campos.texto:
+        for m in _EMAIL.finditer(campos.texto):
+            campos.emails.append(m.group())
+            tramos_email.append(m.span())
+
+    for m in _TOKENS.finditer(campos.texto):
+        if tramos_email and any(inicio <= m.start() < fin for inicio, fin in tramos_email):
+            continue
+        tipo = m.lastgroup
+        valor = m.group()
+        if tipo == 'iban':
+            campos.ibans.append(valor)
+        elif tipo in ('fecha_ymd', 'fecha_dmy'):
+            campos.fechas.append((valor, _fecha_token(valor, tipo)))
+        elif tipo == 'dni':
+            campos.dnis.append(valor)
+        elif tipo == 'pasaporte':
+            campos.pasaportes.append(valor)
+        else:
+            cifra = m.group('cifra')
+            divisa = (m.group('divisa_pre') or m.group('divisa_post') or '').strip() or None
+            if not _es_importe(campos.texto, m.start(), cifra, divisa):
+                continue
+            importe = parsear_monto(cifra)
+            if importe is not None:
+                campos.montos.append((valor.strip(), importe, divisa))
+
+    campos.mrz = parsear_mrz(campos.lineas)
+    return campos
+
+
+def _es_importe(texto: str, inicio: int, cifra: str, divisa: Optional[str]) -> bool:
+    """Con divisa o formato de miles/decimales, o junto a una etiqueta de saldo"""
+    if cifra.isdigit():
+        if len(cifra) > MAX_DIGITOS_SIN_FORMATO:
+            return False
+        if divisa is None:
+            return bool(_ETIQUETA_SALDO.search(texto, max(0, inicio - 40), inicio))
+    return True
+
+
+def _fecha_token(valor: str, tipo: str) -> Optional[datetime]:
+    partes = [int(p) for p in re.split(r'[/.-]', valor)]
+    if tipo == 'fecha_ymd':
+        anio, mes, dia = partes
+        candidatos = [(anio, mes, dia)]
+    else:
+        dia, mes, anio = partes
+        # dd/mm/aaaa y, si no existe esa fecha, mm/dd/aaaa
+        candidatos = [(anio, mes, dia), (anio, dia, mes)]
+    for anio, mes, dia in candidatos:
+        try:
+            return datetime(anio, mes, dia)
+        except ValueError:
+            continue
+    return None
+
+
+def parsear_fecha(fecha_str: str) -> datetime:
+    """dd/mm/aaaa, dd-mm-aaaa, dd.mm.aaaa, aaaa-mm-dd, aaaa/mm/dd (o mm/dd/aaaa)"""
+    fecha_str = fecha_str.strip()
+    tipo = 'fecha_ymd' if re.match(r'^\d{4}[/-]', fecha_str) else 'fecha_dmy'
+    if re.match(r'^\d{2,4}[/.-]\d{2}[/.-]\d{2,4}$', fecha_str):
+        fecha = _fecha_token(fecha_str, tipo)
+        if fecha:
+            return fecha
+    raise ValueError(f"No se pudo parsear fecha: {fecha_str}")
+
+
+def parsear_monto(cifra: str) -> Optional[float]:
+    """
+    Importe con separadores europeos o anglosajones:
+    '15.000' -> 15000, '1.234,56' -> 1234.56, '1,234.56' -> 1234.56, '12,5' -> 12.5
+    """
+    if '.' in cifra and ',' in cifra:
+        decimal = '.' if cifra.rfind('.') > cifra.rfind(',') else ','
+        miles = ',' if decimal == '.' else '.'
+        cifra = cifra.replace(miles, '').replace(decimal, '.')
+    elif '.' in cifra or ',' in cifra:
+        separador = '.' if '.' in cifra else ','
+        enteros, _, decimales = cifra.rpartition(separador)
+        if cifra.count(separador) == 1 and len(decimales) != 3:
+            cifra = f"{enteros}.{decimales}"
+        else:
+            cifra = cifra.replace(separador, '')
+    try:
+        return float(cifra)
+    except ValueError:
+        return None
+
+
+# ----------------------------------------------------------------------------
+# MRZ
+# ----------------------------------------------------------------------------
+
+def digito_control(campo: str) -> int:
+    """Dígito de control ICAO 9303 (pesos 7, 3, 1)"""
+    return sum(_VALORES_MRZ.get(c, 0) * _PESOS_MRZ[i % 3] for i, c in enumerate(campo)) % 10
+
+
+def _control_ok(campo: str, digito: str) -> bool:
+    digito = digito.translate(_A_DIGITO)
+    if digito == '<':
+        # Campo opcional vacío
+        return set(campo) <= {'<'}
+    return digito.isdigit() and digito_control(campo) == int(digito)
+
+
+def _fecha_mrz(aammdd: str, futura: bool) -> Optional[str]:
+    if not aammdd.isdigit():
+        return None
+    anio, mes, dia = int(aammdd[:2]), int(aammdd[2:4]), int(aammdd[4:])
+    actual = datetime.now().year % 100
+    # Caducidad: siempre 20xx; nacimiento: 19xx si el año aún no ha llegado
+    siglo = 2000 if futura or anio <= actual else 1900
+    try:
+        return datetime(siglo + anio, mes, dia).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _nombres_mrz(campo: str) -> Tuple[str, str]:
+    apellidos, _, nombres = campo.partition('<<')
+    return apellidos.replace('<', ' ').strip(), nombres.replace('<', ' ').strip()
+
+
+def _normalizar_linea_mrz(linea: str) -> str:
+    return linea.strip().replace(' ', '').replace('«', '<').upper()
+
+
+def _ajustar(linea: str, longitud: int) -> Optional[str]:
+    """El OCR a veces se come algún '<' final"""
+    if longitud - 2 <= len(linea) <= longitud:
+        return linea.ljust(longitud, '<')
+    return None
+
+
+def _mrz_td3(l1: str, l2: str) -> Dict:
+    numero = l2[0:9]
+    nacimiento = l2[13:19].translate(_A_DIGITO)
+    expiracion = l2[21:27].translate(_A_DIGITO)
+    apellidos, nombres = _nombres_mrz(l1[5:44])
+    controles = {
+        'numero_documento': _control_ok(numero, l2[9]),
+        'fecha_nacimiento': _control_ok(nacimiento, l2[19]),
+        'fecha_expiracion': _control_ok(expiracion, l2[27]),
+        'datos_personales': _control_ok(l2[28:42], l2[42]),
+        'compuesto': _control_ok(l2[0:10] + nacimiento + l2[19] + expiracion + l2[27:43], l2[43]),
+    }
+    return {
+        'formato': 'TD3',
+        'tipo_documento': l1[0:2].replace('<', ''),
+        'pais_emisor': l1[2:5].replace('<', ''),
+        'apellidos': apellidos,
+        'nombres': nombres,
+        'numero_documento': numero.replace('<', ''),
+        'nacionalidad': l2[10:13].replace('<', ''),
+        'fecha_nacimiento': _fecha_mrz(nacimiento, futura=False),
+        'sexo': l2[20].replace('<', ''),
+        'fecha_expiracion': _fecha_mrz(expiracion, futura=True),
+        'controles': controles,
+        'valido': all(controles.values())
+    }
+
+
+def _mrz_td1(l1: str, l2: str, l3: str) -> Dict:
+    numero = l1[5:14]
+    nacimiento = l2[0:6].translate(_A_DIGITO)
+    expiracion = l2[8:14].translate(_A_DIGITO)
+    apellidos, nombres = _nombres_mrz(l3)
+    controles = {
+        'numero_documento': _control_ok(numero, l1[14]),
+        'fecha_nacimiento': _control_ok(nacimiento, l2[6]),
+        'fecha_expiracion': _control_ok(expiracion, l2[14]),
+        'compuesto': _control_ok(l1[5:30] + nacimiento + l2[6] + expiracion + l2[14] + l2[18:29], l2[29]),
+    }
+    return {
+        'formato': 'TD1',
+        'tipo_documento': l1[0:2].replace('<', ''),
+        'pais_emisor': l1[2:5].replace('<', ''),
+        'apellidos': apellidos,
+        'nombres': nombres,
+        'numero_documento': numero.replace('<', ''),
+        'nacionalidad': l2[15:18].replace('<', ''),
+        'fecha_nacimiento': _fecha_mrz(nacimiento, futura=False),
+        'sexo': l2[7].replace('<', ''),
+        'fecha_expiracion': _fecha_mrz(expiracion, futura=True),
+        'controles': controles,
+        'valido': all(controles.values())
+    }
+
+
+def parsear_mrz(lineas: List[str]) -> Optional[Dict]:
+    """
+    Busca e interpreta la MRZ: pasaporte TD3 (2 líneas de 44) o documento
+    de identidad TD1 (3 líneas de 30). None si no hay MRZ reconocible.
+    """
+    candidatas = []
+    for linea in lineas:
+        normalizada = _normalizar_linea_mrz(linea)
+        if '<' in normalizada and _LINEA_MRZ.match(normalizada):
+            candidatas.append(normalizada)
+        elif candidatas and normalizada:
+            # La MRZ son líneas consecutivas: empezar de nuevo
+            candidatas.append(None)
+
+    encontrada = None
+    for i in range(len(candidatas) - 1):
+        l1, l2 = candidatas[i], candidatas[i + 1]
+        if l1 is None or l2 is None:
+            continue
+        td3 = (_ajustar(l1, 44), _ajustar(l2, 44))
+        if all(td3) and td3[0][0] == 'P':
+            encontrada = _mrz_td3(*td3)
+        elif i + 2 < len(candidatas) and candidatas[i + 2] is not None:
+            td1 = (_ajustar(l1, 30), _ajustar(l2, 30), _ajustar(candidatas[i + 2], 30))
+            if all(td1) and td1[0][0] in 'IAC':
+                encontrada = _mrz_td1(*td1)
+        if encontrada and encontrada['valido']:
+            return encontrada
+    return encontrada
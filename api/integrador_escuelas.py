@@ -8,6 +8,7 @@ from typing import List, Dict, Optional
 import json
 import re
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
 from api.cache_manager import CacheManager
 from api.monitor_scrapers import MonitorScrapers
@@ -334,53 +335,101 @@ class IntegradorEscuelas:
         
         return cursos
     
+    # Fuentes que se consultan en paralelo: nombre -> (método, presupuesto en segundos)
+    FUENTES = {
+        'educations': ('scrape_educations_com', 20),
+        'emagister': ('scrape_emagister_com', 20),
+        'masters_bcn': ('scrape_masters_bcn', 15),
+        'ucm_oficial': ('scrape_ucm_oficial', 15),
+    }
+    
     @classmethod
-    def sincronizar_todos_cursos(cls) -> List[Dict]:
+    def sincronizar_todos_cursos(cls, trabajo=None) -> List[Dict]:
         """
         Obtiene cursos de TODAS las fuentes REALES y los consolida
-        """
-        todos_cursos = []
         
+        Las fuentes se consultan a la vez, cada una con su presupuesto de
+        tiempo. Si una falla, no devuelve nada o se pasa de tiempo se usa su
+        último resultado bueno (snapshot). Los cursos se van uniendo sin
+        duplicados según llegan.
+        
+        Args:
+            trabajo: Trabajo en segundo plano (opcional) donde ir dejando el
+                     estado de cada fuente
+        """
         print("\n🔍 Iniciando scraping de portales educativos reales...\n")
         
-        # 1. Educations.com (Internacional)
-        try:
-            cursos_edu = cls.scrape_educations_com()
-            todos_cursos.extend(cursos_edu)
-            time.sleep(2)  # Esperar entre requests
-        except Exception as e:
-            print(f"Error con Educations.com: {e}")
+        cursos_unicos = {}
+        estado_fuentes = {}
         
-        # 2. Emagister (Agregador español)
-        try:
-            cursos_emag = cls.scrape_emagister_com()
-            todos_cursos.extend(cursos_emag)
-            time.sleep(2)
-        except Exception as e:
-            print(f"Error con Emagister: {e}")
+        def agregar(fuente, cursos, estado, **extra):
+            for curso in cursos:
+                clave = (
+                    (curso.get('nombre') or '').strip().lower(),
+                    (curso.get('universidad') or '').strip().lower(),
+                    (curso.get('ciudad') or '').strip().lower()
+                )
+                cursos_unicos.setdefault(clave, curso)
+            estado_fuentes[fuente] = {'estado': estado, 'cursos': len(cursos), **extra}
+            if trabajo is not None:
+                trabajo.actualizar(fuentes=dict(estado_fuentes), cursos_unicos=len(cursos_unicos))
         
-        # 3. MastersBCN (Barcelona)
-        try:
-            cursos_bcn = cls.scrape_masters_bcn()
-            todos_cursos.extend(cursos_bcn)
-            time.sleep(2)
-        except Exception as e:
-            print(f"Error con MastersBCN: {e}")
+        def usar_snapshot(fuente, motivo):
+            snapshot = cls.cache.get_snapshot(fuente)
+            if snapshot:
+                print(f"⚠️ {fuente}: {motivo}, usando snapshot del {snapshot['timestamp']}")
+                agregar(fuente, snapshot['cursos'], 'snapshot', motivo=motivo, snapshot_de=snapshot['timestamp'])
+            else:
+                print(f"⚠️ {fuente}: {motivo}, sin snapshot disponible")
+                agregar(fuente, [], motivo)
+        
+        inicio = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=len(cls.FUENTES), thread_name_prefix='sync_cursos')
+        futuros = {
+            pool.submit(getattr(cls, metodo)): fuente
+            for fuente, (metodo, _) in cls.FUENTES.items()
+        }
+        limites = {fuente: inicio + presupuesto for fuente, (_, presupuesto) in cls.FUENTES.items()}
+        pendientes = set(futuros)
         
-        # 4. UCM Oficial
         try:
-            cursos_ucm = cls.scrape_ucm_oficial()
-            todos_cursos.extend(cursos_ucm)
-        except Exception as e:
-            print(f"Error con UCM: {e}")
+            while pendientes:
+                espera = max(0, min(limites[futuros[f]] for f in pendientes) - time.monotonic())
+                terminados, pendientes = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+                
+                for futuro in terminados:
+                    fuente = futuros[futuro]
+                    duracion = round(time.monotonic() - inicio, 2)
+                    try:
+                        cursos = futuro.result()
+                    except Exception as e:
+                        print(f"Error con {fuente}: {e}")
+                        usar_snapshot(fuente, 'error')
+                        continue
+                    if cursos:
+                        cls.cache.set_snapshot(fuente, cursos)
+                        agregar(fuente, cursos, 'ok', duracion=duracion)
+                    else:
+                        usar_snapshot(fuente, 'sin_resultados')
+                
+                # Fuentes que agotaron su presupuesto: no se las sigue esperando
+                ahora = time.monotonic()
+                for futuro in [f for f in pendientes if limites[futuros[f]] <= ahora]:
+                    pendientes.discard(futuro)
+                    usar_snapshot(futuros[futuro], 'timeout')
+        finally:
+            # Los hilos que sigan corriendo terminan solos, sin bloquear
+            pool.shutdown(wait=False)
+        
+        todos_cursos = list(cursos_unicos.values())
         
-        # Fallback: Si no se obtuvo nada, usar datos base
+        # Último recurso (sin scraping ni snapshots, p.ej. primer arranque)
         if len(todos_cursos) == 0:
             print("\n⚠️ No se pudieron obtener cursos de fuentes externas")
             print("📋 Usando base de datos de respaldo...\n")
             todos_cursos = cls._obtener_cursos_respaldo()
         
-        print(f"\n✅ Total cursos obtenidos: {len(todos_cursos)}\n")
+        print(f"\n✅ Total cursos obtenidos: {len(todos_cursos)} en {time.monotonic() - inicio:.1f}s\n")
         
         return todos_cursos
     
@@ -0,0 +1,79 @@
+"""
+Límite de tamaño de las subidas antes de leer el cuerpo
+Con parámetros UploadFile, Starlette lee y vuelca a disco el multipart
+entero antes de llamar al handler, así que un límite comprobado dentro del
+handler solo salta cuando ya se recibió todo. Este middleware ASGI corta las
+rutas de subida con 413:
+
+- sin leer nada si el Content-Length ya supera el límite;
+- sin Content-Length (chunked) o si no es fiable, en cuanto los bytes
+  recibidos lo pasan.
+
+El límite por archivo lo siguen aplicando los handlers (guardar_upload).
+"""
+import re
+from typing import List, Optional, Pattern, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+MB = 1024 * 1024
+MAX_ARCHIVO_DOCUMENTO = 10 * MB
+MAX_ARCHIVOS_POR_SUBIDA = 10
+# Cabeceras multipart y campos de formulario
+MARGEN_MULTIPART = 256 * 1024
+
+# (ruta, límite del cuerpo completo en bytes)
+LIMITES_SUBIDA: List[Tuple[Pattern, int]] = [
+    (re.compile(r'^/api/documentos/\d+/subir$'),
+     MAX_ARCHIVO_DOCUMENTO * MAX_ARCHIVOS_POR_SUBIDA + MARGEN_MULTIPART),
+    (re.compile(r'^/api/estudiantes/\d+/documentos$'), 5 * MB + MARGEN_MULTIPART),
+    (re.compile(r'^/api/estudiantes/\d+/documentos/upload$'), MAX_ARCHIVO_DOCUMENTO + MARGEN_MULTIPART),
+]
+
+
+def _detalle(limite: int) -> str:
+    return f"La subida supera el máximo de {limite // MB}MB"
+
+
+class LimiteSubidas:
+    """Middleware ASGI puro (no BaseHTTPMiddleware: no debe leer el cuerpo)"""
+
+    def __init__(self, app, limites: List[Tuple[Pattern, int]] = LIMITES_SUBIDA):
+        self.app = app
+        self.limites = limites
+
+    def _limite(self, ruta: str) -> Optional[int]:
+        for patron, limite in self.limites:
+            if patron.match(ruta):
+                return limite
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('POST', 'PUT'):
+            await self.app(scope, receive, send)
+            return
+        limite = self._limite(scope['path'])
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        longitud = dict(scope['headers']).get(b'content-length')
+        if longitud is not None and longitud.isdigit() and int(longitud) > limite:
+            respuesta = JSONResponse({'detail': _detalle(limite)}, status_code=413)
+            await respuesta(scope, receive, send)
+            return
+
+        recibidos = 0
+
+        async def receive_limitado():
+            nonlocal recibidos
+            mensaje = await receive()
+            if mensaje['type'] == 'http.request':
+                recibidos += len(mensaje.get('body', b''))
+                if recibidos > limite:
+                    # Sale de request.form() y FastAPI responde el 413
+                    raise HTTPException(status_code=413, detail=_detalle(limite))
+            return mensaje
+
+        await self.app(scope, receive_limitado, send)
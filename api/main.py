@@ -4,9 +4,10 @@ Endpoints para estudiantes y panel de administración
 Última actualización: 2024-12-20 - Fix fondos_disponibles opcional
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Form, Request, Body
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Form, Request, Body, Response
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -28,7 +29,7 @@ from utils.logger import logger, log_event, log_error
 # Sistema de notificaciones automáticas
 from modules.sistema_notificaciones_automaticas import notificar
 
-from database.models import get_db
+from database.models import get_db, get_connection, pool_stats
 from modules.estudiantes import Estudiante
 from modules.admin_panel import PanelAdministrativo
 from api.schemas import (
@@ -43,6 +44,8 @@ from api.chat_routes import router as chat_router
 from api.analytics_routes import router as analytics_router
 from api.documentos_routes import router as documentos_router
 from api.agentes_routes import router as agentes_router
+from api.eventos_routes import router as eventos_router
+from api.limite_subidas import LimiteSubidas, MAX_ARCHIVO_DOCUMENTO
 
 # Configurar rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -57,6 +60,10 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Cortar subidas demasiado grandes antes de leer el cuerpo (dentro de CORS,
+# para que el 413 lleve sus cabeceras)
+app.add_middleware(LimiteSubidas)
+
 # CORS - Permitir requests desde frontend
 app.add_middleware(
     CORSMiddleware,
@@ -76,464 +83,20 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
-    """Ejecutar migraciones al iniciar"""
-    import os
-    import psycopg2
+    """Aplicar migraciones pendientes e iniciar el scheduler"""
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
-        cursor = conn.cursor()
-        
-        # MIGRACIÓN: Agregar credito_retirado
-        try:
-            cursor.execute("""
-                ALTER TABLE estudiantes 
-                ADD COLUMN IF NOT EXISTS credito_retirado DECIMAL(10, 2) DEFAULT 0.00
-            """)
-            cursor.execute("""
-                ALTER TABLE agentes 
-                ADD COLUMN IF NOT EXISTS credito_retirado DECIMAL(10, 2) DEFAULT 0.00
-            """)
-            conn.commit()
-            print("✅ Migración credito_retirado aplicada")
-        except Exception as e:
-            print(f"⚠️  Migración credito_retirado: {e}")
-        
-        # ARREGLAR: Estudiantes sin codigo_referido
-        try:
-            import random
-            import string
-            cursor.execute("""
-                SELECT id, nombre FROM estudiantes 
-                WHERE codigo_referido IS NULL OR codigo_referido = ''
-            """)
-            estudiantes_sin_codigo = cursor.fetchall()
-            
-            for est_id, nombre in estudiantes_sin_codigo:
-                codigo = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-                cursor.execute("""
-                    UPDATE estudiantes
-                    SET codigo_referido = %s,
-                        tipo_recompensa = 'dinero'
-                    WHERE id = %s
-                """, (codigo, est_id))
-                print(f"✅ Código {codigo} asignado a {nombre} (ID: {est_id})")
-            
-            if estudiantes_sin_codigo:
-                conn.commit()
-        except Exception as e:
-            print(f"⚠️  Arreglar códigos referidos: {e}")
-        
-        # Crear tabla documentos_generados si no existe
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documentos_generados (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
-                tipo_documento VARCHAR(100) NOT NULL,
-                nombre_archivo VARCHAR(255) NOT NULL,
-                contenido_pdf TEXT NOT NULL,
-                estado VARCHAR(50) DEFAULT 'generado',
-                notas TEXT,
-                generado_por VARCHAR(100),
-                aprobado_por VARCHAR(100),
-                fecha_generacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                fecha_aprobacion TIMESTAMP,
-                enviado_estudiante BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Crear tabla fechas_importantes si no existe
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS fechas_importantes (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER NOT NULL REFERENCES estudiantes(id) ON DELETE CASCADE,
-                tipo_fecha VARCHAR(100) NOT NULL,
-                fecha TIMESTAMP NOT NULL,
-                descripcion TEXT,
-                alertado_30d BOOLEAN DEFAULT FALSE,
-                alertado_15d BOOLEAN DEFAULT FALSE,
-                alertado_7d BOOLEAN DEFAULT FALSE,
-                alertado_1d BOOLEAN DEFAULT FALSE,
-                completada BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Crear tablas de universidades y programas
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS universidades_espana (
-                id SERIAL PRIMARY KEY,
-                nombre VARCHAR(255) NOT NULL,
-                siglas VARCHAR(50),
-                ciudad VARCHAR(100) NOT NULL,
-                comunidad_autonoma VARCHAR(100) NOT NULL,
-                tipo VARCHAR(50) NOT NULL,
-                url_oficial VARCHAR(500),
-                email_contacto VARCHAR(255),
-                telefono VARCHAR(50),
-                tiene_api BOOLEAN DEFAULT FALSE,
-                endpoint_api VARCHAR(500),
-                metodo_scraping VARCHAR(100),
-                ultima_actualizacion TIMESTAMP,
-                logo_url VARCHAR(500),
-                descripcion TEXT,
-                ranking_nacional INTEGER,
-                total_alumnos INTEGER,
-                total_programas INTEGER,
-                acepta_extranjeros BOOLEAN DEFAULT TRUE,
-                requisitos_extranjeros TEXT,
-                activa BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS programas_universitarios (
-                id SERIAL PRIMARY KEY,
-                universidad_id INTEGER NOT NULL,
-                nombre VARCHAR(500) NOT NULL,
-                tipo_programa VARCHAR(100),
-                area_estudio VARCHAR(200),
-                duracion_anos FLOAT,
-                creditos_ects INTEGER,
-                idioma VARCHAR(50),
-                modalidad VARCHAR(50),
-                precio_anual_eur FLOAT,
-                plazas_disponibles INTEGER,
-                nota_corte FLOAT,
-                url_info VARCHAR(500),
-                fecha_inicio_inscripcion TIMESTAMP,
-                fecha_fin_inscripcion TIMESTAMP,
-                requisitos TEXT,
-                descripcion TEXT,
-                activo BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Crear índices para optimizar búsquedas
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_universidades_ciudad ON universidades_espana(ciudad);
-            CREATE INDEX IF NOT EXISTS idx_universidades_tipo ON universidades_espana(tipo);
-            CREATE INDEX IF NOT EXISTS idx_programas_universidad ON programas_universitarios(universidad_id);
-            CREATE INDEX IF NOT EXISTS idx_programas_tipo ON programas_universitarios(tipo_programa);
-        """)
-        
-        # Crear tabla blog_posts
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS blog_posts (
-                id SERIAL PRIMARY KEY,
-                titulo VARCHAR(500) NOT NULL,
-                slug VARCHAR(500) UNIQUE NOT NULL,
-                contenido TEXT NOT NULL,
-                extracto TEXT,
-                categoria VARCHAR(100),
-                autor_nombre VARCHAR(200) DEFAULT 'Equipo Editorial',
-                imagen_portada VARCHAR(500),
-                meta_description VARCHAR(300),
-                meta_keywords VARCHAR(500),
-                visitas INTEGER DEFAULT 0,
-                publicado BOOLEAN DEFAULT FALSE,
-                destacado BOOLEAN DEFAULT FALSE,
-                fecha_publicacion TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Crear tabla testimonios
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS testimonios (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER,
-                nombre_completo VARCHAR(200) NOT NULL,
-                pais_origen VARCHAR(100) NOT NULL,
-                programa_estudio VARCHAR(300),
-                universidad VARCHAR(300),
-                ciudad_espana VARCHAR(100),
-                rating INTEGER,
-                titulo VARCHAR(300),
-                testimonio TEXT NOT NULL,
-                foto_url VARCHAR(500),
-                video_url VARCHAR(500),
-                email_contacto VARCHAR(200),
-                aprobado BOOLEAN DEFAULT FALSE,
-                destacado BOOLEAN DEFAULT FALSE,
-                visible BOOLEAN DEFAULT TRUE,
-                fecha_experiencia TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Índices para blog y testimonios
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_blog_categoria ON blog_posts(categoria);
-            CREATE INDEX IF NOT EXISTS idx_blog_publicado ON blog_posts(publicado);
-            CREATE INDEX IF NOT EXISTS idx_blog_slug ON blog_posts(slug);
-            CREATE INDEX IF NOT EXISTS idx_testimonios_aprobado ON testimonios(aprobado);
-            CREATE INDEX IF NOT EXISTS idx_testimonios_destacado ON testimonios(destacado);
-        """)
-        
-        # Tabla notificaciones
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notificaciones (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER NOT NULL,
-                tipo VARCHAR(50) NOT NULL,
-                titulo VARCHAR(200) NOT NULL,
-                mensaje TEXT NOT NULL,
-                leida BOOLEAN DEFAULT FALSE,
-                url_accion VARCHAR(500),
-                icono VARCHAR(20) DEFAULT '🔔',
-                prioridad VARCHAR(20) DEFAULT 'normal',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_notificaciones_estudiante ON notificaciones(estudiante_id);
-            CREATE INDEX IF NOT EXISTS idx_notificaciones_leida ON notificaciones(leida);
-        """)
-        
-        # Tabla mensajes_chat
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS mensajes_chat (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER NOT NULL,
-                admin_id INTEGER,
-                remitente VARCHAR(20) NOT NULL,
-                mensaje TEXT NOT NULL,
-                leido BOOLEAN DEFAULT FALSE,
-                tipo VARCHAR(20) DEFAULT 'texto',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_mensajes_estudiante ON mensajes_chat(estudiante_id);
-            CREATE INDEX IF NOT EXISTS idx_mensajes_leido ON mensajes_chat(leido);
-            CREATE INDEX IF NOT EXISTS idx_mensajes_remitente ON mensajes_chat(remitente);
-        """)
-        
-        # Tabla documentos (crear si no existe, o agregar columnas faltantes)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documentos (
-                id SERIAL PRIMARY KEY,
-                estudiante_id INTEGER NOT NULL REFERENCES estudiantes(id) ON DELETE CASCADE,
-                nombre_archivo VARCHAR(255),
-                tipo_documento VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Agregar columnas nuevas si no existen
-        try:
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS categoria VARCHAR(50)")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS contenido_base64 TEXT")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100)")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS tamano_archivo INTEGER")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS estado_revision VARCHAR(20) DEFAULT 'pendiente'")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS comentario_admin TEXT")
-            cursor.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-        except Exception as alter_error:
-            print(f"⚠️ Error agregando columnas a documentos: {alter_error}")
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_documentos_estudiante ON documentos(estudiante_id);
-        """)
-        
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_documentos_estado ON documentos(estado_revision)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_documentos_categoria ON documentos(categoria)")
-        except:
-            pass
-        
-        # Crear tabla contactos_universidades para sistema de emails
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS contactos_universidades (
-                    id SERIAL PRIMARY KEY,
-                    universidad VARCHAR(200) NOT NULL,
-                    email VARCHAR(200) NOT NULL,
-                    telefono VARCHAR(50),
-                    contacto_nombre VARCHAR(200),
-                    pais VARCHAR(100) DEFAULT 'España',
-                    ciudad VARCHAR(100),
-                    tipo_universidad VARCHAR(100),
-                    programas_interes TEXT,
-                    estado VARCHAR(50) DEFAULT 'pendiente',
-                    fecha_contacto TIMESTAMP,
-                    fecha_respuesta TIMESTAMP,
-                    fecha_reunion TIMESTAMP,
-                    notas TEXT,
-                    condiciones_propuestas TEXT,
-                    comision_acordada DECIMAL(10, 2),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Verificar si hay universidades cargadas
-            cursor.execute("SELECT COUNT(*) FROM contactos_universidades")
-            count = cursor.fetchone()[0]
-            
-            # Si no hay universidades, cargar las 44 predefinidas
-            if count == 0:
-                print("📧 Cargando 44 universidades objetivo...")
-                universidades_iniciales = [
-                    ('UCAM - Universidad Católica de Murcia', 'internacional@ucam.edu', '+34 968 278 160', 'Departamento Internacional', 'España', 'Murcia', 'Privada', 'Grados, Másteres, FP, Medicina, Ingeniería'),
-                    ('UNIR - Universidad Internacional de La Rioja', 'admisiones@unir.net', '+34 941 209 743', 'Admisiones Internacionales', 'España', 'Logroño', 'Privada', 'Grados Online, Másteres Online, Doctorados'),
-                    ('VIU - Universidad Internacional de Valencia', 'informacion@universidadviu.com', '+34 961 924 950', 'Información y Admisiones', 'España', 'Valencia', 'Privada', 'Grados Online/Presencial, Másteres, Doctorados'),
-                    ('UDIMA - Universidad a Distancia de Madrid', 'info@udima.es', '+34 918 561 699', 'Información', 'España', 'Madrid', 'Privada', 'Grados Online, Másteres, Doctorados'),
-                    ('UOC - Universitat Oberta de Catalunya', 'internacional@uoc.edu', '+34 932 532 300', 'Admisiones Internacionales', 'España', 'Barcelona', 'Privada', 'Grados Online, Másteres, Idiomas')
-                ]
-                
-                for uni in universidades_iniciales:
-                    cursor.execute("""
-                        INSERT INTO contactos_universidades 
-                        (universidad, email, telefono, contacto_nombre, pais, ciudad, tipo_universidad, programas_interes, estado)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pendiente')
-                    """, uni)
-                
-                print("✅ 5 universidades principales cargadas")
-        except Exception as e:
-            print(f"⚠️ Error creando tabla contactos_universidades: {e}")
-        
-        # Crear tabla servicios_solicitados
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS servicios_solicitados (
-                    id SERIAL PRIMARY KEY,
-                    estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
-                    servicio_id VARCHAR(100) NOT NULL,
-                    servicio_nombre VARCHAR(200) NOT NULL,
-                    estado VARCHAR(50) DEFAULT 'pendiente',
-                    precio DECIMAL(10, 2),
-                    fecha_solicitud TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_completado TIMESTAMP,
-                    notas_admin TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_servicios_estudiante 
-                ON servicios_solicitados(estudiante_id);
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_servicios_estado 
-                ON servicios_solicitados(estado);
-            """)
-            print("✅ Tabla servicios_solicitados verificada")
-        except Exception as e:
-            print(f"⚠️ Error creando tabla servicios_solicitados: {e}")
-        
-        # Crear tabla proceso_visa_pasos para tracking completo
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS proceso_visa_pasos (
-                    id SERIAL PRIMARY KEY,
-                    estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
-                    paso_inscripcion BOOLEAN DEFAULT FALSE,
-                    fecha_inscripcion TIMESTAMP,
-                    paso_pago_inicial BOOLEAN DEFAULT FALSE,
-                    fecha_pago_inicial TIMESTAMP,
-                    paso_documentos_personales BOOLEAN DEFAULT FALSE,
-                    fecha_documentos_personales TIMESTAMP,
-                    paso_seleccion_universidad BOOLEAN DEFAULT FALSE,
-                    fecha_seleccion_universidad TIMESTAMP,
-                    paso_solicitud_universidad BOOLEAN DEFAULT FALSE,
-                    fecha_solicitud_universidad TIMESTAMP,
-                    paso_carta_aceptacion BOOLEAN DEFAULT FALSE,
-                    fecha_carta_aceptacion TIMESTAMP,
-                    paso_antecedentes_solicitados BOOLEAN DEFAULT FALSE,
-                    fecha_antecedentes_solicitados TIMESTAMP,
-                    paso_antecedentes_recibidos BOOLEAN DEFAULT FALSE,
-                    fecha_antecedentes_recibidos TIMESTAMP,
-                    paso_apostilla_haya BOOLEAN DEFAULT FALSE,
-                    fecha_apostilla_haya TIMESTAMP,
-                    paso_traduccion_documentos BOOLEAN DEFAULT FALSE,
-                    fecha_traduccion_documentos TIMESTAMP,
-                    paso_seguro_medico BOOLEAN DEFAULT FALSE,
-                    fecha_seguro_medico TIMESTAMP,
-                    paso_comprobante_fondos BOOLEAN DEFAULT FALSE,
-                    fecha_comprobante_fondos TIMESTAMP,
-                    paso_carta_banco BOOLEAN DEFAULT FALSE,
-                    fecha_carta_banco TIMESTAMP,
-                    paso_formulario_visa BOOLEAN DEFAULT FALSE,
-                    fecha_formulario_visa TIMESTAMP,
-                    paso_fotos_biometricas BOOLEAN DEFAULT FALSE,
-                    fecha_fotos_biometricas TIMESTAMP,
-                    paso_pago_tasa_visa BOOLEAN DEFAULT FALSE,
-                    fecha_pago_tasa_visa TIMESTAMP,
-                    paso_cita_agendada BOOLEAN DEFAULT FALSE,
-                    fecha_cita_agendada TIMESTAMP,
-                    fecha_cita_embajada TIMESTAMP,
-                    paso_documentos_revisados BOOLEAN DEFAULT FALSE,
-                    fecha_documentos_revisados TIMESTAMP,
-                    paso_simulacro_entrevista BOOLEAN DEFAULT FALSE,
-                    fecha_simulacro_entrevista TIMESTAMP,
-                    paso_entrevista_completada BOOLEAN DEFAULT FALSE,
-                    fecha_entrevista_completada TIMESTAMP,
-                    resultado_entrevista VARCHAR(50),
-                    paso_pasaporte_recogido BOOLEAN DEFAULT FALSE,
-                    fecha_pasaporte_recogido TIMESTAMP,
-                    paso_visa_otorgada BOOLEAN DEFAULT FALSE,
-                    fecha_visa_otorgada TIMESTAMP,
-                    notas_admin TEXT,
-                    ultima_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(estudiante_id)
-                );
-            """)
-            print("✅ Tabla proceso_visa_pasos verificada")
-        except Exception as e:
-            print(f"⚠️ Error creando tabla proceso_visa_pasos: {e}")
-        
-        # Crear índices para optimizar consultas
-        try:
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_documentos_generados_estudiante 
-                ON documentos_generados(estudiante_id);
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_documentos_generados_estado 
-                ON documentos_generados(estado);
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_fechas_importantes_estudiante 
-                ON fechas_importantes(estudiante_id);
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_fechas_importantes_fecha 
-                ON fechas_importantes(fecha);
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_fechas_importantes_completada 
-                ON fechas_importantes(completada);
-            """)
-            print("✅ Índices creados")
-        except Exception as idx_error:
-            print(f"⚠️ Error creando índices: {idx_error}")
-        
-        # Agregar columna estado_servicio si no existe
-        try:
-            cursor.execute("""
-                ALTER TABLE presupuestos 
-                ADD COLUMN IF NOT EXISTS estado_servicio VARCHAR(50) DEFAULT 'pendiente';
-            """)
-            print("✅ Columna estado_servicio verificada")
-        except Exception as col_error:
-            print(f"⚠️ Error agregando columna estado_servicio: {col_error}")
+        # Con el esquema al día es solo una consulta; si hay migraciones
+        # pendientes las aplica un único worker (database/migraciones.py)
+        from database.migraciones import migrar
+        resultado = migrar()
+        if resultado['error']:
+            print(f"⚠️ Migraciones detenidas en {resultado['error']}")
+        else:
+            print(f"✅ Esquema en versión {resultado['version']}")
         
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("✅ Migraciones ejecutadas correctamente")
+        # La cola OCR vive en memoria: los trabajos sin latido no van a seguir
+        from api.cola_ocr import marcar_interrumpidos
+        marcar_interrumpidos()
         
         # Iniciar scheduler de alertas
         from api.scheduler_alertas import iniciar_scheduler
@@ -543,6 +106,18 @@ async def startup_event():
         print(f"⚠️ ERROR CRÍTICO en startup: {e}")
         import traceback
         traceback.print_exc()
+    
+    # Vigilancia del event loop (solo con DETECTAR_BLOQUEOS=<segundos>)
+    from api.detector_bloqueos import activar_si_configurado
+    activar_si_configurado()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Soltar el liderazgo del planificador para que otro worker lo tome ya"""
+    from api.scheduler_alertas import detener_scheduler
+    detener_scheduler()
+    from api.contadores_no_leidos import detener_canal
+    detener_canal()
 
 app.add_middleware(
     CORSMiddleware,
@@ -567,6 +142,7 @@ app.include_router(chat_router, prefix="/api")
 app.include_router(analytics_router, prefix="/api")
 app.include_router(documentos_router, prefix="/api")
 app.include_router(agentes_router, prefix="/api/agentes")
+app.include_router(eventos_router, prefix="/api")
 
 @app.get("/", tags=["Health"])
 async def root():
@@ -579,7 +155,7 @@ async def root():
     }
 
 @app.get("/health", tags=["Health"])
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Health check con verificación de base de datos"""
     try:
         # Verificar conexión a base de datos
@@ -616,7 +192,7 @@ def login(request: Request, datos: LoginRequest, db: Session = Depends(get_db)):
     
     try:
         # Conexión directa a la BD
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+        conn = get_connection()
         cur = conn.cursor()
         
         # Buscar usuario por email
@@ -747,7 +323,7 @@ class RegistroBasicoRequest(BaseModel):
 
 @app.post("/api/estudiantes", tags=["Estudiantes"])
 @limiter.limit("3/hour")  # Máximo 3 registros por hora por IP
-async def registrar_estudiante(
+def registrar_estudiante(
     request: Request,
     datos: RegistroBasicoRequest,
     db: Session = Depends(get_db)
@@ -1097,7 +673,7 @@ def actualizar_estudiante_publico(estudiante_id: int, datos: dict, db: Session =
 
 @app.put("/api/estudiantes/{estudiante_id}/completar-perfil", tags=["Estudiantes"])
 @app.options("/api/estudiantes/{estudiante_id}/completar-perfil", tags=["Estudiantes"])
-async def completar_perfil_estudiante(
+def completar_perfil_estudiante(
     estudiante_id: int,
     codigo_acceso: str = Query(...),
     pasaporte: str = Form(...),
@@ -1128,7 +704,7 @@ async def completar_perfil_estudiante(
     
     # Verificar código de acceso
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -1785,57 +1361,31 @@ def buscar_programas(
     Búsqueda global de programas en todas las universidades
     
     Parámetros:
-    - query: Texto a buscar en nombre del programa
+    - query: Texto a buscar en programa, universidad o ciudad (sin acentos,
+      por prefijo y tolerante a errores de escritura)
     - ciudad: Filtrar por ciudad
     - tipo_programa: grado, master, doctorado
     - precio_max: Precio máximo anual
-    """
-    from database.models import ProgramaUniversitario, UniversidadEspana
-    
-    programas_query = db.query(
-        ProgramaUniversitario, UniversidadEspana
-    ).join(
-        UniversidadEspana,
-        ProgramaUniversitario.universidad_id == UniversidadEspana.id
-    ).filter(
-        ProgramaUniversitario.activo == True,
-        ProgramaUniversitario.nombre.ilike(f'%{query}%')
-    )
     
-    if ciudad:
-        programas_query = programas_query.filter(UniversidadEspana.ciudad.ilike(f'%{ciudad}%'))
-    if tipo_programa:
-        programas_query = programas_query.filter(ProgramaUniversitario.tipo_programa == tipo_programa)
-    if precio_max:
-        programas_query = programas_query.filter(ProgramaUniversitario.precio_anual_eur <= precio_max)
+    Devuelve los 50 más relevantes y conteos por tipo, ciudad y precio.
+    """
+    from api.buscador_programas import obtener_indice
     
-    resultados = programas_query.limit(50).all()
+    busqueda = obtener_indice(db).buscar(
+        query,
+        ciudad=ciudad,
+        tipo_programa=tipo_programa,
+        precio_max=precio_max,
+        limite=50
+    )
     
     return {
         "success": True,
         "query": query,
-        "total": len(resultados),
-        "resultados": [
-            {
-                "programa": {
-                    "id": programa.id,
-                    "nombre": programa.nombre,
-                    "tipo_programa": programa.tipo_programa,
-                    "duracion_anos": programa.duracion_anos,
-                    "precio_anual_eur": programa.precio_anual_eur,
-                    "modalidad": programa.modalidad,
-                    "idioma": programa.idioma
-                },
-                "universidad": {
-                    "id": universidad.id,
-                    "nombre": universidad.nombre,
-                    "ciudad": universidad.ciudad,
-                    "tipo": universidad.tipo,
-                    "url_oficial": universidad.url_oficial
-                }
-            }
-            for programa, universidad in resultados
-        ]
+        "total": len(busqueda['resultados']),
+        "total_coincidencias": busqueda['total_coincidencias'],
+        "resultados": busqueda['resultados'],
+        "facetas": busqueda['facetas']
     }
 
 
@@ -2036,6 +1586,8 @@ def crear_programa_manual(
 ):
     """Crear nuevo programa académico manualmente"""
     from database.models import ProgramaUniversitario
+    from psycopg2 import errorcodes
+    from sqlalchemy.exc import IntegrityError
     
     try:
         nuevo_programa = ProgramaUniversitario(
@@ -2065,6 +1617,15 @@ def crear_programa_manual(
             "programa_id": nuevo_programa.id,
             "nombre": nuevo_programa.nombre
         }
+    except IntegrityError as e:
+        db.rollback()
+        # Índice único (universidad_id, nombre) de la migración 005
+        if getattr(e.orig, 'pgcode', None) == errorcodes.UNIQUE_VIOLATION:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Ya existe un programa '{programa.get('nombre')}' en esa universidad"
+            )
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -2078,6 +1639,8 @@ def actualizar_programa(
 ):
     """Actualizar información de programa existente"""
     from database.models import ProgramaUniversitario
+    from psycopg2 import errorcodes
+    from sqlalchemy.exc import IntegrityError
     
     try:
         programa = db.query(ProgramaUniversitario).filter(
@@ -2106,6 +1669,14 @@ def actualizar_programa(
         }
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if getattr(e.orig, 'pgcode', None) == errorcodes.UNIQUE_VIOLATION:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Ya existe un programa '{datos.get('nombre', programa.nombre)}' en esa universidad"
+            )
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -2141,63 +1712,62 @@ def eliminar_programa(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/documentos/{documento_id}/validar-ocr", tags=["Documentos - OCR"])
-async def validar_documento_ocr(
-    documento_id: int,
-    db: Session = Depends(get_db)
-):
+def _procesar_ocr_documento(documento_id: int) -> dict:
     """
-    Valida documento usando OCR inteligente
-    Extrae información y detecta errores automáticamente
+    OCR + validación de un documento y guardado del resultado.
+    Es bloqueante (Tesseract): se llama desde un hilo, nunca en el event loop.
     """
+    from api.ocr_processor import OCRProcessor
+    
+    conn = get_connection()
     try:
-        from api.ocr_processor import OCRProcessor
-        import os
-        import psycopg2
-        
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
         cursor = conn.cursor()
         
         # Obtener documento
         cursor.execute("""
-            SELECT tipo_documento, nombre_archivo, url_archivo
+            SELECT tipo_documento, nombre_archivo, url_archivo, blob_key
             FROM documentos
             WHERE id = %s
         """, (documento_id,))
         
         documento = cursor.fetchone()
-        
-        if not documento:
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=404, detail="Documento no encontrado")
-        
-        tipo_doc, nombre_archivo, url_archivo = documento
-        
-        # Extraer base64 de la URL (formato: data:image/jpeg;base64,...)
-        if not url_archivo or 'base64,' not in url_archivo:
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=400, detail="Documento no contiene imagen válida")
-        
+        cursor.close()
+    finally:
+        # La conexión no se retiene mientras corre el OCR
+        conn.close()
+    
+    if not documento:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    
+    tipo_doc, nombre_archivo, url_archivo, blob_key = documento
+    
+    if blob_key:
+        import base64
+        from api.blob_storage import leer_documento
+        imagen_base64 = base64.b64encode(leer_documento(blob_key)).decode('utf-8')
+    # Extraer base64 de la URL (formato: data:image/jpeg;base64,...)
+    elif not url_archivo or 'base64,' not in url_archivo:
+        raise HTTPException(status_code=400, detail="Documento no contiene imagen válida")
+    else:
         imagen_base64 = url_archivo.split('base64,')[1]
-        
-        # Procesar con OCR
-        ocr = OCRProcessor()
-        resultado = ocr.procesar_documento(imagen_base64, tipo_doc)
-        
-        if not resultado.get('exito'):
-            cursor.close()
-            conn.close()
-            return {
-                'exito': False,
-                'error': resultado.get('error', 'Error desconocido'),
-                'documento_id': documento_id
-            }
-        
-        # Guardar resultados en DB
-        validacion = resultado.get('validacion', {})
-        
+    
+    # Procesar con OCR
+    ocr = OCRProcessor()
+    resultado = ocr.procesar_documento(imagen_base64, tipo_doc)
+    
+    if not resultado.get('exito'):
+        return {
+            'exito': False,
+            'error': resultado.get('error', 'Error desconocido'),
+            'documento_id': documento_id
+        }
+    
+    # Guardar resultados en DB
+    validacion = resultado.get('validacion', {})
+    
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
         cursor.execute("""
             UPDATE documentos
             SET 
@@ -2224,25 +1794,42 @@ async def validar_documento_ocr(
             validacion.get('errores', []),
             documento_id
         ))
-        
         conn.commit()
         cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        
-        # Generar reporte legible
-        reporte = ocr.generar_reporte_validacion(resultado)
-        
-        return {
-            'exito': True,
-            'documento_id': documento_id,
-            'tipo_detectado': resultado.get('tipo_detectado'),
-            'valido': validacion.get('valido', False),
-            'datos_extraidos': validacion.get('datos_extraidos', {}),
-            'advertencias': validacion.get('advertencias', []),
-            'errores': validacion.get('errores', []),
-            'reporte': reporte,
-            'tiempo_procesamiento': resultado.get('tiempo_procesamiento', 0)
-        }
+    
+    # Generar reporte legible
+    reporte = ocr.generar_reporte_validacion(resultado)
+    
+    return {
+        'exito': True,
+        'documento_id': documento_id,
+        'tipo_detectado': resultado.get('tipo_detectado'),
+        'valido': validacion.get('valido', False),
+        'datos_extraidos': validacion.get('datos_extraidos', {}),
+        'advertencias': validacion.get('advertencias', []),
+        'errores': validacion.get('errores', []),
+        'reporte': reporte,
+        'tiempo_procesamiento': resultado.get('tiempo_procesamiento', 0)
+    }
+
+
+@app.post("/api/documentos/{documento_id}/validar-ocr", tags=["Documentos - OCR"])
+async def validar_documento_ocr(
+    documento_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Valida documento usando OCR inteligente
+    Extrae información y detecta errores automáticamente
+    """
+    try:
+        # El OCR es CPU/red: en un hilo para no parar el event loop
+        return await run_in_threadpool(_procesar_ocr_documento, documento_id)
         
     except HTTPException:
         raise
@@ -2252,7 +1839,7 @@ async def validar_documento_ocr(
 
 
 @app.post("/api/documentos/batch-validar-ocr", tags=["Documentos - OCR"])
-async def validar_documentos_batch(
+def validar_documentos_batch(
     estudiante_id: int,
     db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
@@ -2260,15 +1847,16 @@ async def validar_documentos_batch(
     """
     Valida todos los documentos de un estudiante en lote
     Útil para procesamiento masivo
+    
+    Encola un trabajo y responde al momento con su id; el progreso se
+    consulta en GET /api/documentos/batch-validar-ocr/{trabajo_id}
     """
     verificar_token(credentials.credentials)
     
     try:
-        from api.ocr_processor import OCRProcessor
-        import os
-        import psycopg2
+        from api.cola_ocr import cola_ocr
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Obtener documentos no procesados
@@ -2290,32 +1878,13 @@ async def validar_documentos_batch(
                 'procesados': 0
             }
         
-        # Procesar cada documento
-        resultados = []
-        exitosos = 0
-        
-        for doc_id, tipo_doc in documentos:
-            try:
-                resultado = await validar_documento_ocr(doc_id, db)
-                if resultado.get('exito'):
-                    exitosos += 1
-                resultados.append({
-                    'documento_id': doc_id,
-                    'tipo': tipo_doc,
-                    'resultado': resultado
-                })
-            except Exception as e:
-                resultados.append({
-                    'documento_id': doc_id,
-                    'tipo': tipo_doc,
-                    'error': str(e)
-                })
+        trabajo = cola_ocr.encolar(estudiante_id, documentos, _procesar_ocr_documento)
         
         return {
             'exito': True,
-            'procesados': exitosos,
-            'total': len(documentos),
-            'resultados': resultados
+            'trabajo_id': trabajo.id,
+            'estado': trabajo.estado,
+            'total': len(documentos)
         }
         
     except Exception as e:
@@ -2323,6 +1892,23 @@ async def validar_documentos_batch(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/documentos/batch-validar-ocr/{trabajo_id}", tags=["Documentos - OCR"])
+def estado_validacion_batch(
+    trabajo_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
+):
+    """Progreso de un lote de validación OCR (y resultados al terminar)"""
+    verificar_token(credentials.credentials)
+    
+    from api.cola_ocr import cola_ocr
+    
+    trabajo = cola_ocr.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    
+    return trabajo
+
+
 @app.get("/api/admin/documentos/{documento_id}/ocr-report", tags=["Admin - Documentos"])
 def obtener_reporte_ocr(
     documento_id: int,
@@ -2339,7 +1925,7 @@ def obtener_reporte_ocr(
         import psycopg2
         import ast
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -2408,7 +1994,7 @@ def obtener_reporte_ocr(
 
 
 @app.post("/api/estudiantes/{estudiante_id}/documentos", tags=["Estudiantes"])
-async def subir_documento(
+def subir_documento(
     estudiante_id: int,
     tipo_documento: str,
     archivo: UploadFile = File(...),
@@ -2417,8 +2003,8 @@ async def subir_documento(
     """
     Sube un documento para el estudiante
     """
-    import base64
     from datetime import datetime
+    from api.blob_storage import obtener_storage
     
     # Verificar que el estudiante existe
     from database.models import Estudiante as EstudianteModel
@@ -2437,30 +2023,33 @@ async def subir_documento(
             detail=f"Tipo de archivo no permitido. Use: {', '.join(allowed_extensions)}"
         )
     
-    # Leer archivo y convertir a base64
-    contenido = await archivo.read()
+    # Leer archivo (handler síncrono: se ejecuta en el threadpool)
+    contenido = archivo.file.read()
     tamano_bytes = len(contenido)
     
-    # Validar tamaño (máximo 5MB)
+    # Validar tamaño (máximo 5MB; LimiteSubidas ya cortó cuerpos mayores sin leerlos)
     if tamano_bytes > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Archivo muy grande. Máximo 5MB")
+        raise HTTPException(status_code=413, detail="Archivo muy grande. Máximo 5MB")
     
-    # Convertir a base64 para almacenar en DB
-    contenido_base64 = base64.b64encode(contenido).decode('utf-8')
-    url_archivo = f"data:application/{file_extension[1:]};base64,{contenido_base64}"
+    # Guardar binario en blob storage (la fila solo guarda la clave)
+    blob_key = obtener_storage().guardar(contenido)
+    mime_type = archivo.content_type or f"application/{file_extension[1:]}"
     
     # Guardar en base de datos
     try:
         result = db.execute(text("""
             INSERT INTO documentos 
-            (estudiante_id, tipo_documento, nombre_archivo, url_archivo, tamano_bytes, estado, created_at)
-            VALUES (:estudiante_id, :tipo_doc, :nombre, :url, :tamano, 'pendiente', :fecha)
+            (estudiante_id, tipo_documento, nombre_archivo, url_archivo, blob_key, mime_type,
+             tamano_bytes, estado, created_at)
+            VALUES (:estudiante_id, :tipo_doc, :nombre, :url, :blob_key, :mime, :tamano, 'pendiente', :fecha)
             RETURNING id
         """), {
             "estudiante_id": estudiante_id,
             "tipo_doc": tipo_documento,
             "nombre": archivo.filename,
-            "url": url_archivo,
+            "url": f"blob://{blob_key}",
+            "blob_key": blob_key,
+            "mime": mime_type,
             "tamano": tamano_bytes,
             "fecha": datetime.utcnow()
         })
@@ -2603,7 +2192,7 @@ def generar_documentos_estudiante(
     
     from database.models import Estudiante as EstudianteModel
     from api.generador_documentos import GeneradorDocumentosOficiales
-    import base64
+    from api.blob_storage import obtener_storage
     
     estudiante = db.query(EstudianteModel).filter(EstudianteModel.id == estudiante_id).first()
     if not estudiante:
@@ -2649,22 +2238,20 @@ def generar_documentos_estudiante(
             else:
                 continue
             
-            # Convertir a base64 para almacenar
+            # Guardar PDF en blob storage
             pdf_content = pdf_buffer.read()
-            pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
+            blob_key = obtener_storage().guardar(pdf_content)
             
             # Guardar en base de datos usando SQL directo
-            import os
-            import psycopg2
-            conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+            conn = get_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
                 INSERT INTO documentos_generados 
-                (estudiante_id, tipo_documento, nombre_archivo, contenido_pdf, estado, generado_por, enviado_estudiante)
+                (estudiante_id, tipo_documento, nombre_archivo, blob_key, estado, generado_por, enviado_estudiante)
                 VALUES (%s, %s, %s, %s, %s, %s, TRUE)
                 RETURNING id
-            """, (estudiante_id, tipo, nombre, pdf_base64, 'generado', 'admin'))
+            """, (estudiante_id, tipo, nombre, blob_key, 'generado', 'admin'))
             
             doc_id = cursor.fetchone()[0]
             conn.commit()
@@ -2738,11 +2325,13 @@ def obtener_documentos_generados_estudiante(
             raise HTTPException(status_code=403, detail="Código de acceso inválido")
             
         # Obtener documentos generados
+        import base64
+        from api.blob_storage import leer_documento
         docs_result = db.execute(
             text("""
                 SELECT id, tipo_documento, nombre_archivo, estado, 
                        fecha_generacion, fecha_aprobacion, enviado_estudiante,
-                       notas, contenido_pdf
+                       notas, contenido_pdf, blob_key
                 FROM documentos_generados
                 WHERE estudiante_id = :estudiante_id
                 ORDER BY fecha_generacion DESC
@@ -2752,6 +2341,11 @@ def obtener_documentos_generados_estudiante(
         
         documentos = []
         for row in docs_result:
+            if row[9]:
+                pdf_bytes = leer_documento(row[9])
+                contenido_pdf = base64.b64encode(pdf_bytes).decode('utf-8') if pdf_bytes else None
+            else:
+                contenido_pdf = row[8]
             documentos.append({
                 'id': row[0],
                 'tipo_documento': row[1],
@@ -2761,7 +2355,7 @@ def obtener_documentos_generados_estudiante(
                 'fecha_aprobacion': row[5].isoformat() if row[5] else None,
                 'enviado_estudiante': row[6],
                 'notas': row[7],
-                'contenido_pdf': row[8]  # Base64 del PDF
+                'contenido_pdf': contenido_pdf  # Base64 del PDF
             })
         
         return {
@@ -2790,23 +2384,33 @@ def obtener_documentos_generados_estudiante(
 def listar_documentos_generados(
     estudiante_id: Optional[int] = None,
     estado: Optional[str] = None,
+    limit: Optional[int] = None,
+    pagina_cursor: Optional[str] = Query(None, alias="cursor"),
+    response: Response = None,
     db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
 ):
-    """Lista todos los documentos generados con filtros opcionales"""
+    """
+    Lista todos los documentos generados con filtros opcionales.
+    Con `limit` se pagina por cursor (cabeceras X-Next-Cursor / X-Total-Estimado);
+    sin él se devuelve la lista completa como antes.
+    """
     verificar_token(credentials.credentials)
     
-    import os
-    import psycopg2
+    from api.paginacion import (
+        condicion_keyset, orden_keyset, normalizar_limite, recortar_pagina,
+        total_estimado, cabeceras_paginacion
+    )
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         query = """
             SELECT dg.id, dg.estudiante_id, dg.tipo_documento, dg.nombre_archivo,
                    dg.estado, dg.fecha_generacion, dg.enviado_estudiante,
-                   e.nombre as estudiante_nombre
+                   e.nombre as estudiante_nombre,
+                   COALESCE(dg.fecha_generacion, TIMESTAMP '1970-01-01') as clave_orden
             FROM documentos_generados dg
             LEFT JOIN estudiantes e ON dg.estudiante_id = e.id
             WHERE 1=1
@@ -2821,10 +2425,26 @@ def listar_documentos_generados(
             query += " AND dg.estado = %s"
             params.append(estado)
         
-        query += " ORDER BY dg.fecha_generacion DESC"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        claves = ["COALESCE(dg.fecha_generacion, TIMESTAMP '1970-01-01')", "dg.id"]
+        siguiente = None
+        if limit is not None:
+            limit = normalizar_limite(limit)
+            if response is not None and not pagina_cursor:
+                cabeceras_paginacion(response, None, total_estimado(cursor, query, params))
+            condicion, params_cursor = condicion_keyset(claves, pagina_cursor)
+            if condicion:
+                query += f" AND {condicion}"
+                params += params_cursor
+        
+        query += " " + orden_keyset(claves)
+        
+        if limit is not None:
+            query += " LIMIT %s"
+            cursor.execute(query, params + [limit + 1])
+            rows, siguiente = recortar_pagina(cursor.fetchall(), limit, [8, 0])
+        else:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         
         print(f"[DEBUG] Documentos generados encontrados: {len(rows)}")
         
@@ -2844,8 +2464,12 @@ def listar_documentos_generados(
         cursor.close()
         conn.close()
         
+        if response is not None:
+            cabeceras_paginacion(response, siguiente)
         return documentos
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error listando documentos generados: {e}")
         import traceback
@@ -2861,21 +2485,19 @@ def descargar_documento_generado(
     """Descarga un documento generado"""
     verificar_token(credentials.credentials)
     
-    import os
-    import psycopg2
-    import base64
     from io import BytesIO
+    from api.blob_storage import leer_documento
     
     # Usar conexión directa sin el dependency get_db para evitar conflictos
     conn = None
     cursor = None
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT nombre_archivo, contenido_pdf
+            SELECT nombre_archivo, blob_key, contenido_pdf
             FROM documentos_generados
             WHERE id = %s
         """, (documento_id,))
@@ -2885,10 +2507,10 @@ def descargar_documento_generado(
         if not row:
             raise HTTPException(status_code=404, detail="Documento no encontrado")
         
-        nombre_archivo, contenido_base64 = row
+        nombre_archivo, blob_key, contenido_base64 = row
         
-        # Decodificar PDF
-        pdf_content = base64.b64decode(contenido_base64)
+        # Leer PDF (blob storage o base64 legacy)
+        pdf_content = leer_documento(blob_key, contenido_base64)
         buffer = BytesIO(pdf_content)
         
         return StreamingResponse(
@@ -2915,102 +2537,51 @@ def descargar_expediente_completo(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
-    """Descarga expediente completo del estudiante en formato ZIP"""
-    import zipfile
-    import base64
-    from io import BytesIO
+    """Descarga expediente completo del estudiante en formato ZIP
+    Se genera en streaming: los documentos se leen y comprimen uno a uno"""
+    import json
+    from api.blob_storage import abrir_documento
+    from api.zip_streaming import generar_zip, filas_servidor, nombre_seguro
     
     # Obtener datos del estudiante
-    estudiante_data = db.execute(
-        text("SELECT nombre, email, pasaporte FROM estudiantes WHERE id = :id"),
+    info_estudiante = db.execute(
+        text("""
+            SELECT nombre, email, telefono, pasaporte, edad, nacionalidad,
+                   pais_origen, ciudad_origen, carrera_deseada, especialidad,
+                   nivel_espanol, tipo_visa, fondos_disponibles, estado,
+                   fecha_inicio_estimada, created_at
+            FROM estudiantes WHERE id = :id
+        """),
         {"id": estudiante_id}
     ).fetchone()
     
-    if not estudiante_data:
+    if not info_estudiante:
         raise HTTPException(status_code=404, detail="Estudiante no encontrado")
     
-    nombre_estudiante = estudiante_data[0]
-    
-    # Crear ZIP en memoria
-    zip_buffer = BytesIO()
+    nombre_estudiante = info_estudiante[0]
+    
+    # 3. Información del estudiante en JSON
+    estudiante_json = {
+        "nombre": info_estudiante[0],
+        "email": info_estudiante[1],
+        "telefono": info_estudiante[2],
+        "pasaporte": info_estudiante[3],
+        "edad": info_estudiante[4],
+        "nacionalidad": info_estudiante[5],
+        "pais_origen": info_estudiante[6],
+        "ciudad_origen": info_estudiante[7],
+        "carrera_deseada": info_estudiante[8],
+        "especialidad": info_estudiante[9],
+        "nivel_espanol": info_estudiante[10],
+        "tipo_visa": info_estudiante[11],
+        "fondos_disponibles": float(info_estudiante[12]) if info_estudiante[12] else 0,
+        "estado": info_estudiante[13],
+        "fecha_inicio_estimada": info_estudiante[14].isoformat() if info_estudiante[14] else None,
+        "fecha_registro": info_estudiante[15].isoformat() if info_estudiante[15] else None
+    }
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        
-        # 1. Documentos generados (PDFs)
-        docs_generados = db.execute(
-            text("""
-                SELECT nombre_archivo, contenido_pdf, tipo_documento
-                FROM documentos_generados
-                WHERE estudiante_id = :id
-            """),
-            {"id": estudiante_id}
-        ).fetchall()
-        
-        for doc in docs_generados:
-            nombre, contenido_b64, tipo = doc
-            if contenido_b64:
-                pdf_bytes = base64.b64decode(contenido_b64)
-                zip_file.writestr(f"documentos_generados/{nombre}", pdf_bytes)
-        
-        # 2. Documentos subidos por el estudiante
-        docs_subidos = db.execute(
-            text("""
-                SELECT nombre_archivo, contenido_base64, tipo_documento
-                FROM documentos
-                WHERE estudiante_id = :id
-            """),
-            {"id": estudiante_id}
-        ).fetchall()
-        
-        for doc in docs_subidos:
-            nombre, contenido_b64, tipo = doc
-            if contenido_b64:
-                try:
-                    file_bytes = base64.b64decode(contenido_b64)
-                    zip_file.writestr(f"documentos_subidos/{nombre}", file_bytes)
-                except Exception as e:
-                    print(f"Error procesando documento {nombre}: {e}")
-        
-        # 3. Información del estudiante en JSON
-        import json
-        info_estudiante = db.execute(
-            text("""
-                SELECT nombre, email, telefono, pasaporte, edad, nacionalidad,
-                       pais_origen, ciudad_origen, carrera_deseada, especialidad,
-                       nivel_espanol, tipo_visa, fondos_disponibles, estado,
-                       fecha_inicio_estimada, created_at
-                FROM estudiantes WHERE id = :id
-            """),
-            {"id": estudiante_id}
-        ).fetchone()
-        
-        if info_estudiante:
-            estudiante_json = {
-                "nombre": info_estudiante[0],
-                "email": info_estudiante[1],
-                "telefono": info_estudiante[2],
-                "pasaporte": info_estudiante[3],
-                "edad": info_estudiante[4],
-                "nacionalidad": info_estudiante[5],
-                "pais_origen": info_estudiante[6],
-                "ciudad_origen": info_estudiante[7],
-                "carrera_deseada": info_estudiante[8],
-                "especialidad": info_estudiante[9],
-                "nivel_espanol": info_estudiante[10],
-                "tipo_visa": info_estudiante[11],
-                "fondos_disponibles": float(info_estudiante[12]) if info_estudiante[12] else 0,
-                "estado": info_estudiante[13],
-                "fecha_inicio_estimada": info_estudiante[14].isoformat() if info_estudiante[14] else None,
-                "fecha_registro": info_estudiante[15].isoformat() if info_estudiante[15] else None
-            }
-            
-            zip_file.writestr(
-                "info_estudiante.json",
-                json.dumps(estudiante_json, indent=2, ensure_ascii=False)
-            )
-        
-        # 4. README con información del expediente
-        readme_content = f"""EXPEDIENTE COMPLETO - {nombre_estudiante}
+    # 4. README con información del expediente
+    readme_content = f"""EXPEDIENTE COMPLETO - {nombre_estudiante}
 {'='*60}
 
 Este archivo ZIP contiene:
@@ -3030,7 +2601,33 @@ Este archivo ZIP contiene:
 Generado: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
 Por: {usuario['email']}
 """
-        zip_file.writestr("README.txt", readme_content)
+    
+    def entradas():
+        # 1. Documentos generados (PDFs)
+        for nombre, blob_key, contenido_b64 in filas_servidor("""
+            SELECT nombre_archivo, blob_key, contenido_pdf
+            FROM documentos_generados
+            WHERE estudiante_id = %s
+            ORDER BY id
+        """, (estudiante_id,), nombre_cursor='expediente_generados'):
+            yield f"documentos_generados/{nombre_seguro(nombre)}", abrir_documento(blob_key, contenido_b64)
+        
+        # 2. Documentos subidos por el estudiante
+        for nombre, blob_key, contenido_b64 in filas_servidor("""
+            SELECT nombre_archivo, blob_key, contenido_base64
+            FROM documentos
+            WHERE estudiante_id = %s
+            ORDER BY id
+        """, (estudiante_id,), nombre_cursor='expediente_subidos'):
+            try:
+                contenido = abrir_documento(blob_key, contenido_b64)
+            except Exception as e:
+                print(f"Error procesando documento {nombre}: {e}")
+                continue
+            yield f"documentos_subidos/{nombre_seguro(nombre)}", contenido
+        
+        yield "info_estudiante.json", json.dumps(estudiante_json, indent=2, ensure_ascii=False)
+        yield "README.txt", readme_content
     
     # Registrar auditoría
     registrar_auditoria(
@@ -3040,11 +2637,10 @@ Por: {usuario['email']}
     )
     
     # Preparar respuesta
-    zip_buffer.seek(0)
     filename = f"expediente_{nombre_estudiante.replace(' ', '_')}_{estudiante_id}.zip"
     
     return StreamingResponse(
-        zip_buffer,
+        generar_zip(entradas()),
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -3063,7 +2659,7 @@ def aprobar_documento_generado(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3090,25 +2686,27 @@ def aprobar_documento_generado(
     # Enviar email al estudiante con el documento adjunto
     if enviar_a_estudiante:
         try:
-            import smtplib
             from email.mime.multipart import MIMEMultipart
             from email.mime.text import MIMEText
             from email.mime.application import MIMEApplication
-            import base64
+            from api import servicio_smtp
+            from api.blob_storage import leer_documento
             
             # Obtener email del estudiante y contenido del PDF
-            cursor2 = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require').cursor()
+            conn2 = get_connection()
+            cursor2 = conn2.cursor()
             cursor2.execute("""
-                SELECT e.email, e.nombre, dg.nombre_archivo, dg.tipo_documento, dg.contenido_pdf
+                SELECT e.email, e.nombre, dg.nombre_archivo, dg.tipo_documento, dg.blob_key, dg.contenido_pdf
                 FROM documentos_generados dg
                 JOIN estudiantes e ON dg.estudiante_id = e.id
                 WHERE dg.id = %s
             """, (documento_id,))
             
             row = cursor2.fetchone()
+            cursor2.close()
+            conn2.close()
             if row:
-                estudiante_email, estudiante_nombre, nombre_archivo, tipo_doc, pdf_content = row
-                cursor2.close()
+                estudiante_email, estudiante_nombre, nombre_archivo, tipo_doc, blob_key, pdf_content = row
                 
                 # Configurar email
                 msg = MIMEMultipart()
@@ -3131,17 +2729,16 @@ def aprobar_documento_generado(
                 msg.attach(MIMEText(body, 'html'))
                 
                 # Adjuntar PDF
-                pdf_bytes = base64.b64decode(pdf_content)
+                pdf_bytes = leer_documento(blob_key, pdf_content)
                 pdf_attachment = MIMEApplication(pdf_bytes, _subtype='pdf')
                 pdf_attachment.add_header('Content-Disposition', 'attachment', filename=nombre_archivo)
                 msg.attach(pdf_attachment)
                 
                 # Enviar
-                smtp = smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT')))
-                smtp.starttls()
-                smtp.login(os.getenv('SMTP_USER'), os.getenv('SMTP_PASSWORD'))
-                smtp.send_message(msg)
-                smtp.quit()
+                servicio_smtp.enviar(msg, servicio_smtp.ConfigSMTP(
+                    os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT')),
+                    os.getenv('SMTP_USER'), os.getenv('SMTP_PASSWORD')
+                ))
         except Exception as e:
             print(f"Error enviando email: {str(e)}")
     
@@ -3166,7 +2763,7 @@ def eliminar_documento_generado(
     cursor = None
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Verificar que existe
@@ -3187,6 +2784,7 @@ def eliminar_documento_generado(
             WHERE id = %s
         """, (documento_id,))
         
+        # El blob, si ya no lo usa nadie, lo borra limpiar_blobs_huerfanos()
         conn.commit()
         
         logger.info(f"✅ Documento generado {documento_id} eliminado correctamente")
@@ -3225,7 +2823,7 @@ def eliminar_documentos_duplicados(
     cursor = None
     
     try:
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Construir query según filtro
@@ -3246,7 +2844,7 @@ def eliminar_documentos_duplicados(
                 GROUP BY estudiante_id, tipo_documento
             )
             {where_clause if where_clause else ''}
-            RETURNING id, tipo_documento, estudiante_id
+            RETURNING id, tipo_documento, estudiante_id, blob_key
         """
         
         cursor.execute(query, params if estudiante_id else params * 2 if params else [])
@@ -3295,7 +2893,7 @@ def listar_cursos(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3338,7 +2936,7 @@ def crear_curso(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3378,7 +2976,7 @@ def actualizar_curso(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3419,7 +3017,7 @@ def asignar_curso(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3472,7 +3070,7 @@ def sugerir_cursos(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Obtener datos del estudiante
@@ -3584,7 +3182,7 @@ def listar_alojamientos(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3627,7 +3225,7 @@ def crear_alojamiento(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3667,7 +3265,7 @@ def actualizar_alojamiento(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3708,7 +3306,7 @@ def asignar_alojamiento(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3733,15 +3331,12 @@ def descargar_expediente_zip(
     estudiante_id: int,
     db: Session = Depends(get_db)
 ):
-    """Descarga ZIP con todos los documentos del expediente"""
-    import os
-    import psycopg2
-    import zipfile
-    from io import BytesIO
-    import base64
+    """Descarga ZIP con todos los documentos del expediente (generado en streaming)"""
     from fastapi.responses import StreamingResponse
+    from api.blob_storage import abrir_documento
+    from api.zip_streaming import generar_zip, filas_servidor, nombre_seguro
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Obtener datos del estudiante
@@ -3752,54 +3347,35 @@ def descargar_expediente_zip(
     """, (estudiante_id,))
     
     estudiante = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    
     if not estudiante:
-        cursor.close()
-        conn.close()
         raise HTTPException(status_code=404, detail="Estudiante no encontrado")
     
     nombre, pasaporte = estudiante
     
-    # Obtener documentos generados
-    cursor.execute("""
-        SELECT nombre_archivo, contenido_pdf, tipo_documento
-        FROM documentos_generados
-        WHERE estudiante_id = %s AND estado = 'aprobado'
-    """, (estudiante_id,))
-    
-    docs_generados = cursor.fetchall()
-    
-    # Obtener documentos subidos
-    cursor.execute("""
-        SELECT nombre_archivo, contenido, tipo_documento
-        FROM documentos
-        WHERE estudiante_id = %s
-    """, (estudiante_id,))
-    
-    docs_subidos = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    # Crear ZIP en memoria
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+    def entradas():
         # Agregar documentos generados
-        for doc in docs_generados:
-            nombre_archivo, contenido_b64, tipo = doc
-            contenido = base64.b64decode(contenido_b64)
-            zip_file.writestr(f"generados/{nombre_archivo}", contenido)
+        for nombre_archivo, blob_key, contenido_b64 in filas_servidor("""
+            SELECT nombre_archivo, blob_key, contenido_pdf
+            FROM documentos_generados
+            WHERE estudiante_id = %s AND estado = 'aprobado'
+            ORDER BY id
+        """, (estudiante_id,), nombre_cursor='expediente_generados'):
+            yield f"generados/{nombre_seguro(nombre_archivo)}", abrir_documento(blob_key, contenido_b64)
         
         # Agregar documentos subidos
-        for doc in docs_subidos:
-            nombre_archivo, contenido_b64, tipo = doc
-            if contenido_b64:
-                contenido = base64.b64decode(contenido_b64)
-                zip_file.writestr(f"subidos/{nombre_archivo}", contenido)
-    
-    zip_buffer.seek(0)
+        for nombre_archivo, blob_key, contenido_b64 in filas_servidor("""
+            SELECT nombre_archivo, blob_key, contenido_base64
+            FROM documentos
+            WHERE estudiante_id = %s
+            ORDER BY id
+        """, (estudiante_id,), nombre_cursor='expediente_subidos'):
+            yield f"subidos/{nombre_seguro(nombre_archivo)}", abrir_documento(blob_key, contenido_b64)
     
     return StreamingResponse(
-        zip_buffer,
+        generar_zip(entradas()),
         media_type="application/zip",
         headers={
             "Content-Disposition": f"attachment; filename=expediente_{pasaporte}_{nombre.replace(' ', '_')}.zip"
@@ -3908,7 +3484,7 @@ def obtener_alertas_documentos(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -3956,7 +3532,7 @@ def enviar_recordatorios_masivos(
     import psycopg2
     from api.email_utils import email_recordatorio_documentos
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Buscar estudiantes con documentación incompleta
@@ -4010,7 +3586,7 @@ def reporte_estudiantes(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     query = """
@@ -4223,15 +3799,44 @@ def listar_estudiantes(
     fondos_max: Optional[float] = None,
     fecha_desde: Optional[str] = None,
     fecha_hasta: Optional[str] = None,
-    ordenar_por: Optional[str] = "created_at",
+    ordenar_por: Optional[str] = None,
     orden: Optional[str] = "DESC",
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    response: Response = None,
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
-    """Lista estudiantes con filtros avanzados"""
-    query_text = """
+    """
+    Lista estudiantes con filtros avanzados.
+    Paginación por cursor: pasar en `cursor` el valor de la cabecera
+    X-Next-Cursor de la página anterior (skip se mantiene por compatibilidad).
+    Con `busqueda` el orden por defecto es por relevancia.
+    """
+    from api.paginacion import (
+        condicion_keyset, orden_keyset, normalizar_limite, recortar_pagina,
+        total_estimado, cabeceras_paginacion
+    )
+    from modules.buscador_estudiantes import SQL_COINCIDE, SQL_RELEVANCIA, params_busqueda
+    
+    # Clave de orden (sin NULLs) + id como desempate
+    claves_orden = {
+        "created_at": "COALESCE(created_at, TIMESTAMP '1970-01-01')",
+        "nombre": "COALESCE(nombre, nombre_completo, 'Estudiante ' || id::text)",
+        "email": "COALESCE(email, 'estudiante' || id::text || '@example.com')",
+        "fondos_disponibles": "COALESCE(fondos_disponibles, 0)",
+        "estado": "COALESCE(estado, estado_procesamiento, 'pendiente')"
+    }
+    if busqueda:
+        claves_orden["relevancia"] = SQL_RELEVANCIA
+        ordenar_por = ordenar_por or "relevancia"
+    ordenar_por = ordenar_por or "created_at"
+    clave = claves_orden.get(ordenar_por, claves_orden["created_at"])
+    descendente = (orden or "DESC").upper() == "DESC" if ordenar_por in claves_orden else True
+    limit = normalizar_limite(limit)
+    
+    query_text = f"""
         SELECT 
             id, 
             COALESCE(nombre, nombre_completo, 'Estudiante ' || id::text) as nombre,
@@ -4240,26 +3845,23 @@ def listar_estudiantes(
             COALESCE(estado, estado_procesamiento, 'pendiente') as estado,
             nacionalidad,
             fondos_disponibles,
-            created_at
+            created_at,
+            {clave} as clave_orden
         FROM estudiantes
         WHERE 1=1
     """
     
-    params = {"skip": skip, "limit": limit}
+    params = {}
     
     # Filtro de estado
     if estado:
         query_text += " AND COALESCE(estado, estado_procesamiento, 'pendiente') = :estado"
         params["estado"] = estado
     
-    # Búsqueda por nombre, email o pasaporte
+    # Búsqueda por nombre, email o pasaporte (índice de trigramas, sin acentos)
     if busqueda:
-        query_text += """ AND (
-            LOWER(COALESCE(nombre, nombre_completo, '')) LIKE LOWER(:busqueda)
-            OR LOWER(email) LIKE LOWER(:busqueda)
-            OR LOWER(pasaporte) LIKE LOWER(:busqueda)
-        )"""
-        params["busqueda"] = f"%{busqueda}%"
+        query_text += f" AND {SQL_COINCIDE}"
+        params.update(params_busqueda(busqueda))
     
     # Filtro por nacionalidad
     if nacionalidad:
@@ -4289,17 +3891,26 @@ def listar_estudiantes(
         query_text += " AND created_at <= :fecha_hasta"
         params["fecha_hasta"] = fecha_hasta
     
-    # Ordenamiento dinámico
-    campos_orden_validos = ["created_at", "nombre", "email", "fondos_disponibles", "estado"]
-    if ordenar_por in campos_orden_validos:
-        orden_seguro = "DESC" if orden.upper() == "DESC" else "ASC"
-        query_text += f" ORDER BY {ordenar_por} {orden_seguro}"
-    else:
-        query_text += " ORDER BY created_at DESC"
+    # Total aproximado (estadísticas del planner) solo en la primera página
+    if response is not None and not cursor:
+        cabeceras_paginacion(response, None, total_estimado(db, query_text, params))
     
-    query_text += " OFFSET :skip LIMIT :limit"
+    # Ordenamiento dinámico + keyset
+    condicion, params_cursor = condicion_keyset([clave, "id"], cursor, descendente, estilo='named')
+    if condicion:
+        query_text += f" AND {condicion}"
+        params.update(params_cursor)
+    query_text += " " + orden_keyset([clave, "id"], descendente)
     
-    result = db.execute(text(query_text), params).fetchall()
+    if skip and not cursor:
+        query_text += " OFFSET :skip"
+        params["skip"] = skip
+    query_text += " LIMIT :limit"
+    params["limit"] = limit + 1
+    
+    result, siguiente = recortar_pagina(db.execute(text(query_text), params).fetchall(), limit, [8, 0])
+    if response is not None:
+        cabeceras_paginacion(response, siguiente)
     
     return [{
         'id': row[0],
@@ -5131,39 +4742,22 @@ def obtener_eventos_calendario(
 
 @app.get("/api/admin/estadisticas", response_model=EstadisticasResponse, tags=["Admin"])
 def obtener_estadisticas(
-    usuario=Depends(obtener_usuario_actual),
-    db: Session = Depends(get_db)
+    usuario=Depends(obtener_usuario_actual)
 ):
     """Estadísticas del dashboard"""
-    from database.models import Estudiante as EstudianteModel
-    
-    # Contar estudiantes por estado
-    total = db.query(EstudianteModel).count()
-    pendientes = db.query(EstudianteModel).filter(EstudianteModel.estado == 'pendiente').count()
-    aprobados = db.query(EstudianteModel).filter(EstudianteModel.estado == 'aprobado').count()
-    rechazados = db.query(EstudianteModel).filter(EstudianteModel.estado == 'rechazado').count()
-    
-    # Calcular estadísticas por especialidad
-    especialidades_query = db.execute(text("""
-        SELECT 
-            COALESCE(especialidad, 'Sin especialidad') as especialidad,
-            COUNT(*) as total
-        FROM estudiantes 
-        WHERE especialidad IS NOT NULL AND especialidad != ''
-        GROUP BY especialidad
-        ORDER BY total DESC
-    """))
+    from api.metricas_dashboard import obtener_metricas
     
-    por_especialidad = {
-        row[0]: row[1] for row in especialidades_query.fetchall()
-    }
+    # Contadores precalculados (vista materializada metricas_dashboard)
+    metricas = obtener_metricas()
+    por_estado = metricas['por_estado']
+    aprobados = por_estado.get('aprobado', 0)
     
     return EstadisticasResponse(
-        total_estudiantes=total,
-        pendientes_revision=pendientes,
+        total_estudiantes=metricas['total_estudiantes'],
+        pendientes_revision=por_estado.get('pendiente', 0),
         aprobados=aprobados,
         enviados=aprobados,  # Por ahora enviados = aprobados
-        por_especialidad=por_especialidad
+        por_especialidad={esp: total for esp, total in metricas['por_especialidad']}
     )
 
 
@@ -5173,81 +4767,23 @@ def obtener_metricas_tiempo_real(
     db: Session = Depends(get_db)
 ):
     """Métricas en tiempo real para dashboard actualizado automáticamente"""
-    from datetime import datetime, timedelta
-    
-    # Resumen general
-    total_estudiantes = db.execute(text("SELECT COUNT(*) FROM estudiantes")).fetchone()[0]
+    from datetime import datetime
+    from api.metricas_dashboard import obtener_metricas
     
-    # Por estado
-    estados = db.execute(text("""
-        SELECT 
-            COALESCE(estado, estado_procesamiento, 'pendiente') as estado,
-            COUNT(*) as total
-        FROM estudiantes
-        GROUP BY estado
-    """)).fetchall()
+    # Contadores precalculados (vista materializada metricas_dashboard)
+    metricas = obtener_metricas()
+    total_estudiantes = metricas['total_estudiantes']
     
-    por_estado = {row[0]: row[1] for row in estados}
-    
-    # Últimos 7 días - Tendencia
-    hace_7_dias = (datetime.now() - timedelta(days=7)).isoformat()
-    registros_7d = db.execute(
-        text("SELECT COUNT(*) FROM estudiantes WHERE created_at >= :fecha"),
-        {"fecha": hace_7_dias}
-    ).fetchone()[0]
-    
-    # Últimas 24 horas
-    hace_24h = (datetime.now() - timedelta(hours=24)).isoformat()
-    registros_24h = db.execute(
-        text("SELECT COUNT(*) FROM estudiantes WHERE created_at >= :fecha"),
-        {"fecha": hace_24h}
-    ).fetchone()[0]
-    
-    # Documentos generados hoy
-    hoy = datetime.now().replace(hour=0, minute=0, second=0).isoformat()
-    docs_hoy = db.execute(
-        text("SELECT COUNT(*) FROM documentos_generados WHERE fecha_generacion >= :fecha"),
-        {"fecha": hoy}
-    ).fetchone()[0]
-    
-    # Notas agregadas hoy
-    notas_hoy = db.execute(
-        text("SELECT COUNT(*) FROM notas_internas WHERE created_at >= :fecha"),
-        {"fecha": hoy}
-    ).fetchone()[0]
+    # Por estado (sin estado cuenta como pendiente)
+    por_estado = dict(metricas['por_estado'])
+    if metricas['sin_estado']:
+        por_estado['pendiente'] = por_estado.get('pendiente', 0) + metricas['sin_estado']
     
     # Tasa de conversión (aprobados/total)
     aprobados = por_estado.get('aprobado', 0)
     tasa_aprobacion = round((aprobados / total_estudiantes * 100), 2) if total_estudiantes > 0 else 0
     
-    # Fondos promedio
-    fondos_promedio = db.execute(
-        text("SELECT AVG(fondos_disponibles) FROM estudiantes WHERE fondos_disponibles > 0")
-    ).fetchone()[0]
-    
-    # Top 5 países
-    top_paises = db.execute(text("""
-        SELECT nacionalidad, COUNT(*) as total
-        FROM estudiantes
-        WHERE nacionalidad IS NOT NULL
-        GROUP BY nacionalidad
-        ORDER BY total DESC
-        LIMIT 5
-    """)).fetchall()
-    
-    # Top 5 especialidades
-    top_especialidades = db.execute(text("""
-        SELECT 
-            COALESCE(especialidad, 'Sin especificar') as especialidad,
-            COUNT(*) as total
-        FROM estudiantes
-        WHERE especialidad IS NOT NULL AND especialidad != ''
-        GROUP BY especialidad
-        ORDER BY total DESC
-        LIMIT 5
-    """)).fetchall()
-    
-    # Actividad reciente (últimas 10 acciones)
+    # Actividad reciente (últimas 10 acciones) - usa idx_logs_auditoria_timestamp
     actividad_reciente = db.execute(text("""
         SELECT accion, usuario_email, entidad, timestamp
         FROM logs_auditoria
@@ -5255,34 +4791,29 @@ def obtener_metricas_tiempo_real(
         LIMIT 10
     """)).fetchall()
     
-    # Alertas pendientes (fechas próximas)
-    proximo_7d = (datetime.now() + timedelta(days=7)).isoformat()
-    alertas_pendientes = db.execute(text("""
-        SELECT COUNT(*)
-        FROM fechas_importantes
-        WHERE fecha <= :fecha AND completada = FALSE
-    """), {"fecha": proximo_7d}).fetchone()[0]
-    
     return {
         "timestamp": datetime.now().isoformat(),
+        "actualizado_en": metricas['actualizado_en'].isoformat(),
         "resumen": {
             "total_estudiantes": total_estudiantes,
-            "registros_24h": registros_24h,
-            "registros_7d": registros_7d,
-            "documentos_generados_hoy": docs_hoy,
-            "notas_agregadas_hoy": notas_hoy,
-            "alertas_pendientes": alertas_pendientes
+            "registros_24h": metricas['registros_24h'],
+            "registros_7d": metricas['registros_7d'],
+            "documentos_generados_hoy": metricas['documentos_generados_hoy'],
+            "notas_agregadas_hoy": metricas['notas_agregadas_hoy'],
+            "alertas_pendientes": metricas['alertas_pendientes']
         },
         "por_estado": por_estado,
         "metricas": {
             "tasa_aprobacion": tasa_aprobacion,
-            "fondos_promedio": float(fondos_promedio) if fondos_promedio else 0,
+            "fondos_promedio": metricas['fondos_promedio'],
             "aprobados": aprobados,
             "pendientes": por_estado.get('pendiente', 0) + por_estado.get('en_revision', 0),
             "rechazados": por_estado.get('rechazado', 0)
         },
-        "top_paises": [{"pais": row[0], "total": row[1]} for row in top_paises],
-        "top_especialidades": [{"especialidad": row[0], "total": row[1]} for row in top_especialidades],
+        "top_paises": [{"pais": pais, "total": total} for pais, total in metricas['por_nacionalidad'][:5]],
+        "top_especialidades": [
+            {"especialidad": esp, "total": total} for esp, total in metricas['por_especialidad'][:5]
+        ],
         "actividad_reciente": [
             {
                 "accion": row[0],
@@ -5606,10 +5137,14 @@ def obtener_logs_auditoria(
     usuario_email: Optional[str] = None,
     accion: Optional[str] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
-    """Obtiene logs de auditoría con filtros"""
+    """Obtiene logs de auditoría con filtros (paginado con `cursor` = siguiente_cursor)"""
+    from api.paginacion import condicion_keyset, orden_keyset, normalizar_limite, recortar_pagina, total_estimado
+    
+    limit = normalizar_limite(limit)
     query = "SELECT * FROM logs_auditoria WHERE 1=1"
     params = {}
     
@@ -5621,10 +5156,17 @@ def obtener_logs_auditoria(
         query += " AND accion = :accion"
         params["accion"] = accion
     
-    query += " ORDER BY timestamp DESC LIMIT :limit"
-    params["limit"] = limit
+    total = total_estimado(db, query, params) if not cursor else None
     
-    result = db.execute(text(query), params).fetchall()
+    # Keyset sobre (timestamp, id): no se recorren las páginas anteriores
+    condicion, params_cursor = condicion_keyset(["timestamp", "id"], cursor, estilo='named')
+    if condicion:
+        query += f" AND {condicion}"
+        params.update(params_cursor)
+    query += " " + orden_keyset(["timestamp", "id"]) + " LIMIT :limit"
+    params["limit"] = limit + 1
+    
+    result, siguiente = recortar_pagina(db.execute(text(query), params).fetchall(), limit, [8, 0])
     
     logs = []
     for row in result:
@@ -5638,7 +5180,12 @@ def obtener_logs_auditoria(
             "timestamp": row[8].isoformat() if row[8] else None
         })
     
-    return {"logs": logs, "total": len(logs)}
+    return {
+        "logs": logs,
+        "total": len(logs),
+        "total_estimado": total,
+        "siguiente_cursor": siguiente
+    }
 
 
 # ============================================================================
@@ -5648,10 +5195,17 @@ def obtener_logs_auditoria(
 @app.get("/api/admin/ocr/uso", tags=["Admin"])
 def obtener_uso_ocr(usuario=Depends(obtener_usuario_actual)):
     """Obtiene estadísticas de uso de OCR.space API"""
-    from api.validador_ocr import ValidadorOCR
+    from api.uso_ocr import medidor_ocr
+    from api import cache_ocr
+    
+    uso = medidor_ocr.uso()
     
-    validador = ValidadorOCR()
-    uso = validador.verificar_limite_uso()
+    # Los aciertos de caché no gastan cuota
+    try:
+        cache = cache_ocr.estadisticas()
+    except Exception as e:
+        print(f"⚠️ Error leyendo caché OCR: {e}")
+        cache = None
     
     return {
         "usos_este_mes": uso['usos'],
@@ -5659,7 +5213,48 @@ def obtener_uso_ocr(usuario=Depends(obtener_usuario_actual)):
         "restantes": uso['restante'],
         "porcentaje_usado": uso['porcentaje'],
         "alerta": uso['alerta'],
-        "mes": datetime.now().strftime('%Y-%m')
+        "mes": uso['mes'],
+        "por_dia": uso['por_dia'],
+        "cache": cache
+    }
+
+
+# ============================================================================
+# MONITOREO BASE DE DATOS - Estado del pool de conexiones
+# ============================================================================
+
+@app.get("/api/admin/db/pool", tags=["Admin"])
+def obtener_estado_pool(usuario=Depends(verificar_admin)):
+    """Estadísticas del pool de conexiones compartido (workers actuales)"""
+    from api.detector_bloqueos import estadisticas as estadisticas_bloqueos
+    from api.contadores_no_leidos import estado as estado_eventos
+    return {
+        **pool_stats(),
+        "bloqueos_event_loop": estadisticas_bloqueos(),
+        "eventos_tiempo_real": estado_eventos(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+# ============================================================================
+# MONITOREO PLANIFICADOR - Tareas programadas e historial de ejecuciones
+# ============================================================================
+
+@app.get("/api/admin/planificador", tags=["Admin"])
+def obtener_estado_planificador(
+    limite: int = Query(50, ge=1, le=500),
+    tarea_id: Optional[str] = None,
+    usuario=Depends(verificar_admin)
+):
+    """
+    Tareas programadas, si este worker es el líder, últimas ejecuciones y
+    métricas de duración por tarea (de todos los workers)
+    """
+    from api.planificador import obtener_planificador, historial_ejecuciones
+    return {
+        **obtener_planificador().estado(),
+        **historial_ejecuciones(limite, tarea_id),
+        "timestamp": datetime.now().isoformat()
     }
 
 
@@ -5814,7 +5409,7 @@ def buscar_alojamientos(
 from fastapi import UploadFile, File
 
 @app.post("/api/estudiantes/{estudiante_id}/documentos/upload", tags=["Documentos"])
-async def subir_documento(
+def subir_documento(
     estudiante_id: int,
     tipo_documento: str,
     archivo: UploadFile = File(...),
@@ -5822,6 +5417,7 @@ async def subir_documento(
 ):
     """Sube un documento del estudiante"""
     import os
+    import shutil
     from pathlib import Path
     
     # Verificar estudiante existe
@@ -5837,8 +5433,7 @@ async def subir_documento(
     file_path = upload_dir / f"{tipo_documento}_{archivo.filename}"
     
     with file_path.open("wb") as buffer:
-        content = await archivo.read()
-        buffer.write(content)
+        shutil.copyfileobj(archivo.file, buffer)
     
     return {
         'mensaje': 'Documento subido correctamente',
@@ -5853,25 +5448,31 @@ async def subir_documento(
 # ============================================================================
 
 @app.post("/api/documentos/{estudiante_id}/subir", tags=["Documentos"])
-async def subir_documentos_multi(
+def subir_documentos_multi(
     estudiante_id: int,
     archivos: list[UploadFile] = File(...),
     categorias: str = Form(...)
 ):
     """Subir múltiples documentos del estudiante (usado por GestorDocumentos.jsx)"""
-    import os
-    import psycopg2
-    import base64
-    from pathlib import Path
     from datetime import datetime
+    from psycopg2.extras import execute_values
+    from api.blob_storage import guardar_upload, ArchivoDemasiadoGrande
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    # Parsear categorías (vienen como string separado por comas)
+    categorias_list = [c.strip() for c in categorias.split(',')]
+    
+    # Validar que coincidan archivos y categorías (antes de pedir conexión)
+    if len(archivos) != len(categorias_list):
+        raise HTTPException(
+            status_code=400, 
+            detail=f'Número de archivos ({len(archivos)}) no coincide con categorías ({len(categorias_list)})'
+        )
+    
+    conn = get_connection()
     cursor = conn.cursor()
+    filas = []
     
     try:
-        # Parsear categorías (vienen como string separado por comas)
-        categorias_list = [c.strip() for c in categorias.split(',')]
-        
         # Verificar estudiante
         cursor.execute("SELECT id FROM estudiantes WHERE id = %s", (estudiante_id,))
         if not cursor.fetchone():
@@ -5879,14 +5480,8 @@ async def subir_documentos_multi(
             conn.close()
             raise HTTPException(status_code=404, detail='Estudiante no encontrado')
         
-        # Validar que coincidan archivos y categorías
-        if len(archivos) != len(categorias_list):
-            raise HTTPException(
-                status_code=400, 
-                detail=f'Número de archivos ({len(archivos)}) no coincide con categorías ({len(categorias_list)})'
-            )
-        
         documentos_creados = []
+        rechazados = []
         
         for i, archivo in enumerate(archivos):
             categoria = categorias_list[i]
@@ -5896,45 +5491,49 @@ async def subir_documentos_multi(
             if categoria not in categorias_validas:
                 categoria = 'otros'
             
-            # Leer contenido
-            contenido = await archivo.read()
-            tamano = len(contenido)
-            
-            # Validar tamaño (10MB máx)
-            if tamano > 10 * 1024 * 1024:
+            # Guardar en blob storage por trozos (10MB máx, se corta al pasarse)
+            try:
+                blob_key, tamano = guardar_upload(archivo, MAX_ARCHIVO_DOCUMENTO)
+            except ArchivoDemasiadoGrande as e:
+                rechazados.append({'nombre': archivo.filename, 'error': str(e), 'codigo': 413})
                 continue
             
-            # Convertir a base64
-            contenido_base64 = base64.b64encode(contenido).decode('utf-8')
-            
-            # Insertar en BD
-            cursor.execute("""
-                INSERT INTO documentos 
-                (estudiante_id, tipo_documento, nombre_archivo, url_archivo,
-                 categoria, contenido_base64, tamano_archivo, mime_type, 
-                 estado_revision, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pendiente', %s)
-                RETURNING id
-            """, (
+            filas.append((
                 estudiante_id,
                 categoria,  # tipo_documento = categoria
                 archivo.filename,
-                f'base64://{archivo.filename}',  # url_archivo placeholder
+                f'blob://{blob_key}',
                 categoria,
-                contenido_base64,
+                blob_key,
                 tamano,
                 archivo.content_type or 'application/octet-stream',
+                'pendiente',
                 datetime.utcnow()
             ))
-            
-            doc_id = cursor.fetchone()[0]
             documentos_creados.append({
-                'id': doc_id,
                 'nombre': archivo.filename,
                 'categoria': categoria,
                 'tamano': tamano
             })
         
+        if rechazados and not filas:
+            cursor.close()
+            conn.close()
+            raise HTTPException(status_code=413, detail={'message': 'Ningún archivo se pudo subir', 'rechazados': rechazados})
+        
+        # Insertar todas las filas en una sola sentencia
+        if filas:
+            ids = execute_values(cursor, """
+                INSERT INTO documentos 
+                (estudiante_id, tipo_documento, nombre_archivo, url_archivo,
+                 categoria, blob_key, tamano_archivo, mime_type, 
+                 estado_revision, created_at)
+                VALUES %s
+                RETURNING id
+            """, filas, fetch=True)
+            for doc, (doc_id,) in zip(documentos_creados, ids):
+                doc['id'] = doc_id
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -5944,7 +5543,7 @@ async def subir_documentos_multi(
             try:
                 from api.notificaciones_admin import notificar_documentos_subidos
                 # Obtener datos del estudiante
-                conn_notif = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+                conn_notif = get_connection()
                 cursor_notif = conn_notif.cursor()
                 cursor_notif.execute(
                     "SELECT nombre, email FROM estudiantes WHERE id = %s",
@@ -5966,12 +5565,14 @@ async def subir_documentos_multi(
         return {
             'success': True,
             'message': f'{len(documentos_creados)} documentos subidos correctamente',
-            'documentos': documentos_creados
+            'documentos': documentos_creados,
+            'rechazados': rechazados
         }
         
     except HTTPException:
         raise
     except Exception as e:
+        # Los blobs recién guardados se quedan sin fila: los borra la limpieza de huérfanos
         conn.rollback()
         cursor.close()
         conn.close()
@@ -5988,7 +5589,7 @@ def listar_documentos_estudiante(estudiante_id: int):
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -6078,12 +5679,10 @@ def listar_documentos_estudiante(estudiante_id: int):
 def descargar_documento(documento_id: str):
     """Descargar documento por ID (usado por GestorDocumentos.jsx)
     Soporta documentos subidos (ID numérico) y generados (ID con prefijo 'gen_')"""
-    import os
-    import psycopg2
-    import base64
     from io import BytesIO
+    from api.blob_storage import leer_documento
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -6093,7 +5692,7 @@ def descargar_documento(documento_id: str):
             doc_id_real = str(documento_id).replace('gen_', '')
             
             cursor.execute("""
-                SELECT nombre_archivo, contenido_pdf
+                SELECT nombre_archivo, blob_key, contenido_pdf
                 FROM documentos_generados
                 WHERE id = %s
             """, (doc_id_real,))
@@ -6105,13 +5704,13 @@ def descargar_documento(documento_id: str):
             if not row:
                 raise HTTPException(status_code=404, detail="Documento generado no encontrado")
             
-            nombre, contenido_b64 = row
+            nombre, blob_key, contenido_b64 = row
             mime_type = 'application/pdf'
             
         else:
             # Documento subido por estudiante
             cursor.execute("""
-                SELECT nombre_archivo, url_archivo
+                SELECT nombre_archivo, url_archivo, blob_key, contenido_base64, mime_type
                 FROM documentos
                 WHERE id = %s
             """, (documento_id,))
@@ -6123,11 +5722,14 @@ def descargar_documento(documento_id: str):
             if not row:
                 raise HTTPException(status_code=404, detail="Documento no encontrado")
             
-            nombre, url_archivo = row
+            nombre, url_archivo, blob_key, contenido_base64, mime_type_db = row
             
             # El url_archivo viene como "data:application/pdf;base64,CONTENIDO"
             # Extraer el contenido base64
-            if url_archivo.startswith('data:'):
+            if blob_key or contenido_base64:
+                contenido_b64 = contenido_base64
+                mime_type = mime_type_db or 'application/octet-stream'
+            elif url_archivo.startswith('data:'):
                 # Formato: data:mime/type;base64,CONTENIDO
                 parts = url_archivo.split(',', 1)
                 if len(parts) == 2:
@@ -6145,8 +5747,8 @@ def descargar_documento(documento_id: str):
                 contenido_b64 = url_archivo
                 mime_type = 'application/octet-stream'
         
-        # Decodificar base64
-        contenido = base64.b64decode(contenido_b64)
+        # Leer contenido (blob storage o base64 legacy)
+        contenido = leer_documento(blob_key, contenido_b64)
         
         # Retornar como streaming
         return StreamingResponse(
@@ -6186,10 +5788,7 @@ def descargar_documento(documento_id: str):
 @app.delete("/api/documentos/{documento_id}/eliminar", tags=["Documentos"])
 def eliminar_documento(documento_id: int):
     """Eliminar documento (usado por GestorDocumentos.jsx)"""
-    import os
-    import psycopg2
-    
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -6220,41 +5819,34 @@ def eliminar_documento(documento_id: int):
 
 @app.get("/api/documentos/{estudiante_id}/descargar-zip", tags=["Documentos"])
 def descargar_documentos_zip(estudiante_id: int):
-    """Descargar todos los documentos en ZIP (usado por GestorDocumentos.jsx)"""
-    import os
-    import psycopg2
-    import zipfile
-    import base64
-    from io import BytesIO
+    """Descargar todos los documentos en ZIP (usado por GestorDocumentos.jsx)
+    El ZIP se genera en streaming: un documento cada vez, memoria constante"""
+    from api.blob_storage import abrir_documento
+    from api.zip_streaming import generar_zip, filas_servidor, nombre_seguro
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            SELECT nombre_archivo, contenido_base64
-            FROM documentos
-            WHERE estudiante_id = %s
-        """, (estudiante_id,))
-        
-        documentos = cursor.fetchall()
+        cursor.execute("SELECT 1 FROM documentos WHERE estudiante_id = %s LIMIT 1", (estudiante_id,))
+        tiene_documentos = cursor.fetchone() is not None
         cursor.close()
         conn.close()
         
-        if not documentos:
+        if not tiene_documentos:
             raise HTTPException(status_code=404, detail='No hay documentos para descargar')
         
-        # Crear ZIP en memoria
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for nombre, contenido_b64 in documentos:
-                contenido = base64.b64decode(contenido_b64)
-                zip_file.writestr(nombre, contenido)
-        
-        zip_buffer.seek(0)
+        def entradas():
+            for nombre, blob_key, contenido_b64 in filas_servidor("""
+                SELECT nombre_archivo, blob_key, contenido_base64
+                FROM documentos
+                WHERE estudiante_id = %s
+                ORDER BY id
+            """, (estudiante_id,)):
+                yield nombre_seguro(nombre), abrir_documento(blob_key, contenido_b64)
         
         return StreamingResponse(
-            zip_buffer,
+            generar_zip(entradas()),
             media_type='application/zip',
             headers={'Content-Disposition': f'attachment; filename="estudiante_{estudiante_id}_documentos.zip"'}
         )
@@ -6262,10 +5854,6 @@ def descargar_documentos_zip(estudiante_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
         print(f"❌ Error creando ZIP: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     cursor = conn.cursor()
@@ -6308,7 +5896,7 @@ def descargar_documentos_zip(estudiante_id: int):
 
 
 @app.post("/api/documentos/{documento_id}/validar-ocr", tags=["Documentos"])
-async def validar_documento_ocr(
+def validar_documento_ocr(
     documento_id: int,
     tipo_documento: str,
     db: Session = Depends(get_db)
@@ -6323,7 +5911,7 @@ async def validar_documento_ocr(
         import psycopg2
         from api.validador_ocr import ValidadorOCR
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Obtener documento de BD
@@ -6348,7 +5936,7 @@ async def validar_documento_ocr(
             conn.close()
             raise HTTPException(status_code=404, detail="Archivo no encontrado en servidor")
         
-        # Procesar con OCR
+        # Procesar con OCR (el handler ya corre en el threadpool)
         validador = ValidadorOCR()
         resultado = validador.procesar_documento(ruta, tipo_documento)
         
@@ -6409,7 +5997,7 @@ def obtener_status_ocr(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -6935,32 +6523,20 @@ def reenviar_notificacion(
 # INTEGRACIÓN APIS ESCUELAS
 # ============================================================================
 
-@app.get("/api/admin/sincronizar-cursos-escuelas", tags=["Admin - Escuelas"])
-def sincronizar_cursos_desde_escuelas(
-    db: Session = Depends(get_db),
-    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
-):
+def _guardar_cursos_externos(cursos_externos):
     """
-    Sincroniza cursos desde APIs/scraping de escuelas españolas
-    Obtiene cursos actualizados de múltiples universidades
+    Inserta/actualiza en `cursos` los cursos obtenidos de las escuelas
+    
+    Returns:
+        (cursos_insertados, cursos_actualizados)
     """
-    verificar_token(credentials.credentials)
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursos_insertados = 0
+    cursos_actualizados = 0
     
     try:
-        from api.integrador_escuelas import IntegradorEscuelas
-        import os
-        import psycopg2
-        
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
-        cursor = conn.cursor()
-        
-        # Obtener cursos de todas las fuentes
-        cursos_externos = IntegradorEscuelas.sincronizar_todos_cursos()
-        
-        # Insertar/actualizar en base de datos
-        cursos_insertados = 0
-        cursos_actualizados = 0
-        
         for curso_ext in cursos_externos:
             # Verificar si el curso ya existe (por nombre y ciudad)
             cursor.execute(
@@ -7004,22 +6580,94 @@ def sincronizar_cursos_desde_escuelas(
                 cursos_insertados += 1
         
         conn.commit()
+        return cursos_insertados, cursos_actualizados
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cursor.close()
         conn.close()
-        
-        return {
-            "exito": True,
-            "cursos_encontrados": len(cursos_externos),
-            "cursos_insertados": cursos_insertados,
-            "cursos_actualizados": cursos_actualizados,
-            "cursos_preview": cursos_externos[:5]  # Primeros 5 para preview
-        }
+
+
+def _sincronizar_cursos(trabajo=None):
+    """Scraping de todas las escuelas + guardado en BD (síncrono o como trabajo)"""
+    from api.integrador_escuelas import IntegradorEscuelas
+    
+    # Obtener cursos de todas las fuentes
+    cursos_externos = IntegradorEscuelas.sincronizar_todos_cursos(trabajo=trabajo)
+    # Refresca el consolidado que usa /api/cursos/buscar-externos
+    IntegradorEscuelas.cache.set('consolidado', cursos_externos, ttl_horas=1)
+    
+    if trabajo is not None:
+        trabajo.actualizar(fase='guardando', cursos_encontrados=len(cursos_externos))
+    
+    # Insertar/actualizar en base de datos
+    cursos_insertados, cursos_actualizados = _guardar_cursos_externos(cursos_externos)
+    
+    return {
+        "exito": True,
+        "cursos_encontrados": len(cursos_externos),
+        "cursos_insertados": cursos_insertados,
+        "cursos_actualizados": cursos_actualizados,
+        "cursos_preview": cursos_externos[:5]  # Primeros 5 para preview
+    }
+
+
+@app.get("/api/admin/sincronizar-cursos-escuelas", tags=["Admin - Escuelas"])
+def sincronizar_cursos_desde_escuelas(
+    db: Session = Depends(get_db),
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
+):
+    """
+    Sincroniza cursos desde APIs/scraping de escuelas españolas
+    Obtiene cursos actualizados de múltiples universidades
+    (espera a que termine; para no bloquear usar POST .../trabajos)
+    """
+    verificar_token(credentials.credentials)
+    
+    try:
+        return _sincronizar_cursos()
         
     except Exception as e:
         print(f"Error sincronizando cursos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/admin/sincronizar-cursos-escuelas/trabajos", tags=["Admin - Escuelas"])
+def iniciar_sincronizacion_cursos(
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
+):
+    """
+    Lanza la sincronización de cursos en segundo plano y responde al momento.
+    Si ya hay una en marcha devuelve esa en vez de lanzar otra.
+    El estado se consulta en GET .../trabajos/{trabajo_id}
+    """
+    verificar_token(credentials.credentials)
+    
+    from api.trabajos import gestor_trabajos
+    
+    trabajo = gestor_trabajos.obtener_o_crear('sincronizar_cursos', _sincronizar_cursos)
+    
+    return trabajo.to_dict()
+
+
+@app.get("/api/admin/sincronizar-cursos-escuelas/trabajos/{trabajo_id}", tags=["Admin - Escuelas"])
+def estado_sincronizacion_cursos(
+    trabajo_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())
+):
+    """Estado de una sincronización: progreso por fuente y resultado al terminar"""
+    verificar_token(credentials.credentials)
+    
+    from api.trabajos import gestor_trabajos
+    
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    
+    return trabajo.to_dict()
+
+
 @app.get("/api/cursos/buscar-externos", tags=["Cursos"])
 def buscar_cursos_externos(
     especialidad: Optional[str] = None,
@@ -7033,8 +6681,11 @@ def buscar_cursos_externos(
     try:
         from api.integrador_escuelas import IntegradorEscuelas
         
-        # Obtener todos los cursos disponibles
-        cursos = IntegradorEscuelas.sincronizar_todos_cursos()
+        # Obtener todos los cursos disponibles (consolidado cacheado: las
+        # peticiones simultáneas sin cache esperan a un único scraping)
+        cursos = IntegradorEscuelas.cache.get_or_set(
+            'consolidado', IntegradorEscuelas.sincronizar_todos_cursos, ttl_horas=1
+        )
         
         # Aplicar filtros
         if especialidad:
@@ -7069,7 +6720,7 @@ def verificar_disponibilidad_externa(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Obtener curso de BD
@@ -7222,7 +6873,7 @@ def calcular_probabilidad_exito(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Obtener datos del estudiante
@@ -7300,7 +6951,7 @@ def solicitar_servicio(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Verificar si ya solicitó este servicio
@@ -7349,7 +7000,7 @@ def obtener_servicios_solicitados(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -7496,7 +7147,7 @@ def obtener_analisis_completo(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Obtener todos los datos del estudiante
@@ -7592,7 +7243,7 @@ def crear_universidad_partner(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -7642,7 +7293,7 @@ def listar_universidades_partner(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         query = """
@@ -7717,7 +7368,7 @@ def actualizar_universidad_partner(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -7771,7 +7422,7 @@ def listar_estudiantes_referidos(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -7828,7 +7479,7 @@ def generar_comision(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         estudiante_id = datos.get('estudiante_id')
@@ -7898,7 +7549,7 @@ def listar_comisiones(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         query = """
@@ -7964,7 +7615,7 @@ def marcar_comision_pagada(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -7995,7 +7646,7 @@ def dashboard_partners(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Estadísticas generales
@@ -8086,7 +7737,7 @@ def health():
 # =====================================================
 
 @app.get("/api/referidos/estadisticas/{estudiante_id}", tags=["Referidos"])
-async def obtener_estadisticas_referidos(
+def obtener_estadisticas_referidos(
     estudiante_id: int,
     db: Session = Depends(get_db)
 ):
@@ -8153,16 +7804,16 @@ async def obtener_estadisticas_referidos(
 
 # Alias del endpoint anterior para compatibilidad
 @app.get("/api/estudiantes/{estudiante_id}/referidos", tags=["Referidos"])
-async def obtener_referidos_estudiante(
+def obtener_referidos_estudiante(
     estudiante_id: int,
     db: Session = Depends(get_db)
 ):
     """Alias de /api/referidos/estadisticas/{estudiante_id} para compatibilidad"""
-    return await obtener_estadisticas_referidos(estudiante_id, db)
+    return obtener_estadisticas_referidos(estudiante_id, db)
 
 
 @app.get("/api/referidos/validar/{codigo}", tags=["Referidos"])
-async def validar_codigo_referido(codigo: str):
+def validar_codigo_referido(codigo: str):
     """Valida si un código de referido existe"""
     db = next(get_db())
     
@@ -8185,7 +7836,7 @@ async def validar_codigo_referido(codigo: str):
 
 
 @app.get("/api/admin/referidos", tags=["Referidos"])
-async def admin_obtener_referidos(
+def admin_obtener_referidos(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
@@ -8268,7 +7919,7 @@ async def admin_obtener_referidos(
 
 
 @app.get("/api/admin/referidos/{tipo}/{referidor_id}/detalles", tags=["Referidos"])
-async def admin_obtener_detalles_referidos(
+def admin_obtener_detalles_referidos(
     tipo: str,
     referidor_id: int,
     usuario=Depends(obtener_usuario_actual),
@@ -8326,7 +7977,7 @@ async def admin_obtener_detalles_referidos(
 
 
 @app.put("/api/admin/referidos/{estudiante_id}/credito", tags=["Referidos"])
-async def admin_ajustar_credito(
+def admin_ajustar_credito(
     estudiante_id: int,
     data: dict,
     usuario=Depends(obtener_usuario_actual),
@@ -8359,7 +8010,7 @@ async def admin_ajustar_credito(
 # =====================================================
 
 @app.post("/api/referidos/solicitar-uso", tags=["Referidos"])
-async def solicitar_uso_credito(
+def solicitar_uso_credito(
     data: dict,
     db: Session = Depends(get_db)
 ):
@@ -8413,7 +8064,7 @@ async def solicitar_uso_credito(
 
 
 @app.get("/api/admin/agentes/estadisticas", tags=["Admin - Agentes"])
-async def admin_obtener_estadisticas_agentes(
+def admin_obtener_estadisticas_agentes(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
@@ -8466,7 +8117,7 @@ async def admin_obtener_estadisticas_agentes(
 
 
 @app.get("/api/admin/retiros-agentes", tags=["Admin - Agentes"])
-async def admin_obtener_retiros_agentes(
+def admin_obtener_retiros_agentes(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
@@ -8513,7 +8164,7 @@ async def admin_obtener_retiros_agentes(
 
 
 @app.put("/api/admin/aprobar-retiro-agente/{solicitud_id}", tags=["Admin - Agentes"])
-async def admin_aprobar_retiro_agente(
+def admin_aprobar_retiro_agente(
     solicitud_id: int,
     datos: dict,
     usuario=Depends(obtener_usuario_actual),
@@ -8604,7 +8255,7 @@ async def admin_aprobar_retiro_agente(
 # =====================================================
 
 @app.get("/api/admin/agentes/{agente_id}/mensajes", tags=["Admin - Agentes"])
-async def admin_obtener_mensajes_agente(
+def admin_obtener_mensajes_agente(
     agente_id: int,
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
@@ -8651,7 +8302,7 @@ async def admin_obtener_mensajes_agente(
 
 
 @app.post("/api/admin/agentes/{agente_id}/enviar-mensaje", tags=["Admin - Agentes"])
-async def admin_enviar_mensaje_a_agente(
+def admin_enviar_mensaje_a_agente(
     agente_id: int,
     mensaje: dict,
     usuario=Depends(obtener_usuario_actual),
@@ -8684,23 +8335,19 @@ async def admin_enviar_mensaje_a_agente(
 
 
 @app.get("/api/admin/agentes/mensajes/no-leidos", tags=["Admin - Agentes"])
-async def admin_contar_mensajes_agentes_no_leidos(
+def admin_contar_mensajes_agentes_no_leidos(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
     """Admin: Contar total de mensajes no leídos de todos los agentes"""
+    from api.contadores_no_leidos import CLAVE_AGENTES_TOTAL, leer_contador
     
-    result = db.execute(text("""
-        SELECT COUNT(*) FROM mensajes_agentes
-        WHERE remitente = 'agente' AND leido = FALSE
-    """)).fetchone()
-    
-    return {"no_leidos": result[0] if result else 0}
+    return {"no_leidos": leer_contador(db, CLAVE_AGENTES_TOTAL)}
 
 
 @app.get("/api/admin/contabilidad", tags=["Admin - Contabilidad"])
 
-async def admin_obtener_contabilidad(
+def admin_obtener_contabilidad(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
@@ -8749,7 +8396,7 @@ async def admin_obtener_contabilidad(
 
 
 @app.get("/api/admin/solicitudes-credito", tags=["Admin - Referidos"])
-async def admin_obtener_solicitudes_credito(
+def admin_obtener_solicitudes_credito(
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
@@ -8803,7 +8450,7 @@ async def admin_obtener_solicitudes_credito(
 
 
 @app.put("/api/admin/solicitudes-credito/{solicitud_id}/responder", tags=["Admin - Referidos"])
-async def admin_responder_solicitud_credito(
+def admin_responder_solicitud_credito(
     solicitud_id: int,
     data: dict,
     usuario=Depends(verificar_admin),
@@ -8965,10 +8612,10 @@ def admin_enviar_mensaje_estudiante(
     
     import os
     import psycopg2
-    import smtplib
     from email.mime.multipart import MIMEMultipart
     from email.mime.text import MIMEText
     from datetime import datetime
+    from api import servicio_smtp
     
     # Validar datos
     mensaje = datos.get('mensaje', '').strip()
@@ -8983,7 +8630,7 @@ def admin_enviar_mensaje_estudiante(
     if tipo not in tipos_validos:
         tipo = 'informacion'
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Verificar que el estudiante existe y obtener su email
@@ -9069,11 +8716,10 @@ def admin_enviar_mensaje_estudiante(
         msg.attach(MIMEText(body, 'html'))
         
         # Enviar email
-        smtp = smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT')))
-        smtp.starttls()
-        smtp.login(os.getenv('SMTP_USER'), os.getenv('SMTP_PASSWORD'))
-        smtp.send_message(msg)
-        smtp.quit()
+        servicio_smtp.enviar(msg, servicio_smtp.ConfigSMTP(
+            os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT')),
+            os.getenv('SMTP_USER'), os.getenv('SMTP_PASSWORD')
+        ))
         
         email_enviado = True
     except Exception as e:
@@ -9100,10 +8746,15 @@ def admin_obtener_mensajes_no_leidos(
     """Obtiene mensajes de estudiantes que el admin no ha leído"""
     verificar_token(credentials.credentials)
     
+    # Caso habitual del polling: nada sin leer, sin JOIN ni ORDER BY
+    from api.contadores_no_leidos import CLAVE_CHAT_TOTAL, leer_contador
+    if leer_contador(db, CLAVE_CHAT_TOTAL) == 0:
+        return {'mensajes': [], 'total': 0}
+    
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -9148,7 +8799,7 @@ def admin_obtener_conversacion(
     import os
     import psycopg2
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Verificar estudiante
@@ -9196,7 +8847,7 @@ def admin_obtener_conversacion(
 # ==================== CONTACTO UNIVERSIDADES ====================
 
 @app.get("/api/admin/universidades")
-async def obtener_universidades(
+def obtener_universidades(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Obtener lista de universidades para contactar"""
@@ -9213,7 +8864,7 @@ async def obtener_universidades(
         import os
         import psycopg2
         
-        conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -9267,7 +8918,7 @@ async def obtener_universidades(
 
 
 @app.post("/api/admin/contactar-universidad/{universidad_id}")
-async def contactar_universidad(
+def contactar_universidad(
     universidad_id: int,
     numero_estudiantes: int = 15,
     observaciones: str = "",
@@ -9286,7 +8937,7 @@ async def contactar_universidad(
     import psycopg2
     from api.email_utils import enviar_email
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Obtener datos universidad
@@ -9461,7 +9112,7 @@ async def contactar_universidad(
 
 
 @app.put("/api/admin/universidades/{universidad_id}")
-async def actualizar_universidad(
+def actualizar_universidad(
     universidad_id: int,
     estado: str = None,
     notas: str = None,
@@ -9483,7 +9134,7 @@ async def actualizar_universidad(
     import psycopg2
     from datetime import datetime
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Construir query dinámico
@@ -9540,7 +9191,7 @@ async def actualizar_universidad(
 
 
 @app.get("/api/estudiantes/{estudiante_id}/proceso-visa")
-async def obtener_proceso_visa(estudiante_id: int):
+def obtener_proceso_visa(estudiante_id: int):
     """Obtener el proceso completo de visa del estudiante (acceso público con ID)"""
     
     import os
@@ -9548,7 +9199,7 @@ async def obtener_proceso_visa(estudiante_id: int):
     from datetime import datetime
     from psycopg2.extras import RealDictCursor
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -9607,7 +9258,7 @@ class ActualizarProcesoRequest(BaseModel):
     resultado: Optional[str] = None
 
 @app.put("/api/admin/estudiantes/{estudiante_id}/proceso-visa")
-async def actualizar_paso_proceso(
+def actualizar_paso_proceso(
     estudiante_id: int,
     request: ActualizarProcesoRequest = Body(...),
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -9625,7 +9276,7 @@ async def actualizar_paso_proceso(
     import psycopg2
     from datetime import datetime
     
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Extraer valores del request
@@ -9699,7 +9350,7 @@ async def actualizar_paso_proceso(
     conn.close()
     
     # Verificar si todos los pasos están completos para cambiar estado_servicio a 'completado'
-    conn2 = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn2 = get_connection()
     cursor2 = conn2.cursor()
     
     # Obtener todos los pasos del estudiante
@@ -9851,7 +9502,7 @@ def crear_presupuesto(datos: dict, db: Session = Depends(get_db)):
     # Usar SQL directo con psycopg2 para manejar JSONB correctamente
     import os
     import psycopg2
-    conn = psycopg2.connect(os.getenv('DATABASE_URL'), sslmode='require')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -9959,11 +9610,32 @@ def obtener_presupuestos_estudiante(estudiante_id: int, db: Session = Depends(ge
 
 @app.get("/api/admin/presupuestos", tags=["Admin"])
 def listar_presupuestos_admin(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     usuario=Depends(obtener_usuario_actual),
     db: Session = Depends(get_db)
 ):
-    """Listar todos los presupuestos para el admin con modalidades de pago"""
-    result = db.execute(text("""
+    """
+    Listar todos los presupuestos para el admin con modalidades de pago.
+    Con `limit` se pagina por cursor (cabeceras X-Next-Cursor / X-Total-Estimado).
+    """
+    from api.paginacion import (
+        condicion_keyset, orden_keyset, normalizar_limite, recortar_pagina,
+        total_estimado, cabeceras_paginacion
+    )
+    
+    # Orden: pendiente, ofertado, aceptado, rechazado y después más recientes primero
+    prioridad_estado = """CASE p.estado
+                WHEN 'pendiente' THEN 4
+                WHEN 'ofertado' THEN 3
+                WHEN 'aceptado' THEN 2
+                WHEN 'rechazado' THEN 1
+                ELSE 0
+            END"""
+    claves = [prioridad_estado, "COALESCE(p.created_at, TIMESTAMP '1970-01-01')", "p.id"]
+    
+    query = f"""
         SELECT 
             p.id, p.estudiante_id, p.servicios, p.precio_solicitado,
             p.precio_ofertado, p.forma_pago, p.mensaje_admin, p.estado,
@@ -9971,18 +9643,34 @@ def listar_presupuestos_admin(
             p.servicios_solicitados, p.precio_al_empezar, p.precio_con_visa,
             p.precio_financiado, p.modalidad_seleccionada, p.comentarios_estudiante,
             p.fecha_aceptacion, p.fecha_pago, p.pagado,
-            e.nombre, e.email, e.telefono
+            e.nombre, e.email, e.telefono,
+            {claves[0]} as clave_estado, {claves[1]} as clave_fecha
         FROM presupuestos p
         JOIN estudiantes e ON p.estudiante_id = e.id
-        ORDER BY 
-            CASE p.estado
-                WHEN 'pendiente' THEN 1
-                WHEN 'ofertado' THEN 2
-                WHEN 'aceptado' THEN 3
-                WHEN 'rechazado' THEN 4
-            END,
-            p.created_at DESC
-    """))
+        WHERE 1=1
+    """
+    params = {}
+    
+    siguiente = None
+    if limit is not None:
+        limit = normalizar_limite(limit)
+        if response is not None and not cursor:
+            cabeceras_paginacion(response, None, total_estimado(db, query, params))
+        condicion, params = condicion_keyset(claves, cursor, estilo='named')
+        if condicion:
+            query += f" AND {condicion}"
+    
+    query += " " + orden_keyset(claves)
+    
+    if limit is not None:
+        params["limit"] = limit + 1
+        result, siguiente = recortar_pagina(
+            db.execute(text(query + " LIMIT :limit"), params).fetchall(), limit, [22, 23, 0]
+        )
+        if response is not None:
+            cabeceras_paginacion(response, siguiente)
+    else:
+        result = db.execute(text(query), params).fetchall()
     
     presupuestos = []
     for row in result:
@@ -11060,7 +10748,7 @@ def gestionar_alojamiento(
 # ===============================================
 
 @app.get("/api/admin/solicitudes-seguro-medico")
-async def obtener_solicitudes_seguro_medico(db: Session = Depends(get_db)):
+def obtener_solicitudes_seguro_medico(db: Session = Depends(get_db)):
     """
     Obtener todas las solicitudes de gestión de seguro médico
     """
@@ -11097,7 +10785,7 @@ async def obtener_solicitudes_seguro_medico(db: Session = Depends(get_db)):
         raise HTTPException(status_code=503, detail="Error interno del servidor")
 
 @app.put("/api/admin/gestionar-seguro-medico/{estudiante_id}")
-async def gestionar_seguro_medico(
+def gestionar_seguro_medico(
     estudiante_id: int,
     datos: dict,
     db: Session = Depends(get_db)
@@ -11196,7 +10884,7 @@ async def gestionar_seguro_medico(
         raise HTTPException(status_code=503, detail="Servicio de base de datos temporalmente no disponible")
 
 @app.post("/api/admin/fix-database-columns", tags=["Admin - Database"])
-async def fix_database_columns():
+def fix_database_columns():
     """TEMPORAL: Agregar columnas faltantes de aprobación a la base de datos"""
     
     try:
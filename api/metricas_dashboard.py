@@ -0,0 +1,63 @@
+"""
+Métricas del dashboard precalculadas
+Los contadores del dashboard (totales, estados, nacionalidades, especialidades,
+actividad del día...) viven en la vista materializada `metricas_dashboard`
+(una sola fila). Los endpoints leen esa fila con una única consulta y la vista
+se refresca como mucho una vez cada METRICAS_DASHBOARD_TTL segundos, por mucho
+que los admins tengan el dashboard abierto con auto-refresco.
+"""
+import os
+
+from database.models import get_connection
+
+METRICAS_TTL = int(os.getenv('METRICAS_DASHBOARD_TTL', 60))
+
+# Advisory lock para que solo un worker refresque la vista a la vez
+LOCK_REFRESCO = 720601
+
+COLUMNAS = [
+    'actualizado_en', 'total_estudiantes', 'registros_24h', 'registros_7d',
+    'registros_30d', 'sin_estado', 'fondos_promedio', 'por_estado',
+    'por_nacionalidad', 'por_especialidad', 'documentos_generados_hoy',
+    'notas_agregadas_hoy', 'mensajes_30d', 'alertas_pendientes'
+]
+
+
+def _leer_fila(cursor):
+    cursor.execute(f"""
+        SELECT {', '.join(COLUMNAS)},
+               EXTRACT(EPOCH FROM NOW() - actualizado_en)
+        FROM metricas_dashboard
+    """)
+    fila = cursor.fetchone()
+    metricas = dict(zip(COLUMNAS, fila[:-1]))
+    return metricas, float(fila[-1])
+
+
+def obtener_metricas() -> dict:
+    """
+    Métricas precalculadas del dashboard.
+    Si la fila tiene más de METRICAS_TTL segundos se refresca aquí mismo;
+    si otro worker ya está refrescando se devuelven los valores actuales.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        metricas, edad = _leer_fila(cursor)
+
+        if edad > METRICAS_TTL:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (LOCK_REFRESCO,))
+            if cursor.fetchone()[0]:
+                # CONCURRENTLY: las lecturas no se bloquean durante el refresco
+                cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY metricas_dashboard")
+                metricas, _ = _leer_fila(cursor)
+            conn.commit()
+
+        cursor.close()
+        metricas['fondos_promedio'] = float(metricas['fondos_promedio'] or 0)
+        return metricas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
@@ -3,11 +3,11 @@ Sistema de Notificaciones por Email para Admin
 Envía alertas inmediatas cuando ocurren acciones importantes
 """
 
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from datetime import datetime
+from api import servicio_smtp
 
 def enviar_email_admin(asunto: str, cuerpo_html: str):
     """
@@ -35,11 +35,7 @@ def enviar_email_admin(asunto: str, cuerpo_html: str):
         msg.attach(html_part)
         
         # Enviar
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        servicio_smtp.enviar(msg, servicio_smtp.ConfigSMTP(SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD))
         
         print(f"✅ Email enviado al admin: {asunto}")
         return True
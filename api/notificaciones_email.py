@@ -1,10 +1,10 @@
 """
 Sistema de notificaciones por email
 """
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+from api import servicio_smtp
 
 class NotificacionesEmail:
     
@@ -35,10 +35,7 @@ class NotificacionesEmail:
             mensaje.attach(parte_html)
             
             # Enviar
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(smtp_user, smtp_password)
-                server.sendmail(smtp_user, destinatario, mensaje.as_string())
+            servicio_smtp.enviar(mensaje, servicio_smtp.ConfigSMTP(smtp_server, smtp_port, smtp_user, smtp_password))
             
             print(f"✅ Email enviado a {destinatario}")
             return True
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database.models import Notificacion, Estudiante, get_db
+from api.contadores_no_leidos import clave_notificaciones, leer_contador
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
@@ -84,10 +85,7 @@ def contar_no_leidas(
 ):
     """Contar notificaciones no leídas"""
     try:
-        count = db.query(Notificacion).filter(
-            Notificacion.estudiante_id == estudiante_id,
-            Notificacion.leida == False
-        ).count()
+        count = leer_contador(db, clave_notificaciones(estudiante_id))
         
         return {
             "success": True,
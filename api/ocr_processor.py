@@ -3,14 +3,20 @@ OCR Inteligente para Validación de Documentos
 Extrae y valida información de pasaportes, certificados y extractos bancarios
 """
 
-import re
 import base64
+import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from io import BytesIO
 from PIL import Image
 import pytesseract
 
+from api.extractor_documentos import CamposDocumento, extraer_campos, parsear_fecha
+
+# Tiempo máximo de Tesseract por imagen: pasado, pytesseract mata el proceso
+# y el documento cuenta como fallido, así el hilo de la cola OCR siempre vuelve
+OCR_TIMEOUT_TESSERACT = float(os.getenv('OCR_TIMEOUT_TESSERACT', 60))
+
 # Configurar ruta de Tesseract (Windows)
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
@@ -18,12 +24,6 @@ import pytesseract
 class OCRProcessor:
     """Procesador OCR para validación automática de documentos"""
     
-    # Patrones de validación
-    PASSPORT_MRZ_PATTERN = r'^P<[A-Z]{3}[A-Z<]+<<[A-Z<]+$'
-    PASSPORT_NUMBER_PATTERN = r'^[A-Z0-9]{6,9}$'
-    DATE_PATTERN = r'\d{2}[/-]\d{2}[/-]\d{4}'
-    AMOUNT_PATTERN = r'[\$€£]?\s?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?'
-    
     # Palabras clave para detección de tipo de documento
     PASSPORT_KEYWORDS = ['passport', 'pasaporte', 'passeport', 'reisepass', 'nationality', 'nacionalidad']
     CERTIFICATE_KEYWORDS = ['certificate', 'certificado', 'university', 'universidad', 'degree', 'título']
@@ -52,21 +52,40 @@ class OCRProcessor:
         Returns:
             Texto extraído de la imagen
         """
+        from api import cache_ocr
+        
+        # Decodificar imagen
+        imagen_bytes = base64.b64decode(imagen_base64)
+        
+        # Mismo archivo ya procesado: se reutiliza el texto
+        sha256 = cache_ocr.hash_contenido(imagen_bytes)
+        texto = cache_ocr.obtener(sha256, 'tesseract', idioma)
+        if texto is not None:
+            return texto
+        
         if not self.tesseract_available:
             raise Exception("Tesseract OCR no está instalado. Instale con: apt-get install tesseract-ocr")
         
         try:
-            # Decodificar imagen
-            imagen_bytes = base64.b64decode(imagen_base64)
+            from api.preprocesado_ocr import preparar_imagen
+            
             imagen = Image.open(BytesIO(imagen_bytes))
             
-            # Preprocesar imagen para mejorar OCR
-            imagen = imagen.convert('L')  # Convertir a escala de grises
+            # Preprocesar imagen para mejorar OCR (orientación EXIF, escala
+            # de grises y resolución suficiente para OCR)
+            imagen = preparar_imagen(imagen)
             
             # Extraer texto con Tesseract
-            texto = pytesseract.image_to_string(imagen, lang=idioma)
+            try:
+                texto = pytesseract.image_to_string(
+                    imagen, lang=idioma, timeout=OCR_TIMEOUT_TESSERACT
+                ).strip()
+            except RuntimeError as e:
+                # pytesseract lanza RuntimeError('Tesseract process timeout')
+                raise Exception(f"Tesseract superó el tiempo máximo ({OCR_TIMEOUT_TESSERACT:.0f}s)") from e
             
-            return texto.strip()
+            cache_ocr.guardar(sha256, 'tesseract', idioma, texto)
+            return texto
             
         except Exception as e:
             raise Exception(f"Error extrayendo texto: {str(e)}")
@@ -97,7 +116,7 @@ class OCRProcessor:
         else:
             return 'extracto_bancario'
     
-    def validar_pasaporte(self, texto: str) -> Dict:
+    def validar_pasaporte(self, texto: str, campos: Optional[CamposDocumento] = None) -> Dict:
         """
         Valida pasaporte y extrae información clave
         
@@ -113,21 +132,28 @@ class OCRProcessor:
             'errores': []
         }
         
+        campos = campos or extraer_campos(texto)
+        # MRZ con dígitos de control: sus datos son más fiables que el texto libre
+        mrz = campos.mrz
+        
         # Extraer número de pasaporte
-        numeros = re.findall(r'[A-Z]{1,2}\d{6,9}|\d{6,9}[A-Z]{1,2}', texto)
-        if numeros:
+        numeros = campos.pasaportes
+        if mrz and mrz['controles']['numero_documento']:
+            resultado['datos_extraidos']['numero_pasaporte'] = mrz['numero_documento']
+        elif numeros:
             resultado['datos_extraidos']['numero_pasaporte'] = numeros[0]
         else:
             resultado['errores'].append('No se encontró número de pasaporte válido')
         
         # Extraer fechas
-        fechas = re.findall(self.DATE_PATTERN, texto)
-        if len(fechas) >= 2:
+        fechas = [fecha for fecha, _ in campos.fechas]
+        expiracion_mrz = mrz['fecha_expiracion'] if mrz and mrz['controles']['fecha_expiracion'] else None
+        if len(fechas) >= 2 or expiracion_mrz:
             try:
-                fecha_emision = self._parse_fecha(fechas[0])
-                fecha_expiracion = self._parse_fecha(fechas[1])
-                
-                resultado['datos_extraidos']['fecha_emision'] = fecha_emision.strftime('%Y-%m-%d')
+                if len(fechas) >= 2:
+                    fecha_emision = self._parse_fecha(fechas[0])
+                    resultado['datos_extraidos']['fecha_emision'] = fecha_emision.strftime('%Y-%m-%d')
+                fecha_expiracion = self._parse_fecha(expiracion_mrz or fechas[1])
                 resultado['datos_extraidos']['fecha_expiracion'] = fecha_expiracion.strftime('%Y-%m-%d')
                 
                 # Validar vigencia (mínimo 6 meses)
@@ -146,15 +172,21 @@ class OCRProcessor:
         else:
             resultado['errores'].append('No se encontraron fechas de emisión/expiración')
         
-        # Extraer nombre (líneas en mayúsculas)
-        lineas_mayusculas = [l for l in texto.split('\n') if l.isupper() and len(l) > 5]
-        if lineas_mayusculas:
+        # Extraer nombre (de la MRZ o de las líneas en mayúsculas)
+        lineas_mayusculas = [l for l in campos.lineas if l.isupper() and len(l) > 5]
+        if mrz and mrz['apellidos']:
+            resultado['datos_extraidos']['nombre_extraido'] = f"{mrz['nombres']} {mrz['apellidos']}".strip()
+        elif lineas_mayusculas:
             resultado['datos_extraidos']['nombre_extraido'] = lineas_mayusculas[0]
         
-        # Validar MRZ (Machine Readable Zone)
-        lineas_mrz = [l for l in texto.split('\n') if re.match(r'^[A-Z0-9<]{30,}$', l)]
-        if lineas_mrz:
+        # Validar MRZ (Machine Readable Zone) con sus dígitos de control
+        if mrz:
             resultado['datos_extraidos']['mrz_detectado'] = True
+            if mrz['nacionalidad']:
+                resultado['datos_extraidos']['nacionalidad'] = mrz['nacionalidad']
+            if not mrz['valido']:
+                fallidos = [campo for campo, ok in mrz['controles'].items() if not ok]
+                resultado['advertencias'].append(f"⚠️ MRZ con dígitos de control incorrectos ({', '.join(fallidos)})")
         else:
             resultado['advertencias'].append('⚠️ No se detectó MRZ (puede dificultar lectura automática)')
         
@@ -163,7 +195,7 @@ class OCRProcessor:
         
         return resultado
     
-    def validar_certificado_academico(self, texto: str) -> Dict:
+    def validar_certificado_academico(self, texto: str, campos: Optional[CamposDocumento] = None) -> Dict:
         """
         Valida certificado académico y extrae información
         
@@ -185,7 +217,8 @@ class OCRProcessor:
             'Universidad de Valencia', 'Universidad de Sevilla'
         ]
         
-        texto_lower = texto.lower()
+        campos = campos or extraer_campos(texto)
+        texto_lower = campos.texto_lower
         universidad_encontrada = None
         for uni in universidades_españa:
             if uni.lower() in texto_lower:
@@ -198,7 +231,7 @@ class OCRProcessor:
             resultado['advertencias'].append('⚠️ Universidad no identificada (verificar manualmente)')
         
         # Extraer fechas
-        fechas = re.findall(self.DATE_PATTERN, texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if fechas:
             resultado['datos_extraidos']['fecha_emision'] = fechas[0]
         else:
@@ -240,7 +273,7 @@ class OCRProcessor:
         
         return resultado
     
-    def validar_extracto_bancario(self, texto: str) -> Dict:
+    def validar_extracto_bancario(self, texto: str, campos: Optional[CamposDocumento] = None) -> Dict:
         """
         Valida extracto bancario y extrae montos
         
@@ -261,9 +294,10 @@ class OCRProcessor:
             'ING', 'Banco Popular', 'Bankinter', 'Unicaja'
         ]
         
+        campos = campos or extraer_campos(texto)
         banco_encontrado = None
         for banco in bancos_comunes:
-            if banco.lower() in texto.lower():
+            if banco.lower() in campos.texto_lower:
                 banco_encontrado = banco
                 break
         
@@ -272,21 +306,10 @@ class OCRProcessor:
         else:
             resultado['advertencias'].append('⚠️ Banco no identificado')
         
-        # Extraer montos (buscar números con símbolos de moneda)
-        montos = re.findall(self.AMOUNT_PATTERN, texto)
+        # Extraer montos (en euros o sin divisa)
+        montos = [valor for _, valor, divisa in campos.montos if divisa in (None, '€', 'EUR')]
         if montos:
-            # Limpiar y convertir montos
-            montos_numericos = []
-            for monto in montos:
-                try:
-                    # Eliminar símbolos y convertir
-                    monto_limpio = re.sub(r'[^\d.,]', '', monto)
-                    monto_limpio = monto_limpio.replace(',', '.')
-                    valor = float(monto_limpio)
-                    if valor > 100:  # Filtrar centavos
-                        montos_numericos.append(valor)
-                except:
-                    pass
+            montos_numericos = [valor for valor in montos if valor > 100]  # Filtrar centavos
             
             if montos_numericos:
                 saldo_maximo = max(montos_numericos)
@@ -307,7 +330,7 @@ class OCRProcessor:
             resultado['errores'].append('No se detectaron montos en el extracto')
         
         # Extraer fecha del extracto
-        fechas = re.findall(self.DATE_PATTERN, texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if fechas:
             resultado['datos_extraidos']['fecha_extracto'] = fechas[0]
             
@@ -364,13 +387,14 @@ class OCRProcessor:
             tipo_detectado = tipo_esperado or self.detectar_tipo_documento(texto)
             resultado['tipo_detectado'] = tipo_detectado
             
-            # Paso 3: Validar según tipo
+            # Paso 3: Validar según tipo (una sola pasada sobre el texto)
+            campos = extraer_campos(texto)
             if tipo_detectado == 'pasaporte':
-                validacion = self.validar_pasaporte(texto)
+                validacion = self.validar_pasaporte(texto, campos)
             elif tipo_detectado == 'certificado' or tipo_detectado == 'certificado_academico':
-                validacion = self.validar_certificado_academico(texto)
+                validacion = self.validar_certificado_academico(texto, campos)
             elif tipo_detectado == 'extracto_bancario':
-                validacion = self.validar_extracto_bancario(texto)
+                validacion = self.validar_extracto_bancario(texto, campos)
             else:
                 validacion = {
                     'tipo': 'otro',
@@ -395,21 +419,7 @@ class OCRProcessor:
     
     def _parse_fecha(self, fecha_str: str) -> datetime:
         """Intenta parsear fecha en múltiples formatos"""
-        formatos = [
-            '%d/%m/%Y',
-            '%d-%m-%Y',
-            '%m/%d/%Y',
-            '%Y-%m-%d',
-            '%d.%m.%Y'
-        ]
-        
-        for formato in formatos:
-            try:
-                return datetime.strptime(fecha_str.strip(), formato)
-            except:
-                continue
-        
-        raise ValueError(f"No se pudo parsear fecha: {fecha_str}")
+        return parsear_fecha(fecha_str)
     
     def generar_reporte_validacion(self, resultado: Dict) -> str:
         """
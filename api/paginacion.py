@@ -0,0 +1,136 @@
+"""
+Paginación por cursor (keyset) para los listados del admin
+En vez de OFFSET (que obliga a Postgres a recorrer y descartar todas las filas
+anteriores), cada página continúa a partir de la clave de orden de la última
+fila devuelta: WHERE (clave) < (última clave) ORDER BY clave LIMIT n.
+El cursor que ve el cliente es esa clave codificada (opaco).
+
+Las expresiones de la clave no deben ser NULL (envolver en COALESCE si hace
+falta) y deben terminar en una columna única (normalmente id).
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+LIMITE_MAXIMO = 500
+
+
+def _serializar(valor: Any) -> list:
+    if isinstance(valor, datetime):
+        return ['dt', valor.isoformat()]
+    if isinstance(valor, date):
+        return ['d', valor.isoformat()]
+    if isinstance(valor, Decimal):
+        return ['dec', str(valor)]
+    return ['v', valor]
+
+
+def _deserializar(item: list) -> Any:
+    tipo, valor = item
+    if tipo == 'dt':
+        return datetime.fromisoformat(valor)
+    if tipo == 'd':
+        return date.fromisoformat(valor)
+    if tipo == 'dec':
+        return Decimal(valor)
+    return valor
+
+
+def codificar_cursor(valores: Sequence[Any]) -> str:
+    datos = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: str, num_valores: int) -> list:
+    """Decodifica un cursor recibido del cliente (HTTP 400 si no es válido)"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valores = [_deserializar(item) for item in datos]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+    if len(valores) != num_valores:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+    return valores
+
+
+def condicion_keyset(
+    claves: Sequence[str],
+    cursor: Optional[str],
+    descendente: bool = True,
+    estilo: str = 'pyformat'
+) -> Tuple[str, Union[list, dict]]:
+    """
+    Condición SQL para continuar después del cursor.
+
+    Args:
+        claves: expresiones SQL de la clave de orden, p.ej. ['created_at', 'id']
+        cursor: cursor recibido del cliente (None = primera página)
+        descendente: dirección del orden (la misma para todas las claves)
+        estilo: 'pyformat' (%s, psycopg2) o 'named' (:k0, SQLAlchemy text())
+
+    Returns:
+        (sql, params) - sql vacío si no hay cursor
+    """
+    if not cursor:
+        return '', ([] if estilo == 'pyformat' else {})
+
+    valores = decodificar_cursor(cursor, len(claves))
+    operador = '<' if descendente else '>'
+    if estilo == 'pyformat':
+        marcadores = ', '.join(['%s'] * len(valores))
+        params = list(valores)
+    else:
+        marcadores = ', '.join(f':k{i}' for i in range(len(valores)))
+        params = {f'k{i}': valor for i, valor in enumerate(valores)}
+    return f"({', '.join(claves)}) {operador} ({marcadores})", params
+
+
+def orden_keyset(claves: Sequence[str], descendente: bool = True) -> str:
+    direccion = 'DESC' if descendente else 'ASC'
+    return 'ORDER BY ' + ', '.join(f'{clave} {direccion}' for clave in claves)
+
+
+def normalizar_limite(limit: int) -> int:
+    return max(1, min(limit, LIMITE_MAXIMO))
+
+
+def recortar_pagina(filas: List[Sequence], limite: int, indices_clave: Sequence[int]) -> Tuple[List, Optional[str]]:
+    """
+    Se consulta LIMIT limite + 1: si sobra una fila hay página siguiente y el
+    cursor se construye con la clave de la última fila devuelta.
+    """
+    if len(filas) <= limite:
+        return list(filas), None
+    filas = list(filas[:limite])
+    ultima = filas[-1]
+    return filas, codificar_cursor([ultima[i] for i in indices_clave])
+
+
+def total_estimado(conexion, query: str, params: Union[list, tuple, dict]) -> int:
+    """
+    Total aproximado según las estadísticas del planner (EXPLAIN), sin COUNT(*).
+    `conexion` es un cursor psycopg2 (params lista) o una Session (params dict).
+    """
+    explain = "EXPLAIN (FORMAT JSON) " + query
+    if isinstance(params, dict):
+        plan = conexion.execute(text(explain), params).scalar()
+    else:
+        conexion.execute(explain, params)
+        plan = conexion.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cabeceras_paginacion(response, siguiente_cursor: Optional[str], total: Optional[int] = None):
+    """Para los endpoints que devuelven una lista: el cursor va en cabeceras"""
+    if siguiente_cursor:
+        response.headers['X-Next-Cursor'] = siguiente_cursor
+    if total is not None:
+        response.headers['X-Total-Estimado'] = str(total)
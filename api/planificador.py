@@ -0,0 +1,345 @@
+"""
+Planificador de tareas compartido por todos los workers
+Con N workers de uvicorn cada uno arrancaba su propio BackgroundScheduler y
+las tareas diarias (alertas de fechas, envíos programados) se ejecutaban N veces.
+
+- Elección de líder: el worker que consigue un advisory lock de Postgres (en
+  una conexión propia, fuera del pool) ejecuta las tareas. Si muere o pierde
+  la conexión, Postgres suelta el lock y otro worker lo toma en unos segundos.
+- Los demás workers tienen el scheduler en pausa: pueden programar, mover o
+  cancelar tareas (envíos programados) pero no ejecutan nada.
+- Las tareas se guardan en la BD (tabla apscheduler_jobs): sobreviven a
+  reinicios y todos los workers ven las mismas.
+- Una ejecución perdida (el líder estaba caído a esa hora) se hace igualmente
+  si no han pasado PLANIFICADOR_MARGEN_SEGUNDOS; si se acumulan varias, se
+  ejecuta una sola vez (coalesce).
+- Cada ejecución queda en planificador_ejecuciones (inicio, duración,
+  resultado, worker) para el endpoint de administración.
+
+Para probarlo con varios "workers" en un solo proceso y un Postgres local:
+python verificar_planificador_lider.py
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import psycopg2
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.util import ref_to_obj
+
+from database.models import DATABASE_URL, engine, get_connection
+
+# Clave del advisory lock del líder (distinta de la de migraciones)
+LLAVE_LIDER_PLANIFICADOR = 7_204_510_023
+# Cada cuánto se comprueba el liderazgo y se despierta al scheduler
+PLANIFICADOR_INTERVALO = float(os.getenv('PLANIFICADOR_INTERVALO', 15))
+# Hasta cuánto tarde se ejecuta todavía una tarea que no se pudo lanzar a su hora
+PLANIFICADOR_MARGEN_SEGUNDOS = int(os.getenv('PLANIFICADOR_MARGEN_SEGUNDOS', 3600))
+# false: este proceso nunca es líder (solo programa tareas para que las ejecute otro)
+PLANIFICADOR_ACTIVO = os.getenv('PLANIFICADOR_ACTIVO', 'true').lower() != 'false'
+
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _registrar_ejecucion(tarea_id: str, funcion: str, worker: str, programada_para,
+                         inicio: datetime, duracion_ms: Optional[int], estado: str, error: str = None):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO planificador_ejecuciones
+            (tarea_id, funcion, worker, programada_para, inicio, duracion_ms, estado, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (tarea_id, funcion, worker, programada_para, inicio, duracion_ms, estado, error))
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ No se pudo registrar la ejecución de {tarea_id}: {e}")
+    finally:
+        conn.close()
+
+
+def ejecutar_tarea(tarea_id: str, funcion: str, *args):
+    """
+    Envoltorio con el que se guardan todas las tareas: importa la función por
+    su referencia ('modulo:funcion'), la ejecuta y registra duración y resultado.
+    """
+    inicio = datetime.now()
+    t0 = time.monotonic()
+    try:
+        ref_to_obj(funcion)(*args)
+    except Exception as e:
+        duracion_ms = int((time.monotonic() - t0) * 1000)
+        _registrar_ejecucion(tarea_id, funcion, _WORKER, None, inicio, duracion_ms, 'error',
+                             ''.join(traceback.format_exception_only(type(e), e)).strip())
+        raise
+    duracion_ms = int((time.monotonic() - t0) * 1000)
+    _registrar_ejecucion(tarea_id, funcion, _WORKER, None, inicio, duracion_ms, 'ok')
+
+
+class Planificador:
+    """Scheduler de un worker: ejecuta solo si este worker es el líder"""
+
+    def __init__(self, nombre: str = _WORKER, llave: int = LLAVE_LIDER_PLANIFICADOR,
+                 intervalo: float = PLANIFICADOR_INTERVALO):
+        self.nombre = nombre
+        self.llave = llave
+        self.intervalo = intervalo
+        self.es_lider = False
+        self._conexion_lider = None
+        self._tareas_fijas: Dict[str, Dict] = {}
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(engine=engine)},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': PLANIFICADOR_MARGEN_SEGUNDOS,
+            }
+        )
+        self.scheduler.add_listener(self._tarea_perdida, EVENT_JOB_MISSED)
+
+    # ------------------------------------------------------------------
+    # Tareas
+    # ------------------------------------------------------------------
+
+    def tarea_fija(self, tarea_id: str, funcion: str, trigger, nombre: str = None):
+        """
+        Tarea periódica del sistema (p.ej. las alertas de las 9:00). La da de
+        alta el líder al asumir el cargo; los demás workers solo la registran.
+        """
+        self._tareas_fijas[tarea_id] = {'funcion': funcion, 'trigger': trigger, 'nombre': nombre or tarea_id}
+        if self.es_lider:
+            self._alta_tareas_fijas()
+
+    def programar(self, tarea_id: str, funcion: str, trigger, args: List = None,
+                  nombre: str = None, margen_segundos: Optional[int] = PLANIFICADOR_MARGEN_SEGUNDOS):
+        """
+        Programa (o reemplaza) una tarea. `funcion` es 'modulo:funcion' (se
+        guarda en la BD, no puede ser una lambda). margen_segundos=None: se
+        ejecuta por tarde que sea.
+        """
+        self._asegurar_iniciado()
+        self.scheduler.add_job(
+            ejecutar_tarea,
+            trigger=trigger,
+            args=[tarea_id, funcion, *(args or [])],
+            id=tarea_id,
+            name=nombre or tarea_id,
+            replace_existing=True,
+            misfire_grace_time=margen_segundos
+        )
+
+    def reprogramar(self, tarea_id: str, trigger):
+        self._asegurar_iniciado()
+        self.scheduler.reschedule_job(tarea_id, trigger=trigger)
+
+    def cancelar(self, tarea_id: str) -> bool:
+        self._asegurar_iniciado()
+        try:
+            self.scheduler.remove_job(tarea_id)
+            return True
+        except Exception:
+            return False
+
+    def _alta_tareas_fijas(self):
+        for tarea_id, tarea in self._tareas_fijas.items():
+            existente = self.scheduler.get_job(tarea_id)
+            # No reemplazar si no cambió: se perdería la próxima ejecución ya calculada
+            if existente is not None and str(existente.trigger) == str(tarea['trigger']):
+                continue
+            self.scheduler.add_job(
+                ejecutar_tarea,
+                trigger=tarea['trigger'],
+                args=[tarea_id, tarea['funcion']],
+                id=tarea_id,
+                name=tarea['nombre'],
+                replace_existing=True
+            )
+
+    def _tarea_perdida(self, evento):
+        _registrar_ejecucion(evento.job_id, '', self.nombre, evento.scheduled_run_time,
+                             datetime.now(), None, 'perdida')
+
+    # ------------------------------------------------------------------
+    # Liderazgo
+    # ------------------------------------------------------------------
+
+    def _asegurar_iniciado(self):
+        with self._lock:
+            if not self.scheduler.running:
+                # En pausa: acepta tareas en la BD pero no ejecuta nada
+                self.scheduler.start(paused=True)
+
+    def iniciar(self):
+        """Arranca el scheduler en pausa y el hilo que intenta ser líder"""
+        self._asegurar_iniciado()
+        if not PLANIFICADOR_ACTIVO:
+            return
+        if self._hilo is None or not self._hilo.is_alive():
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle_lider, name='planificador-lider', daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join(timeout=self.intervalo + 5)
+        self._dejar_liderazgo()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def _bucle_lider(self):
+        while True:
+            try:
+                if self.es_lider:
+                    if self._conexion_viva():
+                        # Tareas añadidas por otros workers: el scheduler no se entera solo
+                        self.scheduler.wakeup()
+                    else:
+                        print(f"⚠️ Planificador {self.nombre}: conexión del líder perdida")
+                        self._dejar_liderazgo()
+                if not self.es_lider:
+                    self._intentar_liderazgo()
+            except Exception as e:
+                print(f"⚠️ Planificador {self.nombre}: {e}")
+            if self._parar.wait(self.intervalo):
+                return
+
+    def _intentar_liderazgo(self):
+        conn = self._conexion_lider
+        if conn is None or conn.closed:
+            conn = self._conexion_lider = psycopg2.connect(
+                DATABASE_URL, keepalives=1, keepalives_idle=30,
+                keepalives_interval=10, keepalives_count=5,
+                application_name='planificador'
+            )
+            conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.llave,))
+        conseguido = cursor.fetchone()[0]
+        cursor.close()
+        if not conseguido:
+            return
+
+        self.es_lider = True
+        self._alta_tareas_fijas()
+        self.scheduler.resume()
+        print(f"👑 Planificador: {self.nombre} es el líder y ejecuta las tareas programadas")
+
+    def _conexion_viva(self) -> bool:
+        try:
+            cursor = self._conexion_lider.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _dejar_liderazgo(self):
+        if self.es_lider:
+            self.es_lider = False
+            if self.scheduler.running:
+                self.scheduler.pause()
+            print(f"🔕 Planificador: {self.nombre} deja de ser líder")
+        if self._conexion_lider is not None:
+            # Cerrar la sesión suelta el advisory lock
+            try:
+                self._conexion_lider.close()
+            except Exception:
+                pass
+            self._conexion_lider = None
+
+    # ------------------------------------------------------------------
+    # Monitoreo
+    # ------------------------------------------------------------------
+
+    def estado(self) -> Dict:
+        tareas = []
+        if self.scheduler.running:
+            for job in self.scheduler.get_jobs():
+                tareas.append({
+                    'id': job.id,
+                    'nombre': job.name,
+                    'funcion': job.args[1] if len(job.args) > 1 else None,
+                    'trigger': str(job.trigger),
+                    'proxima_ejecucion': job.next_run_time.isoformat() if job.next_run_time else None
+                })
+        return {
+            'worker': self.nombre,
+            'es_lider': self.es_lider,
+            'tareas': tareas
+        }
+
+
+def historial_ejecuciones(limite: int = 50, tarea_id: str = None) -> Dict:
+    """Últimas ejecuciones y métricas de duración por tarea (últimos 30 días)"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT tarea_id, funcion, worker, programada_para, inicio, duracion_ms, estado, error
+            FROM planificador_ejecuciones
+            WHERE %(tarea)s::text IS NULL OR tarea_id = %(tarea)s
+            ORDER BY inicio DESC
+            LIMIT %(limite)s
+        """, {'tarea': tarea_id, 'limite': limite})
+        columnas = ['tarea_id', 'funcion', 'worker', 'programada_para', 'inicio', 'duracion_ms', 'estado', 'error']
+        ejecuciones = []
+        for fila in cursor.fetchall():
+            ejecucion = dict(zip(columnas, fila))
+            for campo in ('programada_para', 'inicio'):
+                if ejecucion[campo]:
+                    ejecucion[campo] = ejecucion[campo].isoformat()
+            ejecuciones.append(ejecucion)
+
+        cursor.execute("""
+            SELECT tarea_id,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE estado = 'error'),
+                   COUNT(*) FILTER (WHERE estado = 'perdida'),
+                   ROUND(AVG(duracion_ms)),
+                   PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY duracion_ms),
+                   MAX(duracion_ms),
+                   MAX(inicio)
+            FROM planificador_ejecuciones
+            WHERE inicio > NOW() - INTERVAL '30 days'
+            GROUP BY tarea_id
+            ORDER BY tarea_id
+        """)
+        metricas = [{
+            'tarea_id': tarea,
+            'ejecuciones': total,
+            'errores': errores,
+            'perdidas': perdidas,
+            'duracion_media_ms': int(media) if media is not None else None,
+            'duracion_p95_ms': int(p95) if p95 is not None else None,
+            'duracion_max_ms': maxima,
+            'ultima_ejecucion': ultima.isoformat() if ultima else None
+        } for tarea, total, errores, perdidas, media, p95, maxima, ultima in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return {'metricas': metricas, 'ejecuciones': ejecuciones}
+
+
+_planificador: Optional[Planificador] = None
+_planificador_lock = threading.Lock()
+
+
+def obtener_planificador() -> Planificador:
+    """Planificador de este proceso (se crea la primera vez)"""
+    global _planificador
+    with _planificador_lock:
+        if _planificador is None:
+            _planificador = Planificador()
+        return _planificador
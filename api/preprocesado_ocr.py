@@ -0,0 +1,103 @@
+"""
+Preprocesado de documentos antes del OCR
+Las fotos de móvil (6-10 MB) se suben mucho más rápido y fallan menos por
+timeout si antes se enderezan según EXIF, se reducen a la resolución que
+necesita el OCR, se pasan a escala de grises y se recomprimen en JPEG.
+Los PDF de varias páginas se dividen en una imagen (o un PDF) por página.
+Todo es CPU: llamar desde un hilo, nunca directamente en el event loop.
+"""
+import io
+import os
+from typing import List, Tuple
+
+from PIL import Image, ImageOps
+
+# Lado largo máximo: ~250 dpi para un A4, suficiente para OCR
+OCR_MAX_LADO = int(os.getenv('OCR_MAX_LADO', 2200))
+OCR_CALIDAD_JPEG = int(os.getenv('OCR_CALIDAD_JPEG', 80))
+# Límite de tamaño por archivo del plan gratuito de OCR.space
+OCR_MAX_BYTES = int(os.getenv('OCR_MAX_BYTES', 1024 * 1024))
+
+
+def es_pdf(contenido: bytes) -> bool:
+    return contenido[:5] == b'%PDF-'
+
+
+def preparar_imagen(imagen: Image.Image) -> Image.Image:
+    """Orienta según EXIF, pasa a escala de grises y reduce al tamaño de OCR"""
+    imagen = ImageOps.exif_transpose(imagen)
+    imagen = imagen.convert('L')
+    if max(imagen.size) > OCR_MAX_LADO:
+        imagen.thumbnail((OCR_MAX_LADO, OCR_MAX_LADO), Image.LANCZOS)
+    return imagen
+
+
+def comprimir_jpeg(imagen: Image.Image) -> bytes:
+    """JPEG por debajo de OCR_MAX_BYTES (baja la calidad y si no basta, la escala)"""
+    calidad = OCR_CALIDAD_JPEG
+    while True:
+        salida = io.BytesIO()
+        imagen.save(salida, format='JPEG', quality=calidad, optimize=True)
+        if salida.tell() <= OCR_MAX_BYTES or max(imagen.size) < 800:
+            return salida.getvalue()
+        if calidad > 50:
+            calidad -= 15
+        else:
+            imagen = imagen.resize((int(imagen.width * 0.8), int(imagen.height * 0.8)), Image.LANCZOS)
+
+
+def _paginas_pdf(contenido: bytes, nombre: str) -> List[Tuple[str, bytes]]:
+    """
+    Una entrada por página. Las páginas escaneadas (una sola imagen) se
+    extraen y se preparan como cualquier foto; el resto se envía como PDF
+    de una página (el OCR los rasteriza).
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+
+    lector = PdfReader(io.BytesIO(contenido))
+    base = os.path.splitext(nombre)[0]
+    paginas = []
+    for numero, pagina in enumerate(lector.pages, start=1):
+        try:
+            imagenes = list(pagina.images)
+        except Exception:
+            imagenes = []
+
+        if len(imagenes) == 1:
+            try:
+                imagen = preparar_imagen(Image.open(io.BytesIO(imagenes[0].data)))
+                paginas.append((f"{base}_p{numero}.jpg", comprimir_jpeg(imagen)))
+                continue
+            except Exception:
+                pass
+
+        escritor = PdfWriter()
+        escritor.add_page(pagina)
+        salida = io.BytesIO()
+        escritor.write(salida)
+        paginas.append((f"{base}_p{numero}.pdf", salida.getvalue()))
+    return paginas
+
+
+def preparar_documento(contenido: bytes, nombre: str = 'documento') -> List[Tuple[str, bytes]]:
+    """
+    Documento listo para subir al OCR: [(nombre, bytes), ...] (una entrada
+    por página). Lanza ValueError si no es una imagen ni un PDF válido.
+    """
+    if es_pdf(contenido):
+        try:
+            paginas = _paginas_pdf(contenido, nombre)
+        except Exception as e:
+            raise ValueError(f"PDF no válido: {e}")
+        if not paginas:
+            raise ValueError("El PDF no tiene páginas")
+        return paginas
+
+    try:
+        imagen = Image.open(io.BytesIO(contenido))
+        imagen.load()
+    except Exception as e:
+        raise ValueError(f"Archivo no es una imagen válida: {e}")
+
+    base = os.path.splitext(nombre)[0]
+    return [(f"{base}.jpg", comprimir_jpeg(preparar_imagen(imagen)))]
@@ -1,13 +1,14 @@
 """
 Scheduler para envío automático de alertas de fechas importantes
-Ejecuta verificación diaria a las 9:00 AM
+Ejecuta verificación diaria a las 9:00 AM (una sola vez aunque haya varios workers)
 """
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
 from database.models import SessionLocal
 from api.alertas_fechas import GestorAlertasFechas
+from api.planificador import obtener_planificador
 import logging
 
 # Configurar logging
@@ -25,72 +26,55 @@ def job_verificar_alertas():
     try:
         alertas_enviadas = GestorAlertasFechas.verificar_alertas_pendientes(db)
         
+        # Las notificaciones en la app se crean dentro, en un solo INSERT
         if alertas_enviadas:
-            logger.info(f"✅ Se enviaron {len(alertas_enviadas)} alertas:")
-            
-            # Crear notificaciones para cada alerta enviada
-            from api.notificaciones_routes import crear_notificacion
-            
-            for alerta in alertas_enviadas:
-                logger.info(f"   - Estudiante {alerta['estudiante_id']}: alerta de {alerta['tipo']}")
-                
-                # Crear notificación en la app
-                tipos_iconos = {
-                    'cita_consular': ('📅', 'Recordatorio: Cita Consular'),
-                    'vencimiento_visa': ('⚠️', 'Alerta: Vencimiento de Visa'),
-                    'renovacion_nie': ('🆔', 'Recordatorio: Renovación NIE'),
-                    'inicio_clases': ('🎓', 'Recordatorio: Inicio de Clases'),
-                    'entrega_documentos': ('📄', 'Recordatorio: Entrega de Documentos')
-                }
-                
-                icono, titulo_base = tipos_iconos.get(alerta['tipo'], ('🔔', 'Recordatorio'))
-                
-                crear_notificacion(
-                    db=db,
-                    estudiante_id=alerta['estudiante_id'],
-                    tipo='alerta',
-                    titulo=titulo_base,
-                    mensaje=alerta.get('mensaje', 'Tienes una fecha importante próxima. Revisa tu timeline de alertas.'),
-                    url_accion='/estudiante/alertas',
-                    icono=icono,
-                    prioridad='urgente' if 'vencimiento' in alerta['tipo'] else 'alta'
-                )
+            emails = sum(1 for alerta in alertas_enviadas if alerta['email_enviado'])
+            logger.info(f"✅ Se enviaron {len(alertas_enviadas)} alertas ({emails} por email)")
         else:
             logger.info("ℹ️ No hay alertas pendientes para enviar")
             
     except Exception as e:
         logger.error(f"❌ Error en verificación de alertas: {e}")
+        # Que quede como error en el historial del planificador
+        raise
     finally:
         db.close()
     
     logger.info("🏁 Verificación de alertas completada\n")
 
-# Crear scheduler
-scheduler = BackgroundScheduler()
-
-# Agregar job: ejecutar todos los días a las 9:00 AM (hora del servidor)
-scheduler.add_job(
-    job_verificar_alertas,
-    trigger=CronTrigger(hour=9, minute=0),
-    id='verificar_alertas_diarias',
-    name='Verificación diaria de alertas de fechas',
-    replace_existing=True
-)
-
 def iniciar_scheduler():
-    """Inicia el scheduler de alertas"""
-    if not scheduler.running:
-        scheduler.start()
-        logger.info("✅ Scheduler de alertas iniciado - Se ejecutará diariamente a las 9:00 AM")
-        logger.info("📅 Próxima ejecución: " + str(scheduler.get_jobs()[0].next_run_time))
-    else:
-        logger.info("ℹ️ Scheduler ya está corriendo")
+    """
+    Registra las tareas diarias en el planificador compartido y lo arranca.
+    Todos los workers lo llaman; solo el líder ejecuta (api/planificador.py).
+    """
+    planificador = obtener_planificador()
+    # Todos los días a las 9:00 AM (hora del servidor)
+    planificador.tarea_fija(
+        'verificar_alertas_diarias',
+        'api.scheduler_alertas:job_verificar_alertas',
+        CronTrigger(hour=9, minute=0),
+        nombre='Verificación diaria de alertas de fechas'
+    )
+    planificador.tarea_fija(
+        'limpiar_blobs_huerfanos',
+        'api.blob_storage:limpiar_blobs_huerfanos',
+        CronTrigger(hour=4, minute=0),
+        nombre='Borrado de blobs de documentos sin referencias'
+    )
+    # Trabajos OCR de workers caídos (sin latido): no esperan al próximo arranque
+    planificador.tarea_fija(
+        'marcar_trabajos_ocr_interrumpidos',
+        'api.cola_ocr:marcar_interrumpidos',
+        IntervalTrigger(minutes=10),
+        nombre='Trabajos OCR sin latido marcados como interrumpidos'
+    )
+    planificador.iniciar()
+    logger.info("✅ Planificador iniciado - alertas diarias a las 9:00 AM (las ejecuta el worker líder)")
 
 def detener_scheduler():
-    """Detiene el scheduler de alertas"""
-    if scheduler.running:
-        scheduler.shutdown()
-        logger.info("🛑 Scheduler de alertas detenido")
+    """Detiene el planificador de este worker (otro worker toma el liderazgo)"""
+    obtener_planificador().detener()
+    logger.info("🛑 Scheduler de alertas detenido")
 
 def ejecutar_verificacion_manual():
     """
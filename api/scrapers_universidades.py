@@ -5,20 +5,91 @@ Extrae información de programas, precios, requisitos y fechas
 
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import urlparse
+import os
 import re
+import threading
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Concurrencia del scraping: universidades en paralelo, pero sin saturar
+# ningún dominio (máx. peticiones simultáneas e intervalo mínimo por host)
+SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 8))
+SCRAPER_MAX_POR_HOST = int(os.getenv('SCRAPER_MAX_POR_HOST', 2))
+SCRAPER_INTERVALO_HOST = float(os.getenv('SCRAPER_INTERVALO_HOST', 0.5))
+SCRAPER_TIMEOUT = (5, 15)  # (conexión, lectura)
+SCRAPER_REINTENTOS = 3
+
+
+class _LimiteHost:
+    """Semáforo + intervalo mínimo entre peticiones a un mismo dominio"""
+    
+    def __init__(self):
+        self.semaforo = threading.BoundedSemaphore(SCRAPER_MAX_POR_HOST)
+        self.lock = threading.Lock()
+        self.ultima_peticion = 0.0
+    
+    def esperar_turno(self):
+        with self.lock:
+            espera = self.ultima_peticion + SCRAPER_INTERVALO_HOST - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self.ultima_peticion = time.monotonic()
+
+
+_limites_host = {}
+_limites_lock = threading.Lock()
+
+
+def _limite_para(url):
+    host = urlparse(url).netloc.lower()
+    with _limites_lock:
+        if host not in _limites_host:
+            _limites_host[host] = _LimiteHost()
+        return _limites_host[host]
+
+
+class SesionScraper(requests.Session):
+    """
+    requests.Session con límite por dominio, timeout por defecto y
+    reintentos con backoff exponencial ante errores de red, 429 y 5xx
+    """
+    
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', SCRAPER_TIMEOUT)
+        limite = _limite_para(url)
+        
+        for intento in range(SCRAPER_REINTENTOS):
+            ultimo_intento = intento == SCRAPER_REINTENTOS - 1
+            try:
+                with limite.semaforo:
+                    limite.esperar_turno()
+                    response = super().request(method, url, **kwargs)
+                if response.status_code == 429 or response.status_code >= 500:
+                    if ultimo_intento:
+                        return response
+                    logger.warning(f"⚠️ {url}: HTTP {response.status_code}, reintentando...")
+                else:
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if ultimo_intento:
+                    raise
+                logger.warning(f"⚠️ {url}: {e}, reintentando...")
+            time.sleep(2 ** intento)
+
+
 class ScraperUniversidadEspana:
     """Scraper genérico para universidades españolas"""
     
     def __init__(self, universidad_nombre, url_base):
         self.universidad_nombre = universidad_nombre
         self.url_base = url_base
-        self.session = requests.Session()
+        self.session = SesionScraper()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
@@ -516,56 +587,81 @@ def actualizar_todas_universidades(db_session):
     """
     Actualiza datos de todas las universidades configuradas
     Debe ejecutarse periódicamente (diariamente)
+    
+    El scraping se hace en paralelo (SCRAPER_WORKERS hilos, con límite por
+    dominio) y los programas se guardan con un único INSERT ... ON CONFLICT.
     """
     from database.models import UniversidadEspana, ProgramaUniversitario
+    from sqlalchemy import literal_column
+    from sqlalchemy.dialects.postgresql import insert
     
     universidades = db_session.query(UniversidadEspana).filter(
         UniversidadEspana.activa == True,
         UniversidadEspana.metodo_scraping == 'beautifulsoup'
     ).all()
     
-    total_programas_nuevos = 0
-    
-    for universidad in universidades:
-        logger.info(f"🔄 Actualizando {universidad.nombre}...")
-        
-        try:
-            programas = scrape_programas_universidad(
-                universidad.nombre,
-                universidad.url_oficial
-            )
+    filas = {}
+    actualizadas = []
+    
+    with ThreadPoolExecutor(max_workers=SCRAPER_WORKERS) as pool:
+        futuros = {
+            pool.submit(scrape_programas_universidad, universidad.nombre, universidad.url_oficial): universidad
+            for universidad in universidades
+        }
+        for futuro in as_completed(futuros):
+            universidad = futuros[futuro]
+            try:
+                programas = futuro.result()
+            except Exception as e:
+                logger.error(f"❌ Error actualizando {universidad.nombre}: {e}")
+                continue
             
             for programa_data in programas:
-                # Verificar si ya existe
-                existe = db_session.query(ProgramaUniversitario).filter(
-                    ProgramaUniversitario.universidad_id == universidad.id,
-                    ProgramaUniversitario.nombre == programa_data['nombre']
-                ).first()
-                
-                if not existe:
-                    nuevo_programa = ProgramaUniversitario(
-                        universidad_id=universidad.id,
-                        nombre=programa_data['nombre'],
-                        tipo_programa=programa_data.get('tipo_programa', 'grado'),
-                        duracion_anos=programa_data.get('duracion_anos', 4),
-                        creditos_ects=programa_data.get('creditos_ects', 240),
-                        idioma=programa_data.get('idioma', 'español'),
-                        modalidad=programa_data.get('modalidad', 'presencial'),
-                        url_info=programa_data.get('url_info', ''),
-                        activo=True
-                    )
-                    db_session.add(nuevo_programa)
-                    total_programas_nuevos += 1
-            
-            # Actualizar timestamp
-            universidad.ultima_actualizacion = datetime.utcnow()
-            db_session.commit()
-            
+                # Mismo programa repetido en la página: se queda el primero
+                clave = (universidad.id, programa_data['nombre'])
+                if clave in filas:
+                    continue
+                filas[clave] = {
+                    'universidad_id': universidad.id,
+                    'nombre': programa_data['nombre'],
+                    'tipo_programa': programa_data.get('tipo_programa', 'grado'),
+                    'duracion_anos': programa_data.get('duracion_anos', 4),
+                    'creditos_ects': programa_data.get('creditos_ects', 240),
+                    'idioma': programa_data.get('idioma', 'español'),
+                    'modalidad': programa_data.get('modalidad', 'presencial'),
+                    'url_info': programa_data.get('url_info', ''),
+                    'activo': True
+                }
+            actualizadas.append(universidad)
             logger.info(f"✅ {universidad.nombre}: OK")
-            
-        except Exception as e:
-            logger.error(f"❌ Error actualizando {universidad.nombre}: {e}")
-            db_session.rollback()
+    
+    total_programas_nuevos = 0
+    try:
+        if filas:
+            # Los existentes solo refrescan url_info; xmax = 0 => fila insertada
+            stmt = insert(ProgramaUniversitario).values(list(filas.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['universidad_id', 'nombre'],
+                set_={
+                    'url_info': literal_column("COALESCE(NULLIF(EXCLUDED.url_info, ''), programas_universitarios.url_info)"),
+                    'updated_at': datetime.utcnow()
+                }
+            ).returning(literal_column('(xmax = 0)'))
+            total_programas_nuevos = sum(1 for (insertado,) in db_session.execute(stmt) if insertado)
+        
+        # Actualizar timestamp
+        ahora = datetime.utcnow()
+        for universidad in actualizadas:
+            universidad.ultima_actualizacion = ahora
+        db_session.commit()
+    except Exception as e:
+        logger.error(f"❌ Error guardando programas: {e}")
+        db_session.rollback()
+        raise
+    
+    # El buscador de programas debe ver los programas nuevos
+    from api.buscador_programas import invalidar_indice
+    invalidar_indice()
     
     logger.info(f"🎉 Actualización completa: {total_programas_nuevos} programas nuevos")
     return total_programas_nuevos
@@ -0,0 +1,288 @@
+"""
+Servicio de envío de correo con conexiones SMTP persistentes
+Todos los remitentes (email_utils, EmailService, notificaciones al admin y
+automáticas...) comparten un pool pequeño de conexiones ya autenticadas por
+cada servidor/usuario: el STARTTLS y el login se hacen una vez por conexión,
+no una vez por mensaje.
+
+- Una conexión que lleva tiempo sin usarse se comprueba con NOOP antes de
+  reutilizarla; si el servidor la cerró se abre otra y el envío se reintenta
+  una vez.
+- Cada conexión se renueva tras SMTP_MENSAJES_POR_CONEXION mensajes (Gmail
+  corta las sesiones largas).
+- encolar() deja el mensaje en una cola que un hilo vacía por lotes, cada
+  lote por una misma conexión.
+
+Para probar en local basta un servidor SMTP de pruebas sin TLS ni login
+(p.ej. `python -m aiosmtpd -n -l localhost:8025`) con SMTP_SERVER=localhost,
+SMTP_PORT=8025 y SMTP_STARTTLS=false.
+"""
+import atexit
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import Message
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+SMTP_POOL_TAMANO = int(os.getenv('SMTP_POOL_TAMANO', 2))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', 30))
+SMTP_MENSAJES_POR_CONEXION = int(os.getenv('SMTP_MENSAJES_POR_CONEXION', 100))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() != 'false'
+
+# Conexiones sin usar durante más de estos segundos se comprueban con NOOP
+SEGUNDOS_VERIFICAR_CONEXION = 30
+# Y las que llevan más de estos se cierran sin preguntar
+SEGUNDOS_MAX_INACTIVA = 300
+
+# Mensajes que el hilo de la cola envía por conexión antes de devolverla
+LOTE_COLA = 20
+
+
+class ConfigSMTP(NamedTuple):
+    servidor: str
+    puerto: int
+    usuario: Optional[str]
+    password: Optional[str]
+    starttls: bool = SMTP_STARTTLS
+
+
+class _Conexion:
+    __slots__ = ('smtp', 'enviados', 'ultimo_uso')
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.enviados = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class PoolSMTP:
+    """Conexiones autenticadas a un servidor/usuario (como mucho `tamano` a la vez)"""
+
+    def __init__(self, config: ConfigSMTP, tamano: int = SMTP_POOL_TAMANO):
+        self.config = config
+        self._libres: List[_Conexion] = []
+        self._lock = threading.Lock()
+        self._cupo = threading.BoundedSemaphore(tamano)
+        self.estadisticas = {'conexiones_abiertas': 0, 'enviados': 0, 'reconexiones': 0, 'errores': 0}
+
+    def _conectar(self) -> _Conexion:
+        c = self.config
+        if c.puerto == 465:
+            smtp = smtplib.SMTP_SSL(c.servidor, c.puerto, timeout=SMTP_TIMEOUT,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(c.servidor, c.puerto, timeout=SMTP_TIMEOUT)
+            if c.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+        try:
+            smtp.ehlo_or_helo_if_needed()
+            # Un servidor de pruebas local no ofrece AUTH: se envía sin login
+            if c.usuario and c.password and smtp.has_extn('auth'):
+                smtp.login(c.usuario, c.password)
+        except Exception:
+            _cerrar(smtp)
+            raise
+        self.estadisticas['conexiones_abiertas'] += 1
+        return _Conexion(smtp)
+
+    def _tomar(self) -> _Conexion:
+        """Conexión libre que siga viva, o una nueva"""
+        while True:
+            with self._lock:
+                conexion = self._libres.pop() if self._libres else None
+            if conexion is None:
+                return self._conectar()
+
+            inactiva = time.monotonic() - conexion.ultimo_uso
+            if inactiva > SEGUNDOS_MAX_INACTIVA or conexion.enviados >= SMTP_MENSAJES_POR_CONEXION:
+                _cerrar(conexion.smtp)
+                continue
+            if inactiva > SEGUNDOS_VERIFICAR_CONEXION:
+                try:
+                    if conexion.smtp.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected('NOOP rechazado')
+                except Exception:
+                    _cerrar(conexion.smtp)
+                    continue
+            return conexion
+
+    def _devolver(self, conexion: _Conexion):
+        conexion.ultimo_uso = time.monotonic()
+        with self._lock:
+            self._libres.append(conexion)
+
+    def enviar(self, mensaje: Message):
+        """Envía un mensaje (lanza la excepción de smtplib si falla)"""
+        self.enviar_lote([mensaje], lanzar=True)
+
+    def enviar_lote(self, mensajes: List[Message], lanzar: bool = False) -> List[Tuple[Message, Optional[Exception]]]:
+        """
+        Envía varios mensajes por la misma conexión. Devuelve [(mensaje,
+        error o None)]; un destinatario rechazado no detiene el resto.
+        """
+        resultados = []
+        with self._cupo:
+            conexion = None
+            try:
+                for mensaje in mensajes:
+                    try:
+                        if conexion is None:
+                            conexion = self._tomar()
+                        try:
+                            conexion.smtp.send_message(mensaje)
+                        except Exception as e:
+                            if not _error_de_conexion(e):
+                                raise
+                            # El servidor cerró la sesión: reconectar y reintentar una vez
+                            _cerrar(conexion.smtp)
+                            conexion = None
+                            self.estadisticas['reconexiones'] += 1
+                            conexion = self._conectar()
+                            conexion.smtp.send_message(mensaje)
+                        conexion.enviados += 1
+                        self.estadisticas['enviados'] += 1
+                        resultados.append((mensaje, None))
+                    except Exception as e:
+                        self.estadisticas['errores'] += 1
+                        if _error_de_conexion(e) and conexion is not None:
+                            # Ni reconectando: descartar y probar con otra en el siguiente
+                            _cerrar(conexion.smtp)
+                            conexion = None
+                        if lanzar:
+                            raise
+                        resultados.append((mensaje, e))
+            finally:
+                if conexion is not None:
+                    self._devolver(conexion)
+        return resultados
+
+    def cerrar(self):
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for conexion in libres:
+            _cerrar(conexion.smtp, educado=True)
+
+
+def _error_de_conexion(error: Exception) -> bool:
+    """
+    Errores tras los que la conexión ya no sirve (reconectar y reintentar).
+    Los rechazos del servidor (destinatario inválido, mensaje rechazado...)
+    no: reintentarlos daría lo mismo. Ojo: SMTPException hereda de OSError.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # el servidor cierra la sesión
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def _cerrar(smtp: smtplib.SMTP, educado: bool = False):
+    try:
+        if educado:
+            smtp.quit()
+        else:
+            smtp.close()
+    except Exception:
+        pass
+
+
+_pools: Dict[ConfigSMTP, PoolSMTP] = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(config: ConfigSMTP) -> PoolSMTP:
+    with _pools_lock:
+        pool = _pools.get(config)
+        if pool is None:
+            pool = _pools[config] = PoolSMTP(config)
+        return pool
+
+
+def enviar(mensaje: Message, config: ConfigSMTP):
+    """Envía por el pool de esa configuración (lanza excepción si falla)"""
+    obtener_pool(config).enviar(mensaje)
+
+
+def enviar_lote(mensajes: List[Message], config: ConfigSMTP) -> List[Tuple[Message, Optional[Exception]]]:
+    return obtener_pool(config).enviar_lote(mensajes)
+
+
+# ----------------------------------------------------------------------------
+# Cola de envío en segundo plano
+# ----------------------------------------------------------------------------
+
+_cola: "queue.Queue[Tuple[ConfigSMTP, Message]]" = queue.Queue()
+_hilo_cola: Optional[threading.Thread] = None
+_hilo_lock = threading.Lock()
+
+
+def encolar(mensaje: Message, config: ConfigSMTP):
+    """Envía en segundo plano: no espera al servidor SMTP"""
+    global _hilo_cola
+    _cola.put((config, mensaje))
+    with _hilo_lock:
+        if _hilo_cola is None or not _hilo_cola.is_alive():
+            _hilo_cola = threading.Thread(target=_procesar_cola, name='smtp-cola', daemon=True)
+            _hilo_cola.start()
+
+
+def _procesar_cola():
+    while True:
+        lote = [_cola.get()]
+        # Lo que ya esté esperando sale en el mismo lote
+        while len(lote) < LOTE_COLA:
+            try:
+                lote.append(_cola.get_nowait())
+            except queue.Empty:
+                break
+
+        por_config: Dict[ConfigSMTP, List[Message]] = {}
+        for config, mensaje in lote:
+            por_config.setdefault(config, []).append(mensaje)
+
+        for config, mensajes in por_config.items():
+            try:
+                for mensaje, error in obtener_pool(config).enviar_lote(mensajes):
+                    if error:
+                        print(f"❌ Error enviando email a {mensaje['To']}: {error}")
+                    else:
+                        print(f"✅ Email enviado a {mensaje['To']}: {mensaje['Subject']}")
+            except Exception as e:
+                print(f"❌ Error en la cola de emails: {e}")
+        for _ in lote:
+            _cola.task_done()
+
+
+def vaciar_cola(timeout: float = 30):
+    """Espera (como mucho `timeout` s) a que la cola quede vacía"""
+    limite = time.monotonic() + timeout
+    while _cola.unfinished_tasks and time.monotonic() < limite:
+        time.sleep(0.05)
+
+
+def estadisticas() -> Dict:
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {
+        'en_cola': _cola.qsize(),
+        'pools': [
+            {'servidor': f"{config.servidor}:{config.puerto}", 'usuario': config.usuario, **pool.estadisticas}
+            for config, pool in pools
+        ]
+    }
+
+
+def _cerrar_todo():
+    vaciar_cola(timeout=10)
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.cerrar()
+
+
+atexit.register(_cerrar_todo)
@@ -0,0 +1,134 @@
+"""
+Trabajos en segundo plano
+Para tareas largas que no deben bloquear la petición HTTP: el endpoint crea
+el trabajo, responde al momento con su id y el cliente consulta el estado.
+Los trabajos viven en memoria del proceso (el servidor corre un solo
+proceso uvicorn); se guardan los últimos MAX_TRABAJOS.
+"""
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+MAX_TRABAJOS = 100
+
+
+class Trabajo:
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+
+    def __init__(self, tipo: str):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.estado = self.PENDIENTE
+        self.progreso: Dict = {}
+        self.resultado = None
+        self.error: Optional[str] = None
+        self.creado = datetime.now()
+        self.iniciado: Optional[datetime] = None
+        self.terminado: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def actualizar(self, **datos):
+        """Actualiza el progreso (lo llama la propia tarea mientras corre)"""
+        with self._lock:
+            self.progreso.update(datos)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'id': self.id,
+                'tipo': self.tipo,
+                'estado': self.estado,
+                'progreso': dict(self.progreso),
+                'resultado': self.resultado,
+                'error': self.error,
+                'creado': self.creado.isoformat(),
+                'iniciado': self.iniciado.isoformat() if self.iniciado else None,
+                'terminado': self.terminado.isoformat() if self.terminado else None
+            }
+
+
+class GestorTrabajos:
+    """Ejecuta tareas en un pool de hilos y guarda su estado"""
+
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trabajo')
+        self._trabajos: Dict[str, Trabajo] = {}
+        self._lock = threading.Lock()
+
+    def crear(self, tipo: str, funcion: Callable, *args, **kwargs) -> Trabajo:
+        """
+        Encola funcion(trabajo, *args, **kwargs); lo que devuelva queda en
+        trabajo.resultado.
+        """
+        trabajo = Trabajo(tipo)
+        with self._lock:
+            self._registrar(trabajo)
+
+        self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        return trabajo
+
+    def obtener_o_crear(self, tipo: str, funcion: Callable, *args, **kwargs) -> Trabajo:
+        """
+        Como crear(), pero si ya hay un trabajo de ese tipo pendiente o
+        corriendo devuelve ese. La comprobación y el alta van bajo el mismo
+        lock: dos peticiones simultáneas no lanzan dos trabajos.
+        """
+        with self._lock:
+            trabajo = self._buscar_en_curso(tipo)
+            if trabajo is not None:
+                return trabajo
+            trabajo = Trabajo(tipo)
+            self._registrar(trabajo)
+
+        self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        return trabajo
+
+    def _registrar(self, trabajo: Trabajo):
+        """Con self._lock tomado"""
+        self._trabajos[trabajo.id] = trabajo
+        # Olvidar los más antiguos ya terminados
+        if len(self._trabajos) > MAX_TRABAJOS:
+            for antiguo in sorted(self._trabajos.values(), key=lambda t: t.creado):
+                if len(self._trabajos) <= MAX_TRABAJOS:
+                    break
+                if antiguo.estado in (Trabajo.COMPLETADO, Trabajo.ERROR):
+                    del self._trabajos[antiguo.id]
+
+    def _ejecutar(self, trabajo: Trabajo, funcion: Callable, args, kwargs):
+        trabajo.estado = Trabajo.EN_CURSO
+        trabajo.iniciado = datetime.now()
+        try:
+            trabajo.resultado = funcion(trabajo, *args, **kwargs)
+            trabajo.estado = Trabajo.COMPLETADO
+        except Exception as e:
+            print(f"❌ Error en trabajo {trabajo.tipo} {trabajo.id}: {e}")
+            traceback.print_exc()
+            trabajo.error = str(e)
+            trabajo.estado = Trabajo.ERROR
+        finally:
+            trabajo.terminado = datetime.now()
+
+    def obtener(self, trabajo_id: str) -> Optional[Trabajo]:
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+    def en_curso(self, tipo: str) -> Optional[Trabajo]:
+        """Trabajo de ese tipo aún pendiente o corriendo (para no duplicarlo)"""
+        with self._lock:
+            return self._buscar_en_curso(tipo)
+
+    def _buscar_en_curso(self, tipo: str) -> Optional[Trabajo]:
+        """Con self._lock tomado"""
+        for trabajo in self._trabajos.values():
+            if trabajo.tipo == tipo and trabajo.estado in (Trabajo.PENDIENTE, Trabajo.EN_CURSO):
+                return trabajo
+        return None
+
+
+gestor_trabajos = GestorTrabajos()
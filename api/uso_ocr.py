@@ -0,0 +1,206 @@
+"""
+Contador de uso de OCR.space (cuota mensual compartida)
+El uso se cuenta en la tabla `ocr_uso` con un bucket por mes ('2025-01') y
+otro por día ('2025-01-15'), compartida por todos los workers.
+
+La cuota se respeta ANTES de enviar cada petición: cada proceso reserva
+cupo en la BD por lotes de OCR_USO_LOTE peticiones con un UPDATE atómico
+que nunca pasa del límite, y lo va gastando en memoria. Así no hay una
+escritura por petición ni se pierden incrementos entre workers. El cupo
+reservado y no usado se devuelve al cerrar el proceso.
+Los buckets diarios (solo informativos) se vuelcan también por lotes.
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from database.models import get_connection
+
+OCR_LIMITE_MENSUAL = int(os.getenv('OCR_LIMITE_MENSUAL', 25000))
+OCR_USO_LOTE = int(os.getenv('OCR_USO_LOTE', 5))
+
+# Volcado de los buckets diarios como mucho cada estos segundos
+VOLCADO_DIARIO_SEGUNDOS = 60
+
+
+class MedidorOCR:
+    """Reserva y cuenta peticiones a OCR.space en este proceso"""
+
+    def __init__(self, limite_mensual: int = OCR_LIMITE_MENSUAL, lote: int = OCR_USO_LOTE):
+        self.limite_mensual = limite_mensual
+        self.lote = lote
+        self._lock = threading.Lock()
+        self._mes: Optional[str] = None
+        self._disponibles = 0          # cupo reservado en BD aún sin usar
+        self._usos_mes_bd = 0          # valor del bucket tras la última reserva
+        self._dias_pendientes: Dict[str, int] = {}
+        self._ultimo_volcado = time.monotonic()
+
+    def reservar(self) -> bool:
+        """
+        Consume una petición de la cuota. False si el mes ya está agotado
+        (entonces no debe enviarse la petición).
+        """
+        ahora = datetime.now()
+        mes = ahora.strftime('%Y-%m')
+        with self._lock:
+            if mes != self._mes:
+                # Cambio de mes: el cupo del mes anterior ya no sirve
+                self._devolver_cupo()
+                self._mes = mes
+                self._disponibles = 0
+
+            if self._disponibles == 0:
+                concedidas, self._usos_mes_bd = self._reservar_en_bd(mes, self.lote)
+                self._disponibles = concedidas
+                if concedidas == 0:
+                    return False
+
+            self._disponibles -= 1
+            dia = ahora.strftime('%Y-%m-%d')
+            self._dias_pendientes[dia] = self._dias_pendientes.get(dia, 0) + 1
+            if (sum(self._dias_pendientes.values()) >= self.lote
+                    or time.monotonic() - self._ultimo_volcado > VOLCADO_DIARIO_SEGUNDOS):
+                self._volcar_dias()
+            return True
+
+    def _reservar_en_bd(self, mes: str, cantidad: int):
+        """UPDATE atómico: concede hasta `cantidad` sin pasar del límite"""
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO ocr_uso (periodo, tipo, usos)
+                VALUES (%s, 'mes', 0)
+                ON CONFLICT (periodo) DO NOTHING
+            """, (mes,))
+            cursor.execute("""
+                WITH antes AS (
+                    SELECT usos FROM ocr_uso WHERE periodo = %(mes)s FOR UPDATE
+                )
+                UPDATE ocr_uso o
+                SET usos = LEAST(antes.usos + %(cantidad)s, %(limite)s),
+                    actualizado_en = NOW()
+                FROM antes
+                WHERE o.periodo = %(mes)s
+                RETURNING o.usos - antes.usos, o.usos
+            """, {'mes': mes, 'cantidad': cantidad, 'limite': self.limite_mensual})
+            concedidas, usos = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+            return max(concedidas, 0), usos
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _volcar_dias(self):
+        if not self._dias_pendientes:
+            return
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            for dia, usos in self._dias_pendientes.items():
+                cursor.execute("""
+                    INSERT INTO ocr_uso (periodo, tipo, usos)
+                    VALUES (%s, 'dia', %s)
+                    ON CONFLICT (periodo)
+                    DO UPDATE SET usos = ocr_uso.usos + EXCLUDED.usos, actualizado_en = NOW()
+                """, (dia, usos))
+            conn.commit()
+            cursor.close()
+            self._dias_pendientes = {}
+            self._ultimo_volcado = time.monotonic()
+        except Exception as e:
+            # Se reintenta en el próximo volcado (son solo estadísticas)
+            conn.rollback()
+            print(f"⚠️ No se pudo volcar el uso diario de OCR: {e}")
+        finally:
+            conn.close()
+
+    def _devolver_cupo(self):
+        if not self._mes or self._disponibles == 0:
+            return
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE ocr_uso
+                SET usos = GREATEST(usos - %s, 0), actualizado_en = NOW()
+                WHERE periodo = %s
+            """, (self._disponibles, self._mes))
+            conn.commit()
+            cursor.close()
+            self._disponibles = 0
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ No se pudo devolver el cupo OCR reservado: {e}")
+        finally:
+            conn.close()
+
+    def cerrar(self):
+        """Vuelca los días pendientes y devuelve el cupo no usado"""
+        with self._lock:
+            try:
+                self._volcar_dias()
+                self._devolver_cupo()
+            except Exception as e:
+                print(f"⚠️ Error cerrando el contador OCR: {e}")
+
+    def alerta(self) -> Optional[str]:
+        """Alerta según el último valor conocido (sin consultar la BD)"""
+        return _alerta((self._usos_mes_bd / self.limite_mensual) * 100)
+
+    def uso(self, dias: int = 30) -> Dict:
+        """Uso del mes en curso (incluye cupo reservado por los workers) y por día"""
+        with self._lock:
+            self._volcar_dias()
+        mes = datetime.now().strftime('%Y-%m')
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT usos FROM ocr_uso WHERE periodo = %s", (mes,))
+            fila = cursor.fetchone()
+            cursor.execute("""
+                SELECT periodo, usos FROM ocr_uso
+                WHERE tipo = 'dia'
+                ORDER BY periodo DESC
+                LIMIT %s
+            """, (dias,))
+            por_dia = [{'dia': periodo, 'usos': usos} for periodo, usos in cursor.fetchall()]
+            cursor.close()
+        finally:
+            conn.close()
+
+        usos = fila[0] if fila else 0
+        porcentaje_usado = (usos / self.limite_mensual) * 100
+        return {
+            'mes': mes,
+            'usos': usos,
+            'limite': self.limite_mensual,
+            'restante': max(self.limite_mensual - usos, 0),
+            'porcentaje': round(porcentaje_usado, 2),
+            'alerta': _alerta(porcentaje_usado),
+            'reservados_sin_usar': self._disponibles,
+            'por_dia': por_dia
+        }
+
+
+def _alerta(porcentaje_usado: float) -> Optional[str]:
+    if porcentaje_usado >= 100:
+        return "CRÍTICO: límite OCR mensual agotado"
+    if porcentaje_usado >= 90:
+        return "CRÍTICO: 90% del límite OCR alcanzado"
+    if porcentaje_usado >= 75:
+        return "ADVERTENCIA: 75% del límite OCR alcanzado"
+    if porcentaje_usado >= 50:
+        return "AVISO: 50% del límite OCR alcanzado"
+    return None
+
+
+medidor_ocr = MedidorOCR()
+atexit.register(medidor_ocr.cerrar)
@@ -5,13 +5,18 @@ USA OCR.space API (25,000 requests/mes gratis) - Sin instalación de Tesseract
 """
 
 import requests
-from PIL import Image
-import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import json
 import os
 
+from api.extractor_documentos import CamposDocumento, extraer_campos, parsear_fecha
+
+# Tiempo máximo de cada petición a OCR.space (conexión, respuesta). Es lo que
+# acota lo que tarda un documento: el hilo que lo procesa siempre vuelve.
+OCR_TIMEOUT_CONEXION = float(os.getenv('OCR_TIMEOUT_CONEXION', 10))
+OCR_TIMEOUT_PETICION = float(os.getenv('OCR_TIMEOUT_PETICION', 60))
+
 
 class ValidadorOCR:
     """
@@ -19,18 +24,6 @@ class ValidadorOCR:
     Extrae datos clave y valida según tipo de documento
     """
     
-    # Patrones regex para diferentes tipos de datos
-    PATRONES = {
-        'pasaporte_numero': r'[A-Z]{1,3}\d{6,9}',
-        'dni_numero': r'\d{8}[A-Z]',
-        'fecha_ddmmyyyy': r'\d{2}[/-]\d{2}[/-]\d{4}',
-        'fecha_yyyymmdd': r'\d{4}[/-]\d{2}[/-]\d{2}',
-        'monto_euros': r'€?\s*\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?',
-        'monto_dolares': r'\$\s*\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?',
-        'email': r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
-        'iban': r'ES\d{2}\s?\d{4}\s?\d{4}\s?\d{4}\s?\d{4}\s?\d{4}',
-    }
-    
     # Palabras clave por tipo de documento
     PALABRAS_CLAVE = {
         'pasaporte': ['passport', 'pasaporte', 'surname', 'apellidos', 'given names', 'nationality'],
@@ -40,6 +33,10 @@ class ValidadorOCR:
         'certificado_idioma': ['certificate', 'certificado', 'nivel', 'level', 'a1', 'a2', 'b1', 'b2', 'c1', 'c2']
     }
     
+    # Clave de la caché de resultados (cambiar si cambian motor o idioma)
+    MOTOR_OCR = 'ocrspace-engine2'
+    IDIOMA_OCR = 'spa'
+    
     def __init__(self):
         """Inicializa el validador OCR"""
         self.resultados = {}
@@ -48,9 +45,7 @@ class ValidadorOCR:
         # API Key de OCR.space (gratis: 25,000 requests/mes)
         # Registrarse en: https://ocr.space/ocrapi
         self.ocr_api_key = os.getenv('OCR_SPACE_API_KEY', 'K81993791988957')  # Free tier key
-        self.contador_usos = 0  # Contador de requests este mes
-        self.limite_mensual = 25000  # Límite gratuito OCR.space
-        self._cargar_contador_uso()
+        # El uso se cuenta en api.uso_ocr (compartido entre workers)
     
     def procesar_documento(self, ruta_archivo: str, tipo_documento: str) -> Dict:
         """
@@ -64,25 +59,25 @@ class ValidadorOCR:
             Dict con datos extraídos, validación y alertas
         """
         try:
-            # Validar imagen
-            ruta_validada = self._preprocesar_imagen(ruta_archivo)
+            # Extraer texto con OCR.space API (preprocesando antes la imagen)
+            texto = self._extraer_texto(ruta_archivo)
             
-            # Extraer texto con OCR.space API
-            texto = self._extraer_texto(ruta_validada)
+            # Una sola pasada sobre el texto para todos los campos
+            campos = extraer_campos(texto)
             
             # Validar según tipo de documento
             if tipo_documento == 'pasaporte':
-                validacion = self._validar_pasaporte(texto)
+                validacion = self._validar_pasaporte(campos)
             elif tipo_documento == 'dni':
-                validacion = self._validar_dni(texto)
+                validacion = self._validar_dni(campos)
             elif tipo_documento == 'extracto_bancario':
-                validacion = self._validar_extracto_bancario(texto)
+                validacion = self._validar_extracto_bancario(campos)
             elif tipo_documento == 'carta_admision':
-                validacion = self._validar_carta_admision(texto)
+                validacion = self._validar_carta_admision(campos)
             elif tipo_documento == 'certificado_idioma':
-                validacion = self._validar_certificado_idioma(texto)
+                validacion = self._validar_certificado_idioma(campos)
             else:
-                validacion = self._validacion_generica(texto, tipo_documento)
+                validacion = self._validacion_generica(campos, tipo_documento)
             
             return {
                 'exito': True,
@@ -102,74 +97,90 @@ class ValidadorOCR:
                 'tipo_documento': tipo_documento
             }
     
-    def _preprocesar_imagen(self, ruta_archivo: str) -> str:
+    def _preprocesar_imagen(self, ruta_archivo: str, contenido: bytes) -> List[Tuple[str, bytes]]:
         """
-        Verifica y prepara imagen para OCR
-        Retorna la ruta del archivo (ya no procesamos localmente)
+        Prepara el documento para OCR: orientación, escala de grises,
+        resolución reducida y JPEG recomprimido; los PDF, una página por
+        entrada. Retorna [(nombre, bytes), ...]
         """
-        if not os.path.exists(ruta_archivo):
-            raise ValueError("Archivo no encontrado")
+        from api.preprocesado_ocr import preparar_documento
         
-        # Verificar que es una imagen válida
-        try:
-            img = Image.open(ruta_archivo)
-            img.verify()
-            return ruta_archivo
-        except Exception as e:
-            raise ValueError(f"Archivo no es una imagen válida: {e}")
+        paginas = preparar_documento(contenido, os.path.basename(ruta_archivo))
+        print(f"🖼️ OCR: {len(contenido) // 1024}KB -> {sum(len(d) for _, d in paginas) // 1024}KB "
+              f"en {len(paginas)} página(s)")
+        return paginas
     
     def _extraer_texto(self, ruta_archivo: str) -> str:
         """
         Extrae texto de imagen usando OCR.space API
         API gratuita: 25,000 requests/mes
         """
+        from api import cache_ocr
+        
+        if not os.path.exists(ruta_archivo):
+            raise ValueError("Archivo no encontrado")
+        
         try:
-            # Verificar límite de uso
-            verificacion = self.verificar_limite_uso()
-            if verificacion['alerta'] and 'CRÍTICO' in verificacion['alerta']:
-                print(f"🚨 {verificacion['alerta']} ({verificacion['restante']} requests restantes)")
-            elif verificacion['alerta']:
-                print(f"⚠️ {verificacion['alerta']} ({verificacion['restante']} requests restantes)")
-            
-            # Preparar request a OCR.space
             with open(ruta_archivo, 'rb') as f:
-                response = requests.post(
-                    'https://api.ocr.space/parse/image',
-                    files={'file': f},
-                    data={
-                        'apikey': self.ocr_api_key,
-                        'language': 'spa',  # Español
-                        'isOverlayRequired': False,
-                        'detectOrientation': True,
-                        'scale': True,
-                        'OCREngine': 2  # Engine 2 es mejor para documentos
-                    },
-                    timeout=30
-                )
+                contenido = f.read()
             
-            result = response.json()
+            # Mismo archivo ya procesado: no se llama a la API ni se gasta cuota
+            sha256 = cache_ocr.hash_contenido(contenido)
+            texto = cache_ocr.obtener(sha256, self.MOTOR_OCR, self.IDIOMA_OCR)
+            if texto is not None:
+                return texto
             
-            if result.get('IsErroredOnProcessing'):
-                raise Exception(f"Error en OCR: {result.get('ErrorMessage', 'Unknown error')}")
+            paginas = self._preprocesar_imagen(ruta_archivo, contenido)
+            texto = '\n'.join(self._ocr_pagina(nombre, datos) for nombre, datos in paginas).strip()
+            
+            cache_ocr.guardar(sha256, self.MOTOR_OCR, self.IDIOMA_OCR, texto)
+            return texto
             
-            # Extraer texto parseado
-            if result.get('ParsedResults'):
-                texto = result['ParsedResults'][0].get('ParsedText', '')
-                
-                # Incrementar contador y guardar
-                self.contador_usos += 1
-                self._guardar_contador_uso()
-                
-                return texto.strip()
-            else:
-                raise Exception("No se pudo extraer texto del documento")
-                
         except requests.exceptions.Timeout:
             raise Exception("Timeout al procesar OCR - intente de nuevo")
         except Exception as e:
             raise Exception(f"Error al extraer texto: {str(e)}")
     
-    def _validar_pasaporte(self, texto: str) -> Dict:
+    def _ocr_pagina(self, nombre: str, datos: bytes) -> str:
+        """Envía una página a OCR.space (una petición de la cuota)"""
+        from api.uso_ocr import medidor_ocr
+        
+        # Reservar la petición en la cuota ANTES de enviarla
+        if not medidor_ocr.reservar():
+            raise Exception(f"Límite mensual de OCR alcanzado ({medidor_ocr.limite_mensual} requests)")
+        alerta = medidor_ocr.alerta()
+        if alerta and 'CRÍTICO' in alerta:
+            print(f"🚨 {alerta}")
+        elif alerta:
+            print(f"⚠️ {alerta}")
+        
+        # Preparar request a OCR.space
+        response = requests.post(
+            'https://api.ocr.space/parse/image',
+            files={'file': (nombre, datos)},
+            data={
+                'apikey': self.ocr_api_key,
+                'language': self.IDIOMA_OCR,  # Español
+                'isOverlayRequired': False,
+                'detectOrientation': True,
+                'scale': True,
+                'OCREngine': 2  # Engine 2 es mejor para documentos
+            },
+            timeout=(OCR_TIMEOUT_CONEXION, OCR_TIMEOUT_PETICION)
+        )
+        
+        result = response.json()
+        
+        if result.get('IsErroredOnProcessing'):
+            raise Exception(f"Error en OCR: {result.get('ErrorMessage', 'Unknown error')}")
+        
+        # Extraer texto parseado
+        if result.get('ParsedResults'):
+            return result['ParsedResults'][0].get('ParsedText', '').strip()
+        else:
+            raise Exception("No se pudo extraer texto del documento")
+    
+    def _validar_pasaporte(self, campos: CamposDocumento) -> Dict:
         """
         Valida pasaporte:
         - Número de pasaporte
@@ -182,9 +193,15 @@ class ValidadorOCR:
         datos = {}
         validacion = {}
         
+        # MRZ con dígitos de control: sus datos son más fiables que el texto libre
+        mrz = campos.mrz
+        
         # Detectar número de pasaporte
-        numeros_pasaporte = re.findall(self.PATRONES['pasaporte_numero'], texto)
-        if numeros_pasaporte:
+        numeros_pasaporte = campos.pasaportes
+        if mrz and mrz['controles']['numero_documento']:
+            datos['numero_pasaporte'] = mrz['numero_documento']
+            validacion['numero_pasaporte'] = True
+        elif numeros_pasaporte:
             datos['numero_pasaporte'] = numeros_pasaporte[0]
             validacion['numero_pasaporte'] = True
         else:
@@ -192,16 +209,17 @@ class ValidadorOCR:
             self.alertas.append("No se detectó número de pasaporte")
         
         # Detectar fechas
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
-        fechas += re.findall(self.PATRONES['fecha_yyyymmdd'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
+        expiracion_mrz = mrz['fecha_expiracion'] if mrz and mrz['controles']['fecha_expiracion'] else None
         
-        if len(fechas) >= 2:
-            datos['fecha_emision'] = fechas[0]
-            datos['fecha_expiracion'] = fechas[1]
+        if len(fechas) >= 2 or expiracion_mrz:
+            if len(fechas) >= 2:
+                datos['fecha_emision'] = fechas[0]
+            datos['fecha_expiracion'] = expiracion_mrz or fechas[1]
             
             # Validar vigencia (debe vencer en más de 6 meses)
             try:
-                fecha_exp = self._parsear_fecha(fechas[1])
+                fecha_exp = self._parsear_fecha(datos['fecha_expiracion'])
                 hoy = datetime.now()
                 dias_restantes = (fecha_exp - hoy).days
                 
@@ -222,23 +240,22 @@ class ValidadorOCR:
             self.alertas.append("No se detectaron fechas de emisión/expiración")
         
         # Buscar palabras clave de pasaporte
-        texto_lower = texto.lower()
-        palabras_encontradas = sum(1 for palabra in self.PALABRAS_CLAVE['pasaporte'] 
-                                   if palabra in texto_lower)
+        palabras_encontradas = campos.contar_palabras(self.PALABRAS_CLAVE['pasaporte'])
         
-        if palabras_encontradas >= 3:
+        if palabras_encontradas >= 3 or (mrz and mrz['valido']):
             validacion['formato'] = True
         else:
             validacion['formato'] = False
             self.alertas.append("Formato no parece ser un pasaporte válido")
         
-        # Intentar extraer MRZ (últimas 2 líneas del pasaporte)
-        lineas = texto.split('\n')
-        posibles_mrz = [l for l in lineas[-5:] if len(l) > 30 and all(c.isupper() or c.isdigit() or c == '<' for c in l.replace(' ', ''))]
-        
-        if posibles_mrz:
+        # MRZ (Machine Readable Zone) con sus dígitos de control
+        if mrz:
             datos['mrz_detectado'] = True
-            validacion['mrz'] = True
+            datos['mrz'] = {k: mrz[k] for k in ('apellidos', 'nombres', 'nacionalidad', 'fecha_nacimiento', 'sexo')}
+            validacion['mrz'] = mrz['valido']
+            if not mrz['valido']:
+                fallidos = [campo for campo, ok in mrz['controles'].items() if not ok]
+                self.alertas.append(f"⚠️ MRZ con dígitos de control incorrectos ({', '.join(fallidos)})")
         else:
             validacion['mrz'] = False
             self.alertas.append("No se detectó zona MRZ (Machine Readable Zone)")
@@ -253,7 +270,7 @@ class ValidadorOCR:
             'validacion': validacion
         }
     
-    def _validar_dni(self, texto: str) -> Dict:
+    def _validar_dni(self, campos: CamposDocumento) -> Dict:
         """
         Valida DNI/NIE:
         - Número de documento
@@ -266,7 +283,7 @@ class ValidadorOCR:
         validacion = {}
         
         # Detectar número DNI
-        numeros_dni = re.findall(self.PATRONES['dni_numero'], texto)
+        numeros_dni = campos.dnis
         if numeros_dni:
             datos['numero_dni'] = numeros_dni[0]
             validacion['numero_dni'] = True
@@ -283,15 +300,13 @@ class ValidadorOCR:
             self.alertas.append("No se detectó número de DNI")
         
         # Detectar fechas
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if len(fechas) >= 1:
             datos['fecha_nacimiento'] = fechas[0]
             validacion['fecha_nacimiento'] = True
         
         # Buscar palabras clave DNI
-        texto_lower = texto.lower()
-        palabras_encontradas = sum(1 for palabra in self.PALABRAS_CLAVE['dni'] 
-                                   if palabra in texto_lower)
+        palabras_encontradas = campos.contar_palabras(self.PALABRAS_CLAVE['dni'])
         
         if palabras_encontradas >= 2:
             validacion['formato'] = True
@@ -309,7 +324,7 @@ class ValidadorOCR:
             'validacion': validacion
         }
     
-    def _validar_extracto_bancario(self, texto: str) -> Dict:
+    def _validar_extracto_bancario(self, campos: CamposDocumento) -> Dict:
         """
         Valida extracto bancario:
         - Saldo disponible
@@ -322,19 +337,11 @@ class ValidadorOCR:
         datos = {}
         validacion = {}
         
-        # Detectar montos
-        montos_euros = re.findall(self.PATRONES['monto_euros'], texto)
-        montos_dolares = re.findall(self.PATRONES['monto_dolares'], texto)
+        # Detectar montos (en euros o sin divisa)
+        montos_euros = [valor for _, valor, divisa in campos.montos if divisa in (None, '€', 'EUR')]
         
         if montos_euros:
-            # Convertir a float
-            montos_numericos = []
-            for monto in montos_euros:
-                try:
-                    valor = float(monto.replace('€', '').replace(',', '.').replace(' ', ''))
-                    montos_numericos.append(valor)
-                except:
-                    pass
+            montos_numericos = montos_euros
             
             if montos_numericos:
                 saldo_max = max(montos_numericos)
@@ -354,7 +361,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó saldo en el extracto")
         
         # Detectar IBAN
-        ibans = re.findall(self.PATRONES['iban'], texto)
+        ibans = campos.ibans
         if ibans:
             datos['iban'] = ibans[0]
             validacion['iban'] = True
@@ -363,7 +370,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó IBAN")
         
         # Detectar fecha del extracto
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if fechas:
             datos['fecha_extracto'] = fechas[0]
             validacion['fecha'] = True
@@ -387,9 +394,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó fecha del extracto")
         
         # Buscar palabras clave bancarias
-        texto_lower = texto.lower()
-        palabras_encontradas = sum(1 for palabra in self.PALABRAS_CLAVE['extracto_bancario'] 
-                                   if palabra in texto_lower)
+        palabras_encontradas = campos.contar_palabras(self.PALABRAS_CLAVE['extracto_bancario'])
         
         if palabras_encontradas >= 2:
             validacion['formato'] = True
@@ -407,7 +412,7 @@ class ValidadorOCR:
             'validacion': validacion
         }
     
-    def _validar_carta_admision(self, texto: str) -> Dict:
+    def _validar_carta_admision(self, campos: CamposDocumento) -> Dict:
         """
         Valida carta de admisión:
         - Nombre de universidad
@@ -421,9 +426,8 @@ class ValidadorOCR:
         validacion = {}
         
         # Buscar palabras clave de admisión
-        texto_lower = texto.lower()
-        palabras_encontradas = sum(1 for palabra in self.PALABRAS_CLAVE['carta_admision'] 
-                                   if palabra in texto_lower)
+        texto_lower = campos.texto_lower
+        palabras_encontradas = campos.contar_palabras(self.PALABRAS_CLAVE['carta_admision'])
         
         if palabras_encontradas >= 3:
             validacion['formato'] = True
@@ -432,8 +436,7 @@ class ValidadorOCR:
             self.alertas.append("Formato no parece ser una carta de admisión válida")
         
         # Detectar fechas
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
-        fechas += re.findall(self.PATRONES['fecha_yyyymmdd'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         
         if fechas:
             datos['fecha_inicio'] = fechas[0]
@@ -456,7 +459,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó fecha de inicio del curso")
         
         # Detectar email de contacto
-        emails = re.findall(self.PATRONES['email'], texto)
+        emails = campos.emails
         if emails:
             datos['email_contacto'] = emails[0]
             validacion['contacto'] = True
@@ -489,7 +492,7 @@ class ValidadorOCR:
             'validacion': validacion
         }
     
-    def _validar_certificado_idioma(self, texto: str) -> Dict:
+    def _validar_certificado_idioma(self, campos: CamposDocumento) -> Dict:
         """
         Valida certificado de idioma:
         - Nivel (A1, A2, B1, B2, C1, C2)
@@ -502,7 +505,7 @@ class ValidadorOCR:
         validacion = {}
         
         # Detectar nivel de idioma
-        texto_upper = texto.upper()
+        texto_upper = campos.texto.upper()
         niveles = ['C2', 'C1', 'B2', 'B1', 'A2', 'A1']
         nivel_detectado = None
         
@@ -519,7 +522,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó nivel de idioma (A1-C2)")
         
         # Detectar fechas
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if fechas:
             datos['fecha_emision'] = fechas[0]
             validacion['fecha'] = True
@@ -528,9 +531,7 @@ class ValidadorOCR:
             self.alertas.append("No se detectó fecha de emisión")
         
         # Buscar palabras clave de certificado
-        texto_lower = texto.lower()
-        palabras_encontradas = sum(1 for palabra in self.PALABRAS_CLAVE['certificado_idioma'] 
-                                   if palabra in texto_lower)
+        palabras_encontradas = campos.contar_palabras(self.PALABRAS_CLAVE['certificado_idioma'])
         
         if palabras_encontradas >= 2:
             validacion['formato'] = True
@@ -548,26 +549,26 @@ class ValidadorOCR:
             'validacion': validacion
         }
     
-    def _validacion_generica(self, texto: str, tipo_documento: str) -> Dict:
+    def _validacion_generica(self, campos: CamposDocumento, tipo_documento: str) -> Dict:
         """Validación genérica para documentos no específicos"""
         self.alertas = []
         datos = {}
         validacion = {}
         
         # Detectar fechas
-        fechas = re.findall(self.PATRONES['fecha_ddmmyyyy'], texto)
+        fechas = [fecha for fecha, _ in campos.fechas]
         if fechas:
             datos['fechas_detectadas'] = fechas
             validacion['fechas'] = True
         
         # Detectar emails
-        emails = re.findall(self.PATRONES['email'], texto)
+        emails = campos.emails
         if emails:
             datos['emails'] = emails
             validacion['contacto'] = True
         
         # Validar que tiene contenido
-        if len(texto) > 100:
+        if len(campos.texto) > 100:
             validacion['contenido'] = True
         else:
             validacion['contenido'] = False
@@ -582,70 +583,14 @@ class ValidadorOCR:
     
     def _parsear_fecha(self, fecha_str: str) -> datetime:
         """Intenta parsear una fecha en varios formatos"""
-        formatos = ['%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%Y-%m-%d', '%d.%m.%Y']
-        
-        for formato in formatos:
-            try:
-                return datetime.strptime(fecha_str, formato)
-            except ValueError:
-                continue
-        
-        raise ValueError(f"No se pudo parsear fecha: {fecha_str}")
+        return parsear_fecha(fecha_str)
     
     def _calcular_letra_dni(self, numero: str) -> str:
         """Calcula letra de DNI español"""
         letras = 'TRWAGMYFPDXBNJZSQVHLCKE'
         return letras[int(numero) % 23]
     
-    def _cargar_contador_uso(self):
-        """Carga contador de uso desde archivo temporal"""
-        try:
-            import tempfile
-            contador_file = os.path.join(tempfile.gettempdir(), 'ocr_contador.json')
-            if os.path.exists(contador_file):
-                with open(contador_file, 'r') as f:
-                    data = json.load(f)
-                    mes_actual = datetime.now().strftime('%Y-%m')
-                    if data.get('mes') == mes_actual:
-                        self.contador_usos = data.get('usos', 0)
-                    else:
-                        # Nuevo mes, resetear contador
-                        self.contador_usos = 0
-                        self._guardar_contador_uso()
-        except Exception as e:
-            print(f"⚠️ No se pudo cargar contador OCR: {e}")
-    
-    def _guardar_contador_uso(self):
-        """Guarda contador de uso en archivo temporal"""
-        try:
-            import tempfile
-            contador_file = os.path.join(tempfile.gettempdir(), 'ocr_contador.json')
-            with open(contador_file, 'w') as f:
-                json.dump({
-                    'mes': datetime.now().strftime('%Y-%m'),
-                    'usos': self.contador_usos
-                }, f)
-        except Exception as e:
-            print(f"⚠️ No se pudo guardar contador OCR: {e}")
-    
     def verificar_limite_uso(self) -> dict:
         """Verifica si estamos cerca del límite de OCR"""
-        porcentaje_usado = (self.contador_usos / self.limite_mensual) * 100
-        restante = self.limite_mensual - self.contador_usos
-        
-        alerta = None
-        if porcentaje_usado >= 90:
-            alerta = "CRÍTICO: 90% del límite OCR alcanzado"
-        elif porcentaje_usado >= 75:
-            alerta = "ADVERTENCIA: 75% del límite OCR alcanzado"
-        elif porcentaje_usado >= 50:
-            alerta = "AVISO: 50% del límite OCR alcanzado"
-        
-        return {
-            'usos': self.contador_usos,
-            'limite': self.limite_mensual,
-            'restante': restante,
-            'porcentaje': round(porcentaje_usado, 2),
-            'alerta': alerta
-        }
-
+        from api.uso_ocr import medidor_ocr
+        return medidor_ocr.uso()
@@ -0,0 +1,100 @@
+"""
+Exportación ZIP en streaming
+El archivo se va generando y enviando por trozos mientras se leen los
+documentos uno a uno (cursor del lado del servidor + blob storage), así la
+memoria del worker no crece con el número ni el tamaño de los documentos.
+"""
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from database.models import get_connection
+
+TAMANO_CHUNK = 64 * 1024
+
+ContenidoZip = Union[bytes, str, BinaryIO, None]
+
+
+class _BufferSalida:
+    """Destino no 'seekable' para ZipFile: acumula lo escrito hasta vaciarlo"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def generar_zip(entradas: Iterable[Tuple[str, ContenidoZip]]) -> Iterator[bytes]:
+    """
+    Genera un ZIP por trozos.
+
+    Args:
+        entradas: iterable de (nombre_en_zip, contenido); el contenido puede
+                  ser bytes, str o un archivo binario abierto (se cierra al
+                  terminar). Las entradas con contenido None se omiten.
+    """
+    salida = _BufferSalida()
+    # Sin seek(), zipfile escribe descriptores de datos tras cada archivo
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for nombre, contenido in entradas:
+            if contenido is None:
+                continue
+            if isinstance(contenido, str):
+                contenido = contenido.encode('utf-8')
+
+            with zip_file.open(nombre, 'w') as destino:
+                if isinstance(contenido, bytes):
+                    destino.write(contenido)
+                else:
+                    with contenido:
+                        while True:
+                            chunk = contenido.read(TAMANO_CHUNK)
+                            if not chunk:
+                                break
+                            destino.write(chunk)
+                            datos = salida.vaciar()
+                            if datos:
+                                yield datos
+
+            datos = salida.vaciar()
+            if datos:
+                yield datos
+
+    # Directorio central
+    datos = salida.vaciar()
+    if datos:
+        yield datos
+
+
+def filas_servidor(query: str, params: tuple, nombre_cursor: str = 'export_zip',
+                   itersize: int = 1) -> Iterator[tuple]:
+    """
+    Recorre el resultado con un cursor del lado del servidor (psycopg2 named
+    cursor): solo se trae de Postgres `itersize` filas cada vez. La conexión
+    vuelve al pool al terminar o si el cliente corta la descarga.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(name=nombre_cursor)
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+        for fila in cursor:
+            yield fila
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def nombre_seguro(nombre: Optional[str], por_defecto: str = 'documento') -> str:
+    """Nombre de archivo sin rutas para usar dentro del ZIP"""
+    nombre = (nombre or por_defecto).replace('\\', '/').split('/')[-1]
+    return nombre or por_defecto
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark del extractor de campos OCR
+Compara el método anterior (un re.findall por patrón, sin convertir nada)
+con extraer_campos (una sola pasada con la expresión precompilada, que
+además convierte fechas e importes y valida la MRZ).
+
+Uso: python benchmark_extractor_ocr.py
+"""
+
+import re
+import timeit
+
+from api.extractor_documentos import extraer_campos
+
+PASAPORTE = """REINO DE ESPAÑA
+PASAPORTE / PASSPORT
+Apellidos / Surname
+ERIKSSON
+Nombre / Given names
+ANNA MARIA
+Número / Passport No. L898902C3
+Fecha de expedición 15/04/2019
+Fecha de caducidad 15/04/2029
+P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<
+L898902C36UTO7408122F1204159ZE184226B<<<<<10
+"""
+
+DNI = """DOCUMENTO NACIONAL DE IDENTIDAD
+APELLIDOS GARCIA LOPEZ
+NOMBRE JUAN
+DNI 12345678Z
+VALIDO HASTA 01.02.2031
+IDESPBAA000589599999999D<<<<<<
+8001014F3106028ESP<<<<<<<<<<<1
+GARCIA<LOPEZ<<JUAN<<<<<<<<<<<<
+"""
+
+CARTA_ADMISION = """UNIVERSIDAD COMPLUTENSE DE MADRID
+Carta de admisión
+Fecha: 2025-06-30
+Estimado/a estudiante, nos complace comunicarle que ha sido admitido/a
+en el Máster Universitario en Ingeniería Informática, curso 2025/2026.
+Tasas de matrícula: 3.450,00 €
+Contacto: admisiones@ucm.es
+"""
+
+# Extracto de ~2000 movimientos, como un PDF de varias páginas
+EXTRACTO = "BANCO SANTANDER\nExtracto de cuenta\nIBAN ES91 2100 0418 4502 0005 1332\n" + "\n".join(
+    f"{(i % 28) + 1:02d}/{(i % 12) + 1:02d}/2024 Transferencia recibida {i:05d} {1000 + i * 3},{i % 100:02d} € "
+    f"Saldo 15.{i % 1000:03d},50 €"
+    for i in range(2000)
+)
+
+CORPUS = {
+    'pasaporte': PASAPORTE,
+    'dni': DNI,
+    'carta_admision': CARTA_ADMISION,
+    'extracto_bancario': EXTRACTO,
+}
+
+# Patrones del extractor anterior (ValidadorOCR.PATRONES + OCRProcessor)
+PATRONES_ANTERIORES = {
+    'pasaporte_numero': r'[A-Z]{1,3}\d{6,9}',
+    'dni_numero': r'\d{8}[A-Z]',
+    'fecha_ddmmyyyy': r'\d{2}[/-]\d{2}[/-]\d{4}',
+    'fecha_yyyymmdd': r'\d{4}[/-]\d{2}[/-]\d{2}',
+    'monto_euros': r'€?\s*\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?',
+    'monto_dolares': r'\$\s*\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?',
+    'email': r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    'iban': r'ES\d{2}\s?\d{4}\s?\d{4}\s?\d{4}\s?\d{4}\s?\d{4}',
+    'ocr_pasaporte': r'[A-Z]{1,2}\d{6,9}|\d{6,9}[A-Z]{1,2}',
+    'ocr_fecha': r'\d{2}[/-]\d{2}[/-]\d{4}',
+    'ocr_monto': r'[\$€£]?\s?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?',
+}
+
+
+def extraer_anterior(texto):
+    """Una búsqueda por patrón, sin compilar, como hacían los validadores"""
+    resultado = {nombre: re.findall(patron, texto) for nombre, patron in PATRONES_ANTERIORES.items()}
+    resultado['lineas_mrz'] = [l for l in texto.split('\n') if re.match(r'^[A-Z0-9<]{30,}$', l)]
+    return resultado
+
+
+def main():
+    print("⏱️ Benchmark del extractor de campos OCR")
+    print("=" * 60)
+    for nombre, texto in CORPUS.items():
+        repeticiones = 20 if nombre == 'extracto_bancario' else 2000
+        # Evitar que la caché de re.compile favorezca al método anterior en la primera vuelta
+        extraer_anterior(texto)
+        anterior = timeit.timeit(lambda: extraer_anterior(texto), number=repeticiones) / repeticiones
+        nuevo = timeit.timeit(lambda: extraer_campos(texto), number=repeticiones) / repeticiones
+        campos = extraer_campos(texto)
+        print(f"\n📄 {nombre} ({len(texto):,} caracteres)")
+        print(f"   anterior: {anterior * 1000:8.3f} ms")
+        print(f"   una pasada: {nuevo * 1000:6.3f} ms  (x{anterior / nuevo:.1f})")
+        print(f"   fechas={len(campos.fechas)} montos={len(campos.montos)} "
+              f"pasaportes={len(campos.pasaportes)} dnis={len(campos.dnis)} "
+              f"mrz={'válida' if campos.mrz and campos.mrz['valido'] else 'no' if not campos.mrz else 'inválida'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Circuit breaker para el acceso a base de datos.
+
+Cuando Postgres no responde, en lugar de que cada request espere su propio
+timeout (o duerma reintentando), el circuito se abre tras varios fallos
+seguidos y las peticiones fallan al instante con 503. Pasado el tiempo de
+espera se deja pasar una petición de prueba (half-open): si conecta, el
+circuito se cierra de nuevo.
+"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMI_ABIERTO = 'semi_abierto'
+
+    def __init__(self, umbral_fallos: int = 5, tiempo_reset: float = 30.0):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reset = tiempo_reset
+        self._fallos = 0
+        self._abierto_desde = None
+        self._prueba_desde = None
+        self._lock = threading.Lock()
+
+    def _estado_actual(self) -> str:
+        if self._abierto_desde is None:
+            return self.CERRADO
+        if time.monotonic() - self._abierto_desde >= self.tiempo_reset:
+            return self.SEMI_ABIERTO
+        return self.ABIERTO
+
+    def permitir(self) -> bool:
+        """True si se puede intentar usar la base de datos"""
+        with self._lock:
+            estado = self._estado_actual()
+            if estado == self.CERRADO:
+                return True
+            if estado == self.SEMI_ABIERTO:
+                # Solo una petición de prueba a la vez; si la prueba nunca
+                # llegó a tocar la BD, se permite otra pasado tiempo_reset
+                ahora = time.monotonic()
+                if self._prueba_desde is None or ahora - self._prueba_desde >= self.tiempo_reset:
+                    self._prueba_desde = ahora
+                    return True
+            return False
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._prueba_desde = None
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_desde = None
+            if self._abierto_desde is not None or self._fallos >= self.umbral_fallos:
+                # Abrir (o reabrir tras una prueba fallida)
+                self._abierto_desde = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self._estado_actual(),
+                "fallos_consecutivos": self._fallos,
+                "umbral_fallos": self.umbral_fallos,
+                "tiempo_reset": self.tiempo_reset
+            }
@@ -0,0 +1,941 @@
+"""
+Migraciones versionadas del esquema
+Antes el startup de la API ejecutaba ~30 CREATE/ALTER/CREATE INDEX y el
+relleno de códigos de referido en cada arranque de cada worker. Ahora cada
+cambio de esquema es una migración numerada que se aplica una sola vez:
+
+- La tabla `schema_migraciones` guarda las versiones aplicadas.
+- Un advisory lock de Postgres garantiza que solo un worker migra; los demás
+  esperan a que termine y ven el esquema ya al día.
+- Cada migración va en su propia transacción: si falla se deshace entera, no
+  se registra y se reintenta en el próximo arranque (las siguientes esperan).
+- Con el esquema al día, arrancar es una sola consulta (la versión).
+
+Uso:
+    python -m database.migraciones            # aplica las pendientes
+    python -m database.migraciones --estado   # versión actual y pendientes
+
+Para añadir un cambio de esquema: escribir una función _mNNN_descripcion(cursor)
+y añadirla al final de MIGRACIONES con el siguiente número. Nunca editar una
+migración ya publicada. Cada migración lleva su propio SQL: si llamara a una
+función de otro módulo, cambiar esa función cambiaría en silencio lo que hace
+una migración ya aplicada.
+"""
+import json
+import os
+import secrets
+import string
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+from psycopg2.extras import execute_values
+
+from database.models import get_connection
+
+# Clave del advisory lock (cualquier entero fijo, compartido por todos los workers)
+LLAVE_BLOQUEO_MIGRACIONES = 7_204_510_022
+
+
+class Migracion(NamedTuple):
+    version: int
+    nombre: str
+    aplicar: Callable
+
+
+def _existe_tabla(cursor, tabla: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (tabla,))
+    return cursor.fetchone()[0]
+
+
+# ----------------------------------------------------------------------------
+# Migraciones (lo que antes se ejecutaba en cada startup)
+# ----------------------------------------------------------------------------
+
+
+def _m001_esquema_base(cursor):
+    """Tablas, columnas e índices creados hasta ahora en el startup"""
+    cursor.execute("""
+        ALTER TABLE estudiantes
+        ADD COLUMN IF NOT EXISTS credito_retirado DECIMAL(10, 2) DEFAULT 0.00
+    """)
+    if _existe_tabla(cursor, 'agentes'):
+        cursor.execute("""
+            ALTER TABLE agentes
+            ADD COLUMN IF NOT EXISTS credito_retirado DECIMAL(10, 2) DEFAULT 0.00
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documentos_generados (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
+            tipo_documento VARCHAR(100) NOT NULL,
+            nombre_archivo VARCHAR(255) NOT NULL,
+            contenido_pdf TEXT,
+            blob_key VARCHAR(64),
+            estado VARCHAR(50) DEFAULT 'generado',
+            notas TEXT,
+            generado_por VARCHAR(100),
+            aprobado_por VARCHAR(100),
+            fecha_generacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_aprobacion TIMESTAMP,
+            enviado_estudiante BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fechas_importantes (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER NOT NULL REFERENCES estudiantes(id) ON DELETE CASCADE,
+            tipo_fecha VARCHAR(100) NOT NULL,
+            fecha TIMESTAMP NOT NULL,
+            descripcion TEXT,
+            alertado_30d BOOLEAN DEFAULT FALSE,
+            alertado_15d BOOLEAN DEFAULT FALSE,
+            alertado_7d BOOLEAN DEFAULT FALSE,
+            alertado_1d BOOLEAN DEFAULT FALSE,
+            completada BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS universidades_espana (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            siglas VARCHAR(50),
+            ciudad VARCHAR(100) NOT NULL,
+            comunidad_autonoma VARCHAR(100) NOT NULL,
+            tipo VARCHAR(50) NOT NULL,
+            url_oficial VARCHAR(500),
+            email_contacto VARCHAR(255),
+            telefono VARCHAR(50),
+            tiene_api BOOLEAN DEFAULT FALSE,
+            endpoint_api VARCHAR(500),
+            metodo_scraping VARCHAR(100),
+            ultima_actualizacion TIMESTAMP,
+            logo_url VARCHAR(500),
+            descripcion TEXT,
+            ranking_nacional INTEGER,
+            total_alumnos INTEGER,
+            total_programas INTEGER,
+            acepta_extranjeros BOOLEAN DEFAULT TRUE,
+            requisitos_extranjeros TEXT,
+            activa BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS programas_universitarios (
+            id SERIAL PRIMARY KEY,
+            universidad_id INTEGER NOT NULL,
+            nombre VARCHAR(500) NOT NULL,
+            tipo_programa VARCHAR(100),
+            area_estudio VARCHAR(200),
+            duracion_anos FLOAT,
+            creditos_ects INTEGER,
+            idioma VARCHAR(50),
+            modalidad VARCHAR(50),
+            precio_anual_eur FLOAT,
+            plazas_disponibles INTEGER,
+            nota_corte FLOAT,
+            url_info VARCHAR(500),
+            fecha_inicio_inscripcion TIMESTAMP,
+            fecha_fin_inscripcion TIMESTAMP,
+            requisitos TEXT,
+            descripcion TEXT,
+            activo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_universidades_ciudad ON universidades_espana(ciudad);
+        CREATE INDEX IF NOT EXISTS idx_universidades_tipo ON universidades_espana(tipo);
+        CREATE INDEX IF NOT EXISTS idx_programas_universidad ON programas_universitarios(universidad_id);
+        CREATE INDEX IF NOT EXISTS idx_programas_tipo ON programas_universitarios(tipo_programa);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blog_posts (
+            id SERIAL PRIMARY KEY,
+            titulo VARCHAR(500) NOT NULL,
+            slug VARCHAR(500) UNIQUE NOT NULL,
+            contenido TEXT NOT NULL,
+            extracto TEXT,
+            categoria VARCHAR(100),
+            autor_nombre VARCHAR(200) DEFAULT 'Equipo Editorial',
+            imagen_portada VARCHAR(500),
+            meta_description VARCHAR(300),
+            meta_keywords VARCHAR(500),
+            visitas INTEGER DEFAULT 0,
+            publicado BOOLEAN DEFAULT FALSE,
+            destacado BOOLEAN DEFAULT FALSE,
+            fecha_publicacion TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS testimonios (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER,
+            nombre_completo VARCHAR(200) NOT NULL,
+            pais_origen VARCHAR(100) NOT NULL,
+            programa_estudio VARCHAR(300),
+            universidad VARCHAR(300),
+            ciudad_espana VARCHAR(100),
+            rating INTEGER,
+            titulo VARCHAR(300),
+            testimonio TEXT NOT NULL,
+            foto_url VARCHAR(500),
+            video_url VARCHAR(500),
+            email_contacto VARCHAR(200),
+            aprobado BOOLEAN DEFAULT FALSE,
+            destacado BOOLEAN DEFAULT FALSE,
+            visible BOOLEAN DEFAULT TRUE,
+            fecha_experiencia TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_blog_categoria ON blog_posts(categoria);
+        CREATE INDEX IF NOT EXISTS idx_blog_publicado ON blog_posts(publicado);
+        CREATE INDEX IF NOT EXISTS idx_blog_slug ON blog_posts(slug);
+        CREATE INDEX IF NOT EXISTS idx_testimonios_aprobado ON testimonios(aprobado);
+        CREATE INDEX IF NOT EXISTS idx_testimonios_destacado ON testimonios(destacado);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notificaciones (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER NOT NULL,
+            tipo VARCHAR(50) NOT NULL,
+            titulo VARCHAR(200) NOT NULL,
+            mensaje TEXT NOT NULL,
+            leida BOOLEAN DEFAULT FALSE,
+            url_accion VARCHAR(500),
+            icono VARCHAR(20) DEFAULT '🔔',
+            prioridad VARCHAR(20) DEFAULT 'normal',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notificaciones_estudiante ON notificaciones(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_notificaciones_leida ON notificaciones(leida);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mensajes_chat (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER NOT NULL,
+            admin_id INTEGER,
+            remitente VARCHAR(20) NOT NULL,
+            mensaje TEXT NOT NULL,
+            leido BOOLEAN DEFAULT FALSE,
+            tipo VARCHAR(20) DEFAULT 'texto',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_mensajes_estudiante ON mensajes_chat(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_mensajes_leido ON mensajes_chat(leido);
+        CREATE INDEX IF NOT EXISTS idx_mensajes_remitente ON mensajes_chat(remitente);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documentos (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER NOT NULL REFERENCES estudiantes(id) ON DELETE CASCADE,
+            nombre_archivo VARCHAR(255),
+            tipo_documento VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        ALTER TABLE documentos
+            ADD COLUMN IF NOT EXISTS categoria VARCHAR(50),
+            ADD COLUMN IF NOT EXISTS contenido_base64 TEXT,
+            ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS tamano_archivo INTEGER,
+            ADD COLUMN IF NOT EXISTS estado_revision VARCHAR(20) DEFAULT 'pendiente',
+            ADD COLUMN IF NOT EXISTS comentario_admin TEXT,
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS blob_key VARCHAR(64)
+    """)
+    # Binarios en blob storage (api/blob_storage.py); la fila solo guarda la clave
+    cursor.execute("ALTER TABLE documentos_generados ADD COLUMN IF NOT EXISTS blob_key VARCHAR(64)")
+    cursor.execute("ALTER TABLE documentos_generados ALTER COLUMN contenido_pdf DROP NOT NULL")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documentos_estudiante ON documentos(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_documentos_estado ON documentos(estado_revision);
+        CREATE INDEX IF NOT EXISTS idx_documentos_categoria ON documentos(categoria);
+        CREATE INDEX IF NOT EXISTS idx_documentos_blob_key ON documentos(blob_key);
+        CREATE INDEX IF NOT EXISTS idx_documentos_generados_blob_key ON documentos_generados(blob_key);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS contactos_universidades (
+            id SERIAL PRIMARY KEY,
+            universidad VARCHAR(200) NOT NULL,
+            email VARCHAR(200) NOT NULL,
+            telefono VARCHAR(50),
+            contacto_nombre VARCHAR(200),
+            pais VARCHAR(100) DEFAULT 'España',
+            ciudad VARCHAR(100),
+            tipo_universidad VARCHAR(100),
+            programas_interes TEXT,
+            estado VARCHAR(50) DEFAULT 'pendiente',
+            fecha_contacto TIMESTAMP,
+            fecha_respuesta TIMESTAMP,
+            fecha_reunion TIMESTAMP,
+            notas TEXT,
+            condiciones_propuestas TEXT,
+            comision_acordada DECIMAL(10, 2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Universidades objetivo iniciales (solo si la tabla está vacía)
+    cursor.execute("SELECT COUNT(*) FROM contactos_universidades")
+    if cursor.fetchone()[0] == 0:
+        execute_values(cursor, """
+            INSERT INTO contactos_universidades
+            (universidad, email, telefono, contacto_nombre, pais, ciudad, tipo_universidad, programas_interes, estado)
+            VALUES %s
+        """, [
+            ('UCAM - Universidad Católica de Murcia', 'internacional@ucam.edu', '+34 968 278 160', 'Departamento Internacional', 'España', 'Murcia', 'Privada', 'Grados, Másteres, FP, Medicina, Ingeniería', 'pendiente'),
+            ('UNIR - Universidad Internacional de La Rioja', 'admisiones@unir.net', '+34 941 209 743', 'Admisiones Internacionales', 'España', 'Logroño', 'Privada', 'Grados Online, Másteres Online, Doctorados', 'pendiente'),
+            ('VIU - Universidad Internacional de Valencia', 'informacion@universidadviu.com', '+34 961 924 950', 'Información y Admisiones', 'España', 'Valencia', 'Privada', 'Grados Online/Presencial, Másteres, Doctorados', 'pendiente'),
+            ('UDIMA - Universidad a Distancia de Madrid', 'info@udima.es', '+34 918 561 699', 'Información', 'España', 'Madrid', 'Privada', 'Grados Online, Másteres, Doctorados', 'pendiente'),
+            ('UOC - Universitat Oberta de Catalunya', 'internacional@uoc.edu', '+34 932 532 300', 'Admisiones Internacionales', 'España', 'Barcelona', 'Privada', 'Grados Online, Másteres, Idiomas', 'pendiente'),
+        ])
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS servicios_solicitados (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
+            servicio_id VARCHAR(100) NOT NULL,
+            servicio_nombre VARCHAR(200) NOT NULL,
+            estado VARCHAR(50) DEFAULT 'pendiente',
+            precio DECIMAL(10, 2),
+            fecha_solicitud TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_completado TIMESTAMP,
+            notas_admin TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_servicios_estudiante ON servicios_solicitados(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_servicios_estado ON servicios_solicitados(estado);
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS proceso_visa_pasos (
+            id SERIAL PRIMARY KEY,
+            estudiante_id INTEGER REFERENCES estudiantes(id) ON DELETE CASCADE,
+            paso_inscripcion BOOLEAN DEFAULT FALSE,
+            fecha_inscripcion TIMESTAMP,
+            paso_pago_inicial BOOLEAN DEFAULT FALSE,
+            fecha_pago_inicial TIMESTAMP,
+            paso_documentos_personales BOOLEAN DEFAULT FALSE,
+            fecha_documentos_personales TIMESTAMP,
+            paso_seleccion_universidad BOOLEAN DEFAULT FALSE,
+            fecha_seleccion_universidad TIMESTAMP,
+            paso_solicitud_universidad BOOLEAN DEFAULT FALSE,
+            fecha_solicitud_universidad TIMESTAMP,
+            paso_carta_aceptacion BOOLEAN DEFAULT FALSE,
+            fecha_carta_aceptacion TIMESTAMP,
+            paso_antecedentes_solicitados BOOLEAN DEFAULT FALSE,
+            fecha_antecedentes_solicitados TIMESTAMP,
+            paso_antecedentes_recibidos BOOLEAN DEFAULT FALSE,
+            fecha_antecedentes_recibidos TIMESTAMP,
+            paso_apostilla_haya BOOLEAN DEFAULT FALSE,
+            fecha_apostilla_haya TIMESTAMP,
+            paso_traduccion_documentos BOOLEAN DEFAULT FALSE,
+            fecha_traduccion_documentos TIMESTAMP,
+            paso_seguro_medico BOOLEAN DEFAULT FALSE,
+            fecha_seguro_medico TIMESTAMP,
+            paso_comprobante_fondos BOOLEAN DEFAULT FALSE,
+            fecha_comprobante_fondos TIMESTAMP,
+            paso_carta_banco BOOLEAN DEFAULT FALSE,
+            fecha_carta_banco TIMESTAMP,
+            paso_formulario_visa BOOLEAN DEFAULT FALSE,
+            fecha_formulario_visa TIMESTAMP,
+            paso_fotos_biometricas BOOLEAN DEFAULT FALSE,
+            fecha_fotos_biometricas TIMESTAMP,
+            paso_pago_tasa_visa BOOLEAN DEFAULT FALSE,
+            fecha_pago_tasa_visa TIMESTAMP,
+            paso_cita_agendada BOOLEAN DEFAULT FALSE,
+            fecha_cita_agendada TIMESTAMP,
+            fecha_cita_embajada TIMESTAMP,
+            paso_documentos_revisados BOOLEAN DEFAULT FALSE,
+            fecha_documentos_revisados TIMESTAMP,
+            paso_simulacro_entrevista BOOLEAN DEFAULT FALSE,
+            fecha_simulacro_entrevista TIMESTAMP,
+            paso_entrevista_completada BOOLEAN DEFAULT FALSE,
+            fecha_entrevista_completada TIMESTAMP,
+            resultado_entrevista VARCHAR(50),
+            paso_pasaporte_recogido BOOLEAN DEFAULT FALSE,
+            fecha_pasaporte_recogido TIMESTAMP,
+            paso_visa_otorgada BOOLEAN DEFAULT FALSE,
+            fecha_visa_otorgada TIMESTAMP,
+            notas_admin TEXT,
+            ultima_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(estudiante_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documentos_generados_estudiante ON documentos_generados(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_documentos_generados_estado ON documentos_generados(estado);
+        CREATE INDEX IF NOT EXISTS idx_fechas_importantes_estudiante ON fechas_importantes(estudiante_id);
+        CREATE INDEX IF NOT EXISTS idx_fechas_importantes_fecha ON fechas_importantes(fecha);
+        CREATE INDEX IF NOT EXISTS idx_fechas_importantes_completada ON fechas_importantes(completada);
+    """)
+
+    if _existe_tabla(cursor, 'presupuestos'):
+        cursor.execute("""
+            ALTER TABLE presupuestos
+            ADD COLUMN IF NOT EXISTS estado_servicio VARCHAR(50) DEFAULT 'pendiente'
+        """)
+
+
+def _generar_codigo(longitud: int = 8) -> str:
+    # Mismo alfabeto que los códigos del registro (sin O/I/0/1)
+    caracteres = string.ascii_uppercase + string.digits
+    caracteres = caracteres.replace('O', '').replace('I', '').replace('0', '').replace('1', '')
+    return ''.join(secrets.choice(caracteres) for _ in range(longitud))
+
+
+def _m002_codigos_referido(cursor):
+    """Código de referido para los estudiantes que no tienen (un solo UPDATE)"""
+    cursor.execute("""
+        SELECT id FROM estudiantes
+        WHERE codigo_referido IS NULL OR codigo_referido = ''
+    """)
+    ids = [fila[0] for fila in cursor.fetchall()]
+    if not ids:
+        return
+
+    cursor.execute("SELECT codigo_referido FROM estudiantes WHERE codigo_referido <> ''")
+    usados = {fila[0] for fila in cursor.fetchall()}
+    asignaciones = []
+    for est_id in ids:
+        codigo = _generar_codigo()
+        while codigo in usados:
+            codigo = _generar_codigo()
+        usados.add(codigo)
+        asignaciones.append((est_id, codigo))
+
+    execute_values(cursor, """
+        UPDATE estudiantes e
+        SET codigo_referido = v.codigo,
+            tipo_recompensa = 'dinero'
+        FROM (VALUES %s) AS v(id, codigo)
+        WHERE e.id = v.id
+    """, asignaciones, page_size=1000)
+    print(f"   ✅ Código de referido asignado a {len(asignaciones)} estudiantes")
+
+
+def _m003_vista_metricas(cursor):
+    """Crea la vista materializada (y el índice único que exige CONCURRENTLY)"""
+    # notas_internas no la crea m001 (migrate_missing_tables.py): sin ella, 0
+    if _existe_tabla(cursor, 'notas_internas'):
+        notas_hoy = "(SELECT COUNT(*) FROM notas_internas WHERE created_at >= CURRENT_DATE)"
+    else:
+        notas_hoy = "0::bigint"
+    cursor.execute(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS metricas_dashboard AS
+        WITH est AS (
+            SELECT
+                COUNT(*) AS total_estudiantes,
+                COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '24 hours') AS registros_24h,
+                COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '7 days') AS registros_7d,
+                COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '30 days') AS registros_30d,
+                COUNT(*) FILTER (WHERE estado IS NULL) AS sin_estado,
+                AVG(fondos_disponibles) FILTER (WHERE fondos_disponibles > 0) AS fondos_promedio
+            FROM estudiantes
+        )
+        SELECT
+            1 AS id,
+            NOW() AS actualizado_en,
+            est.*,
+            (SELECT COALESCE(jsonb_object_agg(estado, total), '{{}}'::jsonb)
+               FROM (SELECT estado, COUNT(*) AS total
+                       FROM estudiantes WHERE estado IS NOT NULL
+                      GROUP BY estado) s) AS por_estado,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(nacionalidad, total) ORDER BY total DESC), '[]'::jsonb)
+               FROM (SELECT nacionalidad, COUNT(*) AS total
+                       FROM estudiantes WHERE nacionalidad IS NOT NULL
+                      GROUP BY nacionalidad) s) AS por_nacionalidad,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(especialidad, total) ORDER BY total DESC), '[]'::jsonb)
+               FROM (SELECT especialidad, COUNT(*) AS total
+                       FROM estudiantes WHERE especialidad IS NOT NULL AND especialidad != ''
+                      GROUP BY especialidad) s) AS por_especialidad,
+            (SELECT COUNT(*) FROM documentos_generados
+              WHERE fecha_generacion >= CURRENT_DATE) AS documentos_generados_hoy,
+            {notas_hoy} AS notas_agregadas_hoy,
+            (SELECT COUNT(*) FROM mensajes_chat
+              WHERE created_at >= NOW() - INTERVAL '30 days') AS mensajes_30d,
+            (SELECT COUNT(*) FROM fechas_importantes
+              WHERE fecha <= NOW() + INTERVAL '7 days' AND completada = FALSE) AS alertas_pendientes
+        FROM est
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_metricas_dashboard_id
+        ON metricas_dashboard(id)
+    """)
+
+
+def _m004_busqueda_estudiantes(cursor):
+    """
+    Crea (si no existen) las extensiones, la columna normalizada, el trigger
+    que la mantiene y el índice GIN de trigramas. Rellena las filas antiguas.
+    """
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    cursor.execute("ALTER TABLE estudiantes ADD COLUMN IF NOT EXISTS busqueda_normalizada TEXT")
+    # to_jsonb(NEW) para no fallar si alguna columna legacy no existe en esta BD
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION estudiantes_busqueda_normalizada() RETURNS trigger AS $$
+        DECLARE
+            fila jsonb := to_jsonb(NEW);
+        BEGIN
+            NEW.busqueda_normalizada := lower(unaccent(concat_ws(' ',
+                fila->>'nombre', fila->>'nombre_completo', fila->>'email',
+                fila->>'pasaporte', fila->>'numero_pasaporte')));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS trg_estudiantes_busqueda ON estudiantes")
+    cursor.execute("""
+        CREATE TRIGGER trg_estudiantes_busqueda
+        BEFORE INSERT OR UPDATE ON estudiantes
+        FOR EACH ROW EXECUTE PROCEDURE estudiantes_busqueda_normalizada()
+    """)
+    # El trigger calcula el valor: basta con "tocar" las filas pendientes
+    cursor.execute("""
+        UPDATE estudiantes SET busqueda_normalizada = NULL
+        WHERE busqueda_normalizada IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_busqueda_trgm
+        ON estudiantes USING GIN (busqueda_normalizada gin_trgm_ops)
+    """)
+
+
+def _m005_programas_unicos(cursor):
+    """Programas únicos por universidad (necesario para el upsert del scraping)"""
+    cursor.execute("""
+        DELETE FROM programas_universitarios p
+        USING programas_universitarios otro
+        WHERE p.universidad_id = otro.universidad_id
+          AND p.nombre = otro.nombre
+          AND p.id > otro.id
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_programas_universidad_nombre
+        ON programas_universitarios(universidad_id, nombre)
+    """)
+
+
+def _m006_indices_keyset(cursor):
+    """Índices para la paginación por cursor (keyset) de los listados admin"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estudiantes_keyset_created
+        ON estudiantes ((COALESCE(created_at, TIMESTAMP '1970-01-01')), id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documentos_generados_keyset_fecha
+        ON documentos_generados ((COALESCE(fecha_generacion, TIMESTAMP '1970-01-01')), id)
+    """)
+    if _existe_tabla(cursor, 'logs_auditoria'):
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_logs_auditoria_keyset
+            ON logs_auditoria (timestamp, id)
+        """)
+
+
+def _m007_trabajos_ocr(cursor):
+    """Estado persistido de los trabajos de la cola OCR (api/cola_ocr.py)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trabajos_ocr (
+            id VARCHAR(32) PRIMARY KEY,
+            estudiante_id INTEGER,
+            estado VARCHAR(20) NOT NULL,
+            total INTEGER DEFAULT 0,
+            procesados INTEGER DEFAULT 0,
+            exitosos INTEGER DEFAULT 0,
+            fallidos INTEGER DEFAULT 0,
+            resultados JSONB DEFAULT '[]'::jsonb,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            terminado_at TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_trabajos_ocr_estudiante
+        ON trabajos_ocr(estudiante_id, created_at DESC)
+    """)
+
+
+def _m008_cache_ocr(cursor):
+    """Caché del texto OCR por hash del archivo (api/cache_ocr.py)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            sha256 CHAR(64) NOT NULL,
+            motor VARCHAR(30) NOT NULL,
+            idioma VARCHAR(30) NOT NULL,
+            texto TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT NOW(),
+            ultimo_uso TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (sha256, motor, idioma)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocr_cache_ultimo_uso
+        ON ocr_cache(ultimo_uso)
+    """)
+
+
+def _m009_uso_ocr(cursor):
+    """Crea la tabla; la primera vez arrastra el mes en curso del antiguo JSON"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_uso (
+            periodo VARCHAR(10) PRIMARY KEY,
+            tipo VARCHAR(3) NOT NULL,
+            usos INTEGER NOT NULL DEFAULT 0,
+            actualizado_en TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+    contador_file = os.path.join(tempfile.gettempdir(), 'ocr_contador.json')
+    if os.path.exists(contador_file):
+        try:
+            with open(contador_file, 'r') as f:
+                data = json.load(f)
+            cursor.execute("""
+                INSERT INTO ocr_uso (periodo, tipo, usos)
+                VALUES (%s, 'mes', %s)
+                ON CONFLICT (periodo) DO NOTHING
+            """, (data['mes'], int(data.get('usos', 0))))
+        except Exception as e:
+            print(f"⚠️ No se pudo importar el contador OCR antiguo: {e}")
+
+
+def _m010_planificador_ejecuciones(cursor):
+    """Historial de ejecuciones de las tareas programadas (api/planificador.py)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS planificador_ejecuciones (
+            id SERIAL PRIMARY KEY,
+            tarea_id VARCHAR(200) NOT NULL,
+            funcion VARCHAR(300) NOT NULL,
+            worker VARCHAR(200),
+            programada_para TIMESTAMP,
+            inicio TIMESTAMP NOT NULL,
+            duracion_ms INTEGER,
+            estado VARCHAR(20) NOT NULL,
+            error TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_planificador_ejecuciones_tarea
+        ON planificador_ejecuciones (tarea_id, inicio DESC)
+    """)
+
+
+def _m011_notificaciones_idempotentes(cursor):
+    """Clave única para que un job reejecutado no cree (ni envíe) la misma notificación dos veces"""
+    cursor.execute("ALTER TABLE notificaciones ADD COLUMN IF NOT EXISTS clave_idempotencia VARCHAR(100)")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_notificaciones_clave_idempotencia
+        ON notificaciones (clave_idempotencia)
+    """)
+
+
+# Tablas contadas al crear los triggers (copia congelada de
+# api.contadores_no_leidos.TABLAS_CONTADAS)
+_M012_TABLAS_CONTADAS = {
+    'notificaciones': (
+        'leida',
+        "ARRAY['notificaciones:' || t.estudiante_id]"
+    ),
+    'mensajes_chat': (
+        'leido',
+        "ARRAY['chat:' || t.remitente || ':' || t.estudiante_id]"
+        " || CASE WHEN t.remitente = 'estudiante' THEN ARRAY['chat:estudiante:total'] ELSE ARRAY[]::TEXT[] END"
+    ),
+    'mensajes_agentes': (
+        'leido',
+        "ARRAY['agentes:' || t.remitente || ':' || t.agente_id]"
+        " || CASE WHEN t.remitente = 'agente' THEN ARRAY['agentes:agente:total'] ELSE ARRAY[]::TEXT[] END"
+    ),
+}
+
+
+def _m012_contadores_no_leidos(cursor):
+    """Tabla, función de ajuste y triggers; recalcula los contadores desde los datos"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS contadores_no_leidos (
+            clave VARCHAR(80) PRIMARY KEY,
+            no_leidos INTEGER NOT NULL DEFAULT 0,
+            actualizado_en TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    # Un ajuste por clave y sentencia (marcar 200 mensajes como leídos es una
+    # sola actualización del contador) y claves en orden para no crear deadlocks
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ajustar_contadores_no_leidos(restar TEXT[], sumar TEXT[])
+        RETURNS void AS $$
+        DECLARE
+            cambio RECORD;
+        BEGIN
+            FOR cambio IN
+                SELECT d.clave, SUM(d.delta)::INTEGER AS delta
+                FROM (
+                    SELECT unnest(restar) AS clave, -1 AS delta
+                    UNION ALL
+                    SELECT unnest(sumar), 1
+                ) d
+                GROUP BY d.clave
+                HAVING SUM(d.delta) <> 0
+                ORDER BY d.clave
+            LOOP
+                INSERT INTO contadores_no_leidos (clave, no_leidos)
+                VALUES (cambio.clave, GREATEST(cambio.delta, 0))
+                ON CONFLICT (clave) DO UPDATE
+                SET no_leidos = GREATEST(contadores_no_leidos.no_leidos + cambio.delta, 0),
+                    actualizado_en = NOW();
+                PERFORM pg_notify('contadores_no_leidos', cambio.clave);
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    if not _existe_tabla(cursor, 'mensajes_agentes') and _existe_tabla(cursor, 'agentes'):
+        # Hasta ahora solo la creaba create_mensajes_agentes_table.py
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS mensajes_agentes (
+                id SERIAL PRIMARY KEY,
+                agente_id INTEGER REFERENCES agentes(id) ON DELETE CASCADE,
+                remitente VARCHAR(20) NOT NULL,
+                mensaje TEXT NOT NULL,
+                leido BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    for tabla, (columna_leido, claves) in _M012_TABLAS_CONTADAS.items():
+        if not _existe_tabla(cursor, tabla):
+            print(f"   ⚠️ Tabla {tabla} no existe: sin contadores para ella")
+            continue
+        _m012_triggers(cursor, tabla, columna_leido, claves)
+
+    _m012_recalcular(cursor)
+
+
+def _m012_triggers(cursor, tabla: str, columna_leido: str, claves: str):
+    # Triggers por sentencia con tablas de transición: un INSERT de 500
+    # notificaciones o un "marcar todas" llama una vez a la función de ajuste
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION contadores_{tabla}() RETURNS trigger AS $$
+        DECLARE
+            restar TEXT[];
+            sumar TEXT[];
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                restar := ARRAY(SELECT unnest({claves}) FROM viejas t
+                                WHERE NOT COALESCE(t.{columna_leido}, FALSE));
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                sumar := ARRAY(SELECT unnest({claves}) FROM nuevas t
+                               WHERE NOT COALESCE(t.{columna_leido}, FALSE));
+            END IF;
+            PERFORM ajustar_contadores_no_leidos(restar, sumar);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    transiciones = {
+        'INSERT': "NEW TABLE AS nuevas",
+        'UPDATE': "OLD TABLE AS viejas NEW TABLE AS nuevas",
+        'DELETE': "OLD TABLE AS viejas",
+    }
+    for operacion, referencias in transiciones.items():
+        nombre = f"trg_{tabla}_contadores_{operacion.lower()}"
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nombre} ON {tabla}")
+        cursor.execute(f"""
+            CREATE TRIGGER {nombre}
+            AFTER {operacion} ON {tabla}
+            REFERENCING {referencias}
+            FOR EACH STATEMENT EXECUTE PROCEDURE contadores_{tabla}()
+        """)
+
+
+def _m012_recalcular(cursor):
+    """Contadores iniciales con COUNT(*) sobre las tablas"""
+    cursor.execute("UPDATE contadores_no_leidos SET no_leidos = 0, actualizado_en = NOW() WHERE no_leidos <> 0")
+    for tabla, (columna_leido, claves) in _M012_TABLAS_CONTADAS.items():
+        if not _existe_tabla(cursor, tabla):
+            continue
+        cursor.execute(f"""
+            INSERT INTO contadores_no_leidos (clave, no_leidos)
+            SELECT c.clave, COUNT(*)
+            FROM (
+                SELECT unnest({claves}) AS clave
+                FROM {tabla} t
+                WHERE NOT COALESCE(t.{columna_leido}, FALSE)
+            ) c
+            GROUP BY c.clave
+            ON CONFLICT (clave) DO UPDATE
+            SET no_leidos = EXCLUDED.no_leidos, actualizado_en = NOW()
+        """)
+        print(f"   ✅ Contadores de {tabla}: {cursor.rowcount} claves")
+
+
+MIGRACIONES: List[Migracion] = [
+    Migracion(1, 'esquema_base', _m001_esquema_base),
+    Migracion(2, 'codigos_referido', _m002_codigos_referido),
+    Migracion(3, 'vista_metricas_dashboard', _m003_vista_metricas),
+    Migracion(4, 'busqueda_estudiantes', _m004_busqueda_estudiantes),
+    Migracion(5, 'programas_unicos', _m005_programas_unicos),
+    Migracion(6, 'indices_keyset', _m006_indices_keyset),
+    Migracion(7, 'trabajos_ocr', _m007_trabajos_ocr),
+    Migracion(8, 'cache_ocr', _m008_cache_ocr),
+    Migracion(9, 'uso_ocr', _m009_uso_ocr),
+    Migracion(10, 'planificador_ejecuciones', _m010_planificador_ejecuciones),
+    Migracion(11, 'notificaciones_idempotentes', _m011_notificaciones_idempotentes),
+    Migracion(12, 'contadores_no_leidos', _m012_contadores_no_leidos),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1].version
+
+
+# ----------------------------------------------------------------------------
+# Ejecución
+# ----------------------------------------------------------------------------
+
+def _versiones_aplicadas(cursor) -> set:
+    if not _existe_tabla(cursor, 'schema_migraciones'):
+        return set()
+    cursor.execute("SELECT version FROM schema_migraciones")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def estado() -> Dict:
+    """Versión del esquema en la BD y migraciones pendientes (sin tocar nada)"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        aplicadas = _versiones_aplicadas(cursor)
+        cursor.close()
+        conn.rollback()
+    finally:
+        conn.close()
+    return {
+        'version': max(aplicadas, default=0),
+        'version_codigo': VERSION_ESQUEMA,
+        'pendientes': [f"{m.version:03d}_{m.nombre}" for m in MIGRACIONES if m.version not in aplicadas]
+    }
+
+
+def migrar() -> Dict:
+    """
+    Aplica las migraciones pendientes. Si el esquema ya está al día solo
+    hace una consulta. Devuelve {'version', 'aplicadas', 'error'}.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        aplicadas = _versiones_aplicadas(cursor)
+        conn.rollback()
+        if all(m.version in aplicadas for m in MIGRACIONES):
+            cursor.close()
+            return {'version': max(aplicadas), 'aplicadas': [], 'error': None}
+
+        # Solo un worker migra: el resto espera aquí y luego ve todo aplicado
+        cursor.execute("SELECT pg_advisory_lock(%s)", (LLAVE_BLOQUEO_MIGRACIONES,))
+        try:
+            return _aplicar_pendientes(conn, cursor)
+        finally:
+            try:
+                conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (LLAVE_BLOQUEO_MIGRACIONES,))
+                conn.commit()
+                cursor.close()
+            except Exception:
+                # Conexión caída: Postgres ya soltó el lock al cerrar la sesión
+                pass
+    finally:
+        conn.close()
+
+
+def _aplicar_pendientes(conn, cursor) -> Dict:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version INTEGER PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            aplicada_en TIMESTAMP DEFAULT NOW(),
+            duracion_ms INTEGER
+        )
+    """)
+    conn.commit()
+    # Releer con el lock tomado: otro worker pudo migrar mientras esperábamos
+    aplicadas = _versiones_aplicadas(cursor)
+    conn.commit()
+
+    nuevas = []
+    for migracion in MIGRACIONES:
+        if migracion.version in aplicadas:
+            continue
+        etiqueta = f"{migracion.version:03d}_{migracion.nombre}"
+        inicio = time.monotonic()
+        try:
+            migracion.aplicar(cursor)
+            duracion_ms = int((time.monotonic() - inicio) * 1000)
+            cursor.execute("""
+                INSERT INTO schema_migraciones (version, nombre, duracion_ms)
+                VALUES (%s, %s, %s)
+            """, (migracion.version, migracion.nombre, duracion_ms))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Migración {etiqueta} falló: {e}")
+            # Las siguientes pueden depender de esta: se reintenta en el próximo arranque
+            return {'version': max(aplicadas, default=0), 'aplicadas': nuevas, 'error': f"{etiqueta}: {e}"}
+        aplicadas.add(migracion.version)
+        nuevas.append(etiqueta)
+        print(f"✅ Migración {etiqueta} aplicada ({duracion_ms} ms)")
+
+    return {'version': max(aplicadas), 'aplicadas': nuevas, 'error': None}
+
+
+if __name__ == "__main__":
+    if '--estado' in sys.argv:
+        info = estado()
+        print(f"📦 Esquema en versión {info['version']} (código: {info['version_codigo']})")
+        for pendiente in info['pendientes']:
+            print(f"   ⏳ {pendiente}")
+        sys.exit(0)
+
+    resultado = migrar()
+    if resultado['error']:
+        print(f"❌ Migraciones detenidas en {resultado['error']}")
+        sys.exit(1)
+    print(f"✅ Esquema en versión {resultado['version']} "
+          f"({len(resultado['aplicadas'])} migraciones aplicadas)")
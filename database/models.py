@@ -1,11 +1,11 @@
 from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, JSON, Text, Numeric
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import event
 from datetime import datetime
 from fastapi import HTTPException
+from database.circuit_breaker import CircuitBreaker
 import os
-import time
 
 Base = declarative_base()
 
@@ -271,6 +271,7 @@ class Notificacion(Base):
     url_accion = Column(String(500))  # URL donde redirigir al hacer clic
     icono = Column(String(20), default='🔔')  # Emoji del icono
     prioridad = Column(String(20), default='normal')  # 'baja', 'normal', 'alta', 'urgente'
+    clave_idempotencia = Column(String(100), unique=True)  # evita duplicados al reejecutar jobs (p.ej. alertas)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class MensajeChat(Base):
@@ -311,38 +312,76 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Circuit breaker: tras varios fallos de conexión seguidos, las peticiones
+# fallan al instante con 503 en lugar de bloquear un worker esperando a la BD
+db_circuit = CircuitBreaker(
+    umbral_fallos=int(os.getenv('DB_CIRCUIT_UMBRAL', 5)),
+    tiempo_reset=float(os.getenv('DB_CIRCUIT_RESET', 30))
+)
+
+@event.listens_for(engine, "handle_error")
+def _registrar_error_conexion(context):
+    # Solo cuentan los errores de conexión, no los de SQL
+    if context.is_disconnect or context.connection is None:
+        db_circuit.registrar_fallo()
+
+@event.listens_for(engine.pool, "checkout")
+def _registrar_checkout(dbapi_connection, connection_record, connection_proxy):
+    # pool_pre_ping ya validó (o reconectó) la conexión antes de entregarla
+    db_circuit.registrar_exito()
+
+def _verificar_circuito():
+    if not db_circuit.permitir():
+        raise HTTPException(
+            status_code=503,
+            detail="La base de datos está iniciando. Por favor, intenta de nuevo en unos segundos."
+        )
+
+def get_connection():
+    """
+    Obtener conexión psycopg2 del pool compartido del engine.
+
+    Se usa igual que psycopg2.connect(): cursor(), commit(), rollback().
+    Al llamar close() la conexión vuelve al pool en lugar de cerrarse,
+    así que cada request se ahorra el handshake TLS + Postgres.
+    """
+    _verificar_circuito()
+    try:
+        return engine.raw_connection()
+    except engine.dialect.loaded_dbapi.OperationalError:
+        # raw_connection() no pasa por handle_error
+        db_circuit.registrar_fallo()
+        raise
+
+def pool_stats():
+    """Estadísticas del pool de conexiones (para monitoreo)"""
+    pool = engine.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "status": pool.status(),
+        "circuito": db_circuit.stats()
+    }
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created successfully")
 
 def get_db():
-    """Get database session with retry logic"""
-    max_retries = 3
-    retry_delay = 1  # segundos
-    
-    for attempt in range(max_retries):
-        db = SessionLocal()
-        try:
-            # Test connection
-            db.execute(text("SELECT 1"))
-            yield db
-            return
-        except Exception as e:
-            db.close()
-            
-            if attempt < max_retries - 1:
-                print(f"⚠️ Intento {attempt + 1}/{max_retries} falló. Reintentando en {retry_delay}s...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Backoff exponencial
-            else:
-                print(f"❌ Error de base de datos después de {max_retries} intentos: {e}")
-                raise HTTPException(
-                    status_code=503, 
-                    detail="La base de datos está iniciando. Por favor, intenta de nuevo en unos segundos."
-                )
-        finally:
-            try:
-                db.close()
-            except:
-                pass
+    """
+    Get database session.
+
+    La validación de la conexión la hace el pool (pool_pre_ping) al primer
+    uso de la sesión; aquí no hay SELECT 1 ni reintentos con sleep. Si la
+    BD está caída el circuit breaker corta con 503 sin esperar.
+    """
+    _verificar_circuito()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
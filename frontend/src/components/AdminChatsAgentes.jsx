@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react'
 import axios from 'axios'
 import '../components/AdminUniversidades.css'
 import './ChatAdmin.css'
+import { useContadores } from './useContadores'
 
 const API_URL = import.meta.env.VITE_API_URL || 'https://botvisas.onrender.com'
 
@@ -16,15 +17,21 @@ function AdminChatsAgentes() {
 
   useEffect(() => {
     cargarAgentes()
-    cargarNoLeidos()
-    const interval = setInterval(() => {
-      cargarNoLeidos()
-      if (agenteActivo) {
+  }, [agenteActivo])
+
+  // Contador empujado por el servidor (sin polling): si sube, hay mensaje
+  // nuevo de algún agente y se recarga la conversación abierta
+  const tokenEventos = localStorage.getItem('token')
+  useContadores(
+    tokenEventos ? `${API_URL}/api/eventos/equipo?token=${encodeURIComponent(tokenEventos)}` : null,
+    (cambios) => {
+      if (cambios.agentes === undefined) return
+      if (cambios.agentes > noLeidos && agenteActivo) {
         cargarMensajes(agenteActivo.id)
       }
-    }, 10000) // Actualizar cada 10s
-    return () => clearInterval(interval)
-  }, [agenteActivo])
+      setNoLeidos(cambios.agentes)
+    }
+  )
 
   useEffect(() => {
     mensajesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -42,18 +49,6 @@ function AdminChatsAgentes() {
     }
   }
 
-  const cargarNoLeidos = async () => {
-    try {
-      const token = localStorage.getItem('token')
-      const response = await axios.get(`${API_URL}/api/admin/agentes/mensajes/no-leidos`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-      setNoLeidos(response.data.no_leidos || 0)
-    } catch (error) {
-      console.error('Error cargando no leídos:', error)
-    }
-  }
-
   const cargarMensajes = async (agenteId) => {
     setLoading(true)
     try {
@@ -62,7 +57,6 @@ function AdminChatsAgentes() {
         headers: { Authorization: `Bearer ${token}` }
       })
       setMensajes(response.data.mensajes || [])
-      cargarNoLeidos() // Actualizar contador después de marcar como leídos
     } catch (error) {
       console.error('Error cargando mensajes:', error)
     } finally {
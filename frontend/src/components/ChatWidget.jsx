@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react'
 import './ChatWidget.css'
+import { useContadores } from './useContadores'
 
 const API_URL = import.meta.env.VITE_API_URL || 'https://bot-visas-api.onrender.com'
 const WS_URL = API_URL.replace('https://', 'wss://').replace('http://', 'ws://')
@@ -33,14 +34,15 @@ function ChatWidget({ estudianteId }) {
     mensajesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }, [mensajes])
 
-  // Polling no leídos cada 30s
-  useEffect(() => {
-    if (!estudianteId) return
-    
-    cargarNoLeidos()
-    const interval = setInterval(cargarNoLeidos, 30000)
-    return () => clearInterval(interval)
-  }, [estudianteId])
+  // No leídos empujados por el servidor (sin polling)
+  useContadores(
+    estudianteId ? `${API_URL}/api/eventos/estudiante/${estudianteId}` : null,
+    (cambios) => {
+      if (cambios.chat !== undefined) {
+        setNoLeidos(cambios.chat)
+      }
+    }
+  )
 
   const cargarHistorial = async () => {
     try {
@@ -54,18 +56,6 @@ function ChatWidget({ estudianteId }) {
     }
   }
 
-  const cargarNoLeidos = async () => {
-    try {
-      const response = await fetch(`${API_URL}/api/chat/${estudianteId}/no-leidos?remitente=admin`)
-      const data = await response.json()
-      if (data.success) {
-        setNoLeidos(data.no_leidos)
-      }
-    } catch (error) {
-      console.error('Error cargando no leídos:', error)
-    }
-  }
-
   const conectarWebSocket = () => {
     try {
       const ws = new WebSocket(`${WS_URL}/api/ws/chat/${estudianteId}/estudiante`)
@@ -163,8 +153,6 @@ function ChatWidget({ estudianteId }) {
       if (response.ok) {
         setNoLeidos(0)
         console.log('✅ Mensajes marcados como leídos')
-        // Recargar contador después de marcar
-        setTimeout(() => cargarNoLeidos(), 500)
       }
     } catch (error) {
       console.error('Error marcando como leído:', error)
@@ -8,6 +8,7 @@ import GuiaProceso from './GuiaProceso'
 import AdminChats from './AdminChats'
 import TesoroAdmin from './TesoroAdmin'
 import PresupuestosAdmin from './PresupuestosAdmin'
+import { useContadores } from './useContadores'
 
 function DashboardAdminExpandido({ onLogout }) {
   const [activeTab, setActiveTab] = useState('estudiantes')
@@ -88,41 +89,23 @@ function DashboardAdminExpandido({ onLogout }) {
       axios.defaults.headers.common['Authorization'] = `Bearer ${token}`
     }
     cargarDatos()
-    cargarContadorMensajes() // Cargar contador inicial
-    
-    // Actualizar contador cada 30 segundos
-    const interval = setInterval(cargarContadorMensajes, 30000)
-    return () => clearInterval(interval)
   }, [activeTab])
 
-  const cargarContadorMensajes = async () => {
-    try {
-      const token = localStorage.getItem('token')
-      
-      // Contador mensajes estudiantes
-      const response = await axios.get(`${apiUrl}/api/admin/chat/total-no-leidos`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-      if (response.data.success) {
-        // Usar ref para obtener valor actual, no el capturado en closure
-        if (activeTabRef.current !== 'chat') {
-          setMensajesNoLeidos(response.data.total_no_leidos || 0)
-        }
+  // Contadores de mensajes empujados por el servidor (sin polling)
+  const tokenEventos = localStorage.getItem('token')
+  useContadores(
+    tokenEventos ? `${apiUrl}/api/eventos/equipo?token=${encodeURIComponent(tokenEventos)}` : null,
+    (cambios) => {
+      // Usar ref para obtener valor actual, no el capturado en closure
+      if (cambios.chat !== undefined && activeTabRef.current !== 'chat') {
+        setMensajesNoLeidos(cambios.chat)
       }
-
-      // Contador mensajes agentes
-      const responseAgentes = await axios.get(`${apiUrl}/api/admin/agentes/mensajes/no-leidos`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
       // No resetear si están viendo agentes o si hay modal abierto
-      if (activeTabRef.current !== 'agentes') {
-        setMensajesAgentesNoLeidos(responseAgentes.data.no_leidos || 0)
+      if (cambios.agentes !== undefined && activeTabRef.current !== 'agentes') {
+        setMensajesAgentesNoLeidos(cambios.agentes)
       }
-    } catch (error) {
-      console.error('Error cargando contador de mensajes:', error)
-      // No resetear a 0 si hay error, mantener el valor actual
     }
-  }
+  )
 
   const abrirChatAgente = async (agente) => {
     setAgenteParaChat(agente)
@@ -137,7 +120,6 @@ function DashboardAdminExpandido({ onLogout }) {
         headers: { Authorization: `Bearer ${token}` }
       })
       setMensajesAgente(response.data.mensajes || [])
-      cargarContadorMensajes() // Actualizar contador
     } catch (error) {
       console.error('Error cargando mensajes:', error)
     }
@@ -740,11 +722,21 @@ function DashboardAdminExpandido({ onLogout }) {
     
     setLoading(true)
     try {
-      const res = await axios.get(`${apiUrl}/api/admin/sincronizar-cursos-escuelas`)
+      // Se lanza en segundo plano y se consulta el estado hasta que termine
+      let { data: trabajo } = await axios.post(`${apiUrl}/api/admin/sincronizar-cursos-escuelas/trabajos`)
+      while (trabajo.estado === 'pendiente' || trabajo.estado === 'en_curso') {
+        await new Promise(resolve => setTimeout(resolve, 2000))
+        const res = await axios.get(`${apiUrl}/api/admin/sincronizar-cursos-escuelas/trabajos/${trabajo.id}`)
+        trabajo = res.data
+      }
+      if (trabajo.estado === 'error') {
+        throw new Error(trabajo.error)
+      }
+      const resultado = trabajo.resultado
       alert(`✅ Sincronización completada!\n\n` +
-            `📚 Cursos encontrados: ${res.data.cursos_encontrados}\n` +
-            `➕ Cursos nuevos insertados: ${res.data.cursos_insertados}\n` +
-            `🔄 Cursos actualizados: ${res.data.cursos_actualizados}`)
+            `📚 Cursos encontrados: ${resultado.cursos_encontrados}\n` +
+            `➕ Cursos nuevos insertados: ${resultado.cursos_insertados}\n` +
+            `🔄 Cursos actualizados: ${resultado.cursos_actualizados}`)
       cargarDatos()
     } catch (err) {
       alert('Error: ' + (err.response?.data?.detail || err.message))
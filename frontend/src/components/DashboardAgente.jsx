@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useParams, useNavigate } from 'react-router-dom';
 import './DashboardAdminExpandido.css';
+import { useContadores } from './useContadores';
 
 const DashboardAgente = () => {
   const { agenteId } = useParams();
@@ -27,11 +28,22 @@ const DashboardAgente = () => {
 
   useEffect(() => {
     cargarDatos();
-    cargarNoLeidos();
-    const interval = setInterval(cargarNoLeidos, 10000);
-    return () => clearInterval(interval);
   }, [agenteId, activeTab]);
 
+  // Mensajes del admin sin leer, empujados por el servidor (sin polling)
+  const tokenEventos = localStorage.getItem('token');
+  useContadores(
+    tokenEventos ? `${apiUrl}/api/eventos/equipo?token=${encodeURIComponent(tokenEventos)}` : null,
+    (cambios) => {
+      if (cambios.mensajes === undefined) return;
+      setNoLeidos(cambios.mensajes);
+      // Con el chat abierto, traer el mensaje nuevo (y marcarlo como leído)
+      if (cambios.mensajes > 0 && activeTab === 'mensajes') {
+        cargarDatos();
+      }
+    }
+  );
+
   const cargarDatos = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -52,7 +64,6 @@ const DashboardAgente = () => {
       } else if (activeTab === 'mensajes') {
         const mensajesRes = await axios.get(`${apiUrl}/api/agentes/mensajes`, { headers });
         setMensajes(mensajesRes.data);
-        cargarNoLeidos();
       } else if (activeTab === 'estadisticas') {
         const statsRes = await axios.get(`${apiUrl}/api/agentes/estadisticas`, { headers });
         setEstadisticas(statsRes.data);
@@ -149,18 +160,6 @@ Te invito a registrarte en Fortunario Cash, donde te ayudamos con todo el proces
     }
   };
 
-  const cargarNoLeidos = async () => {
-    try {
-      const token = localStorage.getItem('token');
-      const response = await axios.get(`${apiUrl}/api/agentes/mensajes/no-leidos`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setNoLeidos(response.data.no_leidos || 0);
-    } catch (error) {
-      console.error('Error cargando no leídos:', error);
-    }
-  };
-
   const enviarMensaje = async (e) => {
     e.preventDefault();
     if (!mensaje.trim()) return;
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
 import { Link } from 'react-router-dom'
+import { useContadores } from './useContadores'
 import './Notificaciones.css'
 
 const API_URL = import.meta.env.VITE_API_URL || 'https://bot-visas-api.onrender.com'
@@ -11,15 +12,15 @@ function Notificaciones({ estudianteId }) {
   const [mostrarDropdown, setMostrarDropdown] = useState(false)
   const [loading, setLoading] = useState(false)
 
-  // Cargar contador de no leídas cada 30 segundos
-  useEffect(() => {
-    if (!estudianteId) return
-
-    cargarContador()
-    const interval = setInterval(cargarContador, 30000) // 30 segundos
-
-    return () => clearInterval(interval)
-  }, [estudianteId])
+  // Contador de no leídas empujado por el servidor (sin polling)
+  useContadores(
+    estudianteId ? `${API_URL}/api/eventos/estudiante/${estudianteId}` : null,
+    (cambios) => {
+      if (cambios.notificaciones !== undefined) {
+        setNoLeidas(cambios.notificaciones)
+      }
+    }
+  )
 
   // Cargar notificaciones cuando se abre el dropdown
   useEffect(() => {
@@ -28,17 +29,6 @@ function Notificaciones({ estudianteId }) {
     }
   }, [mostrarDropdown, estudianteId])
 
-  const cargarContador = async () => {
-    try {
-      const response = await axios.get(`${API_URL}/api/notificaciones/${estudianteId}/contar`)
-      if (response.data.success) {
-        setNoLeidas(response.data.no_leidas)
-      }
-    } catch (error) {
-      console.error('Error cargando contador:', error)
-    }
-  }
-
   const cargarNotificaciones = async () => {
     setLoading(true)
     try {
@@ -0,0 +1,51 @@
+import { useEffect, useRef } from 'react'
+
+// Contadores de no leídos empujados por el backend (SSE en /api/eventos/...)
+// en lugar de preguntar cada X segundos. `onCambio` recibe solo los que
+// cambiaron, p.ej. { chat: 3 }; al conectar (y al reconectar) llegan todos.
+// Los componentes que piden la misma URL comparten un único EventSource.
+const fuentes = new Map() // url -> { fuente, oyentes }
+
+function suscribir(url, oyente) {
+  let entrada = fuentes.get(url)
+  if (!entrada) {
+    const fuente = new EventSource(url)
+    entrada = { fuente, oyentes: new Set(), ultimos: {} }
+    fuente.addEventListener('contadores', (e) => {
+      let cambios
+      try {
+        cambios = JSON.parse(e.data)
+      } catch (error) {
+        console.error('Error leyendo contadores:', error)
+        return
+      }
+      Object.assign(entrada.ultimos, cambios)
+      entrada.oyentes.forEach(o => o(cambios))
+    })
+    fuentes.set(url, entrada)
+  } else if (Object.keys(entrada.ultimos).length > 0) {
+    // Quien llega tarde recibe los valores actuales sin esperar a un cambio
+    oyente({ ...entrada.ultimos })
+  }
+  entrada.oyentes.add(oyente)
+
+  return () => {
+    entrada.oyentes.delete(oyente)
+    if (entrada.oyentes.size === 0) {
+      entrada.fuente.close()
+      fuentes.delete(url)
+    }
+  }
+}
+
+export function useContadores(url, onCambio) {
+  const onCambioRef = useRef(onCambio)
+  onCambioRef.current = onCambio
+
+  useEffect(() => {
+    if (!url) return
+    return suscribir(url, (cambios) => onCambioRef.current(cambios))
+  }, [url])
+}
+
+export default useContadores
@@ -0,0 +1,135 @@
+"""
+Migración: mover binarios de documentos de Postgres al blob storage
+- documentos.contenido_base64 / url_archivo (data:...;base64,...) -> blob_key
+- documentos_generados.contenido_pdf -> blob_key
+Procesa por lotes y deja la columna base64 en NULL; se puede relanzar
+sin problema (solo toca filas que aún no tienen blob_key; las que fallan
+se dejan intactas).
+
+Uso: python migrar_documentos_blob_storage.py [tamaño_lote]
+Después de migrar conviene ejecutar VACUUM FULL documentos, documentos_generados
+para devolver el espacio al sistema.
+"""
+import os
+import sys
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from api.blob_storage import obtener_storage, decodificar_base64_legacy
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+TAMANO_LOTE = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+
+def migrar_documentos(conn, storage):
+    cur = conn.cursor()
+    total = 0
+    ultimo_id = 0
+    while True:
+        cur.execute("""
+            SELECT id, COALESCE(contenido_base64, url_archivo)
+            FROM documentos
+            WHERE id > %s AND blob_key IS NULL
+              AND (contenido_base64 IS NOT NULL OR url_archivo LIKE 'data:%%')
+            ORDER BY id
+            LIMIT %s
+        """, (ultimo_id, TAMANO_LOTE))
+        filas = cur.fetchall()
+        if not filas:
+            break
+
+        for doc_id, contenido_b64 in filas:
+            ultimo_id = doc_id
+            try:
+                clave = storage.guardar(decodificar_base64_legacy(contenido_b64))
+            except Exception as e:
+                # Se deja la fila intacta para revisarla a mano
+                print(f"   ⚠️  documento {doc_id}: {e} (se omite)")
+                continue
+            cur.execute("""
+                UPDATE documentos
+                SET blob_key = %s,
+                    contenido_base64 = NULL,
+                    url_archivo = CASE WHEN url_archivo LIKE 'data:%%' OR url_archivo LIKE 'base64://%%'
+                                       THEN %s ELSE url_archivo END
+                WHERE id = %s
+            """, (clave, f'blob://{clave}', doc_id))
+
+        conn.commit()
+        total += len(filas)
+        print(f"   📦 documentos migrados: {total}")
+    cur.close()
+    return total
+
+
+def migrar_documentos_generados(conn, storage):
+    cur = conn.cursor()
+    total = 0
+    ultimo_id = 0
+    while True:
+        cur.execute("""
+            SELECT id, contenido_pdf
+            FROM documentos_generados
+            WHERE id > %s AND blob_key IS NULL AND contenido_pdf IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+        """, (ultimo_id, TAMANO_LOTE))
+        filas = cur.fetchall()
+        if not filas:
+            break
+
+        for doc_id, contenido_b64 in filas:
+            ultimo_id = doc_id
+            try:
+                clave = storage.guardar(decodificar_base64_legacy(contenido_b64))
+            except Exception as e:
+                # Se deja la fila intacta para revisarla a mano
+                print(f"   ⚠️  documento generado {doc_id}: {e} (se omite)")
+                continue
+            cur.execute("""
+                UPDATE documentos_generados
+                SET blob_key = %s, contenido_pdf = NULL
+                WHERE id = %s
+            """, (clave, doc_id))
+
+        conn.commit()
+        total += len(filas)
+        print(f"   📦 documentos generados migrados: {total}")
+    cur.close()
+    return total
+
+
+if __name__ == '__main__':
+    if not DATABASE_URL:
+        print("❌ ERROR: No se encontró DATABASE_URL")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("🚀 MIGRANDO DOCUMENTOS A BLOB STORAGE")
+    print("=" * 60)
+
+    conn = psycopg2.connect(DATABASE_URL)
+    storage = obtener_storage()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("ALTER TABLE documentos ADD COLUMN IF NOT EXISTS blob_key VARCHAR(64)")
+        cur.execute("ALTER TABLE documentos_generados ADD COLUMN IF NOT EXISTS blob_key VARCHAR(64)")
+        cur.execute("ALTER TABLE documentos_generados ALTER COLUMN contenido_pdf DROP NOT NULL")
+        conn.commit()
+        cur.close()
+
+        print("\n1. Documentos subidos...")
+        n_docs = migrar_documentos(conn, storage)
+        print("\n2. Documentos generados...")
+        n_gen = migrar_documentos_generados(conn, storage)
+
+        print(f"\n✅ ¡MIGRACIÓN COMPLETADA! ({n_docs} subidos, {n_gen} generados)")
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ ERROR: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
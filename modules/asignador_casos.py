@@ -3,9 +3,11 @@ Sistema de Asignación de Casos a Admins
 Distribuye estudiantes automáticamente entre admins
 """
 
-from typing import List, Dict
+import heapq
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import bindparam, func
 from modules.estudiantes import Estudiante
-from database.models import get_db
+from database.models import SessionLocal
 from datetime import datetime
 
 
@@ -19,6 +21,9 @@ class AsignadorCasos:
         3: {'nombre': 'Especialista Salud', 'especialidades': ['medicina', 'enfermeria'], 'carga_maxima': 15},
     }
     
+    # Estados que cuentan como carga de trabajo del admin
+    ESTADOS_CARGA = ['pendiente_revision_admin', 'aprobado_admin']
+    
     @staticmethod
     def asignar_automaticamente(estudiante_id: int) -> Dict:
         """
@@ -30,9 +35,7 @@ class AsignadorCasos:
         Returns:
             Dict con resultado de asignación
         """
-        from modules.estudiantes import GestorEstudiantes
-        
-        db = get_db()
+        db = SessionLocal()
         
         try:
             estudiante = db.query(Estudiante).filter(Estudiante.id == estudiante_id).first()
@@ -41,11 +44,10 @@ class AsignadorCasos:
                 return {'exito': False, 'error': 'Estudiante no encontrado'}
             
             # Determinar mejor admin
-            admin_id = AsignadorCasos._seleccionar_admin(estudiante)
+            admin_id = AsignadorCasos._seleccionar_admin(estudiante, db)
             
             # Asignar
-            estudiante.admin_revisor_id = admin_id
-            estudiante.fecha_asignacion_admin = datetime.utcnow()
+            AsignadorCasos._guardar_asignaciones(db, [(estudiante.id, admin_id)])
             db.commit()
             
             admin_info = AsignadorCasos.ADMINS.get(admin_id, {})
@@ -61,54 +63,134 @@ class AsignadorCasos:
             db.close()
     
     @staticmethod
-    def _seleccionar_admin(estudiante: Estudiante) -> int:
-        """Selecciona el mejor admin para un estudiante"""
+    def asignar_lote(estudiante_ids: Optional[List[int]] = None, db=None) -> Dict:
+        """
+        Asigna de una vez un lote de estudiantes (p.ej. una importación de
+        referidos) en una sola transacción: una consulta para los
+        estudiantes, otra para las cargas y un único commit.
         
-        # Obtener carga actual de cada admin
-        db = get_db()
+        Solo asigna estudiantes sin admin: los que ya tienen uno se omiten
+        (cambiarlos es reasignar_admin, que deja auditoría).
+        
+        Args:
+            estudiante_ids: IDs a asignar (si None, todos los pendientes de
+                revisión que aún no tienen admin)
+            db: sesión a usar (si None, abre y cierra una propia)
+            
+        Returns:
+            Dict con el número de asignados, los omitidos por tener ya
+            admin y el reparto por admin
+        """
+        cerrar = db is None
+        db = db or SessionLocal()
         
         try:
-            cargas = {}
-            for admin_id in AsignadorCasos.ADMINS.keys():
-                carga = db.query(Estudiante).filter(
-                    Estudiante.admin_revisor_id == admin_id,
-                    Estudiante.estado_procesamiento.in_([
-                        'pendiente_revision_admin',
-                        'aprobado_admin'
-                    ])
-                ).count()
-                
-                cargas[admin_id] = carga
+            consulta = db.query(Estudiante).filter(Estudiante.admin_revisor_id.is_(None))
+            if estudiante_ids is None:
+                consulta = consulta.filter(Estudiante.estado_procesamiento == 'pendiente_revision_admin')
+            else:
+                consulta = consulta.filter(Estudiante.id.in_(estudiante_ids))
+            estudiantes = consulta.order_by(Estudiante.id).all()
             
-            # Filtrar admins por especialidad
-            especialidad = estudiante.especialidad_interes.lower() if estudiante.especialidad_interes else ''
+            omitidos = []
+            if estudiante_ids is not None:
+                encontrados = {estudiante.id for estudiante in estudiantes}
+                omitidos = [
+                    estudiante_id for (estudiante_id,) in db.query(Estudiante.id).filter(
+                        Estudiante.id.in_([i for i in estudiante_ids if i not in encontrados]),
+                        Estudiante.admin_revisor_id.isnot(None)
+                    ).order_by(Estudiante.id)
+                ]
             
-            candidatos = []
-            for admin_id, config in AsignadorCasos.ADMINS.items():
-                # Verificar carga máxima
-                if cargas[admin_id] >= config['carga_maxima']:
-                    continue
-                
-                # Verificar especialidad
-                if 'todas' in config['especialidades']:
-                    candidatos.append((admin_id, 100))  # Score máximo
-                else:
-                    for esp in config['especialidades']:
-                        if esp in especialidad:
-                            candidatos.append((admin_id, 90))  # Score alto
-                            break
-            
-            # Si no hay especialistas, asignar a quien tenga menos carga
-            if not candidatos:
-                admin_menos_carga = min(cargas.items(), key=lambda x: x[1])
-                return admin_menos_carga[0]
-            
-            # Retornar admin con mejor score y menos carga
-            candidatos_ordenados = sorted(candidatos, key=lambda x: (x[1], -cargas[x[0]]), reverse=True)
-            return candidatos_ordenados[0][0]
+            if not estudiantes:
+                return {'exito': True, 'asignados': 0, 'omitidos': omitidos, 'por_admin': {}}
+            
+            balanceo = _BalanceoCarga(AsignadorCasos.ADMINS, AsignadorCasos._cargas(db))
+            asignaciones = []
+            por_admin = {}
             
+            for estudiante in estudiantes:
+                admin_id = balanceo.elegir(estudiante.especialidad_interes)
+                asignaciones.append((estudiante.id, admin_id))
+                if estudiante.estado_procesamiento in AsignadorCasos.ESTADOS_CARGA:
+                    balanceo.sumar(admin_id)
+                por_admin[admin_id] = por_admin.get(admin_id, 0) + 1
+            
+            AsignadorCasos._guardar_asignaciones(db, asignaciones)
+            db.commit()
+            
+            return {
+                'exito': True,
+                'asignados': len(estudiantes),
+                'omitidos': omitidos,
+                'por_admin': por_admin
+            }
+            
+        except Exception:
+            db.rollback()
+            raise
         finally:
-            db.close()
+            if cerrar:
+                db.close()
+    
+    @staticmethod
+    def _guardar_asignaciones(db, asignaciones: List[Tuple[int, int]]):
+        """
+        UPDATE en bloque (executemany) de [(estudiante_id, admin_id), ...].
+        Con UPDATE directo en vez del flush del ORM: el modelo Estudiante de
+        este módulo tiene claves foráneas a tablas de otros metadatos que el
+        ORM no puede ordenar al hacer flush.
+        """
+        tabla = Estudiante.__table__
+        db.execute(
+            tabla.update()
+            .where(tabla.c.id == bindparam('b_estudiante_id'))
+            .values(admin_revisor_id=bindparam('b_admin_id')),
+            [{'b_estudiante_id': estudiante_id, 'b_admin_id': admin_id} for estudiante_id, admin_id in asignaciones]
+        )
+    
+    @staticmethod
+    def _cargas(db) -> Dict[int, Dict[str, int]]:
+        """
+        Carga de cada admin en una sola consulta agrupada
+        
+        Returns:
+            {admin_id: {'activos': n, 'pendientes': n, 'total': n}}
+        """
+        filas = db.query(
+            Estudiante.admin_revisor_id,
+            func.count(Estudiante.id).filter(
+                Estudiante.estado_procesamiento.in_(AsignadorCasos.ESTADOS_CARGA)
+            ),
+            func.count(Estudiante.id).filter(
+                Estudiante.estado_procesamiento == 'pendiente_revision_admin'
+            ),
+            func.count(Estudiante.id)
+        ).filter(
+            Estudiante.admin_revisor_id.in_(list(AsignadorCasos.ADMINS.keys()))
+        ).group_by(Estudiante.admin_revisor_id).all()
+        
+        cargas = {admin_id: {'activos': 0, 'pendientes': 0, 'total': 0} for admin_id in AsignadorCasos.ADMINS}
+        for admin_id, activos, pendientes, total in filas:
+            cargas[admin_id] = {'activos': activos, 'pendientes': pendientes, 'total': total}
+        return cargas
+    
+    @staticmethod
+    def _seleccionar_admin(estudiante: Estudiante, db=None) -> int:
+        """
+        Selecciona el mejor admin para un estudiante: primero los
+        especialistas en su área, luego los generalistas y, dentro de cada
+        grupo, el de menor carga relativa a su carga máxima
+        """
+        cerrar = db is None
+        db = db or SessionLocal()
+        
+        try:
+            balanceo = _BalanceoCarga(AsignadorCasos.ADMINS, AsignadorCasos._cargas(db))
+            return balanceo.elegir(estudiante.especialidad_interes)
+        finally:
+            if cerrar:
+                db.close()
     
     @staticmethod
     def _explicar_asignacion(estudiante: Estudiante, admin_id: int) -> str:
@@ -127,7 +209,7 @@ class AsignadorCasos:
     @staticmethod
     def reasignar_admin(estudiante_id: int, nuevo_admin_id: int, motivo: str) -> Dict:
         """Reasigna estudiante a otro admin"""
-        db = get_db()
+        db = SessionLocal()
         
         try:
             estudiante = db.query(Estudiante).filter(Estudiante.id == estudiante_id).first()
@@ -161,25 +243,19 @@ class AsignadorCasos:
     @staticmethod
     def estadisticas_carga() -> Dict:
         """Estadísticas de carga por admin"""
-        db = get_db()
+        db = SessionLocal()
         
         try:
+            cargas = AsignadorCasos._cargas(db)
             stats = {}
             
             for admin_id, config in AsignadorCasos.ADMINS.items():
-                pendientes = db.query(Estudiante).filter(
-                    Estudiante.admin_revisor_id == admin_id,
-                    Estudiante.estado_procesamiento == 'pendiente_revision_admin'
-                ).count()
-                
-                total_asignados = db.query(Estudiante).filter(
-                    Estudiante.admin_revisor_id == admin_id
-                ).count()
+                pendientes = cargas[admin_id]['pendientes']
                 
                 stats[admin_id] = {
                     'nombre': config['nombre'],
                     'pendientes': pendientes,
-                    'total_asignados': total_asignados,
+                    'total_asignados': cargas[admin_id]['total'],
                     'carga_maxima': config['carga_maxima'],
                     'porcentaje_carga': (pendientes / config['carga_maxima']) * 100
                 }
@@ -188,3 +264,56 @@ class AsignadorCasos:
             
         finally:
             db.close()
+
+
+class _BalanceoCarga:
+    """
+    Reparto por menor carga relativa (carga / carga_maxima) con afinidad
+    por especialidad. Un montículo por especialidad; al sumar carga a un
+    admin se inserta su nueva entrada y las antiguas se descartan al llegar
+    a la cima.
+    """
+    
+    GENERALISTA = 'todas'
+    
+    def __init__(self, admins: Dict[int, Dict], cargas: Dict[int, Dict[str, int]]):
+        self.admins = admins
+        self.cargas = {admin_id: cargas.get(admin_id, {}).get('activos', 0) for admin_id in admins}
+        self._monticulos: Dict[str, List[Tuple[float, int, int]]] = {}
+        for admin_id in admins:
+            self._insertar(admin_id)
+    
+    def _insertar(self, admin_id: int):
+        carga = self.cargas[admin_id]
+        entrada = (carga / self.admins[admin_id]['carga_maxima'], admin_id, carga)
+        for especialidad in self.admins[admin_id]['especialidades']:
+            heapq.heappush(self._monticulos.setdefault(especialidad, []), entrada)
+    
+    def _cima(self, especialidad: str) -> Optional[Tuple[float, int, int]]:
+        """Admin menos cargado de la especialidad, si no está al máximo"""
+        monticulo = self._monticulos.get(especialidad, [])
+        while monticulo and monticulo[0][2] != self.cargas[monticulo[0][1]]:
+            heapq.heappop(monticulo)  # entrada antigua
+        if monticulo and monticulo[0][0] < 1:
+            return monticulo[0]
+        return None
+    
+    def elegir(self, especialidad_interes: Optional[str]) -> int:
+        especialidad = especialidad_interes.lower() if especialidad_interes else ''
+        afines = [
+            esp for esp in self._monticulos
+            if esp != self.GENERALISTA and esp in especialidad
+        ]
+        for grupo in (afines, [self.GENERALISTA]):
+            cimas = [cima for cima in map(self._cima, grupo) if cima]
+            if cimas:
+                return min(cimas)[1]
+        
+        # Todos al máximo: el de menor carga relativa
+        return min(self.admins, key=lambda admin_id: (
+            self.cargas[admin_id] / self.admins[admin_id]['carga_maxima'], admin_id
+        ))
+    
+    def sumar(self, admin_id: int, casos: int = 1):
+        self.cargas[admin_id] += casos
+        self._insertar(admin_id)
@@ -1,13 +1,39 @@
 """
 Sistema de Búsqueda y Filtros Avanzados
 Permite búsquedas complejas de estudiantes
+
+La búsqueda por texto usa la columna `estudiantes.busqueda_normalizada`
+(nombre + email + pasaporte en minúsculas y sin acentos), mantenida por un
+trigger en INSERT/UPDATE e indexada con pg_trgm (GIN): admite coincidencias
+parciales, tolera errores de escritura y ordena por relevancia.
 """
 
+import unicodedata
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from modules.estudiantes import Estudiante
-from database.models import get_db
-from sqlalchemy import or_, and_
+from database.models import SessionLocal
+from sqlalchemy import or_, and_, text
+
+# Coincidencia: subcadena o parecido por trigramas (errores de escritura)
+SQL_COINCIDE = "(busqueda_normalizada LIKE :busqueda_like OR :busqueda <% busqueda_normalizada)"
+# float8: word_similarity devuelve real y el cursor de paginación guarda la
+# clave como float de Python; comparado con un real se redondearía distinto
+SQL_RELEVANCIA = "word_similarity(:busqueda, COALESCE(busqueda_normalizada, ''))::float8"
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin acentos (igual que lower(unaccent(...)) en Postgres)"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+
+def params_busqueda(texto: str) -> Dict[str, str]:
+    """Parámetros para SQL_COINCIDE / SQL_RELEVANCIA"""
+    normalizado = normalizar_texto(texto)
+    escapado = normalizado.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return {'busqueda': normalizado, 'busqueda_like': f'%{escapado}%'}
 
 
 class BuscadorEstudiantes:
@@ -28,18 +54,21 @@ class BuscadorEstudiantes:
         nivel_espanol: str = None,
         admin_revisor_id: int = None,
         fondos_suficientes: bool = None,
-        documentos_completos: bool = None
+        documentos_completos: bool = None,
+        db=None
     ) -> List[Estudiante]:
         """
         Búsqueda avanzada con múltiples filtros
         
         Args:
             Múltiples parámetros opcionales de búsqueda
+            db: sesión a usar (si None, abre y cierra una propia)
             
         Returns:
             Lista de estudiantes que coinciden
         """
-        db = get_db()
+        cerrar = db is None
+        db = db or SessionLocal()
         
         try:
             query = db.query(Estudiante)
@@ -122,34 +151,37 @@ class BuscadorEstudiantes:
             return resultados
             
         finally:
-            db.close()
+            if cerrar:
+                db.close()
     
     @staticmethod
-    def busqueda_rapida(texto: str) -> List[Estudiante]:
+    def busqueda_rapida(texto: str, db=None) -> List[Estudiante]:
         """
         Búsqueda rápida por nombre, pasaporte o email
         
         Args:
             texto: Texto a buscar
+            db: sesión a usar (si None, abre y cierra una propia)
             
         Returns:
             Lista de estudiantes
         """
-        db = get_db()
+        cerrar = db is None
+        db = db or SessionLocal()
         
         try:
+            # Índice de trigramas sobre busqueda_normalizada, más relevantes primero
             resultados = db.query(Estudiante).filter(
-                or_(
-                    Estudiante.nombre_completo.ilike(f'%{texto}%'),
-                    Estudiante.numero_pasaporte.ilike(f'%{texto}%'),
-                    Estudiante.email.ilike(f'%{texto}%')
-                )
-            ).limit(20).all()
+                text(SQL_COINCIDE)
+            ).order_by(
+                text(f"{SQL_RELEVANCIA} DESC")
+            ).params(**params_busqueda(texto)).limit(20).all()
             
             return resultados
             
         finally:
-            db.close()
+            if cerrar:
+                db.close()
     
     @staticmethod
     def filtros_predefinidos(filtro: str) -> List[Estudiante]:
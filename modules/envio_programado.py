@@ -8,7 +8,6 @@ from typing import Dict, List, Optional
 from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Boolean, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from database.models import get_db
-from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
 
 Base = declarative_base()
@@ -42,15 +41,14 @@ class EnvioProgramado(Base):
 class GestorEnviosProgramados:
     """Gestor de envíos programados"""
     
-    scheduler = None
-    
     @staticmethod
-    def inicializar_scheduler():
-        """Inicializa el scheduler de tareas programadas"""
-        if GestorEnviosProgramados.scheduler is None:
-            GestorEnviosProgramados.scheduler = BackgroundScheduler()
-            GestorEnviosProgramados.scheduler.start()
-            print("✅ Scheduler de envíos programados iniciado")
+    def _planificador():
+        """
+        Planificador compartido: la tarea se guarda en la BD y la ejecuta el
+        worker líder, una sola vez aunque haya varios workers
+        """
+        from api.planificador import obtener_planificador
+        return obtener_planificador()
     
     @staticmethod
     def programar_envio(
@@ -97,15 +95,14 @@ class GestorEnviosProgramados:
             db.commit()
             db.refresh(envio)
             
-            # Programar en el scheduler
-            GestorEnviosProgramados.inicializar_scheduler()
-            
-            GestorEnviosProgramados.scheduler.add_job(
-                func=GestorEnviosProgramados._ejecutar_envio,
-                trigger=DateTrigger(run_date=fecha_programada),
+            # Programar en el scheduler (se envía aunque el líder llegue tarde)
+            GestorEnviosProgramados._planificador().programar(
+                f"envio_{envio.id}",
+                'modules.envio_programado:GestorEnviosProgramados._ejecutar_envio',
+                DateTrigger(run_date=fecha_programada),
                 args=[envio.id],
-                id=f"envio_{envio.id}",
-                replace_existing=True
+                nombre=f"Envío programado #{envio.id}",
+                margen_segundos=None
             )
             
             print(f"✅ Envío programado para {fecha_programada.strftime('%d/%m/%Y %H:%M')}")
@@ -190,10 +187,7 @@ class GestorEnviosProgramados:
                 return False
             
             # Cancelar en el scheduler
-            try:
-                GestorEnviosProgramados.scheduler.remove_job(f"envio_{envio_id}")
-            except:
-                pass
+            GestorEnviosProgramados._planificador().cancelar(f"envio_{envio_id}")
             
             # Actualizar estado
             envio.estado = 'cancelado'
@@ -243,9 +237,9 @@ class GestorEnviosProgramados:
             envio.updated_at = datetime.utcnow()
             
             # Reprogramar en el scheduler
-            GestorEnviosProgramados.scheduler.reschedule_job(
-                job_id=f"envio_{envio_id}",
-                trigger=DateTrigger(run_date=nueva_fecha)
+            GestorEnviosProgramados._planificador().reprogramar(
+                f"envio_{envio_id}",
+                DateTrigger(run_date=nueva_fecha)
             )
             
             db.commit()
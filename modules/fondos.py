@@ -4,7 +4,7 @@ Verificación de fondos, cartas de patrocinio, transferencias
 """
 
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, JSON, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from database.models import get_db
@@ -81,6 +81,30 @@ class TransferenciaFondos(Base):
 class GestorFondos:
     """Gestor principal de fondos económicos"""
     
+    # Cálculo de fondos mínimos requeridos
+    MANUTENCION_MENSUAL = 600  # € mínimo por mes
+    ALOJAMIENTO_MENSUAL = 500  # € promedio
+    SEGURO_ANUAL = 400  # €
+    
+    @staticmethod
+    def calcular_fondos_minimos(curso=None) -> Tuple[float, float, int]:
+        """
+        Fondos mínimos para el curso (o para un curso estándar si no hay)
+        
+        Returns:
+            (fondos_minimos, costo_matricula, duracion_meses)
+        """
+        if curso:
+            duracion_meses = curso.duracion_meses or 12
+            costo_matricula = curso.precio or 5000
+        else:
+            duracion_meses = 12
+            costo_matricula = 5000
+        
+        fondos_minimos = costo_matricula + (GestorFondos.MANUTENCION_MENSUAL * duracion_meses) + \
+                        (GestorFondos.ALOJAMIENTO_MENSUAL * duracion_meses) + GestorFondos.SEGURO_ANUAL
+        return fondos_minimos, costo_matricula, duracion_meses
+    
     @staticmethod
     def verificar_fondos(estudiante_id: int) -> Dict:
         """
@@ -108,20 +132,7 @@ class GestorFondos:
             curso = GestorCursos.obtener_curso_por_id(estudiante.curso_asignado_id)
         
         # Calcular fondos necesarios
-        if curso:
-            duracion_meses = curso.duracion_meses or 12
-            costo_matricula = curso.precio or 5000
-        else:
-            duracion_meses = 12
-            costo_matricula = 5000
-        
-        # Cálculo de fondos mínimos requeridos
-        MANUTENCIÓN_MENSUAL = 600  # € mínimo por mes
-        ALOJAMIENTO_MENSUAL = 500  # € promedio
-        SEGURO_ANUAL = 400  # €
-        
-        fondos_minimos = costo_matricula + (MANUTENCIÓN_MENSUAL * duracion_meses) + \
-                        (ALOJAMIENTO_MENSUAL * duracion_meses) + SEGURO_ANUAL
+        fondos_minimos, costo_matricula, duracion_meses = GestorFondos.calcular_fondos_minimos(curso)
         
         # Evaluar fuentes de fondos
         fondos_disponibles = 0
@@ -202,9 +213,9 @@ class GestorFondos:
             'fuentes': fuentes,
             'desglose': {
                 'matricula': costo_matricula,
-                'manutencion': MANUTENCIÓN_MENSUAL * duracion_meses,
-                'alojamiento': ALOJAMIENTO_MENSUAL * duracion_meses,
-                'seguro': SEGURO_ANUAL,
+                'manutencion': GestorFondos.MANUTENCION_MENSUAL * duracion_meses,
+                'alojamiento': GestorFondos.ALOJAMIENTO_MENSUAL * duracion_meses,
+                'seguro': GestorFondos.SEGURO_ANUAL,
                 'duracion_meses': duracion_meses
             },
             'recomendaciones': GestorFondos._generar_recomendaciones_fondos(
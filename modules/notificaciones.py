@@ -6,7 +6,6 @@ vía Email, WhatsApp y Telegram
 
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from telegram import Bot
@@ -15,6 +14,7 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Foreign
 from sqlalchemy.ext.declarative import declarative_base
 from database.models import get_db
 import config
+from api import servicio_smtp
 
 Base = declarative_base()
 
@@ -196,11 +196,12 @@ class SistemaNotificaciones:
             msg.attach(part)
             
             # Enviar
-            server = smtplib.SMTP(SistemaNotificaciones.SMTP_SERVER, SistemaNotificaciones.SMTP_PORT)
-            server.starttls()
-            server.login(SistemaNotificaciones.EMAIL_FROM, SistemaNotificaciones.EMAIL_PASSWORD)
-            server.sendmail(SistemaNotificaciones.EMAIL_FROM, email_destino, msg.as_string())
-            server.quit()
+            servicio_smtp.enviar(msg, servicio_smtp.ConfigSMTP(
+                SistemaNotificaciones.SMTP_SERVER,
+                SistemaNotificaciones.SMTP_PORT,
+                SistemaNotificaciones.EMAIL_FROM,
+                SistemaNotificaciones.EMAIL_PASSWORD
+            ))
             
             return True
         except Exception as e:
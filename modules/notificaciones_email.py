@@ -3,7 +3,6 @@ Sistema de Notificaciones por Email
 Reemplaza las notificaciones de Telegram con emails profesionales
 """
 
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -11,6 +10,7 @@ from email import encoders
 from typing import List, Dict, Optional
 from datetime import datetime
 import config
+from api import servicio_smtp
 
 
 class EmailService:
@@ -25,16 +25,14 @@ class EmailService:
     FROM_NAME = getattr(config, 'FROM_NAME', 'Agencia Educativa España')
     
     @staticmethod
-    def _crear_conexion():
-        """Crea conexión SMTP"""
-        try:
-            server = smtplib.SMTP(EmailService.SMTP_SERVER, EmailService.SMTP_PORT)
-            server.starttls()
-            server.login(EmailService.SMTP_USER, EmailService.SMTP_PASSWORD)
-            return server
-        except Exception as e:
-            print(f"❌ Error conectando a SMTP: {e}")
-            return None
+    def _config_smtp() -> servicio_smtp.ConfigSMTP:
+        """Configuración SMTP (las conexiones las gestiona servicio_smtp)"""
+        return servicio_smtp.ConfigSMTP(
+            EmailService.SMTP_SERVER,
+            EmailService.SMTP_PORT,
+            EmailService.SMTP_USER,
+            EmailService.SMTP_PASSWORD
+        )
     
     @staticmethod
     def enviar_email(
@@ -86,15 +84,9 @@ class EmailService:
                     mensaje.attach(parte)
             
             # Enviar
-            server = EmailService._crear_conexion()
-            if server:
-                server.send_message(mensaje)
-                server.quit()
-                print(f"✅ Email enviado a {destinatario}")
-                return True
-            else:
-                print(f"❌ No se pudo conectar al servidor SMTP")
-                return False
+            servicio_smtp.enviar(mensaje, EmailService._config_smtp())
+            print(f"✅ Email enviado a {destinatario}")
+            return True
                 
         except Exception as e:
             print(f"❌ Error enviando email: {e}")
@@ -2,17 +2,16 @@
 Sistema de Notificaciones Automáticas
 Envía correos y notificaciones internas por cada acción importante
 """
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import psycopg2
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from database.models import get_connection
+from api import servicio_smtp
 
 load_dotenv()
 
-DATABASE_URL = os.getenv('DATABASE_URL')
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
 SMTP_USER = os.getenv('SMTP_USER')
@@ -23,7 +22,10 @@ class SistemaNotificaciones:
     
     @staticmethod
     def _enviar_email(destinatario, asunto, contenido_html):
-        """Envía un correo electrónico"""
+        """
+        Encola un correo electrónico: se envía en segundo plano, por lotes,
+        por una conexión SMTP persistente (el resultado se registra en el log)
+        """
         try:
             msg = MIMEMultipart('alternative')
             msg['Subject'] = asunto
@@ -33,22 +35,17 @@ class SistemaNotificaciones:
             html_part = MIMEText(contenido_html, 'html', 'utf-8')
             msg.attach(html_part)
             
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.send_message(msg)
-            
-            print(f"✅ Email enviado a {destinatario}: {asunto}")
+            servicio_smtp.encolar(msg, servicio_smtp.ConfigSMTP(SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD))
             return True
         except Exception as e:
-            print(f"❌ Error enviando email a {destinatario}: {e}")
+            print(f"❌ Error encolando email a {destinatario}: {e}")
             return False
     
     @staticmethod
     def _crear_notificacion_interna(estudiante_id, tipo, titulo, mensaje):
         """Crea una notificación en la base de datos"""
         try:
-            conn = psycopg2.connect(DATABASE_URL)
+            conn = get_connection()
             cur = conn.cursor()
             
             cur.execute("""
@@ -69,7 +66,7 @@ class SistemaNotificaciones:
     def _obtener_email_estudiante(estudiante_id):
         """Obtiene el email del estudiante"""
         try:
-            conn = psycopg2.connect(DATABASE_URL)
+            conn = get_connection()
             cur = conn.cursor()
             cur.execute("SELECT email, nombre FROM estudiantes WHERE id = %s", (estudiante_id,))
             resultado = cur.fetchone()
@@ -3,19 +3,87 @@ Sistema de Prioridades Inteligente
 Ordena estudiantes por urgencia, completitud y probabilidad de éxito
 """
 
+import heapq
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
+from sqlalchemy import func
 from modules.estudiantes import Estudiante
-from modules.cursos import GestorCursos
-from modules.fondos import GestorFondos
-from database.models import get_db
+from modules.cursos import Curso
+from modules.fondos import GestorFondos, Patrocinador, TransferenciaFondos
+from database.models import SessionLocal
+
+# Parte del score que solo depende de datos guardados (completitud, fondos,
+# perfil), por estudiante: {estudiante_id: (firma_de_los_datos, desglose)}.
+# La urgencia y la espera dependen de la hora y se calculan siempre.
+_scores_cache: Dict[int, tuple] = {}
+_scores_lock = threading.Lock()
 
 
 class SistemaPrioridades:
     """Calcula prioridades para revisión de estudiantes"""
     
     @staticmethod
-    def calcular_score_prioridad(estudiante: Estudiante) -> Dict:
+    def cargar_datos_prioridad(db, estudiantes: List[Estudiante]) -> Dict[int, Dict]:
+        """
+        Carga de una vez los cursos, patrocinadores y transferencias de los
+        estudiantes (tres consultas en total, no tres por estudiante)
+        
+        Returns:
+            {estudiante_id: {'curso': Curso|None, 'porcentaje_cobertura': float|None}}
+        """
+        cursos_ids = {e.curso_asignado_id for e in estudiantes if e.curso_asignado_id}
+        cursos = {}
+        if cursos_ids:
+            cursos = {c.id: c for c in db.query(Curso).filter(Curso.id.in_(cursos_ids)).all()}
+        
+        # Fondos: mismo cálculo que GestorFondos.verificar_fondos, en bloque
+        try:
+            patrocinadores_ids = {
+                e.patrocinador_id for e in estudiantes
+                if e.tiene_patrocinador and e.patrocinador_id
+            }
+            patrocinios = {}
+            if patrocinadores_ids:
+                patrocinios = dict(
+                    db.query(Patrocinador.id, Patrocinador.capacidad_patrocinio)
+                    .filter(Patrocinador.id.in_(patrocinadores_ids)).all()
+                )
+            
+            transferencias = dict(
+                db.query(TransferenciaFondos.estudiante_id, func.sum(TransferenciaFondos.monto))
+                .filter(
+                    TransferenciaFondos.estudiante_id.in_([e.id for e in estudiantes]),
+                    TransferenciaFondos.estado == 'completada'
+                )
+                .group_by(TransferenciaFondos.estudiante_id).all()
+            ) if estudiantes else {}
+            fondos_ok = True
+        except Exception as e:
+            print(f"⚠️ No se pudieron cargar los fondos para prioridades: {e}")
+            db.rollback()
+            fondos_ok = False
+        
+        datos = {}
+        for est in estudiantes:
+            curso = cursos.get(est.curso_asignado_id)
+            porcentaje_cobertura = None
+            if fondos_ok:
+                fondos_minimos, _, _ = GestorFondos.calcular_fondos_minimos(curso)
+                fondos_disponibles = 0
+                if est.tiene_fondos_propios and est.monto_fondos_disponibles:
+                    fondos_disponibles += est.monto_fondos_disponibles
+                if est.tiene_patrocinador and est.patrocinador_id:
+                    fondos_disponibles += patrocinios.get(est.patrocinador_id) or 0
+                fondos_disponibles += transferencias.get(est.id) or 0
+                porcentaje_cobertura = (fondos_disponibles / fondos_minimos * 100) if fondos_minimos > 0 else 0
+            
+            datos[est.id] = {'curso': curso, 'porcentaje_cobertura': porcentaje_cobertura}
+        
+        return datos
+    
+    @staticmethod
+    def calcular_score_prioridad(estudiante: Estudiante, datos: Optional[Dict] = None) -> Dict:
         """
         Calcula un score de prioridad para un estudiante
         
@@ -28,10 +96,19 @@ class SistemaPrioridades:
         
         Args:
             estudiante: Objeto Estudiante
+            datos: Curso y cobertura de fondos ya cargados (ver
+                cargar_datos_prioridad); si None se consultan ahora
             
         Returns:
             Dict con score y desglose
         """
+        if datos is None:
+            db = SessionLocal()
+            try:
+                datos = SistemaPrioridades.cargar_datos_prioridad(db, [estudiante])[estudiante.id]
+            finally:
+                db.close()
+        
         score = 0
         desglose = {}
         
@@ -40,7 +117,7 @@ class SistemaPrioridades:
         dias_hasta_inicio = None
         
         if estudiante.curso_asignado_id:
-            curso = GestorCursos.obtener_curso_por_id(estudiante.curso_asignado_id)
+            curso = datos['curso']
             if curso and curso.fecha_inicio:
                 dias_hasta_inicio = (curso.fecha_inicio - datetime.now()).days
                 
@@ -60,48 +137,24 @@ class SistemaPrioridades:
             'nivel': 'muy_urgente' if urgencia_score >= 35 else 'urgente' if urgencia_score >= 25 else 'moderado' if urgencia_score >= 15 else 'normal'
         }
         
-        # 2. COMPLETITUD DE INFORMACIÓN (0-25 puntos)
-        completitud_score = 0
-        
-        total_docs = len(estudiante.documentos_completados or []) + len(estudiante.documentos_pendientes or [])
-        if total_docs > 0:
-            porcentaje_docs = (len(estudiante.documentos_completados or []) / total_docs) * 100
-            completitud_score = int(porcentaje_docs * 0.25)  # Max 25 puntos
-        
-        score += completitud_score
-        desglose['completitud'] = {
-            'puntos': completitud_score,
-            'porcentaje_documentos': porcentaje_docs if total_docs > 0 else 0,
-            'nivel': 'completo' if completitud_score >= 20 else 'alto' if completitud_score >= 15 else 'medio' if completitud_score >= 10 else 'bajo'
-        }
-        
-        # 3. FONDOS ECONÓMICOS (0-20 puntos)
-        fondos_score = 0
+        # 2, 3 y 5: solo dependen de datos guardados, se reutilizan mientras no cambien
+        firma = SistemaPrioridades._firma_datos(estudiante, datos)
+        with _scores_lock:
+            en_cache = _scores_cache.get(estudiante.id)
+        if en_cache and en_cache[0] == firma:
+            desglose_fijo = en_cache[1]
+        else:
+            desglose_fijo = SistemaPrioridades._desglose_fijo(estudiante, datos)
+            with _scores_lock:
+                _scores_cache[estudiante.id] = (firma, desglose_fijo)
         
-        try:
-            verificacion = GestorFondos.verificar_fondos(estudiante.id)
-            porcentaje_fondos = verificacion.get('porcentaje_cobertura', 0)
-            
-            if porcentaje_fondos >= 100:
-                fondos_score = 20  # Fondos suficientes
-            elif porcentaje_fondos >= 80:
-                fondos_score = 15  # Casi suficientes
-            elif porcentaje_fondos >= 50:
-                fondos_score = 10  # Parciales
-            else:
-                fondos_score = 5   # Insuficientes (pero igual requiere atención)
-        except:
-            fondos_score = 10  # Default si no se puede verificar
-        
-        score += fondos_score
-        desglose['fondos'] = {
-            'puntos': fondos_score,
-            'porcentaje_cobertura': porcentaje_fondos if 'verificacion' in locals() else 0,
-            'nivel': 'suficiente' if fondos_score >= 18 else 'casi_suficiente' if fondos_score >= 13 else 'parcial' if fondos_score >= 8 else 'insuficiente'
-        }
+        desglose['completitud'] = desglose_fijo['completitud']
+        desglose['fondos'] = desglose_fijo['fondos']
+        score += desglose['completitud']['puntos'] + desglose['fondos']['puntos']
         
         # 4. TIEMPO ESPERANDO REVISIÓN (0-10 puntos)
         tiempo_espera_score = 0
+        horas_esperando = 0
         
         if estudiante.fecha_procesamiento_automatico:
             horas_esperando = (datetime.now() - estudiante.fecha_procesamiento_automatico).total_seconds() / 3600
@@ -118,10 +171,79 @@ class SistemaPrioridades:
         score += tiempo_espera_score
         desglose['tiempo_espera'] = {
             'puntos': tiempo_espera_score,
-            'horas_esperando': horas_esperando if 'horas_esperando' in locals() else 0,
+            'horas_esperando': horas_esperando,
             'nivel': 'critico' if tiempo_espera_score >= 9 else 'alto' if tiempo_espera_score >= 6 else 'moderado' if tiempo_espera_score >= 4 else 'reciente'
         }
         
+        desglose['calidad_perfil'] = desglose_fijo['calidad_perfil']
+        score += desglose['calidad_perfil']['puntos']
+        
+        # SCORE TOTAL (0-100)
+        return {
+            'score_total': min(score, 100),  # Máximo 100
+            'prioridad': 'URGENTE' if score >= 70 else 'ALTA' if score >= 50 else 'MEDIA' if score >= 30 else 'BAJA',
+            'desglose': desglose,
+            'recomendacion': SistemaPrioridades._generar_recomendacion(desglose)
+        }
+    
+    @staticmethod
+    def _firma_datos(estudiante: Estudiante, datos: Dict) -> tuple:
+        """Valores de los que dependen completitud, fondos y calidad del perfil"""
+        curso = datos['curso']
+        return (
+            len(estudiante.documentos_completados or []),
+            len(estudiante.documentos_pendientes or []),
+            datos['porcentaje_cobertura'],
+            bool(estudiante.email),
+            bool(estudiante.telefono),
+            bool(estudiante.especialidad_interes),
+            bool(estudiante.nivel_espanol),
+            estudiante.curso_asignado_id,
+            curso.id if curso else None,
+        )
+    
+    @staticmethod
+    def _desglose_fijo(estudiante: Estudiante, datos: Dict) -> Dict:
+        """Completitud (0-25), fondos (0-20) y calidad del perfil (0-5)"""
+        desglose = {}
+        
+        # 2. COMPLETITUD DE INFORMACIÓN (0-25 puntos)
+        completitud_score = 0
+        
+        porcentaje_docs = 0
+        total_docs = len(estudiante.documentos_completados or []) + len(estudiante.documentos_pendientes or [])
+        if total_docs > 0:
+            porcentaje_docs = (len(estudiante.documentos_completados or []) / total_docs) * 100
+            completitud_score = int(porcentaje_docs * 0.25)  # Max 25 puntos
+        
+        desglose['completitud'] = {
+            'puntos': completitud_score,
+            'porcentaje_documentos': porcentaje_docs,
+            'nivel': 'completo' if completitud_score >= 20 else 'alto' if completitud_score >= 15 else 'medio' if completitud_score >= 10 else 'bajo'
+        }
+        
+        # 3. FONDOS ECONÓMICOS (0-20 puntos)
+        fondos_score = 0
+        
+        porcentaje_fondos = datos['porcentaje_cobertura']
+        
+        if porcentaje_fondos is None:
+            fondos_score = 10  # Default si no se puede verificar
+        elif porcentaje_fondos >= 100:
+            fondos_score = 20  # Fondos suficientes
+        elif porcentaje_fondos >= 80:
+            fondos_score = 15  # Casi suficientes
+        elif porcentaje_fondos >= 50:
+            fondos_score = 10  # Parciales
+        else:
+            fondos_score = 5   # Insuficientes (pero igual requiere atención)
+        
+        desglose['fondos'] = {
+            'puntos': fondos_score,
+            'porcentaje_cobertura': porcentaje_fondos or 0,
+            'nivel': 'suficiente' if fondos_score >= 18 else 'casi_suficiente' if fondos_score >= 13 else 'parcial' if fondos_score >= 8 else 'insuficiente'
+        }
+        
         # 5. CALIDAD DEL PERFIL (0-5 puntos)
         calidad_score = 0
         
@@ -137,19 +259,12 @@ class SistemaPrioridades:
         else:
             calidad_score = 2
         
-        score += calidad_score
         desglose['calidad_perfil'] = {
             'puntos': calidad_score,
             'nivel': 'completo' if calidad_score >= 4 else 'incompleto'
         }
-        
-        # SCORE TOTAL (0-100)
-        return {
-            'score_total': min(score, 100),  # Máximo 100
-            'prioridad': 'URGENTE' if score >= 70 else 'ALTA' if score >= 50 else 'MEDIA' if score >= 30 else 'BAJA',
-            'desglose': desglose,
-            'recomendacion': SistemaPrioridades._generar_recomendacion(desglose)
-        }
+    
+        return desglose
     
     @staticmethod
     def _generar_recomendacion(desglose: Dict) -> str:
@@ -181,7 +296,8 @@ class SistemaPrioridades:
     @staticmethod
     def ordenar_estudiantes_por_prioridad(
         estudiantes: List[Estudiante] = None,
-        limite: int = None
+        limite: int = None,
+        db=None
     ) -> List[Dict]:
         """
         Ordena estudiantes por prioridad
@@ -189,15 +305,18 @@ class SistemaPrioridades:
         Args:
             estudiantes: Lista de estudiantes (si None, busca todos los pendientes)
             limite: Número máximo de resultados
+            db: sesión a usar (si None, abre y cierra una propia)
             
         Returns:
             Lista ordenada de estudiantes con sus scores
         """
-        db = get_db()
+        cerrar = db is None
+        db = db or SessionLocal()
         
         try:
             # Si no se pasan estudiantes, buscar todos los pendientes
-            if estudiantes is None:
+            pendientes = estudiantes is None
+            if pendientes:
                 estudiantes = db.query(Estudiante).filter(
                     Estudiante.estado_procesamiento.in_([
                         'procesado_automaticamente',
@@ -208,8 +327,17 @@ class SistemaPrioridades:
             # Calcular score para cada estudiante
             estudiantes_con_score = []
             
+            # Cursos y fondos de todos los estudiantes en bloque
+            datos = SistemaPrioridades.cargar_datos_prioridad(db, estudiantes)
+            
+            if pendientes:
+                # Olvidar los que ya no están pendientes de revisión
+                with _scores_lock:
+                    for estudiante_id in set(_scores_cache) - set(datos):
+                        del _scores_cache[estudiante_id]
+            
             for est in estudiantes:
-                score_info = SistemaPrioridades.calcular_score_prioridad(est)
+                score_info = SistemaPrioridades.calcular_score_prioridad(est, datos[est.id])
                 
                 estudiantes_con_score.append({
                     'estudiante': est,
@@ -223,17 +351,17 @@ class SistemaPrioridades:
                     'fecha_procesamiento': est.fecha_procesamiento_automatico
                 })
             
-            # Ordenar por score descendente
-            estudiantes_con_score.sort(key=lambda x: x['score'], reverse=True)
-            
-            # Limitar resultados si se especifica
+            # Ordenar por score descendente (con límite basta un heap parcial)
             if limite:
-                estudiantes_con_score = estudiantes_con_score[:limite]
+                estudiantes_con_score = heapq.nlargest(limite, estudiantes_con_score, key=lambda x: x['score'])
+            else:
+                estudiantes_con_score.sort(key=lambda x: x['score'], reverse=True)
             
             return estudiantes_con_score
             
         finally:
-            db.close()
+            if cerrar:
+                db.close()
     
     @staticmethod
     def obtener_estudiantes_urgentes(
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test de la asignación en lote de casos a admins
+Corre asignar_lote contra una base SQLite en memoria con la tabla
+estudiantes real (sin las claves foráneas a cursos, patrocinadores...).
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/no_usada')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from modules.asignador_casos import AsignadorCasos
+from modules.estudiantes import Estudiante
+
+
+def _sesion(estudiantes):
+    engine = create_engine('sqlite://')
+    tabla = Estudiante.__table__
+    with engine.begin() as conn:
+        conn.execute(CreateTable(tabla, include_foreign_key_constraints=[]))
+        # INSERT directo: el flush del ORM no resuelve esas claves foráneas
+        conn.execute(tabla.insert(), [
+            {
+                'id': i, 'telegram_id': 1000 + i, 'nombre_completo': f'Estudiante {i}',
+                'numero_pasaporte': f'P{i:07d}', 'especialidad_interes': especialidad,
+                'estado_procesamiento': estado, 'admin_revisor_id': admin_id
+            }
+            for i, (especialidad, estado, admin_id) in enumerate(estudiantes, start=1)
+        ])
+    return sessionmaker(bind=engine)()
+
+
+def _admins(db):
+    return dict(db.query(Estudiante.id, Estudiante.admin_revisor_id).all())
+
+
+def test_asignar_lote_pendientes():
+    """Reparte los pendientes sin admin por especialidad y carga"""
+    db = _sesion([
+        ('Ingenieria Informatica', 'pendiente_revision_admin', None),
+        ('Medicina', 'pendiente_revision_admin', None),
+        ('Derecho', 'pendiente_revision_admin', None),
+        ('Derecho', 'registrado', None),
+    ])
+
+    resultado = AsignadorCasos.asignar_lote(db=db)
+
+    assert resultado['asignados'] == 3
+    assert resultado['por_admin'] == {2: 1, 3: 1, 1: 1}
+    db.expire_all()
+    assert _admins(db) == {1: 2, 2: 3, 3: 1, 4: None}
+
+
+def test_asignar_lote_omite_ya_asignados():
+    """Un estudiante con admin no se reasigna ni altera el reparto"""
+    db = _sesion(
+        [('Medicina', 'pendiente_revision_admin', 3)] * 14
+        + [('Medicina', 'pendiente_revision_admin', None)] * 2
+    )
+
+    resultado = AsignadorCasos.asignar_lote([1, 15, 16], db=db)
+
+    assert resultado['asignados'] == 2
+    assert resultado['omitidos'] == [1]
+    # El especialista (14/15) recibe uno y, lleno, el siguiente va al principal
+    assert resultado['por_admin'] == {3: 1, 1: 1}
+    db.expire_all()
+    admins = _admins(db)
+    assert (admins[1], admins[15], admins[16]) == (3, 3, 1)
+
+
+if __name__ == "__main__":
+    test_asignar_lote_pendientes()
+    test_asignar_lote_omite_ya_asignados()
+    print("✅ Asignación en lote OK")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test del buscador de estudiantes
+Los filtros de buscar() corren contra SQLite en memoria. La búsqueda por
+trigramas necesita Postgres con pg_trgm: esos tests solo corren con
+TEST_DATABASE_URL (trabajan sobre una tabla temporal `estudiantes`).
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/no_usada')
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from api.paginacion import codificar_cursor, condicion_keyset
+from modules.buscador_estudiantes import (
+    SQL_COINCIDE, SQL_RELEVANCIA, BuscadorEstudiantes, params_busqueda
+)
+from modules.estudiantes import Estudiante
+
+ESTUDIANTES = [
+    ('José Pérez', 'Cuba', 'pendiente_revision_admin'),
+    ('Josefa Martínez', 'Cuba', 'registrado'),
+    ('Ana Pereira', 'Venezuela', 'pendiente_revision_admin'),
+    ('Anabel Pérez', 'Cuba', 'pendiente_revision_admin'),
+]
+
+
+def _filas():
+    return [
+        {
+            'id': i, 'telegram_id': 1000 + i, 'nombre_completo': nombre,
+            'numero_pasaporte': f'P{i:07d}', 'nacionalidad': nacionalidad,
+            'estado_procesamiento': estado
+        }
+        for i, (nombre, nacionalidad, estado) in enumerate(ESTUDIANTES, start=1)
+    ]
+
+
+def test_buscar_filtros():
+    """buscar() abre la consulta con la sesión y aplica los filtros"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(CreateTable(Estudiante.__table__, include_foreign_key_constraints=[]))
+        conn.execute(Estudiante.__table__.insert(), _filas())
+    db = sessionmaker(bind=engine)()
+
+    resultado = BuscadorEstudiantes.buscar(
+        nacionalidad='cuba', estado_procesamiento='pendiente_revision_admin', db=db
+    )
+
+    assert sorted(e.id for e in resultado) == [1, 4]
+
+
+@pytest.fixture
+def db_postgres():
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("Sin TEST_DATABASE_URL (Postgres con pg_trgm)")
+    engine = create_engine(url)
+    db = sessionmaker(bind=engine)()
+    # Tabla temporal: tapa a la real solo en esta sesión
+    ddl = str(CreateTable(Estudiante.__table__, include_foreign_key_constraints=[])
+              .compile(dialect=postgresql.dialect()))
+    db.execute(text(ddl.replace('CREATE TABLE', 'CREATE TEMPORARY TABLE', 1)))
+    db.execute(text("ALTER TABLE pg_temp.estudiantes ADD COLUMN busqueda_normalizada TEXT"))
+    db.execute(Estudiante.__table__.insert(), _filas())
+    db.execute(text("""
+        UPDATE pg_temp.estudiantes
+        SET busqueda_normalizada = lower(unaccent(nombre_completo))
+    """))
+    yield db
+    db.rollback()
+    db.close()
+
+
+def test_busqueda_rapida(db_postgres):
+    """Sin acentos, con coincidencias parciales y los más relevantes primero"""
+    resultado = BuscadorEstudiantes.busqueda_rapida('perez', db=db_postgres)
+
+    assert {e.id for e in resultado} >= {1, 4}
+    assert 2 not in {e.id for e in resultado}
+
+
+def test_relevancia_estable_en_el_cursor(db_postgres):
+    """La clave de orden vuelve idéntica del cursor: la fila frontera no se repite"""
+    params = params_busqueda('jose')
+    tipo = db_postgres.execute(text(f"SELECT pg_typeof({SQL_RELEVANCIA})::text"), params).scalar()
+    assert tipo == 'double precision'
+
+    consulta = f"""
+        SELECT id, {SQL_RELEVANCIA} AS clave FROM estudiantes
+        WHERE {SQL_COINCIDE} {{condicion}}
+        ORDER BY {SQL_RELEVANCIA} DESC, id DESC
+    """
+    filas = db_postgres.execute(text(consulta.format(condicion='')), params).all()
+    assert len(filas) >= 2
+
+    frontera = filas[0]
+    condicion, params_cursor = condicion_keyset(
+        [SQL_RELEVANCIA, 'id'], codificar_cursor([frontera.clave, frontera.id]), estilo='named'
+    )
+    siguientes = db_postgres.execute(
+        text(consulta.format(condicion=f"AND {condicion}")), {**params, **params_cursor}
+    ).all()
+
+    assert [fila.id for fila in siguientes] == [fila.id for fila in filas[1:]]
+
+
+if __name__ == "__main__":
+    test_buscar_filtros()
+    print("✅ Buscador OK (los tests de trigramas necesitan pytest y TEST_DATABASE_URL)")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test del extractor de campos OCR: importes de extractos bancarios
+Los números de cuenta, de cliente o los años no deben leerse como saldo.
+"""
+
+from api.extractor_documentos import extraer_campos
+from api.validador_ocr import ValidadorOCR
+
+EXTRACTO_CON_CUENTA = """BANCO SANTANDER
+Extracto de cuenta
+Cuenta: 0049 1500 05 2710183452
+Cliente: 4471203
+Fecha: 15/03/2024
+Saldo disponible: 1.250,00 EUR
+"""
+
+
+def test_numero_de_cuenta_no_es_saldo():
+    """El saldo es 1.250,00 €, no el número de cuenta"""
+    campos = extraer_campos(EXTRACTO_CON_CUENTA)
+    assert [valor for _, valor, _ in campos.montos] == [1250.0]
+
+    resultado = ValidadorOCR()._validar_extracto_bancario(campos)
+    assert resultado['datos']['saldo_disponible'] == "1,250.00 €"
+    assert resultado['validacion']['saldo_suficiente'] is False
+
+
+def test_importes_aceptados():
+    """Con divisa, con formato de miles/decimales o tras una etiqueta de saldo"""
+    campos = extraer_campos("Ingreso 20.000 €\nComisión 12,50\nSaldo: 18000\nAño 2024")
+    assert [valor for _, valor, _ in campos.montos] == [20000.0, 12.5, 18000.0]
+
+
+def test_cifras_largas_sin_formato():
+    """Una tirada larga de dígitos nunca es importe, ni tras 'saldo'"""
+    campos = extraer_campos("Saldo cuenta 2710183452\nReferencia 99999999 EUR")
+    assert campos.montos == []
+
+
+if __name__ == "__main__":
+    test_numero_de_cuenta_no_es_saldo()
+    test_importes_aceptados()
+    test_cifras_largas_sin_formato()
+    print("✅ Extractor de importes OK")
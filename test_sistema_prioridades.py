@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test del orden de estudiantes por prioridad
+Corre ordenar_estudiantes_por_prioridad contra una base SQLite en memoria
+con las tablas reales (sin sus claves foráneas) y cuenta las consultas.
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/no_usada')
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from modules.cursos import Curso
+from modules.estudiantes import Estudiante
+from modules.fondos import GestorFondos, Patrocinador, TransferenciaFondos
+from modules.sistema_prioridades import SistemaPrioridades
+
+
+def _estudiante(i, **datos):
+    return {
+        'id': i, 'telegram_id': 1000 + i, 'nombre_completo': f'Estudiante {i}',
+        'numero_pasaporte': f'P{i:07d}', 'estado_procesamiento': 'pendiente_revision_admin',
+        **datos
+    }
+
+
+def _sesion():
+    engine = create_engine('sqlite://')
+    ahora = datetime.now()
+    with engine.begin() as conn:
+        for modelo in (Estudiante, Curso, Patrocinador, TransferenciaFondos):
+            conn.execute(CreateTable(modelo.__table__, include_foreign_key_constraints=[]))
+        # INSERT directo: el flush del ORM no resuelve las claves foráneas
+        conn.execute(Curso.__table__.insert(), [
+            {'id': 1, 'nombre': 'Grado', 'precio': 6000, 'duracion_meses': 12,
+             'fecha_inicio': ahora + timedelta(days=10, hours=1)},
+            {'id': 2, 'nombre': 'Máster', 'precio': 9000, 'duracion_meses': 12,
+             'fecha_inicio': ahora + timedelta(days=200)},
+        ])
+        conn.execute(Patrocinador.__table__.insert(), [
+            {'id': 1, 'nombre_completo': 'Patrocinador', 'capacidad_patrocinio': 10000},
+        ])
+        conn.execute(TransferenciaFondos.__table__.insert(), [
+            {'id': 1, 'estudiante_id': 3, 'monto': 2000, 'estado': 'completada'},
+            {'id': 2, 'estudiante_id': 3, 'monto': 500, 'estado': 'completada'},
+            {'id': 3, 'estudiante_id': 3, 'monto': 9999, 'estado': 'pendiente'},
+        ])
+        # Uno a uno: cada fila rellena columnas distintas
+        for fila in [
+            # Curso inminente, todo completo, fondos de sobra, 50 h esperando
+            _estudiante(
+                1, curso_asignado_id=1, documentos_completados=['a', 'b'], documentos_pendientes=[],
+                tiene_fondos_propios=True, monto_fondos_disponibles=100000,
+                fecha_procesamiento_automatico=ahora - timedelta(hours=50),
+                email='a@a.es', telefono='600', especialidad_interes='Medicina', nivel_espanol='B2'
+            ),
+            # Sin curso ni datos
+            _estudiante(2),
+            # Patrocinador + transferencias completadas
+            _estudiante(
+                3, curso_asignado_id=2, documentos_completados=['a'], documentos_pendientes=['b'],
+                tiene_patrocinador=True, patrocinador_id=1
+            ),
+            _estudiante(4, estado_procesamiento='registrado'),
+        ]:
+            conn.execute(Estudiante.__table__.insert(), fila)
+    return engine, sessionmaker(bind=engine)()
+
+
+def test_orden_por_prioridad():
+    engine, db = _sesion()
+    consultas = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+
+    resultado = SistemaPrioridades.ordenar_estudiantes_por_prioridad(db=db)
+
+    # Estudiantes pendientes, cursos, patrocinadores y transferencias
+    assert len(consultas) == 4
+    assert [e['estudiante_id'] for e in resultado] == [1, 3, 2]
+    assert resultado[0]['score'] == 100
+    assert resultado[0]['prioridad'] == 'URGENTE'
+
+    fondos_minimos, _, _ = GestorFondos.calcular_fondos_minimos(db.get(Curso, 2))
+    cobertura = resultado[1]['desglose']['fondos']['porcentaje_cobertura']
+    assert cobertura == (10000 + 2500) / fondos_minimos * 100
+
+
+def test_limite_devuelve_los_mayores():
+    _, db = _sesion()
+
+    resultado = SistemaPrioridades.ordenar_estudiantes_por_prioridad(limite=2, db=db)
+
+    assert [e['estudiante_id'] for e in resultado] == [1, 3]
+
+
+if __name__ == "__main__":
+    test_orden_por_prioridad()
+    test_limite_devuelve_los_mayores()
+    print("✅ Prioridades OK")
@@ -0,0 +1,99 @@
+"""
+Verifica que ningún handler `async def` de la API haga I/O síncrono de BD
+Recorre api/*.py y marca las funciones async que llaman directamente a
+get_connection(), cursor.execute(), db.query(), db.execute(), db.commit()...
+fuera de run_in_threadpool. Esas llamadas bloquean el event loop: el handler
+debe ser `def` (FastAPI lo ejecuta en su threadpool) o delegar en un hilo.
+
+Uso: python verificar_bloqueos_event_loop.py   (sale con 1 si encuentra alguno)
+En ejecución, DETECTAR_BLOQUEOS=0.2 activa api/detector_bloqueos.py.
+"""
+
+import ast
+import glob
+import os
+import sys
+
+# Llamadas que siempre son I/O síncrono de BD
+FUNCIONES_BLOQUEANTES = {'get_connection', 'psycopg2.connect'}
+# Métodos síncronos de sesiones, conexiones y cursores
+METODOS_BLOQUEANTES = {'execute', 'executemany', 'query', 'commit', 'rollback', 'refresh',
+                       'fetchone', 'fetchall', 'flush', 'cursor'}
+# Receptores habituales de esos métodos en este código
+RECEPTORES = {'db', 'conn', 'cursor', 'cur', 'session', 'connection'}
+
+
+def _nombre(nodo) -> str:
+    if isinstance(nodo, ast.Name):
+        return nodo.id
+    if isinstance(nodo, ast.Attribute):
+        base = _nombre(nodo.value)
+        return f"{base}.{nodo.attr}" if base else nodo.attr
+    return ''
+
+
+class _Buscador(ast.NodeVisitor):
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.hallazgos = []
+        self._async = []
+
+    def visit_AsyncFunctionDef(self, nodo):
+        self._async.append(nodo.name)
+        self.generic_visit(nodo)
+        self._async.pop()
+
+    def visit_FunctionDef(self, nodo):
+        # Una función síncrona anidada no corre en el loop por sí misma
+        anterior, self._async = self._async, []
+        self.generic_visit(nodo)
+        self._async = anterior
+
+    def visit_Lambda(self, nodo):
+        anterior, self._async = self._async, []
+        self.generic_visit(nodo)
+        self._async = anterior
+
+    def visit_Call(self, nodo):
+        nombre = _nombre(nodo.func)
+        if nombre.endswith('run_in_threadpool') or nombre.endswith('to_thread') or nombre.endswith('run_in_executor'):
+            # Los argumentos se ejecutan en otro hilo
+            return
+        if self._async:
+            metodo = nombre.rsplit('.', 1)[-1]
+            receptor = nombre.rsplit('.', 2)[-2] if '.' in nombre else ''
+            if nombre in FUNCIONES_BLOQUEANTES or (metodo in METODOS_BLOQUEANTES and receptor in RECEPTORES):
+                self.hallazgos.append((self.archivo, nodo.lineno, self._async[-1], nombre))
+        self.generic_visit(nodo)
+
+
+def verificar(rutas):
+    hallazgos = []
+    for ruta in rutas:
+        with open(ruta, encoding='utf-8') as f:
+            arbol = ast.parse(f.read(), filename=ruta)
+        buscador = _Buscador(ruta)
+        buscador.visit(arbol)
+        hallazgos.extend(buscador.hallazgos)
+    return hallazgos
+
+
+def main():
+    base = os.path.dirname(os.path.abspath(__file__))
+    rutas = sorted(glob.glob(os.path.join(base, 'api', '*.py')))
+    hallazgos = verificar(rutas)
+
+    print("🔎 I/O síncrono de BD dentro de funciones async")
+    print("=" * 60)
+    # El startup corre antes de aceptar peticiones: bloquear ahí no congela a nadie
+    hallazgos = [h for h in hallazgos if h[2] != 'startup_event']
+    for archivo, linea, funcion, llamada in hallazgos:
+        print(f"❌ {os.path.relpath(archivo, base)}:{linea} {funcion}() llama a {llamada}()")
+    if hallazgos:
+        print(f"\n{len(hallazgos)} llamadas bloqueantes en el event loop")
+        sys.exit(1)
+    print(f"✅ {len(rutas)} archivos revisados, ningún handler async bloquea el event loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Verifica la elección de líder del planificador con varios workers
+Arranca 3 planificadores en este mismo proceso (cada uno con su conexión y
+su advisory lock, como si fueran 3 workers de uvicorn) contra la BD de
+DATABASE_URL (usar un Postgres local), programa una tarea cada 2 segundos y
+comprueba que:
+  1. hay exactamente un líder,
+  2. cada tick se ejecuta una sola vez (no una por worker),
+  3. al detener al líder otro worker toma el relevo y la tarea sigue.
+
+Uso: DATABASE_URL=postgresql://localhost/pruebas python verificar_planificador_lider.py
+"""
+
+import sys
+import time
+
+from apscheduler.triggers.interval import IntervalTrigger
+
+from api.planificador import Planificador
+from database.migraciones import migrar
+
+# Llave distinta de la real para no competir con una API arrancada
+LLAVE_PRUEBA = 7_204_519_999
+TAREA = 'verificacion_lider_tick'
+
+ejecuciones = []
+
+
+def tick():
+    ejecuciones.append(time.monotonic())
+
+
+def lideres(planificadores):
+    return [p.nombre for p in planificadores if p.es_lider]
+
+
+def main():
+    migrar()
+    planificadores = [Planificador(nombre=f"worker-{i}", llave=LLAVE_PRUEBA, intervalo=1) for i in range(3)]
+    for p in planificadores:
+        p.iniciar()
+    planificadores[0].programar(TAREA, f'{__name__}:tick', IntervalTrigger(seconds=2))
+
+    errores = []
+    time.sleep(10)
+    actuales = lideres(planificadores)
+    print(f"👑 Líderes: {actuales}")
+    if len(actuales) != 1:
+        errores.append(f"se esperaba 1 líder y hay {len(actuales)}")
+
+    # Un tick cada 2 s: dos ejecuciones a menos de 1 s son el mismo tick duplicado
+    repetidos = sum(1 for a, b in zip(ejecuciones, ejecuciones[1:]) if b - a < 1)
+    print(f"⏱️ Ticks ejecutados: {len(ejecuciones)}, repetidos: {repetidos}")
+    if repetidos:
+        errores.append(f"{repetidos} ticks ejecutados más de una vez")
+
+    # Relevo: detener al líder
+    if actuales:
+        lider = next(p for p in planificadores if p.nombre == actuales[0])
+        lider.detener()
+        antes = len(ejecuciones)
+        time.sleep(8)
+        nuevos = lideres(planificadores)
+        print(f"🔁 Tras detener a {lider.nombre}: líderes {nuevos}, ticks nuevos {len(ejecuciones) - antes}")
+        if len(nuevos) != 1:
+            errores.append("no hubo relevo del líder")
+        if len(ejecuciones) == antes:
+            errores.append("la tarea dejó de ejecutarse tras el relevo")
+
+    vivos = [p for p in planificadores if p.scheduler.running]
+    if vivos:
+        vivos[0].cancelar(TAREA)
+    for p in vivos:
+        p.detener()
+
+    if errores:
+        for error in errores:
+            print(f"❌ {error}")
+        sys.exit(1)
+    print("✅ Un solo líder, sin ejecuciones duplicadas y con relevo")
+
+
+if __name__ == "__main__":
+    main()